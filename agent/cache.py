@@ -0,0 +1,113 @@
+"""Two-tier cache of WhatWeb scan results: an in-process LRU and an optional shared Redis tier."""
+
+import collections
+import logging
+import threading
+import time
+import zlib
+from typing import Optional
+
+import redis
+
+from agent import definitions
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 1024
+REDIS_KEY_PREFIX = "agent_whatweb_cache"
+
+
+def make_key(
+    target: str,
+    plugin_profile: str,
+    log_format: str,
+    fingerprint_engine: str = definitions.WHATWEB_FINGERPRINT_ENGINE,
+) -> str:
+    """Returns the cache key of the scan results of a canonical target.
+
+    The results of a target differ with the plugin profile, the log format and the fingerprint engine, the
+    agents and MCP servers sharing the Redis tier may not use the same ones.
+    """
+    return f"{fingerprint_engine}:{log_format}:{plugin_profile}:{target}"
+
+
+class FingerprintCache:
+    """Caches the raw WhatWeb JSON log of a target for `ttl` seconds, entries are stored compressed.
+
+    Lookups hit the in-process LRU first, then the Redis tier if one is configured. Redis hits are copied to the
+    LRU. Redis failures are logged and handled as cache misses, they never fail a scan.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        redis_client: Optional["redis.Redis[bytes]"] = None,
+    ) -> None:
+        if ttl <= 0:
+            raise ValueError("Cache TTL must be a positive number.")
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._redis_client = redis_client
+        self._entries: collections.OrderedDict[str, tuple[float, bytes]] = (
+            collections.OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> bytes | None:
+        """Returns the cached WhatWeb output of the key, None if it is missing or expired."""
+        compressed = self._get_local(key)
+        if compressed is None:
+            compressed = self._get_redis(key)
+            if compressed is None:
+                return None
+            self._set_local(key, compressed)
+        return zlib.decompress(compressed)
+
+    def set(self, key: str, output: bytes) -> None:
+        """Caches the WhatWeb output of the key in all the tiers."""
+        compressed = zlib.compress(output)
+        self._set_local(key, compressed)
+        if self._redis_client is not None:
+            try:
+                self._redis_client.set(
+                    f"{REDIS_KEY_PREFIX}:{key}", compressed, ex=int(self._ttl) or 1
+                )
+            except redis.exceptions.RedisError as e:
+                logger.warning("Could not cache results of %s in Redis: %s", key, e)
+
+    def _get_local(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, compressed = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return compressed
+
+    def _set_local(self, key: str, compressed: bytes) -> None:
+        if self._max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self._ttl, compressed)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def _get_redis(self, key: str) -> bytes | None:
+        if self._redis_client is None:
+            return None
+        try:
+            value = self._redis_client.get(f"{REDIS_KEY_PREFIX}:{key}")
+        except redis.exceptions.RedisError as e:
+            logger.warning("Could not read cached results of %s from Redis: %s", key, e)
+            return None
+        if not isinstance(value, bytes):
+            return None
+        return value
@@ -0,0 +1,57 @@
+"""Per-target scan deadlines adapting to the latency observed on the previous scans."""
+
+import collections
+import math
+import threading
+
+# Number of recent scan durations the latency percentile is computed on.
+DEFAULT_WINDOW = 200
+# The deadline stays at its maximum until this many scans were observed.
+DEFAULT_MIN_SAMPLES = 20
+
+
+class AdaptiveDeadline:
+    """Deadline of a scan computed as a percentile of the recent scan durations times a safety factor.
+
+    The deadline is clamped between `minimum` and `maximum`, it is `maximum` until enough scans were observed.
+    Only completed scans are observed, so tarpitting targets do not drag the deadline up.
+    """
+
+    def __init__(
+        self,
+        maximum: float,
+        minimum: float = 0,
+        percentile: float = 95,
+        factor: float = 3,
+        window: int = DEFAULT_WINDOW,
+        min_samples: int = DEFAULT_MIN_SAMPLES,
+    ) -> None:
+        if maximum <= 0:
+            raise ValueError("Maximum scan deadline must be a positive number.")
+        if not 0 < percentile <= 100:
+            raise ValueError("Deadline percentile must be between 0 and 100.")
+        self._maximum = maximum
+        self._minimum = min(minimum, maximum)
+        self._percentile = percentile
+        self._factor = factor
+        self._min_samples = max(min_samples, 1)
+        self._durations: collections.deque[float] = collections.deque(
+            maxlen=max(window, 1)
+        )
+        self._lock = threading.Lock()
+
+    def observe(self, duration: float) -> None:
+        """Records the duration in seconds of a scan that completed before its deadline."""
+        with self._lock:
+            self._durations.append(duration)
+
+    def current(self) -> float:
+        """Returns the deadline in seconds of the next scan."""
+        with self._lock:
+            if len(self._durations) < self._min_samples:
+                return self._maximum
+            durations = sorted(self._durations)
+        # Nearest-rank percentile.
+        rank = math.ceil(self._percentile / 100 * len(durations))
+        deadline = durations[max(rank, 1) - 1] * self._factor
+        return min(max(deadline, self._minimum), self._maximum)
@@ -0,0 +1,78 @@
+"""Decoder of the WhatWeb JSON log into fingerprint records, shared by the agent and the MCP server tools."""
+
+import dataclasses
+from collections.abc import Iterable, Iterator
+from typing import IO
+
+from agent import definitions
+from agent import log_parser
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class Fingerprint:
+    """A library detected on a target, with one of its versions, None when no version was detected."""
+
+    name: str
+    version: str | None
+    type: str
+
+
+def fingerprint_type(library_name: str) -> str:
+    """Returns the fingerprint type of a library, the default type for unknown libraries."""
+    return definitions.FINGERPRINT_TYPE_MAP.get(
+        library_name.lower(), definitions.DEFAULT_FINGERPRINT_TYPE
+    )
+
+
+def decode_plugin_results(
+    plugin_results: Iterable[log_parser.PluginResult],
+) -> Iterator[Fingerprint]:
+    """Yields the fingerprints of the plugin results of one log line, the results of skipped plugins are dropped.
+
+    A plugin reporting a string is named after its last string, a plugin without version yields a single
+    fingerprint with a None version.
+    """
+    for plugin_result in plugin_results:
+        if plugin_result.name in log_parser.SKIPPED_PLUGINS:
+            continue
+        library_name = plugin_result.name
+        if plugin_result.string is not None:
+            library_name = str(plugin_result.string)
+        library_type = fingerprint_type(library_name)
+        if len(plugin_result.versions) == 0:
+            yield Fingerprint(library_name, None, library_type)
+        for version in plugin_result.versions:
+            yield Fingerprint(library_name, str(version), library_type)
+
+
+def decode_line(line: bytes) -> Iterator[Fingerprint]:
+    """Yields the fingerprints of one line of the WhatWeb JSON log, collected from one URL.
+
+    Raises:
+        json.JSONDecodeError: if the line is not valid JSON.
+    """
+    yield from decode_plugin_results(log_parser.iter_plugin_results(line))
+
+
+def decode_output(lines: Iterable[bytes]) -> Iterator[Fingerprint]:
+    """Yields the fingerprints of every line of a WhatWeb JSON log in the order they were logged, skipping blank lines.
+
+    Raises:
+        json.JSONDecodeError: if a line is not valid JSON.
+    """
+    for line in lines:
+        if line.strip() == b"":
+            continue
+        yield from decode_line(line)
+
+
+def decode_log(
+    stream: IO[bytes], max_bytes: int = 0, partial: bool = False
+) -> Iterator[Fingerprint]:
+    """Yields the fingerprints of a WhatWeb JSON log parsed while it is read from its file, see `log_parser.iter_log`.
+
+    Raises:
+        json.JSONDecodeError: if a line is not valid JSON.
+    """
+    for log_line in log_parser.iter_log(stream, max_bytes, partial=partial):
+        yield from decode_plugin_results(log_line.plugin_results)
@@ -0,0 +1,332 @@
+"""Local front of the Redis sets deduplicating the scanned targets: an exact LRU and a Bloom filter.
+
+Every message checks its target against a Redis set shared by the agent replicas. Under message floods most
+targets were already seen, the front answers the definitely seen targets without a Redis round trip:
+
+- a target in the LRU of the recently seen targets was seen,
+- otherwise Redis decides: the target is added with SADD and is new if Redis did not hold it.
+
+The Bloom filter, loaded with the members of the Redis set in the background, is never trusted on its own: a false
+positive would drop a target that was never scanned. Its hits are confirmed by Redis and its false positives are
+counted, they grow once the set outgrows the capacity of the filter. Networks found new are written to Redis in
+pipelined batches, on every Redis round trip, periodically once the front is started, and when it is closed. A
+network first seen by two replicas within a flush interval may be scanned by both of them. Redis round trips are
+made without holding the lock of the front.
+"""
+
+import collections
+import dataclasses
+import hashlib
+import ipaddress
+import logging
+import math
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+
+import redis
+
+from agent import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 1_000_000
+DEFAULT_ERROR_RATE = 0.001
+DEFAULT_LRU_SIZE = 65536
+DEFAULT_FLUSH_SIZE = 256
+# Seconds a new target may wait before being written to Redis.
+DEFAULT_FLUSH_INTERVAL = 1.0
+# Members read per SSCAN call while loading the Bloom filter.
+LOAD_BATCH_SIZE = 1000
+
+
+class BloomFilter:
+    """Bloom filter sized for `capacity` members at a false positive rate of `error_rate`."""
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        if capacity <= 0:
+            raise ValueError("Bloom filter capacity must be a positive number.")
+        if not 0 < error_rate < 1:
+            raise ValueError("Bloom filter error rate must be between 0 and 1.")
+        self._bits_count = max(
+            8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self._hashes_count = max(1, round(self._bits_count / capacity * math.log(2)))
+        self._bits = bytearray((self._bits_count + 7) // 8)
+
+    def _positions(self, member: bytes) -> list[int]:
+        # Double hashing: the k positions are derived from two independent 64 bits hashes.
+        digest = hashlib.blake2b(member, digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [
+            (first + index * second) % self._bits_count
+            for index in range(self._hashes_count)
+        ]
+
+    def add(self, member: bytes) -> None:
+        for position in self._positions(member):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, member: bytes) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(member)
+        )
+
+
+@dataclasses.dataclass
+class DedupStats:
+    """Counters of the answers of a dedup front."""
+
+    # Targets answered as seen by the LRU.
+    lru_hits: int = 0
+    # Targets answered by Redis.
+    redis_lookups: int = 0
+    # Targets answered by Redis that were in the Bloom filter, and those of them Redis did not hold.
+    bloom_hits: int = 0
+    bloom_false_positives: int = 0
+    # Pipelined writes of the new networks and the networks they wrote.
+    flushes: int = 0
+    flushed_members: int = 0
+
+    @property
+    def redis_avoided_ratio(self) -> float:
+        """Share of the targets answered without a Redis round trip."""
+        answered = self.lru_hits + self.redis_lookups
+        if answered == 0:
+            return 0.0
+        return self.lru_hits / answered
+
+
+class DedupFront:
+    """Deduplicates the members of a Redis set, answering the recently seen members from a local LRU."""
+
+    def __init__(
+        self,
+        redis_client: "redis.Redis[bytes]",
+        key: bytes | str,
+        capacity: int = DEFAULT_CAPACITY,
+        error_rate: float = DEFAULT_ERROR_RATE,
+        lru_size: int = DEFAULT_LRU_SIZE,
+        flush_size: int = DEFAULT_FLUSH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._redis_client = redis_client
+        self._key = key
+        self._metric_key = key.decode() if isinstance(key, bytes) else key
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._lru: collections.OrderedDict[bytes, None] = collections.OrderedDict()
+        self._lru_size = max(lru_size, 1)
+        self._flush_size = max(flush_size, 1)
+        self._flush_interval = flush_interval
+        self._clock = clock
+        self._pending: list[bytes] = []
+        self._pending_since = 0.0
+        self._lock = threading.Lock()
+        self._load_started = False
+        self._closed = threading.Event()
+        self._flusher: threading.Thread | None = None
+        self.stats = DedupStats()
+
+    def start(self) -> None:
+        """Loads the Bloom filter and flushes the new networks every flush interval, from background threads."""
+        with self._lock:
+            self._start_loading()
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(
+                target=self._flush_periodically, name="dedup-flusher", daemon=True
+            )
+            self._flusher.start()
+
+    def close(self) -> None:
+        """Stops the periodic flush and writes the queued new networks to Redis."""
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+
+    def load(self) -> None:
+        """Adds the members of the Redis set to the Bloom filter, once, in the calling thread."""
+        with self._lock:
+            if self._load_started is True:
+                return
+            self._load_started = True
+        self._load_members()
+
+    def _start_loading(self) -> None:
+        """Loads the Bloom filter from a background thread, once. Called with the lock held."""
+        if self._load_started is True:
+            return
+        self._load_started = True
+        threading.Thread(
+            target=self._load_members, name="dedup-loader", daemon=True
+        ).start()
+
+    def _load_members(self) -> None:
+        """Scans the Redis set without holding the lock, lookups go on meanwhile."""
+        loaded = 0
+        batch: list[bytes] = []
+        for member in self._redis_client.sscan_iter(self._key, count=LOAD_BATCH_SIZE):
+            batch.append(member)
+            if len(batch) >= LOAD_BATCH_SIZE:
+                loaded += self._add_to_bloom(batch)
+        loaded += self._add_to_bloom(batch)
+        logger.info("Loaded %s members of %r in the dedup filter.", loaded, self._key)
+
+    def _add_to_bloom(self, members: list[bytes]) -> int:
+        with self._lock:
+            for member in members:
+                self._bloom.add(member)
+        added = len(members)
+        members.clear()
+        return added
+
+    def add(self, member: str) -> bool:
+        """Returns True if the member was never seen and records it, False if it was seen before."""
+        encoded = member.encode()
+        with self._lock:
+            self._start_loading()
+            if self._seen_locally(encoded) is True:
+                self._record_ratio()
+                return False
+            self.stats.redis_lookups += 1
+            in_bloom = encoded in self._bloom
+            pending = self._take_pending()
+        pipeline = self._pipeline(pending)
+        pipeline.sadd(self._key, encoded)
+        is_new = bool(self._execute(pipeline, pending)[-1])
+        with self._lock:
+            if in_bloom is True:
+                self.stats.bloom_hits += 1
+                if is_new is True:
+                    self.stats.bloom_false_positives += 1
+            self._remember(encoded)
+            self._record_ratio()
+        return is_new
+
+    def add_ip_network(
+        self,
+        ip_range: ipaddress.IPv4Network | ipaddress.IPv6Network,
+        value: Callable[[ipaddress.IPv4Network | ipaddress.IPv6Network], str],
+    ) -> bool:
+        """Returns True and records the network if neither it nor one of its supernets was seen before.
+
+        Same semantics as `AgentPersistMixin.add_ip_network`. The network and its supernets are checked in the
+        LRU, then with a single pipelined round trip instead of one round trip per supernet. The new network is
+        queued for the next pipelined write.
+        """
+        # The network itself, then its supernets.
+        supernets = [value(ip_range).encode()]
+        network = ip_range
+        while network.prefixlen > 1:
+            network = network.supernet()
+            supernets.append(value(network).encode())
+        with self._lock:
+            self._start_loading()
+            if any(self._seen_locally(supernet) for supernet in supernets):
+                self._record_ratio()
+                return False
+            self.stats.redis_lookups += 1
+            pending = self._take_pending()
+        pipeline = self._pipeline(pending)
+        for supernet in supernets:
+            pipeline.sismember(self._key, supernet)
+        seen = any(self._execute(pipeline, pending)[-len(supernets) :])
+        with self._lock:
+            self._record_ratio()
+            # Another thread may have found the network new during the round trip.
+            if seen is True or supernets[0] in self._lru:
+                self._remember(supernets[0])
+                return False
+            self._remember(supernets[0])
+            flushed = self._queue(supernets[0])
+        if len(flushed) > 0:
+            self._execute(self._pipeline(flushed), flushed)
+        return True
+
+    def flush(self) -> None:
+        """Writes the queued new networks to Redis."""
+        with self._lock:
+            pending = self._take_pending()
+        if len(pending) > 0:
+            self._execute(self._pipeline(pending), pending)
+
+    def _flush_periodically(self) -> None:
+        while self._closed.wait(self._flush_interval) is False:
+            try:
+                self.flush()
+            except redis.RedisError as e:
+                logger.error("Error flushing the dedup members of %r: %s", self._key, e)
+
+    def _seen_locally(self, member: bytes) -> bool:
+        if member in self._lru:
+            self._lru.move_to_end(member)
+            self.stats.lru_hits += 1
+            return True
+        return False
+
+    def _remember(self, member: bytes) -> None:
+        self._bloom.add(member)
+        self._lru[member] = None
+        self._lru.move_to_end(member)
+        if len(self._lru) > self._lru_size:
+            self._lru.popitem(last=False)
+
+    def _queue(self, member: bytes) -> list[bytes]:
+        """Queues a new network, returns the queued networks to write when a flush is due. Called with the lock held."""
+        if len(self._pending) == 0:
+            self._pending_since = self._clock()
+        self._pending.append(member)
+        if (
+            len(self._pending) >= self._flush_size
+            or self._clock() - self._pending_since >= self._flush_interval
+        ):
+            return self._take_pending()
+        return []
+
+    def _take_pending(self) -> list[bytes]:
+        """Takes the queued networks for a write, called with the lock held."""
+        pending = self._pending
+        self._pending = []
+        return pending
+
+    def _pipeline(self, pending: list[bytes]) -> "redis.client.Pipeline[bytes]":
+        """Returns a pipeline writing the taken networks, the commands of the caller are answered last."""
+        pipeline = self._redis_client.pipeline(transaction=False)
+        for start in range(0, len(pending), self._flush_size):
+            pipeline.sadd(self._key, *pending[start : start + self._flush_size])
+        return pipeline
+
+    def _execute(
+        self, pipeline: "redis.client.Pipeline[bytes]", pending: list[bytes]
+    ) -> list[Any]:
+        """Executes a pipeline of `_pipeline` without the lock, the taken networks are queued back if it fails."""
+        try:
+            results = pipeline.execute()
+        except redis.RedisError:
+            with self._lock:
+                if len(pending) > 0:
+                    if len(self._pending) == 0:
+                        self._pending_since = self._clock()
+                    self._pending[:0] = pending
+            raise
+        if len(pending) > 0:
+            with self._lock:
+                self.stats.flushes += 1
+                self.stats.flushed_members += len(pending)
+            logger.debug(
+                "Flushed %s new members of %r, %.1f%% of the lookups avoided Redis.",
+                len(pending),
+                self._key,
+                self.stats.redis_avoided_ratio * 100,
+            )
+        return results
+
+    def _record_ratio(self) -> None:
+        metrics.DEDUP_REDIS_AVOIDED_RATIO.set(
+            self.stats.redis_avoided_ratio, key=self._metric_key
+        )
@@ -2,6 +2,20 @@
 
 WHATWEB_PATH = "./whatweb"
 WHATWEB_DIRECTORY = "/WhatWeb"
+WHATWEB_WORKER_PATH = "./whatweb_worker.rb"
+WHATWEB_MAX_THREADS = 25
+# Bytes of WhatWeb log parsed per target, the lines past the cap are dropped.
+MAX_OUTPUT_BYTES = 16 * 1024 * 1024
+
+THREADS_SCAN_ENGINE = "threads"
+ASYNCIO_SCAN_ENGINE = "asyncio"
+
+WHATWEB_FINGERPRINT_ENGINE = "whatweb"
+NATIVE_FINGERPRINT_ENGINE = "native"
+NATIVE_SIGNATURES_PATH = "/app/agent/signatures.json"
+NATIVE_USER_AGENT = "WhatWeb/0.5.5"
+NATIVE_MAX_REDIRECTS = 10
+NATIVE_REQUEST_TIMEOUT = 15
 
 BLACKLISTED_PLUGINS = [
     "X-Frame-Options",
@@ -29,6 +43,24 @@ BLACKLISTED_PLUGINS = [
     "IP",
 ]
 
+# Named selections of the WhatWeb plugins to run, turned into WhatWeb's `--plugins` option.
+# Every entry is a plugin name prefixed with `+` to include it or `-` to exclude it from the default plugin set.
+PLUGIN_PROFILES: dict[str, list[str]] = {
+    # All the plugins run, blacklisted plugins are only discarded while parsing the results.
+    "all": [],
+    # The blacklisted plugins never run, they cost no matching nor log output.
+    "lean": [f"-{plugin}" for plugin in BLACKLISTED_PLUGINS],
+}
+DEFAULT_PLUGIN_PROFILE = "all"
+
+# WhatWeb log option of every log format. The lean log is written by `worker/lean_json_log.rb`, it only holds the
+# plugin names, versions and strings of every visited URL.
+LOG_FORMATS: dict[str, str] = {
+    "verbose": "--log-json-verbose",
+    "lean": "--log-lean-json",
+}
+DEFAULT_LOG_FORMAT = "verbose"
+
 DEFAULT_FINGERPRINT_TYPE = "BACKEND_COMPONENT"
 
 FINGERPRINT_TYPE_MAP: dict[str, str] = {"jquery": "JAVASCRIPT_LIBRARY"}
@@ -0,0 +1,98 @@
+"""TCP liveness prefilter, drops the hosts that do not accept connections before paying a WhatWeb run for them."""
+
+import asyncio
+import collections
+import itertools
+import logging
+from collections.abc import Callable, Iterable, Iterator
+from typing import TypeVar
+
+from agent import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_CONNECT_TIMEOUT = 1.0
+DEFAULT_CONCURRENCY = 500
+
+
+async def is_port_open(host: str, port: int, timeout: float) -> bool:
+    """Whether a TCP connection to the host port is accepted before the timeout expires."""
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (TimeoutError, OSError):
+        return False
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True
+
+
+async def _probe(
+    host: str, port: int | None, timeout: float, semaphore: asyncio.Semaphore
+) -> bool:
+    """Probes the address once a connect slot is free, an address without a port is considered alive."""
+    if port is None:
+        return True
+    async with semaphore:
+        return await is_port_open(host, port, timeout)
+
+
+def filter_live_targets(
+    targets: Iterable[T],
+    get_address: Callable[[T], tuple[str, int | None]],
+    timeout: float = DEFAULT_CONNECT_TIMEOUT,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> Iterator[T]:
+    """Yields the targets accepting TCP connections on their port, in their original order.
+
+    The probes run on a single event loop, a semaphore caps the non-blocking connects in flight. Targets are
+    probed up to `concurrency` targets ahead of the oldest pending one, the loop only runs while the generator
+    waits for the oldest probe to end.
+
+    Args:
+        targets: Targets to probe, consumed lazily.
+        get_address: Returns the host and port to connect to for a target.
+        timeout: Connect timeout in seconds.
+        concurrency: Maximum number of connects in flight.
+    """
+    concurrency = max(concurrency, 1)
+    loop = asyncio.new_event_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    pending: collections.deque[tuple[T, asyncio.Task[bool]]] = collections.deque()
+    kept = 0
+    dropped = 0
+    iterator = iter(targets)
+    try:
+        while True:
+            for target in itertools.islice(iterator, concurrency - len(pending)):
+                host, port = get_address(target)
+                pending.append(
+                    (target, loop.create_task(_probe(host, port, timeout, semaphore)))
+                )
+            if len(pending) == 0:
+                break
+            target, probe = pending.popleft()
+            if loop.run_until_complete(probe) is True:
+                kept += 1
+                yield target
+            else:
+                dropped += 1
+                metrics.LIVENESS_DROPPED.inc()
+                logger.debug("Dropping unresponsive target %s", target)
+    finally:
+        for _, probe in pending:
+            probe.cancel()
+        if len(pending) > 0:
+            loop.run_until_complete(
+                asyncio.gather(*(probe for _, probe in pending), return_exceptions=True)
+            )
+        loop.close()
+    logger.info(
+        "Liveness prefilter kept %s targets and dropped %s unresponsive targets",
+        kept,
+        dropped,
+    )
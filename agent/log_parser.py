@@ -0,0 +1,459 @@
+"""Parser of the WhatWeb JSON log lines, keeping only the fields the fingerprints are built from.
+
+Verbose log lines embed compiled regexes, whole scripts and meta payloads, the results of every plugin are merged
+into their versions and their last string. Lines past `INCREMENTAL_LINE_BYTES` are walked token by token without
+building their tree: only the plugin names and the `version` and `string` values are decoded. Skipped values,
+including the whole results of the skipped plugins, are stepped over from one bracket to the next with possessive
+regexes, which keep no backtracking state. Shorter lines are decoded at once by the Rust decoder of pydantic, about
+twice as fast as the json module, their tree is small.
+
+A log is read from its file or pipe by `iter_log`, line after line under the output cap of the scan. A long line is
+parsed while it is read, chunk by chunk: only the window around the value being parsed is held in memory, a
+skipped value is stepped over without being buffered. Reading stops at the cap, the line crossing it is dropped.
+
+Lean log lines, written by `worker/lean_json_log.rb`, hold a single result object per plugin instead of a list of
+results, they are read the same way.
+"""
+
+import dataclasses
+import json
+import logging
+import re
+from collections.abc import Collection, Iterator
+from typing import IO, Any
+
+import pydantic_core
+
+from agent import definitions
+
+logger = logging.getLogger(__name__)
+
+# Results of the blacklisted plugins are never decoded.
+SKIPPED_PLUGINS = frozenset(definitions.BLACKLISTED_PLUGINS)
+# Lines longer than this are parsed incrementally.
+INCREMENTAL_LINE_BYTES = 64 * 1024
+# Bytes of a long line read at a time, the window grows only while a decoded value spans it.
+READ_CHUNK_BYTES = 64 * 1024
+
+_WHITESPACE = re.compile(rb"[ \t\r\n]*+")
+# Unrolled string body, a character class run between escapes is matched in one step.
+_STRING_PATTERN = rb'"[^"\\]*+(?:\\.[^"\\]*+)*+"'
+_STRING = re.compile(_STRING_PATTERN, re.DOTALL)
+_SCALAR = re.compile(
+    _STRING_PATTERN + rb"|-?[0-9][0-9.eE+-]*+|true|false|null", re.DOTALL
+)
+_NUMBER_OR_LITERAL = re.compile(rb"-?[0-9][0-9.eE+-]*+|true|false|null")
+# Rest of a string body after its opening quote, up to its closing quote or the end of the window.
+_STRING_BODY = re.compile(rb'[^"\\]*+(?:\\.[^"\\]*+)*+', re.DOTALL)
+# Everything up to the next bracket that is not inside a string, stops at a string cut by the end of the window.
+_UNTIL_BRACKET = re.compile(rb'(?:[^"\[\]{}]++|' + _STRING_PATTERN + rb")*+", re.DOTALL)
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class PluginResult:
+    """The results of a plugin on one URL, merged into the versions of all the results and the last string.
+
+    `string` is None when no result holds a string.
+    """
+
+    name: str
+    versions: list[Any]
+    string: Any = None
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class LogLine:
+    """A line of a WhatWeb JSON log read by `iter_log`.
+
+    `head` is the start of the line, holding at least its URL and status. `line` is the whole line when the lines
+    are kept, None otherwise.
+    """
+
+    head: bytes
+    plugin_results: list[PluginResult]
+    line: bytes | None = None
+
+
+class _CapExceeded(Exception):
+    """Raised when a line read from a stream crosses the output cap."""
+
+
+class _Reader:
+    """Cursor over the bytes of a log line, read from a stream chunk by chunk when one is given.
+
+    The consumed bytes are dropped from the window when the next chunk is read, except from the start of the value
+    being decoded.
+    """
+
+    def __init__(
+        self,
+        data: bytes,
+        stream: IO[bytes] | None = None,
+        limit: int = -1,
+        keep: bool = False,
+    ) -> None:
+        self._data = data
+        self._pos = 0
+        self._stream = stream
+        self._line_ended = stream is None or data.endswith(b"\n")
+        # Bytes of the stream that may still be read, negative for no limit.
+        self._limit = limit
+        self._mark: int | None = None
+        self.terminated = data.endswith(b"\n")
+        self.read_bytes = 0
+        self.chunks: list[bytes] | None = [data] if keep is True else None
+
+    def error(self, message: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(message, "", self._pos)
+
+    def _more(self) -> bool:
+        """Reads the next chunk of the line into the window, False at the end of the line.
+
+        Raises:
+            _CapExceeded: if the line continues past the limit.
+        """
+        if self._line_ended is True or self._stream is None:
+            return False
+        keep_from = self._pos if self._mark is None else self._mark
+        # A value spanning the window doubles it, decoding a long value reads it in a few chunks.
+        size = max(READ_CHUNK_BYTES, len(self._data) - keep_from)
+        if self._limit >= 0:
+            if self._limit == 0:
+                raise _CapExceeded()
+            size = min(size, self._limit)
+        chunk = self._stream.readline(size)
+        if chunk == b"":
+            self._line_ended = True
+            return False
+        self.read_bytes += len(chunk)
+        if self._limit >= 0:
+            self._limit -= len(chunk)
+        if chunk.endswith(b"\n"):
+            self._line_ended = True
+            self.terminated = True
+        if self.chunks is not None:
+            self.chunks.append(chunk)
+        self._data = self._data[keep_from:] + chunk
+        self._pos -= keep_from
+        if self._mark is not None:
+            self._mark -= keep_from
+        return True
+
+    def finish(self) -> None:
+        """Reads and drops the rest of the line."""
+        while self._more():
+            self._pos = len(self._data)
+
+    def peek(self) -> bytes:
+        """Returns the next non-whitespace character without consuming it, empty at the end of the line."""
+        while True:
+            self._pos = _WHITESPACE.match(self._data, self._pos).end()  # type: ignore[union-attr]
+            if self._pos < len(self._data) or self._more() is False:
+                return self._data[self._pos : self._pos + 1]
+
+    def expect(self, char: bytes) -> None:
+        if self.peek() != char:
+            raise self.error(f"Expecting {char.decode()}")
+        self._pos += 1
+
+    def items(self, open_char: bytes, close_char: bytes) -> Iterator[None]:
+        """Yields once per item of an array or an object, positioned on the item. Items must be consumed."""
+        self.expect(open_char)
+        if self.peek() == close_char:
+            self._pos += 1
+            return
+        while True:
+            yield
+            separator = self.peek()
+            self._pos += 1
+            if separator == close_char:
+                return
+            if separator != b",":
+                raise self.error(f"Expecting , or {close_char.decode()}")
+
+    def string(self) -> str:
+        if self.peek() != b'"':
+            raise self.error("Expecting string")
+        found = _STRING.match(self._data, self._pos)
+        if found is not None:
+            self._pos = found.end()
+            return str(json.loads(found.group(0)))
+        return str(self.value())
+
+    def _skip_string(self) -> None:
+        """Steps over the string starting at the cursor."""
+        found = _STRING.match(self._data, self._pos)
+        if found is not None:
+            self._pos = found.end()
+            return
+        self._pos += 1
+        while True:
+            self._pos = _STRING_BODY.match(self._data, self._pos).end()  # type: ignore[union-attr]
+            if self._data[self._pos : self._pos + 1] == b'"':
+                self._pos += 1
+                return
+            # The window ends in the string, or on the backslash of a cut escape.
+            if self._more() is False:
+                raise self.error("Unterminated string")
+
+    def skip(self) -> None:
+        """Steps over the next value without decoding it."""
+        first = self.peek()
+        if first == b'"':
+            self._skip_string()
+            return
+        if first not in (b"[", b"{"):
+            while True:
+                found = _NUMBER_OR_LITERAL.match(self._data, self._pos)
+                if (
+                    found is not None and found.end() < len(self._data)
+                ) or self._more() is False:
+                    break
+            if found is None:
+                raise self.error("Expecting value")
+            self._pos = found.end()
+            return
+        depth = 0
+        while True:
+            self._pos = _UNTIL_BRACKET.match(self._data, self._pos).end()  # type: ignore[union-attr]
+            bracket = self._data[self._pos : self._pos + 1]
+            if bracket == b'"':
+                # A string cut by the end of the window.
+                self._skip_string()
+                continue
+            if bracket == b"":
+                if self._more() is False:
+                    raise self.error("Unterminated value")
+                continue
+            self._pos += 1
+            if bracket in (b"[", b"{"):
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def value(self) -> Any:
+        """Decodes the next value."""
+        self.peek()
+        self._mark = self._pos
+        try:
+            self.skip()
+            return json.loads(self._data[self._mark : self._pos])
+        finally:
+            self._mark = None
+
+
+def iter_plugin_results(
+    line: bytes, skipped_plugins: Collection[str] = SKIPPED_PLUGINS
+) -> Iterator[PluginResult]:
+    """Yields the results of the plugins of a WhatWeb JSON log line, `[url, status, [[plugin, [result...]]...]]`.
+
+    The results of a plugin of a lean log line are a single result object, `[plugin, result]`.
+
+    Malformed entries are skipped like the entries of the skipped plugins.
+
+    Raises:
+        json.JSONDecodeError: if the line is not valid JSON.
+    """
+    if len(line) <= INCREMENTAL_LINE_BYTES:
+        yield from _decoded_plugin_results(_loads(line), skipped_plugins)
+        return
+    yield from _read_plugin_results(_Reader(line), skipped_plugins)
+
+
+def iter_log(
+    stream: IO[bytes],
+    max_bytes: int = 0,
+    skipped_plugins: Collection[str] = SKIPPED_PLUGINS,
+    keep_lines: bool = False,
+    partial: bool = False,
+) -> Iterator[LogLine]:
+    """Yields the lines of a WhatWeb JSON log as they are read from a file or a pipe, skipping blank lines.
+
+    Args:
+        stream: The log, read line after line.
+        max_bytes: Bytes of log read, the line crossing it is dropped and the log is not read further. 0 reads the
+            whole log.
+        skipped_plugins: Plugins whose results are not decoded.
+        keep_lines: Whether the lines are kept whole in the `line` of their `LogLine`, to cache them.
+        partial: Whether the log was cut by a killed scan, its unterminated last line is dropped.
+
+    Raises:
+        json.JSONDecodeError: if a line is not valid JSON.
+    """
+    read_bytes = 0
+    while True:
+        limit = INCREMENTAL_LINE_BYTES + 1
+        if max_bytes > 0:
+            limit = min(limit, max_bytes - read_bytes + 1)
+        head = stream.readline(limit)
+        if head == b"":
+            return
+        read_bytes += len(head)
+        if max_bytes > 0 and read_bytes > max_bytes:
+            _warn_capped(max_bytes)
+            return
+        if head.endswith(b"\n") is False and len(head) < limit:
+            # The last line of the log, without its newline.
+            if partial is True or head.strip() == b"":
+                return
+            yield LogLine(
+                head,
+                list(_decoded_plugin_results(_loads(head), skipped_plugins)),
+                head if keep_lines is True else None,
+            )
+            return
+        if head.endswith(b"\n") is True:
+            if head.strip() != b"":
+                yield LogLine(
+                    head,
+                    list(_decoded_plugin_results(_loads(head), skipped_plugins)),
+                    head if keep_lines is True else None,
+                )
+            continue
+        reader = _Reader(
+            head,
+            stream,
+            limit=max_bytes - read_bytes if max_bytes > 0 else -1,
+            keep=keep_lines,
+        )
+        try:
+            try:
+                plugin_results = list(_read_plugin_results(reader, skipped_plugins))
+                reader.finish()
+            except json.JSONDecodeError:
+                reader.finish()
+                if partial is True and reader.terminated is False:
+                    return
+                raise
+        except _CapExceeded:
+            _warn_capped(max_bytes)
+            return
+        read_bytes += reader.read_bytes
+        if partial is True and reader.terminated is False:
+            return
+        yield LogLine(
+            head,
+            plugin_results,
+            b"".join(reader.chunks) if reader.chunks is not None else None,
+        )
+
+
+def _warn_capped(max_bytes: int) -> None:
+    logger.warning(
+        "WhatWeb output exceeds %s bytes, dropping the lines past it.", max_bytes
+    )
+
+
+def _read_plugin_results(
+    reader: _Reader, skipped_plugins: Collection[str]
+) -> Iterator[PluginResult]:
+    """Yields the plugin results of the line under the reader, stepping over everything else."""
+    if reader.peek() != b"[":
+        reader.skip()
+        return
+    for index, _ in enumerate(reader.items(b"[", b"]")):
+        if index == 2 and reader.peek() == b"[":
+            for _ in reader.items(b"[", b"]"):
+                plugin_result = _plugin_result(reader, skipped_plugins)
+                if plugin_result is not None:
+                    yield plugin_result
+        else:
+            reader.skip()
+
+
+def _loads(line: bytes) -> Any:
+    """Decodes a whole line, failing like the json module."""
+    try:
+        return pydantic_core.from_json(line)
+    except ValueError as e:
+        raise json.JSONDecodeError(str(e), "", 0) from e
+
+
+def _decoded_plugin_results(
+    decoded_line: Any, skipped_plugins: Collection[str]
+) -> Iterator[PluginResult]:
+    """Yields the plugin results of a decoded line, with the same filtering as the incremental parser."""
+    if not isinstance(decoded_line, list) or len(decoded_line) < 3:
+        return
+    if not isinstance(decoded_line[2], list):
+        return
+    for entry in decoded_line[2]:
+        if not isinstance(entry, list) or len(entry) < 2:
+            continue
+        name = entry[0]
+        if not isinstance(name, str) or name in skipped_plugins:
+            continue
+        results = entry[1] if isinstance(entry[1], list) else [entry[1]]
+        versions: list[Any] = []
+        string = None
+        for result in results:
+            if not isinstance(result, dict):
+                continue
+            if "version" in result:
+                _add_version(versions, result["version"])
+            if result.get("string") is not None:
+                string = result["string"]
+        yield PluginResult(name, versions, string)
+
+
+def _add_version(versions: list[Any], version: Any) -> None:
+    """Adds the `version` value of a result, a list of versions or a single version."""
+    if isinstance(version, list):
+        versions.extend(version)
+    else:
+        versions.append(version)
+
+
+def _plugin_result(
+    reader: _Reader, skipped_plugins: Collection[str]
+) -> PluginResult | None:
+    """Reads a `[plugin, [result...]]` or a lean `[plugin, result]` entry, None if it is malformed or skipped."""
+    if reader.peek() != b"[":
+        reader.skip()
+        return None
+    name: str | None = None
+    plugin_result: PluginResult | None = None
+    for index, _ in enumerate(reader.items(b"[", b"]")):
+        if index == 0 and reader.peek() == b'"':
+            name = reader.string()
+        elif index == 1 and name is not None and name not in skipped_plugins:
+            plugin_result = PluginResult(name, *_results(reader))
+        else:
+            reader.skip()
+    return plugin_result
+
+
+def _results(reader: _Reader) -> tuple[list[Any], Any]:
+    """Reads the results of a plugin, returns the versions of all the results and the last string."""
+    versions: list[Any] = []
+    if reader.peek() == b"{":
+        return versions, _result(reader, versions)
+    if reader.peek() != b"[":
+        reader.skip()
+        return versions, None
+    string = None
+    for _ in reader.items(b"[", b"]"):
+        if reader.peek() != b"{":
+            reader.skip()
+            continue
+        result_string = _result(reader, versions)
+        if result_string is not None:
+            string = result_string
+    return versions, string
+
+
+def _result(reader: _Reader, versions: list[Any]) -> Any:
+    """Reads a result object, adds its versions to `versions` and returns its string, None if it has none."""
+    string = None
+    for _ in reader.items(b"{", b"}"):
+        key = reader.string()
+        reader.expect(b":")
+        if key == "version":
+            _add_version(versions, reader.value())
+        elif key == "string":
+            string = reader.value()
+        else:
+            reader.skip()
+    return string
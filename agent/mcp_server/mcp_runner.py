@@ -14,9 +14,31 @@ class MCPRunner:
         self,
         agent_key: str,
         agent_version: str = "",
+        worker_pool_size: int = 0,
+        cache_ttl: float = 0,
+        cache_max_entries: int = 0,
+        cache_redis_url: str = "",
+        scan_timeout: float = 0,
+        log_format: str = "",
+        metrics_port: int = 0,
+        metrics_host: str = "",
+        profiling_directory: str = "",
+        profiling_slowest_targets: int = 0,
+        profiling_traces_url: str = "",
     ) -> None:
         self._agent_key: str = agent_key
         self._agent_version: str = agent_version
+        self._worker_pool_size: int = worker_pool_size
+        self._cache_ttl: float = cache_ttl
+        self._cache_max_entries: int = cache_max_entries
+        self._cache_redis_url: str = cache_redis_url
+        self._scan_timeout: float = scan_timeout
+        self._log_format: str = log_format
+        self._metrics_port: int = metrics_port
+        self._metrics_host: str = metrics_host
+        self._profiling_directory: str = profiling_directory
+        self._profiling_slowest_targets: int = profiling_slowest_targets
+        self._profiling_traces_url: str = profiling_traces_url
 
     def run(self) -> None:
         """Start the MCP server process."""
@@ -29,4 +51,31 @@ class MCPRunner:
             "--agent-version",
             self._agent_version,
         ]
+        if self._worker_pool_size > 0:
+            command.extend(["--worker-pool-size", str(self._worker_pool_size)])
+        if self._cache_ttl > 0:
+            command.extend(["--cache-ttl", str(self._cache_ttl)])
+            if self._cache_max_entries > 0:
+                command.extend(["--cache-max-entries", str(self._cache_max_entries)])
+            if self._cache_redis_url != "":
+                command.extend(["--cache-redis-url", self._cache_redis_url])
+        if self._scan_timeout > 0:
+            command.extend(["--scan-timeout", str(self._scan_timeout)])
+        if self._log_format != "":
+            command.extend(["--log-format", self._log_format])
+        if self._metrics_port > 0:
+            command.extend(["--metrics-port", str(self._metrics_port)])
+            if self._metrics_host != "":
+                command.extend(["--metrics-host", self._metrics_host])
+        if self._profiling_directory != "":
+            command.extend(["--profiling-directory", self._profiling_directory])
+            if self._profiling_slowest_targets > 0:
+                command.extend(
+                    [
+                        "--profiling-slowest-targets",
+                        str(self._profiling_slowest_targets),
+                    ]
+                )
+            if self._profiling_traces_url != "":
+                command.extend(["--profiling-traces-url", self._profiling_traces_url])
         subprocess.Popen(command)
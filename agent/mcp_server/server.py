@@ -8,11 +8,17 @@ import time
 
 import click
 import google.cloud.logging
+import redis
 from google.oauth2 import service_account
 import fastmcp
 from fastmcp import tools as fastmcp_tools
 from rich import logging as rich_logging
 
+from agent import cache
+from agent import definitions
+from agent import metrics
+from agent import profiling
+from agent import whatweb_pool
 from agent.mcp_server import tools
 
 
@@ -75,7 +81,10 @@ def _configure_cloud_logging(
 def _run() -> None:
     """Starts the MCP server."""
     mcp = fastmcp.FastMCP(MCP_SERVER_NAME)
-    mcp.add_tool(fastmcp_tools.Tool.from_function(tools.fingerprint))
+    # The async variant lets concurrent MCP calls share the event loop instead of blocking it.
+    mcp.add_tool(
+        fastmcp_tools.Tool.from_function(tools.fingerprint_async, name="fingerprint")
+    )
     logger.info("Starting MCP server on %s:%s", MCP_SERVER_HOST, MCP_SERVER_PORT)
     mcp.run(transport="http", host=MCP_SERVER_HOST, port=MCP_SERVER_PORT)
 
@@ -83,9 +92,37 @@ def _run() -> None:
 @click.command()
 @click.option("--agent-key", default="")
 @click.option("--agent-version", default="")
+@click.option("--worker-pool-size", default=0, type=int)
+@click.option("--cache-ttl", default=0, type=float)
+@click.option("--cache-max-entries", default=cache.DEFAULT_MAX_ENTRIES, type=int)
+@click.option("--cache-redis-url", default="")
+@click.option("--scan-timeout", default=0, type=float)
+@click.option(
+    "--log-format",
+    default=definitions.DEFAULT_LOG_FORMAT,
+    type=click.Choice(list(definitions.LOG_FORMATS)),
+)
+@click.option("--metrics-port", default=0, type=int)
+@click.option("--metrics-host", default=metrics.DEFAULT_HOST)
+@click.option("--profiling-directory", default="")
+@click.option(
+    "--profiling-slowest-targets", default=profiling.DEFAULT_SLOWEST_TARGETS, type=int
+)
+@click.option("--profiling-traces-url", default="")
 def main(
     agent_key: str,
     agent_version: str,
+    worker_pool_size: int,
+    cache_ttl: float,
+    cache_max_entries: int,
+    cache_redis_url: str,
+    scan_timeout: float,
+    log_format: str,
+    metrics_port: int,
+    metrics_host: str,
+    profiling_directory: str,
+    profiling_slowest_targets: int,
+    profiling_traces_url: str,
 ) -> None:
     """Run the MCP server."""
 
@@ -96,8 +133,43 @@ def main(
             agent_key=agent_key,
             version=agent_version,
         )
+    if worker_pool_size > 0:
+        logger.info("Using %s pre-forked WhatWeb workers.", worker_pool_size)
+        tools.set_worker_pool(
+            whatweb_pool.WorkerPool(
+                worker_pool_size, plugin_profiles=definitions.PLUGIN_PROFILES
+            )
+        )
+    if cache_ttl > 0:
+        logger.info("Caching scan results for %s seconds.", cache_ttl)
+        tools.set_cache(
+            cache.FingerprintCache(
+                ttl=cache_ttl,
+                max_entries=cache_max_entries,
+                redis_client=redis.Redis.from_url(cache_redis_url)
+                if cache_redis_url != ""
+                else None,
+            )
+        )
+    if scan_timeout > 0:
+        logger.info("Killing scans running for more than %s seconds.", scan_timeout)
+        tools.set_scan_timeout(scan_timeout)
+    tools.set_log_format(log_format)
+    if metrics_port > 0:
+        metrics.start_server(metrics_port, host=metrics_host)
+    profiler = profiling.Profiler.from_settings(
+        profiling_directory,
+        slowest_targets=profiling_slowest_targets,
+        traces_url=profiling_traces_url,
+        service_name=agent_key or MCP_SERVER_NAME,
+    )
+    tools.set_profiler(profiler)
     logger.info("Running mcp server..")
-    _run()
+    try:
+        _run()
+    finally:
+        if profiler is not None:
+            profiler.close()
 
 
 if __name__ == "__main__":
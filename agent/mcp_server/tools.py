@@ -1,37 +1,180 @@
 """WhatWeb MCP server tools."""
 
+import asyncio
+import contextlib
+import io
+import json
 import logging
+import subprocess
+from typing import Any
 
+from agent import cache
+from agent import decoder
+from agent import definitions
+from agent import metrics
+from agent import profiling
+from agent import whatweb_pool
 from agent import whatweb_utils
 from agent.mcp_server import models
 
 logger = logging.getLogger(__name__)
 
+_worker_pool: whatweb_pool.WorkerPool | None = None
+_cache: cache.FingerprintCache | None = None
+_scan_timeout: float | None = None
+_log_format: str = definitions.DEFAULT_LOG_FORMAT
+_profiler: profiling.Profiler | None = None
 
-def fingerprint(target: str) -> list[models.Fingerprint]:
+
+def set_worker_pool(worker_pool: whatweb_pool.WorkerPool | None) -> None:
+    """Sets the pool of pre-forked WhatWeb workers used by the tools, None spawns a WhatWeb process per call."""
+    global _worker_pool
+    _worker_pool = worker_pool
+
+
+def set_cache(fingerprint_cache: cache.FingerprintCache | None) -> None:
+    """Sets the cache of scan results consulted by the tools before scanning, None scans on every call."""
+    global _cache
+    _cache = fingerprint_cache
+
+
+def set_scan_timeout(scan_timeout: float | None) -> None:
+    """Sets the deadline in seconds of every scan, None lets a scan run until WhatWeb exits."""
+    global _scan_timeout
+    _scan_timeout = scan_timeout
+
+
+def set_log_format(log_format: str) -> None:
+    """Sets the format of the JSON log WhatWeb writes, one of `definitions.LOG_FORMATS`."""
+    global _log_format
+    _log_format = log_format
+
+
+def set_profiler(profiler: profiling.Profiler | None) -> None:
+    """Sets the profiler tracing every fingerprinted target, None does not profile them."""
+    global _profiler
+    _profiler = profiler
+
+
+def _profile_target(
+    target: str, cpu_profile: bool = True
+) -> contextlib.AbstractContextManager[None]:
+    """Returns the context tracing and profiling the fingerprinting of a target, a no-op without profiler."""
+    if _profiler is None:
+        return contextlib.nullcontext()
+    return _profiler.target(target, cpu_profile=cpu_profile)
+
+
+@metrics.STAGE_DURATION.time(stage="fingerprint")
+def fingerprint(
+    target: str, plugin_profile: str = definitions.DEFAULT_PLUGIN_PROFILE
+) -> list[models.Fingerprint]:
     """Scan a web target to identify technologies and fingerprints.
 
     Args:
         target: Must be a complete URL including scheme (http/https) and port.
+        plugin_profile: Plugins to run, `all` runs every plugin, `lean` skips the plugins reporting
+            generic headers and metadata.
 
     Returns:
         List of detected technology fingerprints.
     """
-    output_bytes = whatweb_utils.run_whatweb_scan(target)
-    fingerprint_dicts = whatweb_utils.parse_whatweb_output(output_bytes)
-
-    seen_fingerprints: set[tuple[str, str | None, str]] = set()
-    unique_fingerprints: list[models.Fingerprint] = []
-
-    for fp in fingerprint_dicts:
-        name = str(fp["name"])
-        version = fp["version"]
-        fp_type = str(fp["type"])
-        key = (name, version, fp_type)
-        if key not in seen_fingerprints:
-            seen_fingerprints.add(key)
-            unique_fingerprints.append(
-                models.Fingerprint(name=name, version=version, type=fp_type)
+    with _profile_target(target):
+        metrics.TARGETS.inc()
+        key = cache.make_key(target, plugin_profile, _log_format)
+        output_bytes = _get_cached_output(key)
+        if output_bytes is not None:
+            return _unique_fingerprints(output_bytes)
+        try:
+            output_bytes = whatweb_utils.run_whatweb_scan(
+                target, _worker_pool, **_scan_options(plugin_profile)
             )
+        except subprocess.TimeoutExpired as e:
+            return _timed_out_fingerprints(target, e)
+        return _scanned_fingerprints(key, output_bytes)
+
 
-    return unique_fingerprints
+async def fingerprint_async(
+    target: str, plugin_profile: str = definitions.DEFAULT_PLUGIN_PROFILE
+) -> list[models.Fingerprint]:
+    """Async counterpart of `fingerprint`, only the WhatWeb run differs.
+
+    The WhatWeb process is awaited on the event loop, the scans of the worker pool and the cache run on threads.
+    """
+    with (
+        metrics.STAGE_DURATION.time(stage="fingerprint"),
+        _profile_target(target, cpu_profile=False),
+    ):
+        metrics.TARGETS.inc()
+        key = cache.make_key(target, plugin_profile, _log_format)
+        # The Redis tier of the cache is not awaited on the event loop.
+        output_bytes = await asyncio.to_thread(_get_cached_output, key)
+        if output_bytes is not None:
+            return _unique_fingerprints(output_bytes)
+        try:
+            if _worker_pool is not None:
+                output_bytes = await asyncio.to_thread(
+                    whatweb_utils.run_whatweb_scan,
+                    target,
+                    _worker_pool,
+                    **_scan_options(plugin_profile),
+                )
+            else:
+                output_bytes = await whatweb_utils.run_whatweb_scan_async(
+                    target, **_scan_options(plugin_profile)
+                )
+        except subprocess.TimeoutExpired as e:
+            return _timed_out_fingerprints(target, e)
+        return await asyncio.to_thread(_scanned_fingerprints, key, output_bytes)
+
+
+def _scan_options(plugin_profile: str) -> dict[str, Any]:
+    """Returns the options of the WhatWeb runs of the tools, shared by the sync and async runs."""
+    return {
+        "plugin_profile": plugin_profile,
+        "timeout": _scan_timeout,
+        "log_format": _log_format,
+    }
+
+
+def _get_cached_output(key: str) -> bytes | None:
+    """Returns the cached output of the scan, None if there is no cache or the scan is not cached."""
+    if _cache is None:
+        return None
+    return _cache.get(key)
+
+
+def _scanned_fingerprints(key: str, output_bytes: bytes) -> list[models.Fingerprint]:
+    """Caches the output of a completed scan and returns its fingerprints."""
+    if _cache is not None:
+        _cache.set(key, output_bytes)
+    return _unique_fingerprints(output_bytes)
+
+
+def _timed_out_fingerprints(
+    target: str, e: subprocess.TimeoutExpired
+) -> list[models.Fingerprint]:
+    """Returns the fingerprints collected before a scan was killed at its deadline, they are not cached."""
+    logger.warning("Scan of %s timed out after %.1fs.", target, e.timeout)
+    return _unique_fingerprints(e.output or b"")
+
+
+def _unique_fingerprints(output_bytes: bytes) -> list[models.Fingerprint]:
+    """Parse WhatWeb output into fingerprint models, without duplicates.
+
+    A malformed line stops the parsing, the fingerprints of the lines before it are returned.
+    """
+    fingerprints: dict[decoder.Fingerprint, None] = {}
+    try:
+        with profiling.span("parse"):
+            for fingerprint in decoder.decode_output(io.BytesIO(output_bytes)):
+                fingerprints[fingerprint] = None
+    except json.JSONDecodeError as e:
+        logger.error("Exception while processing WhatWeb output: %s", e)
+    metrics.FINGERPRINTS.inc(len(fingerprints))
+    return [
+        models.Fingerprint(
+            name=fingerprint.name, version=fingerprint.version, type=fingerprint.type
+        )
+        for fingerprint in fingerprints
+    ]
@@ -0,0 +1,378 @@
+"""Prometheus metrics of the scans, served in the Prometheus text format on a local HTTP endpoint.
+
+Metrics are always recorded, recording is a lock and an addition. The endpoint is only served when a metrics port
+is set. Throughputs are counters, targets per second are `rate(whatweb_targets_total[1m])`.
+"""
+
+import contextlib
+import http.server
+import logging
+import math
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from typing import TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+METRICS_PATH = "/metrics"
+# The endpoint is local unless a bind address is configured.
+DEFAULT_HOST = "127.0.0.1"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Bounds in seconds of the latency buckets, from a cached answer to a scan close to its deadline.
+DEFAULT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+    300.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if len(pairs) == 0:
+        return ""
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Metric:
+    """A metric family, one series per combination of its label values."""
+
+    type = "untyped"
+
+    def __init__(
+        self, name: str, documentation: str, labels: Iterable[str] = ()
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        if labels.keys() != set(self.labels):
+            raise ValueError(
+                f"Metric {self.name} expects the labels {', '.join(self.labels) or 'none'}, "
+                f"got {', '.join(labels) or 'none'}."
+            )
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self) -> list[str]:
+        """Returns the sample lines of the series of the metric."""
+        raise NotImplementedError()
+
+    def render(self) -> list[str]:
+        """Returns the lines of the metric in the Prometheus text format."""
+        return [
+            f"# HELP {self.name} {_escape(self.documentation)}",
+            f"# TYPE {self.name} {self.type}",
+            *self.samples(),
+        ]
+
+
+class Counter(Metric):
+    """Monotonic count of events."""
+
+    type = "counter"
+
+    def __init__(
+        self, name: str, documentation: str, labels: Iterable[str] = ()
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only be incremented.")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        key = self._key(labels)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Gauge(Counter):
+    """Value going up and down, like the number of running scans."""
+
+    type = "gauge"
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    @contextlib.contextmanager
+    def track(self, **labels: str) -> Iterator[None]:
+        """Counts the code running in the block while it runs."""
+        self.inc(1, **labels)
+        try:
+            yield
+        finally:
+            self.dec(1, **labels)
+
+
+class Histogram(Metric):
+    """Distribution of observed values, counted in cumulative buckets."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self._buckets = tuple(sorted(buckets))
+        # Per series: the count of every bucket, the +Inf bucket last, and the sum of the observed values.
+        self._counts: dict[tuple[str, ...], list[int]] = {}
+        self._sums: dict[tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self._buckets) + 1)
+                self._sums[key] = 0.0
+            for index, bound in enumerate(self._buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._sums[key] += value
+
+    def count(self, **labels: str) -> int:
+        key = self._key(labels)
+        with self._lock:
+            return sum(self._counts.get(key, []))
+
+    @contextlib.contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observes the duration of the block in seconds, can decorate a function as well."""
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at, **labels)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            series = sorted(
+                (key, list(counts), self._sums[key])
+                for key, counts in self._counts.items()
+            )
+        lines = []
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip((*self._buckets, math.inf), counts):
+                cumulative += count
+                bucket_labels = _format_labels(
+                    (*self.labels, "le"), (*key, _format_value(bound))
+                )
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            series_labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{series_labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{series_labels} {cumulative}")
+        return lines
+
+
+M = TypeVar("M", bound=Metric)
+
+
+class Registry:
+    """Set of the metrics served by the endpoint."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: M) -> M:
+        """Adds a metric to the registry and returns it.
+
+        Raises:
+            ValueError: if a metric with the same name is registered.
+        """
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered.")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> bytes:
+        """Returns all the metrics in the Prometheus text format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return ("\n".join(lines) + "\n").encode()
+
+
+REGISTRY = Registry()
+
+STAGE_DURATION = REGISTRY.register(
+    Histogram(
+        "whatweb_stage_duration_seconds",
+        "Duration of the stages of a scan: the WhatWeb run, the parsing, the emission and the dedup checks.",
+        labels=("stage",),
+    )
+)
+TARGETS = REGISTRY.register(
+    Counter("whatweb_targets_total", "Targets scanned or answered from the scan cache.")
+)
+FINGERPRINTS = REGISTRY.register(
+    Counter("whatweb_fingerprints_total", "Fingerprints emitted or returned.")
+)
+SUBPROCESSES_IN_FLIGHT = REGISTRY.register(
+    Gauge(
+        "whatweb_subprocesses_in_flight",
+        "WhatWeb scans running, in their own process or on a pre-forked worker.",
+    )
+)
+QUEUE_DEPTH = REGISTRY.register(
+    Gauge(
+        "whatweb_queue_depth",
+        "Items waiting in a queue: scans waiting for an idle worker, targets held back by the rate scheduler.",
+        labels=("queue",),
+    )
+)
+WHATWEB_EXITS = REGISTRY.register(
+    Counter(
+        "whatweb_exits_total",
+        "WhatWeb runs per exit code, `timeout` for the runs killed at their deadline.",
+        labels=("code",),
+    )
+)
+BATCH_LINES_DROPPED = REGISTRY.register(
+    Counter(
+        "whatweb_batch_lines_dropped_total",
+        "Log lines of batch scans collected from a host that is neither a scanned target nor redirected from one.",
+    )
+)
+LIVENESS_DROPPED = REGISTRY.register(
+    Counter(
+        "whatweb_liveness_dropped_targets_total",
+        "Targets dropped by the liveness prefilter, they did not accept a TCP connection on their port.",
+    )
+)
+
+DEDUP_REDIS_AVOIDED_RATIO = REGISTRY.register(
+    Gauge(
+        "whatweb_dedup_redis_avoided_ratio",
+        "Share of the dedup checks answered by the local LRU without a Redis round trip, per set.",
+        labels=("key",),
+    )
+)
+
+
+def counted(items: Iterable[T], counter: Counter) -> Iterator[T]:
+    """Yields the items, incrementing the counter for every item as it is consumed."""
+    for item in items:
+        counter.inc()
+        yield item
+
+
+def timed(items: Iterable[T], histogram: Histogram, **labels: str) -> Iterator[T]:
+    """Yields the items, observing the time spent waiting for them once they are all consumed or the loop stops.
+
+    The time the consumer spends on every item is left out, unlike a `time` block around the loop.
+    """
+    iterator = iter(items)
+    waited = 0.0
+    try:
+        while True:
+            started_at = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                waited += time.perf_counter() - started_at
+            yield item
+    finally:
+        histogram.observe(waited, **labels)
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    registry: Registry = REGISTRY
+
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] != METRICS_PATH:
+            self.send_error(404)
+            return
+        body = self.registry.render()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:
+        logger.debug("Metrics endpoint: " + format, *args)
+
+
+def start_server(
+    port: int, host: str = DEFAULT_HOST, registry: Registry | None = None
+) -> http.server.ThreadingHTTPServer:
+    """Serves the metrics of the registry on `http://host:port/metrics` from a daemon thread.
+
+    Args:
+        port: Port of the endpoint, 0 picks a free port, read it from `server_address`.
+        host: Address the endpoint binds to, `0.0.0.0` exposes it on every interface.
+        registry: Metrics to serve, the default registry when None.
+
+    Returns:
+        The running server, `shutdown` stops it.
+    """
+    handler = type(
+        "MetricsHandler", (_MetricsHandler,), {"registry": registry or REGISTRY}
+    )
+    server = http.server.ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(
+        target=server.serve_forever, name="metrics-endpoint", daemon=True
+    )
+    thread.start()
+    logger.info(
+        "Serving metrics on %s:%s%s", host, server.server_address[1], METRICS_PATH
+    )
+    return server
@@ -0,0 +1,363 @@
+"""Python-native fingerprint engine evaluating the extracted plugin signatures without the Ruby interpreter.
+
+The engine fetches the target with a pooled HTTP client, evaluates the signatures on every response of the
+redirect chain and writes the results in the WhatWeb JSON log format, so they are parsed and emitted like the
+results of a WhatWeb scan.
+"""
+
+import dataclasses
+import json
+import logging
+import re
+import time
+from collections.abc import Iterable
+from typing import Any
+from urllib import parse
+
+import requests
+import urllib3
+from requests import adapters
+
+from agent import definitions
+from agent import pattern_index
+from agent import signatures
+
+logger = logging.getLogger(__name__)
+
+BODY_CHUNK_BYTES = 64 * 1024
+
+
+def search_field(search: str) -> str:
+    """Returns the response field a `:search` declaration reads, WhatWeb searches the body for unknown contexts."""
+    if search == "headers":
+        return search
+    if search.startswith("headers[") and search.endswith("]"):
+        return search.lower()
+    return "body"
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class Response:
+    """An HTTP response the signatures are evaluated on."""
+
+    url: str
+    status: int
+    headers: dict[str, str]
+    body: str
+
+    def search_context(self, search: str) -> str:
+        """Returns the part of the response a match searches."""
+        field = search_field(search)
+        if field == "headers":
+            return "\r\n".join(
+                f"{name}: {value}" for name, value in self.headers.items()
+            )
+        if field != "body":
+            return self.headers.get(field[len("headers[") : -1], "")
+        return self.body
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class Match:
+    """A compiled match declaration of a plugin."""
+
+    search: str
+    name: str | None
+    regexp: re.Pattern[str] | None
+    text: str | None
+    captures: tuple[tuple[str, re.Pattern[str]], ...]
+    offset: int
+
+    @classmethod
+    def from_signature(cls, match: dict[str, Any]) -> "Match":
+        return cls(
+            search=match.get("search", "body"),
+            name=match.get("name"),
+            regexp=re.compile(match["regexp"]) if "regexp" in match else None,
+            text=match.get("text"),
+            captures=tuple(
+                (key, re.compile(match[key]))
+                for key in signatures.CAPTURE_KEYS
+                if key in match
+            ),
+            offset=int(match.get("offset", 0)),
+        )
+
+    def required_literals(self) -> pattern_index.Literals | None:
+        """Returns the literals one of which the context contains when the match fires, None if there are none.
+
+        Every pattern of the match fires on its own, each one must have literals for the match to be indexed.
+        """
+        literals: set[str] = set()
+        patterns = [pattern for _, pattern in self.captures]
+        if self.regexp is not None:
+            patterns.append(self.regexp)
+        for pattern in patterns:
+            pattern_literals = pattern_index.required_literals(pattern.pattern)
+            if pattern_literals is None:
+                return None
+            literals |= pattern_literals
+        if self.text is not None:
+            if len(self.text) < pattern_index.MIN_LITERAL_LENGTH:
+                return None
+            literals.add(self.text.casefold())
+        return frozenset(literals)
+
+    def evaluate(self, context: str) -> list[dict[str, Any]]:
+        """Returns the WhatWeb results of the match on the search context, empty if it did not match."""
+        results: list[dict[str, Any]] = []
+        if self.regexp is not None:
+            found = self.regexp.search(context)
+            if found is not None:
+                results.append(self._result(regexp=[found.group(0)]))
+        if self.text is not None and self.text in context:
+            results.append(self._result(text=self.text))
+        for key, pattern in self.captures:
+            values = sorted(
+                {
+                    value
+                    for found in pattern.finditer(context)
+                    if (value := _captured_value(found, self.offset)) is not None
+                }
+            )
+            if len(values) > 0:
+                results.append(self._result(**{key: values}))
+        return results
+
+    def _result(self, **values: Any) -> dict[str, Any]:
+        result: dict[str, Any] = {"name": self.name} if self.name is not None else {}
+        result.update(values)
+        result["certainty"] = 100
+        return result
+
+
+def _captured_value(found: re.Match[str], offset: int) -> str | None:
+    """Returns the group at the offset of a match, like Ruby's `String#scan`, the whole match if it has no group."""
+    groups = found.groups()
+    if len(groups) == 0:
+        return found.group(0)
+    if offset < len(groups):
+        return groups[offset]
+    return None
+
+
+class Matcher:
+    """Evaluates all the plugin signatures on a response.
+
+    With `indexed`, the matches of every search field are looked up with a single multi-pattern pass over the
+    field, then only the candidate matches are evaluated. Without it, every match is evaluated one by one.
+    """
+
+    def __init__(
+        self, plugin_signatures: Iterable[dict[str, Any]], indexed: bool = True
+    ) -> None:
+        self._plugins = [
+            (
+                str(signature["name"]),
+                [Match.from_signature(match) for match in signature["matches"]],
+            )
+            for signature in plugin_signatures
+        ]
+        # Flat list of the (plugin position, match) pairs, match ids are positions in this list.
+        self._matches = [
+            (plugin_id, match)
+            for plugin_id, (_, matches) in enumerate(self._plugins)
+            for match in matches
+        ]
+        self._indexes: dict[str, pattern_index.PatternIndex] | None = None
+        if indexed is True:
+            entries_by_search: dict[
+                str, list[tuple[int, pattern_index.Literals | None]]
+            ] = {}
+            for match_id, (_, match) in enumerate(self._matches):
+                entries_by_search.setdefault(search_field(match.search), []).append(
+                    (match_id, match.required_literals())
+                )
+            self._indexes = {
+                search: pattern_index.PatternIndex(entries)
+                for search, entries in entries_by_search.items()
+            }
+
+    @classmethod
+    def from_file(cls, path: str) -> "Matcher":
+        """Loads the signatures extracted at build time by `agent.signatures`."""
+        with open(path, "rb") as signatures_file:
+            return cls(json.load(signatures_file))
+
+    def match(self, response: Response) -> list[list[Any]]:
+        """Returns the `[plugin name, results]` pairs of the plugins matching the response."""
+        if self._indexes is not None:
+            return self._match_indexed(response, self._indexes)
+        plugin_results: list[list[Any]] = []
+        for plugin_name, matches in self._plugins:
+            results = []
+            for match in matches:
+                results.extend(match.evaluate(response.search_context(match.search)))
+            if len(results) > 0:
+                plugin_results.append([plugin_name, results])
+        return plugin_results
+
+    def _match_indexed(
+        self, response: Response, indexes: dict[str, pattern_index.PatternIndex]
+    ) -> list[list[Any]]:
+        """Evaluates only the candidate matches of every search field, results keep the declaration order."""
+        fired: list[tuple[int, list[dict[str, Any]]]] = []
+        for search, index in indexes.items():
+            context = response.search_context(search)
+            for match_id in index.candidates(context):
+                results = self._matches[match_id][1].evaluate(context)
+                if len(results) > 0:
+                    fired.append((match_id, results))
+        plugin_results: list[list[Any]] = []
+        previous_plugin_id: int | None = None
+        for match_id, results in sorted(fired, key=lambda item: item[0]):
+            plugin_id = self._matches[match_id][0]
+            if plugin_id == previous_plugin_id:
+                plugin_results[-1][1].extend(results)
+            else:
+                plugin_results.append([self._plugins[plugin_id][0], results])
+            previous_plugin_id = plugin_id
+        return plugin_results
+
+    def log_line(self, response: Response) -> bytes:
+        """Returns the WhatWeb JSON log line of the response."""
+        return (
+            json.dumps([response.url, response.status, self.match(response)]).encode()
+            + b"\n"
+        )
+
+
+class NativeEngine:
+    """Fingerprints targets with a pooled HTTP client and the native matcher.
+
+    Like the WhatWeb scans, a scan reads at most `max_body_bytes` of every response body and the whole redirect
+    chain, body reads included, is bounded by one deadline.
+    """
+
+    def __init__(
+        self,
+        matcher: Matcher,
+        pool_size: int = 10,
+        timeout: float = definitions.NATIVE_REQUEST_TIMEOUT,
+        max_body_bytes: int = definitions.MAX_OUTPUT_BYTES,
+    ) -> None:
+        self._matcher = matcher
+        self._timeout = timeout
+        self._max_body_bytes = max_body_bytes
+        # Like WhatWeb, certificates are not verified, fingerprinting self-signed appliances is the common case.
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        self._session = requests.Session()
+        self._session.verify = False
+        self._session.max_redirects = definitions.NATIVE_MAX_REDIRECTS
+        self._session.headers["User-Agent"] = definitions.NATIVE_USER_AGENT
+        adapter = adapters.HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size
+        )
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def scan(self, target_url: str, timeout: float | None = None) -> bytes:
+        """Fetches the target and returns the WhatWeb JSON log of every response of its redirect chain.
+
+        Args:
+            target_url: URL of the target, `http://` is assumed without a scheme.
+            timeout: Seconds the whole redirect chain may take, the request timeout of the engine if None.
+
+        Unreachable targets have an empty log, like WhatWeb that only reports errors on stderr. When the deadline
+        is exceeded or a later request of the chain fails, the responses fetched so far are logged.
+        """
+        if "://" not in target_url:
+            target_url = f"http://{target_url}"
+        deadline = time.monotonic() + (
+            timeout if timeout is not None else self._timeout
+        )
+        responses: list[Response] = []
+        url: str | None = target_url
+        try:
+            while url is not None:
+                if len(responses) > self._session.max_redirects:
+                    raise requests.TooManyRedirects(
+                        f"Exceeded {self._session.max_redirects} redirects."
+                    )
+                response, url = self._fetch(url, deadline)
+                responses.append(response)
+        except requests.RequestException as e:
+            logger.error("Error fetching target `%s`: %s", target_url, e)
+        return b"".join(self._matcher.log_line(response) for response in responses)
+
+    def _fetch(self, url: str, deadline: float) -> tuple[Response, str | None]:
+        """Fetches a single response before the deadline, returns it with the URL it redirects to.
+
+        Redirects are followed by the caller: the session would read the whole body to resolve them.
+        """
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise requests.Timeout(f"Scan deadline exceeded before fetching `{url}`.")
+        request = self._session.prepare_request(requests.Request("GET", url))
+        http_response = self._session.get_adapter(url).send(
+            request,
+            stream=True,
+            timeout=min(self._timeout, remaining),
+            verify=False,
+        )
+        complete = False
+        try:
+            body, complete = _read_body(http_response, deadline, self._max_body_bytes)
+        finally:
+            if complete is True:
+                http_response.raw.release_conn()
+            else:
+                http_response.close()
+        location = self._session.get_redirect_target(http_response)
+        next_url = parse.urljoin(http_response.url, location) if location else None
+        return _to_response(http_response, body), next_url
+
+    def close(self) -> None:
+        self._session.close()
+
+
+def _read_body(
+    http_response: requests.Response, deadline: float, max_bytes: int
+) -> tuple[bytes, bool]:
+    """Reads the decoded body up to `max_bytes` before the deadline, 0 reads the whole body.
+
+    Every socket read waits at most until the deadline, a server trickling its body can not hold the scan past it.
+
+    Returns:
+        The body and whether it was read whole.
+    """
+    # The urllib3 1.26 stubs lack `read1`, added in urllib3 2.
+    raw: Any = http_response.raw
+    body = bytearray()
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise requests.Timeout(
+                f"Scan deadline exceeded reading `{http_response.url}`."
+            )
+        sock = getattr(raw.connection, "sock", None)
+        if sock is not None:
+            sock.settimeout(remaining)
+        try:
+            chunk = raw.read1(BODY_CHUNK_BYTES, decode_content=True)
+        except (urllib3.exceptions.HTTPError, OSError) as e:
+            raise requests.ConnectionError(e) from e
+        if chunk == b"":
+            return bytes(body), True
+        body += chunk
+        if max_bytes > 0 and len(body) >= max_bytes:
+            logger.warning(
+                "Body of `%s` exceeds %s bytes, dropping the bytes past it.",
+                http_response.url,
+                max_bytes,
+            )
+            return bytes(body[:max_bytes]), False
+
+
+def _to_response(http_response: requests.Response, body: bytes) -> Response:
+    return Response(
+        url=http_response.url,
+        status=http_response.status_code,
+        headers={name.lower(): value for name, value in http_response.headers.items()},
+        body=body.decode("utf-8", errors="replace"),
+    )
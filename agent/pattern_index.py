@@ -0,0 +1,166 @@
+"""Multi-pattern prefilter: finds the candidate signatures of a search context in a single pass.
+
+Every signature pattern is reduced to the literals one of which any match must contain, read from the regex tree
+of `agent.signatures`. All the literals of a search field are compiled into one alternation regex, scanned once
+over the case folded context. Only the patterns whose literals were found, and the patterns without a usable
+literal, are then evaluated.
+"""
+
+import re
+from collections.abc import Iterable
+from typing import Any
+
+from agent import signatures
+
+# Shorter literals are found in almost every response and do not filter anything.
+MIN_LITERAL_LENGTH = 3
+
+Literals = frozenset[str]
+
+
+def _best(factors: Iterable[Literals | None]) -> Literals | None:
+    """Returns the most selective factor, the one whose shortest literal is the longest."""
+    best: Literals | None = None
+    for factor in factors:
+        if factor is None or len(factor) == 0:
+            continue
+        if best is None or min(map(len, factor)) > min(map(len, best)):
+            best = factor
+    return best
+
+
+def _group_factor(group: signatures.RegexGroup) -> Literals | None:
+    """Returns the literals one of which every branch of a group requires, None if a branch requires none."""
+    branches = [_sequence_factor(branch) for branch in group.branches]
+    if any(branch is None for branch in branches):
+        return None
+    return frozenset().union(*branches)  # type: ignore[arg-type]
+
+
+def _sequence_factor(nodes: Iterable[signatures.RegexNode]) -> Literals | None:
+    """Returns the best required factor of a sequence: a literal run or the alternatives of a group."""
+    factors: list[Literals | None] = []
+    run: list[str] = []
+
+    def close_run() -> None:
+        if len(run) > 0:
+            factors.append(frozenset(["".join(run)]))
+            run.clear()
+
+    for node in nodes:
+        if isinstance(node, signatures.RegexLiteral):
+            run.append(node.char)
+        elif isinstance(node, signatures.RegexGroup):
+            # A group of literals is inlined, its literals extend the current run.
+            chars = [
+                inner.char
+                for inner in node.branches[0]
+                if isinstance(inner, signatures.RegexLiteral)
+            ]
+            if len(node.branches) == 1 and len(chars) == len(node.branches[0]):
+                run.extend(chars)
+            else:
+                close_run()
+                factors.append(_group_factor(node))
+        elif isinstance(node, signatures.RegexRepeat):
+            close_run()
+            if node.minimum >= 1:
+                factors.append(_sequence_factor([node.node]))
+        else:
+            close_run()
+    close_run()
+    return _best(factors)
+
+
+def required_literals(pattern: str) -> Literals | None:
+    """Returns the case folded literals one of which every match of the pattern contains.
+
+    None means no literal of at least `MIN_LITERAL_LENGTH` characters is required, the pattern must always be
+    evaluated.
+    """
+    try:
+        tree = signatures.parse_regex(pattern)
+    except signatures.ExtractionError:
+        return None
+    factor = _group_factor(tree)
+    if factor is None or len(factor) == 0:
+        return None
+    literals = frozenset(literal.casefold() for literal in factor)
+    if min(map(len, literals)) < MIN_LITERAL_LENGTH:
+        return None
+    return literals
+
+
+def _trie_pattern(node: dict[str, Any]) -> str:
+    """Compiles a trie into a regex where every literal path is tried, longer literals first."""
+    branches = [
+        re.escape(char) + _trie_pattern(child)
+        for char, child in sorted(node.items())
+        if char != ""
+    ]
+    if len(branches) == 0:
+        return ""
+    body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+    if "" in node:
+        return f"(?:{body})?"
+    return body
+
+
+class LiteralAutomaton:
+    """Finds all the literals of a set occurring in a text with a single scan.
+
+    The literals are compiled into one trie-shaped alternation inside a lookahead: the scan tries the alternation
+    at every position of the text in a single pass of the regex engine and reports the longest literal starting
+    there, overlapping literals included.
+    """
+
+    def __init__(self, literals: Iterable[str]) -> None:
+        self._literals = frozenset(literals)
+        trie: dict[str, Any] = {}
+        for literal in self._literals:
+            node = trie
+            for char in literal:
+                node = node.setdefault(char, {})
+            node[""] = True
+        self._regex = re.compile(f"(?=({_trie_pattern(trie)}))", re.DOTALL)
+        # The literals starting at the same position are all prefixes of the longest one reported there.
+        self._closure = {
+            literal: frozenset(
+                prefix for prefix in self._literals if literal.startswith(prefix)
+            )
+            for literal in self._literals
+        }
+
+    def find(self, text: str) -> set[str]:
+        """Returns the literals occurring in the text."""
+        found: set[str] = set()
+        for occurrence in self._regex.finditer(text):
+            found |= self._closure[occurrence.group(1)]
+            if len(found) == len(self._literals):
+                break
+        return found
+
+
+class PatternIndex:
+    """Candidate lookup of the entries searching the same field, an entry is a set of required literals."""
+
+    def __init__(self, entries: Iterable[tuple[int, Literals | None]]) -> None:
+        self._always: list[int] = []
+        self._ids_by_literal: dict[str, list[int]] = {}
+        for entry_id, literals in entries:
+            if literals is None:
+                self._always.append(entry_id)
+                continue
+            for literal in literals:
+                self._ids_by_literal.setdefault(literal, []).append(entry_id)
+        self._automaton: LiteralAutomaton | None = None
+        if len(self._ids_by_literal) > 0:
+            self._automaton = LiteralAutomaton(self._ids_by_literal)
+
+    def candidates(self, context: str) -> list[int]:
+        """Returns the sorted ids of the entries that may match the context."""
+        candidate_ids = set(self._always)
+        if self._automaton is not None and context != "":
+            for literal in self._automaton.find(context.casefold()):
+                candidate_ids.update(self._ids_by_literal[literal])
+        return sorted(candidate_ids)
@@ -0,0 +1,292 @@
+"""Opt-in profiling of the scans: tracing spans per target and profiles of the slowest targets.
+
+Every scanned target runs in a `target` span with child spans for the WhatWeb process spawn and wait, the output
+parsing and the fingerprint emission. Spans are exported to the OpenTelemetry collector of the agent when one is
+configured, to the traces URL of the profiler otherwise: `file:///path/spans.json` or `otlp://host:4317`.
+
+The CPU of a target is profiled with cProfile when no other target is being profiled, a single profiler can be
+active at a time. Python allocations are traced with tracemalloc. The cProfile stats and the tracemalloc
+snapshot of the slowest targets are kept in the profiling directory, `slowest.json` lists them. Snapshots are
+taken at most once per snapshot interval, a slow target within the interval only keeps its cProfile stats. Read them with
+`python -m pstats <file>.prof` and `tracemalloc.Snapshot.load`.
+"""
+
+import contextlib
+import contextvars
+import cProfile
+import dataclasses
+import functools
+import heapq
+import itertools
+import json
+import logging
+import os
+import pathlib
+import re
+import threading
+import time
+import tracemalloc
+from collections.abc import Callable, Coroutine, Iterator
+from typing import (
+    Any,
+    Optional,
+    TypeVar,
+)
+
+from opentelemetry import context as otel_context
+from opentelemetry import trace
+from opentelemetry.sdk import resources
+from opentelemetry.sdk import trace as sdk_trace
+from opentelemetry.sdk.trace import export as sdk_export
+from ostorlab.agent.mixins import agent_open_telemetry_mixin
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Setting the variable to a directory enables the profiling of the agent and of the MCP server.
+DIRECTORY_ENV_VARIABLE = "WHATWEB_PROFILING_DIRECTORY"
+DEFAULT_SLOWEST_TARGETS = 10
+TRACEMALLOC_FRAMES = 16
+# A tracemalloc snapshot copies every traced allocation, it takes seconds on a large heap.
+DEFAULT_SNAPSHOT_INTERVAL = 60.0
+SPANS_FILE_NAME = "spans.json"
+SLOWEST_FILE_NAME = "slowest.json"
+
+# Tracer of the target running in the current thread or task, None when it is not traced.
+_tracer: contextvars.ContextVar[trace.Tracer | None] = contextvars.ContextVar(
+    "whatweb_profiling_tracer", default=None
+)
+
+
+def span(
+    name: str, **attributes: str | float
+) -> contextlib.AbstractContextManager[Any]:
+    """Returns a child span of the traced target running in the current thread or task, a no-op otherwise."""
+    tracer = _tracer.get()
+    if tracer is None:
+        return contextlib.nullcontext()
+    return tracer.start_as_current_span(name, attributes=attributes)
+
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9.-]+", "_", name).strip("_")[:64]
+
+
+@dataclasses.dataclass(order=True)
+class ProfiledTarget:
+    """A target among the slowest ones, with the files of its profiles."""
+
+    duration: float
+    name: str = dataclasses.field(compare=False)
+    files: list[str] = dataclasses.field(compare=False, default_factory=list)
+
+
+class Profiler:
+    """Traces the scanned targets and keeps the profiles of the slowest ones."""
+
+    def __init__(
+        self,
+        directory: str,
+        slowest_targets: int = DEFAULT_SLOWEST_TARGETS,
+        traces_url: str = "",
+        service_name: str = "whatweb",
+        snapshot_interval: float = DEFAULT_SNAPSHOT_INTERVAL,
+    ) -> None:
+        self._directory = pathlib.Path(directory)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._slowest_targets = max(slowest_targets, 1)
+        self._slowest: list[ProfiledTarget] = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._snapshot_interval = snapshot_interval
+        self._last_snapshot_at: float | None = None
+        # cProfile can only profile one target at a time.
+        self._cpu_profile_lock = threading.Lock()
+        self._span_processor: sdk_export.BatchSpanProcessor | None = None
+        self._tracer = self._get_tracer(traces_url, service_name)
+        self._started_tracemalloc = tracemalloc.is_tracing() is False
+        if self._started_tracemalloc is True:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+
+    @classmethod
+    def from_settings(
+        cls,
+        directory: str | None,
+        slowest_targets: int | None = None,
+        traces_url: str | None = None,
+        service_name: str = "whatweb",
+    ) -> Optional["Profiler"]:
+        """Returns the profiler of the settings, None when neither the directory nor its environment variable are set."""
+        directory = directory or os.environ.get(DIRECTORY_ENV_VARIABLE)
+        if directory is None or directory == "":
+            return None
+        logger.info("Profiling the scans to %s.", directory)
+        return cls(
+            directory,
+            slowest_targets=slowest_targets or DEFAULT_SLOWEST_TARGETS,
+            traces_url=traces_url or "",
+            service_name=service_name,
+        )
+
+    def _get_tracer(self, traces_url: str, service_name: str) -> trace.Tracer:
+        """Returns the tracer of the collector of the agent if one is configured, a tracer of its own otherwise."""
+        if isinstance(trace.get_tracer_provider(), sdk_trace.TracerProvider):
+            return trace.get_tracer(__name__)
+        provider = sdk_trace.TracerProvider(
+            resource=resources.Resource.create({resources.SERVICE_NAME: service_name})
+        )
+        exporter = agent_open_telemetry_mixin.TraceExporter(
+            traces_url or f"file://{self._directory / SPANS_FILE_NAME}"
+        ).get_trace_exporter()
+        self._span_processor = sdk_export.BatchSpanProcessor(exporter)
+        provider.add_span_processor(self._span_processor)
+        return provider.get_tracer(__name__)
+
+    @property
+    def slowest(self) -> list[ProfiledTarget]:
+        """The slowest targets profiled, the slowest first."""
+        with self._lock:
+            return sorted(self._slowest, reverse=True)
+
+    @contextlib.contextmanager
+    def message(self, selector: str) -> Iterator[None]:
+        """Traces the processing of a message, the spans of its targets are its children."""
+        try:
+            with self._tracer.start_as_current_span(
+                "process", attributes={"message.selector": selector}
+            ):
+                yield
+        finally:
+            self.flush()
+
+    @contextlib.contextmanager
+    def target(self, name: str, cpu_profile: bool = True) -> Iterator[None]:
+        """Traces the scan of a target, profiles it and keeps its profiles if it is among the slowest.
+
+        Args:
+            name: The scanned target.
+            cpu_profile: Whether to profile the CPU, the CPU of concurrent tasks of an event loop can not be told
+                apart.
+        """
+        profile: cProfile.Profile | None = None
+        if cpu_profile is True and self._cpu_profile_lock.acquire(blocking=False):
+            profile = cProfile.Profile()
+        token = _tracer.set(self._tracer)
+        started_at = time.perf_counter()
+        try:
+            with self._tracer.start_as_current_span(
+                "target", attributes={"whatweb.target": name}
+            ):
+                if profile is not None:
+                    try:
+                        profile.enable()
+                    except ValueError as e:
+                        # An other profiling tool of the interpreter is active.
+                        logger.debug("Target %s is not CPU profiled: %s", name, e)
+                        self._cpu_profile_lock.release()
+                        profile = None
+                try:
+                    yield
+                finally:
+                    if profile is not None:
+                        profile.disable()
+        finally:
+            _tracer.reset(token)
+            if profile is not None:
+                self._cpu_profile_lock.release()
+            self._keep_if_slowest(name, time.perf_counter() - started_at, profile)
+
+    def wrap(
+        self, function: Callable[[T], None], describe: Callable[[T], str] = str
+    ) -> Callable[[T], None]:
+        """Returns the function tracing and profiling every call as a target named by `describe`.
+
+        The trace context is captured when wrapping, the calls may run on other threads.
+        """
+        parent = otel_context.get_current()
+
+        @functools.wraps(function)
+        def wrapper(item: T) -> None:
+            token = otel_context.attach(parent)
+            try:
+                with self.target(describe(item)):
+                    function(item)
+            finally:
+                otel_context.detach(token)
+
+        return wrapper
+
+    def wrap_async(
+        self,
+        function: Callable[[T], Coroutine[Any, Any, None]],
+        describe: Callable[[T], str] = str,
+    ) -> Callable[[T], Coroutine[Any, Any, None]]:
+        """Async counterpart of `wrap`, tasks inherit the trace context and their CPU is not profiled."""
+
+        @functools.wraps(function)
+        async def wrapper(item: T) -> None:
+            with self.target(describe(item), cpu_profile=False):
+                await function(item)
+
+        return wrapper
+
+    def _keep_if_slowest(
+        self, name: str, duration: float, profile: cProfile.Profile | None
+    ) -> None:
+        """Keeps the profiles of the target if it is among the slowest ones.
+
+        The profiles are written outside of the lock, the other targets do not wait for a snapshot to end.
+        """
+        with self._lock:
+            if (
+                len(self._slowest) >= self._slowest_targets
+                and duration <= self._slowest[0].duration
+            ):
+                return
+            prefix = self._directory / f"{next(self._sequence):06d}_{_slug(name)}"
+            now = time.monotonic()
+            take_snapshot = (
+                self._last_snapshot_at is None
+                or now - self._last_snapshot_at >= self._snapshot_interval
+            )
+            if take_snapshot is True:
+                self._last_snapshot_at = now
+        profiled = ProfiledTarget(duration=duration, name=name)
+        if profile is not None:
+            profile.dump_stats(f"{prefix}.prof")
+            profiled.files.append(f"{prefix}.prof")
+        if take_snapshot is True:
+            tracemalloc.take_snapshot().dump(f"{prefix}.tracemalloc")
+            profiled.files.append(f"{prefix}.tracemalloc")
+        with self._lock:
+            heapq.heappush(self._slowest, profiled)
+            if len(self._slowest) > self._slowest_targets:
+                for path in heapq.heappop(self._slowest).files:
+                    pathlib.Path(path).unlink(missing_ok=True)
+            self._write_summary()
+
+    def _write_summary(self) -> None:
+        summary = [
+            {
+                "target": profiled.name,
+                "duration": profiled.duration,
+                "files": profiled.files,
+            }
+            for profiled in sorted(self._slowest, reverse=True)
+        ]
+        (self._directory / SLOWEST_FILE_NAME).write_text(json.dumps(summary, indent=2))
+
+    def flush(self) -> None:
+        """Exports the ended spans."""
+        if self._span_processor is not None:
+            self._span_processor.force_flush()
+
+    def close(self) -> None:
+        """Exports the ended spans, stops the exporter of the profiler and the tracing of the allocations."""
+        if self._started_tracemalloc is True:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        if self._span_processor is not None:
+            self._span_processor.shutdown()  # type: ignore[no-untyped-call]
+            self._span_processor = None
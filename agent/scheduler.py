@@ -0,0 +1,204 @@
+"""Politeness scheduler enforcing scan rate budgets per host, per subnet and globally with token buckets."""
+
+import collections
+import ipaddress
+import itertools
+import logging
+import time
+from collections.abc import Callable, Iterable, Iterator
+from typing import TypeVar
+
+from agent import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Number of pending items looked ahead to find work for an other host while a bucket refills.
+DEFAULT_WINDOW = 256
+# Idle buckets are dropped once more than this many buckets are tracked.
+MAX_IDLE_BUCKETS = 4096
+
+
+class TokenBucket:
+    """Token bucket refilled with `rate` tokens per second, holding at most `burst` tokens."""
+
+    def __init__(self, rate: float, burst: float, now: float) -> None:
+        self._rate = rate
+        self._burst = burst
+        self._tokens = burst
+        self._updated_at = now
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(
+            self._burst, self._tokens + (now - self._updated_at) * self._rate
+        )
+        self._updated_at = now
+
+    def wait_time(self, now: float, tokens: int = 1) -> float:
+        """Returns the seconds until `tokens` tokens are available, 0 if they are available now.
+
+        No more than the burst is ever waited for, a larger charge leaves the bucket in debt when consumed.
+        """
+        self._refill(now)
+        needed = min(tokens, self._burst)
+        if self._tokens >= needed:
+            return 0.0
+        return (needed - self._tokens) / self._rate
+
+    def consume(self, now: float, tokens: int = 1) -> None:
+        """Takes tokens, the caller checks they are available with `wait_time`."""
+        self._refill(now)
+        self._tokens -= tokens
+
+    def is_full(self, now: float) -> bool:
+        """Whether the bucket is back to its burst size, it is then equivalent to a new bucket."""
+        self._refill(now)
+        return self._tokens >= self._burst
+
+
+def subnet_key(host: str) -> str | None:
+    """Returns the /24 of an IPv4 address or the /64 of an IPv6 address, None for a domain name."""
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return None
+    prefix = 24 if address.version == 4 else 64
+    return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+
+class PolitenessScheduler:
+    """Yields work items once the budgets of their host, of their subnet and the global budget allow it.
+
+    Rates are in scans per second, a rate of 0 is not limited. Items whose budgets are exhausted are held back
+    and the next ready items of the lookahead window are yielded first, the scheduler only sleeps when no item
+    of the window is ready.
+    """
+
+    def __init__(
+        self,
+        host_rate: float = 0,
+        subnet_rate: float = 0,
+        global_rate: float = 0,
+        burst: float = 1,
+        window: int = DEFAULT_WINDOW,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self._host_rate = host_rate
+        self._subnet_rate = subnet_rate
+        self._burst = max(burst, 1)
+        self._window = max(window, 1)
+        self._clock = clock
+        self._sleep = sleep
+        self._host_buckets: dict[str, TokenBucket] = {}
+        self._subnet_buckets: dict[str, TokenBucket] = {}
+        self._global_bucket: TokenBucket | None = None
+        if global_rate > 0:
+            self._global_bucket = TokenBucket(global_rate, self._burst, clock())
+
+    def _buckets(self, host: str, now: float) -> list[TokenBucket]:
+        buckets = []
+        if self._host_rate > 0:
+            buckets.append(
+                self._bucket(self._host_buckets, host.lower(), self._host_rate, now)
+            )
+        subnet = subnet_key(host)
+        if self._subnet_rate > 0 and subnet is not None:
+            buckets.append(
+                self._bucket(self._subnet_buckets, subnet, self._subnet_rate, now)
+            )
+        if self._global_bucket is not None:
+            buckets.append(self._global_bucket)
+        return buckets
+
+    def _bucket(
+        self, buckets: dict[str, TokenBucket], key: str, rate: float, now: float
+    ) -> TokenBucket:
+        bucket = buckets.get(key)
+        if bucket is None:
+            if len(buckets) >= MAX_IDLE_BUCKETS:
+                for idle_key in [k for k, b in buckets.items() if b.is_full(now)]:
+                    del buckets[idle_key]
+            bucket = TokenBucket(rate, self._burst, now)
+            buckets[key] = bucket
+        return bucket
+
+    def schedule(self, items: Iterable[T], host_of: Callable[[T], str]) -> Iterator[T]:
+        """Yields the items as their budgets allow, reordering the items of the lookahead window.
+
+        Args:
+            items: Work items, consumed lazily.
+            host_of: Returns the host name or IP address an item is sent to.
+        """
+        source = iter(items)
+        pending: collections.deque[T] = collections.deque()
+        exhausted = False
+        while True:
+            while exhausted is False and len(pending) < self._window:
+                try:
+                    pending.append(next(source))
+                except StopIteration:
+                    exhausted = True
+            metrics.QUEUE_DEPTH.set(len(pending), queue="scheduler")
+            if len(pending) == 0:
+                return
+
+            now = self._clock()
+            shortest_wait: float | None = None
+            for position, item in enumerate(pending):
+                buckets = self._buckets(host_of(item), now)
+                wait = max((bucket.wait_time(now) for bucket in buckets), default=0.0)
+                if wait == 0:
+                    for bucket in buckets:
+                        bucket.consume(now)
+                    del pending[position]
+                    yield item
+                    break
+                if shortest_wait is None or wait < shortest_wait:
+                    shortest_wait = wait
+            else:
+                logger.debug("Rate budgets exhausted, waiting %.3fs", shortest_wait)
+                self._sleep(shortest_wait or 0.0)
+
+    def schedule_batches(
+        self, items: Iterable[T], host_of: Callable[[T], str], size: int
+    ) -> Iterator[list[T]]:
+        """Yields the items in batches of at most `size` items, once the budgets allow a whole batch.
+
+        The items of a batch are scanned at once, a batch is charged a token per item in the budgets of their
+        hosts, of their subnets and in the global budget before it is released. A charge above the burst leaves
+        the bucket in debt: the next batches of the same host wait until it is paid back. Batches keep the order
+        of the items.
+
+        Args:
+            items: Work items, consumed lazily.
+            host_of: Returns the host name or IP address an item is sent to.
+            size: Maximum number of items of a batch.
+        """
+        source = iter(items)
+        while True:
+            batch = list(itertools.islice(source, max(size, 1)))
+            if len(batch) == 0:
+                return
+            while True:
+                now = self._clock()
+                charges: dict[TokenBucket, int] = collections.Counter(
+                    bucket
+                    for item in batch
+                    for bucket in self._buckets(host_of(item), now)
+                )
+                wait = max(
+                    (
+                        bucket.wait_time(now, tokens)
+                        for bucket, tokens in charges.items()
+                    ),
+                    default=0.0,
+                )
+                if wait == 0:
+                    break
+                logger.debug("Rate budgets exhausted, waiting %.3fs for a batch", wait)
+                self._sleep(wait)
+            for bucket, tokens in charges.items():
+                bucket.consume(now, tokens)
+            yield batch
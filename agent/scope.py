@@ -0,0 +1,87 @@
+"""Scope of the scanned domains: exact names, wildcard suffixes and regular expressions.
+
+Scope entries are:
+
+- `example.com`: the domain itself,
+- `*.example.com`: any subdomain of the domain, not the domain itself,
+- `re:<pattern>`: domains matching the regular expression from their start, like `re.match`.
+
+Names and suffixes are stored in a trie of the reversed domain labels, a lookup walks the labels of the domain
+once whatever the number of entries. Regular expressions are compiled once and only evaluated when the trie did
+not match.
+"""
+
+import re
+from collections.abc import Iterable
+from typing import Any, Optional
+
+REGEX_PREFIX = "re:"
+WILDCARD_PREFIX = "*."
+
+# Markers of the trie nodes ending an entry, a domain label never holds a dot.
+_EXACT = "."
+_WILDCARD = ".*"
+
+
+def _labels(domain: str) -> list[str]:
+    """Returns the labels of a domain from the top-level one, case folded and without the root dot."""
+    return domain.strip().rstrip(".").lower().split(".")[::-1]
+
+
+class Scope:
+    """Matches domains against a set of scope entries."""
+
+    def __init__(self, entries: Iterable[str]) -> None:
+        self._trie: dict[str, Any] = {}
+        self._regexes: list[re.Pattern[str]] = []
+        for entry in entries:
+            self.add(entry)
+
+    @classmethod
+    def from_args(
+        cls, entries: Iterable[str] | None, regex: str | None
+    ) -> Optional["Scope"]:
+        """Returns the scope of the agent arguments, None when no scope is set and every domain is in scope.
+
+        Raises:
+            re.error: if a regular expression is invalid.
+        """
+        scope_entries = list(entries or [])
+        if regex is not None:
+            scope_entries.append(f"{REGEX_PREFIX}{regex}")
+        if len(scope_entries) == 0:
+            return None
+        return cls(scope_entries)
+
+    def add(self, entry: str) -> None:
+        """Adds a scope entry.
+
+        Raises:
+            re.error: if the entry is an invalid regular expression.
+        """
+        if entry.startswith(REGEX_PREFIX):
+            self._regexes.append(re.compile(entry.removeprefix(REGEX_PREFIX)))
+            return
+        marker = _EXACT
+        if entry.startswith(WILDCARD_PREFIX):
+            marker = _WILDCARD
+            entry = entry.removeprefix(WILDCARD_PREFIX)
+        node = self._trie
+        for label in _labels(entry):
+            node = node.setdefault(label, {})
+        node[marker] = True
+
+    def __contains__(self, domain: str) -> bool:
+        node = self._trie
+        labels = _labels(domain)
+        for index, label in enumerate(labels):
+            child = node.get(label)
+            if child is None:
+                break
+            node = child
+            if _WILDCARD in node and index < len(labels) - 1:
+                return True
+        else:
+            if _EXACT in node:
+                return True
+        return any(regex.match(domain) is not None for regex in self._regexes)
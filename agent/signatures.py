@@ -0,0 +1,517 @@
+"""Extracts the `matches` declarations of WhatWeb Ruby plugins into JSON signatures for the native matcher.
+
+Only the declarative subset of the plugin DSL is supported: string, symbol, integer, regex literals, arrays and
+hashes. Ruby regexes are converted to Python regexes, declarations that cannot be converted are skipped with a
+warning, the plugin keeps its other declarations.
+
+Usage: python -m agent.signatures <plugins directory> <output json file>
+"""
+
+import dataclasses
+import json
+import logging
+import pathlib
+import re
+import sys
+from collections.abc import Iterator
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# Match keys whose regex captures a value, reported under the same key by WhatWeb.
+CAPTURE_KEYS = (
+    "version",
+    "os",
+    "string",
+    "account",
+    "model",
+    "firmware",
+    "module",
+    "filepath",
+)
+
+_POSIX_CLASSES = {
+    "alpha": "a-zA-Z",
+    "digit": "0-9",
+    "alnum": "a-zA-Z0-9",
+    "upper": "A-Z",
+    "lower": "a-z",
+    "xdigit": "0-9a-fA-F",
+    "space": r"\s",
+    "word": r"\w",
+    "punct": r"!-/:-@\[-`{-~",
+}
+
+_RUBY_TO_PYTHON_FLAGS = {"i": "i", "m": "s", "x": "x"}
+
+
+class ExtractionError(ValueError):
+    """Raised when a plugin uses Ruby syntax outside the supported declarative subset."""
+
+
+@dataclasses.dataclass(frozen=True)
+class RubyRegex:
+    """A Ruby regex literal, converted to Python once its declaration is kept."""
+
+    pattern: str
+    flags: str
+
+
+def convert_regex(pattern: str, flags: str = "") -> str:
+    """Converts a Ruby regex literal to an equivalent Python pattern with its flags inlined.
+
+    `^` and `$` are line anchors in Ruby, the Python pattern is always multiline. Ruby's `m` flag is Python's
+    `s` flag.
+
+    Raises:
+        ExtractionError: if the regex uses a Ruby construct without a Python equivalent.
+    """
+    python_flags = "m" + "".join(
+        _RUBY_TO_PYTHON_FLAGS[flag] for flag in flags if flag in _RUBY_TO_PYTHON_FLAGS
+    )
+    converted: list[str] = []
+    in_class = False
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == "\\" and index + 1 < len(pattern):
+            escaped = pattern[index + 1]
+            index += 2
+            if escaped == "h":
+                converted.append("0-9a-fA-F" if in_class else "[0-9a-fA-F]")
+            elif escaped == "H" and in_class is False:
+                converted.append("[^0-9a-fA-F]")
+            elif escaped == "z" and in_class is False:
+                converted.append(r"\Z")
+            elif escaped == "Z" and in_class is False:
+                converted.append(r"(?=\n?\Z)")
+            elif escaped == "/":
+                converted.append("/")
+            elif escaped in "GHpPk" or (escaped in "zZ" and in_class is True):
+                raise ExtractionError(f"Unsupported escape \\{escaped} in /{pattern}/")
+            else:
+                converted.append("\\" + escaped)
+            continue
+        if in_class is True:
+            posix_class = re.match(r"\[:(\^?)(\w+):\]", pattern[index:])
+            if posix_class is not None:
+                if (
+                    posix_class.group(1) != ""
+                    or posix_class.group(2) not in _POSIX_CLASSES
+                ):
+                    raise ExtractionError(f"Unsupported POSIX class in /{pattern}/")
+                converted.append(_POSIX_CLASSES[posix_class.group(2)])
+                index += posix_class.end()
+                continue
+            if char == "]":
+                in_class = False
+            elif char == "[":
+                raise ExtractionError(f"Unsupported nested class in /{pattern}/")
+            converted.append(char)
+            index += 1
+            continue
+        if char == "[":
+            in_class = True
+            converted.append(char)
+            # A leading `]` or `^]` is a literal bracket.
+            for leading in ("^]", "]", "^"):
+                if pattern.startswith(leading, index + 1):
+                    converted.append(leading)
+                    index += len(leading)
+                    break
+            index += 1
+            continue
+        if pattern.startswith("(?<", index) and pattern[index + 3 : index + 4] not in (
+            "=",
+            "!",
+        ):
+            converted.append("(?P<")
+            index += 3
+            continue
+        inline_flags = re.match(r"\(\?([imx]*)(?:-([imx]*))?:", pattern[index:])
+        if inline_flags is not None and inline_flags.group(0) != "(?:":
+            enabled = "".join(_RUBY_TO_PYTHON_FLAGS[f] for f in inline_flags.group(1))
+            disabled = "".join(
+                _RUBY_TO_PYTHON_FLAGS[f] for f in inline_flags.group(2) or ""
+            )
+            converted.append(f"(?{enabled}{'-' + disabled if disabled else ''}:")
+            index += inline_flags.end()
+            continue
+        converted.append(char)
+        index += 1
+
+    python_pattern = f"(?{python_flags})" + "".join(converted)
+    try:
+        re.compile(python_pattern)
+    except re.error as e:
+        raise ExtractionError(f"Invalid converted regex /{pattern}/: {e}") from e
+    return python_pattern
+
+
+@dataclasses.dataclass(frozen=True)
+class RegexLiteral:
+    """A character matched as is."""
+
+    char: str
+
+
+@dataclasses.dataclass(frozen=True)
+class RegexGroup:
+    """A group, or the whole pattern, matching one of its branches."""
+
+    branches: tuple[tuple["RegexNode", ...], ...]
+
+
+@dataclasses.dataclass(frozen=True)
+class RegexRepeat:
+    """A quantified node, repeated at least `minimum` times."""
+
+    minimum: int
+    node: "RegexNode"
+
+
+@dataclasses.dataclass(frozen=True)
+class RegexOther:
+    """Any other construct: a class, a class escape, a back reference or a zero-width assertion."""
+
+
+RegexNode = RegexLiteral | RegexGroup | RegexRepeat | RegexOther
+
+_LITERAL_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "f": "\f", "v": "\v", "a": "\a"}
+_QUANTIFIER_RE = re.compile(r"(?:[*+?]|\{(\d+)(?:,(\d*))?\})[?+]?")
+_GROUP_PREFIX_RE = re.compile(
+    r"\(\?(?:(?P<assertion><?[=!])|P?<\w+>|(?P<flags>[aiLmsux]*(?:-[imsx]*)?)(?P<scoped>:)?)"
+)
+
+
+def parse_regex(pattern: str) -> RegexGroup:
+    """Parses a pattern converted by `convert_regex` into a tree of literals, groups, repeats and other constructs.
+
+    Raises:
+        ExtractionError: if the pattern uses a construct outside the converted subset, or the verbose flag.
+    """
+    parser = _RegexParser(pattern)
+    tree = parser.group()
+    if parser.index != len(pattern):
+        raise ExtractionError(f"Unbalanced group in /{pattern}/")
+    return tree
+
+
+class _RegexParser:
+    def __init__(self, pattern: str) -> None:
+        self._pattern = pattern
+        self.index = 0
+
+    def group(self) -> RegexGroup:
+        """Parses branches up to the end of the pattern or the closing parenthesis of the current group."""
+        branches: list[tuple[RegexNode, ...]] = []
+        sequence: list[RegexNode] = []
+        while self.index < len(self._pattern) and self._pattern[self.index] != ")":
+            char = self._pattern[self.index]
+            if char == "|":
+                branches.append(tuple(sequence))
+                sequence = []
+                self.index += 1
+                continue
+            quantifier = _QUANTIFIER_RE.match(self._pattern, self.index)
+            if quantifier is not None and len(sequence) > 0:
+                minimum = {"*": 0, "+": 1, "?": 0}.get(quantifier.group(0)[0])
+                if minimum is None:
+                    minimum = int(quantifier.group(1))
+                sequence.append(RegexRepeat(minimum, sequence.pop()))
+                self.index = quantifier.end()
+                continue
+            node = self._atom()
+            if node is not None:
+                sequence.append(node)
+        branches.append(tuple(sequence))
+        return RegexGroup(tuple(branches))
+
+    def _atom(self) -> RegexNode | None:
+        """Parses one atom, None for the constructs matching nothing like comments and global flags."""
+        char = self._pattern[self.index]
+        if char == "\\":
+            return self._escape()
+        if char == "[":
+            self._skip_class()
+            return RegexOther()
+        if char == "(":
+            return self._parenthesized()
+        self.index += 1
+        if char in ".^$":
+            return RegexOther()
+        return RegexLiteral(char)
+
+    def _escape(self) -> RegexNode:
+        escaped = self._pattern[self.index + 1 : self.index + 2]
+        self.index += 2
+        if escaped in _LITERAL_ESCAPES:
+            return RegexLiteral(_LITERAL_ESCAPES[escaped])
+        if escaped == "x":
+            code = re.match(r"[0-9a-fA-F]{2}", self._pattern[self.index :])
+            if code is not None:
+                self.index += 2
+                return RegexLiteral(chr(int(code.group(0), 16)))
+        if escaped != "" and not escaped.isalnum():
+            return RegexLiteral(escaped)
+        return RegexOther()
+
+    def _skip_class(self) -> None:
+        index = self.index + 1
+        # A leading `]` or `^]` is a literal bracket.
+        for leading in ("^]", "]"):
+            if self._pattern.startswith(leading, index):
+                index += len(leading)
+                break
+        while index < len(self._pattern) and self._pattern[index] != "]":
+            index += 2 if self._pattern[index] == "\\" else 1
+        if index >= len(self._pattern):
+            raise ExtractionError(f"Unterminated class in /{self._pattern}/")
+        self.index = index + 1
+
+    def _parenthesized(self) -> RegexNode | None:
+        if self._pattern.startswith("(?#", self.index):
+            end = self._pattern.find(")", self.index)
+            if end == -1:
+                raise ExtractionError(f"Unterminated comment in /{self._pattern}/")
+            self.index = end + 1
+            return None
+        prefix = _GROUP_PREFIX_RE.match(self._pattern, self.index)
+        if prefix is None:
+            if self._pattern.startswith("(?", self.index):
+                raise ExtractionError(f"Unsupported group in /{self._pattern}/")
+            prefix_end = self.index + 1
+        else:
+            flags = prefix.group("flags")
+            if flags is not None and "x" in flags.split("-")[0]:
+                raise ExtractionError(f"Unsupported verbose flag in /{self._pattern}/")
+            if flags is not None and prefix.group("scoped") is None:
+                self.index = prefix.end()
+                self._expect_closing()
+                return None
+            prefix_end = prefix.end()
+        self.index = prefix_end
+        group = self.group()
+        self._expect_closing()
+        if prefix is not None and prefix.group("assertion") is not None:
+            return RegexOther()
+        return group
+
+    def _expect_closing(self) -> None:
+        if self._pattern[self.index : self.index + 1] != ")":
+            raise ExtractionError(f"Unbalanced group in /{self._pattern}/")
+        self.index += 1
+
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<space>\s+|\#[^\n]*)
+    |(?P<dstring>"(?:[^"\\]|\\.)*")
+    |(?P<sstring>'(?:[^'\\]|\\.)*')
+    |(?P<regex>/(?:[^/\\\n]|\\.)*/[a-z]*)
+    |(?P<symbol>:[A-Za-z_]\w*[?!]?)
+    |(?P<label>[A-Za-z_]\w*:(?!:))
+    |(?P<arrow>=>)
+    |(?P<number>-?\d+)
+    |(?P<ident>[A-Za-z_][\w.]*[?!]?)
+    |(?P<punct>[\[\]{}(),])
+    """,
+    re.VERBOSE,
+)
+
+_DOUBLE_QUOTE_ESCAPES = {
+    "n": "\n",
+    "t": "\t",
+    "r": "\r",
+    "0": "\0",
+    "e": "\x1b",
+    "s": " ",
+}
+
+
+def _unescape_double_quoted(value: str) -> str:
+    if "#{" in value:
+        raise ExtractionError(f"Unsupported string interpolation in {value!r}")
+    return re.sub(
+        r"\\(.)", lambda m: _DOUBLE_QUOTE_ESCAPES.get(m.group(1), m.group(1)), value
+    )
+
+
+def _tokenize(source: str) -> Iterator[tuple[str, str]]:
+    index = 0
+    while index < len(source):
+        token = _TOKEN_RE.match(source, index)
+        if token is None:
+            raise ExtractionError(
+                f"Unsupported syntax at {source[index : index + 20]!r}"
+            )
+        index = token.end()
+        kind = token.lastgroup or ""
+        if kind != "space":
+            yield kind, token.group(0)
+
+
+class _Parser:
+    """Recursive descent parser of Ruby literals."""
+
+    def __init__(self, tokens: list[tuple[str, str]]) -> None:
+        self._tokens = tokens
+        self._index = 0
+
+    def at_end(self) -> bool:
+        return self._index >= len(self._tokens)
+
+    def peek(self) -> tuple[str, str]:
+        if self.at_end() is True:
+            return "", ""
+        return self._tokens[self._index]
+
+    def next(self) -> tuple[str, str]:
+        token = self.peek()
+        self._index += 1
+        return token
+
+    def expect(self, value: str) -> None:
+        _, token = self.next()
+        if token != value:
+            raise ExtractionError(f"Expected {value!r}, found {token!r}")
+
+    def value(self) -> Any:
+        kind, token = self.next()
+        if kind == "dstring":
+            return _unescape_double_quoted(token[1:-1])
+        if kind == "sstring":
+            return re.sub(r"\\([\\'])", r"\1", token[1:-1])
+        if kind == "regex":
+            body, _, flags = token[1:].rpartition("/")
+            return RubyRegex(body, flags)
+        if kind == "symbol":
+            return token[1:]
+        if kind == "number":
+            return int(token)
+        if token == "[":
+            return self.array()
+        if token == "{":
+            return self._hash()
+        raise ExtractionError(f"Unsupported value {token!r}")
+
+    def array(self) -> list[Any]:
+        items = []
+        while self.peek()[1] != "]":
+            items.append(self.value())
+            if self.peek()[1] == ",":
+                self.next()
+        self.expect("]")
+        return items
+
+    def _hash(self) -> dict[str, Any]:
+        items: dict[str, Any] = {}
+        while self.peek()[1] != "}":
+            kind, token = self.next()
+            if kind == "label":
+                key = token[:-1]
+            elif kind == "symbol":
+                key = token[1:]
+                self.expect("=>")
+            else:
+                raise ExtractionError(f"Unsupported hash key {token!r}")
+            items[key] = self.value()
+            if self.peek()[1] == ",":
+                self.next()
+        self.expect("}")
+        return items
+
+
+def _convert_match(match: dict[str, Any]) -> dict[str, Any] | None:
+    """Keeps the keys of a match declaration evaluated by the native matcher, None if nothing can be matched.
+
+    Raises:
+        ExtractionError: if a regex of the declaration cannot be converted.
+    """
+    if "url" in match or "md5" in match or "status" in match or "tagpattern" in match:
+        # Aggressive or non-content matches need requests WhatWeb's passive scan does not make.
+        return None
+    converted: dict[str, Any] = {"search": str(match.get("search", "body"))}
+    if "name" in match:
+        converted["name"] = str(match["name"])
+    if isinstance(match.get("regexp"), RubyRegex):
+        converted["regexp"] = convert_regex(
+            match["regexp"].pattern, match["regexp"].flags
+        )
+    if isinstance(match.get("text"), str):
+        converted["text"] = match["text"]
+    for key in CAPTURE_KEYS:
+        if isinstance(match.get(key), RubyRegex):
+            converted[key] = convert_regex(match[key].pattern, match[key].flags)
+            converted["offset"] = int(match.get("offset", 0))
+    if len(converted.keys() - {"search", "name", "offset"}) == 0:
+        return None
+    return converted
+
+
+def extract_plugin(source: str) -> dict[str, Any]:
+    """Extracts the name and the `matches` declarations of a plugin source.
+
+    Raises:
+        ExtractionError: if the plugin uses syntax outside the supported subset.
+    """
+    tokens = list(_tokenize(source))
+    parser = _Parser(tokens)
+    name: str | None = None
+    matches: list[dict[str, Any]] = []
+    while parser.at_end() is False:
+        kind, token = parser.next()
+        if kind != "ident":
+            continue
+        if (
+            token == "name"
+            and name is None
+            and parser.peek()[0] in ("dstring", "sstring")
+        ):
+            name = parser.value()
+        elif token == "matches" and parser.peek()[1] == "[":
+            parser.next()
+            for match in parser.array():
+                if not isinstance(match, dict):
+                    raise ExtractionError(f"Unsupported match declaration {match!r}")
+                try:
+                    converted = _convert_match(match)
+                except ExtractionError as e:
+                    logger.warning("Skipping match of plugin %s: %s", name, e)
+                    continue
+                if converted is not None:
+                    matches.append(converted)
+        elif token in ("passive", "aggressive", "def"):
+            raise ExtractionError(f"Unsupported Ruby code block `{token}`")
+    if name is None:
+        raise ExtractionError("Plugin name not found")
+    return {"name": name, "matches": matches}
+
+
+def extract_signatures(plugins_directory: pathlib.Path) -> list[dict[str, Any]]:
+    """Extracts the signatures of all the plugins of a directory, plugins that cannot be extracted are skipped."""
+    signatures = []
+    for plugin_path in sorted(plugins_directory.glob("*.rb")):
+        try:
+            signature = extract_plugin(plugin_path.read_text())
+        except ExtractionError as e:
+            logger.warning("Skipping plugin %s: %s", plugin_path.name, e)
+            continue
+        if len(signature["matches"]) > 0:
+            signatures.append(signature)
+    return signatures
+
+
+def main(argv: list[str]) -> None:
+    if len(argv) != 2:
+        raise SystemExit(
+            "Usage: python -m agent.signatures <plugins directory> <output file>"
+        )
+    signatures = extract_signatures(pathlib.Path(argv[0]))
+    pathlib.Path(argv[1]).write_text(json.dumps(signatures, indent=1))
+    logger.info("Extracted %s plugin signatures to %s", len(signatures), argv[1])
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level="INFO")
+    main(sys.argv[1:])
@@ -1,19 +1,32 @@
 """WhatWeb Agent: Agent responsible for finger-printing a website."""
 
 import abc
+import asyncio
 import dataclasses
 import io
 import ipaddress
+import itertools
 import json
 import logging
-import re
+import math
+import os
 import subprocess
 import tempfile
-from typing import List, Optional, Dict, Any
+import threading
+import time
+from collections.abc import Callable, Coroutine, Iterable, Iterator
+from concurrent import futures
+from typing import (
+    IO,
+    Any,
+    Dict,
+    List,
+    Optional,
+    TypeVar,
+    cast,
+)
 from urllib import parse
 
-from agent.mcp_server import mcp_runner
-
 from ostorlab.agent import agent
 from ostorlab.agent import definitions as agent_definitions
 from ostorlab.agent.kb import kb
@@ -26,7 +39,21 @@ from ostorlab.assets import ipv6 as ipv6_asset
 from ostorlab.runtimes import definitions as runtime_definitions
 from rich import logging as rich_logging
 
+from agent import cache
+from agent import deadline
+from agent import decoder
+from agent import dedup
 from agent import definitions
+from agent import liveness
+from agent import log_parser
+from agent import metrics
+from agent import native_matcher
+from agent import profiling
+from agent import scheduler
+from agent import scope
+from agent import whatweb_pool
+from agent import whatweb_utils
+from agent.mcp_server import mcp_runner
 
 logging.basicConfig(
     format="%(message)s",
@@ -39,17 +66,42 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# Redis sets of the targets already processed, by the domain and URL messages and by the IP messages.
+ASSET_DEDUP_KEY = b"agent_whatweb_asset"
+IP_DEDUP_KEY = "agent_whois_ip_asset"
+
+# Marks the end of the items generated in a thread.
+_NO_ITEM = object()
+
 VULNZ_TITLE = "Tech Stack Fingerprint"
 VULNZ_ENTRY_RISK_RATING = "INFO"
 VULNZ_SHORT_DESCRIPTION = "List of web technologies recognized"
 VULNZ_DESCRIPTION = """Lists web technologies including content management systems(CMS), blogging platforms,
 statistic/analytics packages, JavaScript libraries, web servers, embedded devices, version numbers, email addresses,
 account IDs, web framework modules, SQL errors, and more."""
+# The report entry is the same for all the fingerprints, only the technical detail changes.
+VULNZ_ENTRY = kb.Entry(
+    title=VULNZ_TITLE,
+    risk_rating=VULNZ_ENTRY_RISK_RATING,
+    short_description=VULNZ_SHORT_DESCRIPTION,
+    description=VULNZ_DESCRIPTION,
+    references={},
+    security_issue=True,
+    privacy_issue=False,
+    has_public_exploit=False,
+    targeted_by_malware=False,
+    targeted_by_ransomware=False,
+    targeted_by_nation_state=False,
+)
 
 
 class BaseTarget(abc.ABC):
     """Base target with a target property for use by the Whatweb binary."""
 
+    __slots__ = ()
+
     @property
     @abc.abstractmethod
     def target(self) -> str:
@@ -57,7 +109,7 @@ class BaseTarget(abc.ABC):
         raise NotImplementedError()
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class DomainTarget(BaseTarget):
     """Domain target."""
 
@@ -80,7 +132,7 @@ class DomainTarget(BaseTarget):
         return url
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class IPTarget(BaseTarget):
     """IP target."""
 
@@ -96,7 +148,8 @@ class IPTarget(BaseTarget):
         if self.schema is not None and self.schema in ("https", "http"):
             url += f"{self.schema}://"
 
-        url += self.name
+        # IPv6 literals are bracketed, their colons would otherwise be read as the port separator.
+        url += f"[{self.name}]" if self.version == 6 else self.name
 
         if self.port is not None:
             url += f":{self.port}"
@@ -104,6 +157,26 @@ class IPTarget(BaseTarget):
         return url
 
 
+def _describe_scanned(item: object) -> str:
+    """Returns the name of a scanned item in the profiles, a target or a batch of targets."""
+    if isinstance(item, list):
+        return f"batch of {len(item)} targets"
+    if isinstance(item, (DomainTarget, IPTarget)):
+        return item.target
+    return str(item)
+
+
+def _count_hosts(network: ipaddress.IPv4Network | ipaddress.IPv6Network) -> int:
+    """Returns the number of addresses yielded by `network.hosts()`, without generating them."""
+    if network.num_addresses <= 2:
+        return network.num_addresses
+    if network.version == 4:
+        # Network and broadcast addresses are excluded.
+        return network.num_addresses - 2
+    # The Subnet-Router anycast address is excluded.
+    return network.num_addresses - 1
+
+
 class AgentWhatWeb(
     agent.Agent, vuln_mixin.AgentReportVulnMixin, persist_mixin.AgentPersistMixin
 ):
@@ -118,24 +191,191 @@ class AgentWhatWeb(
         vuln_mixin.AgentReportVulnMixin.__init__(self)
         persist_mixin.AgentPersistMixin.__init__(self, agent_settings)
         self._scope_domain_regex: Optional[str] = self.args.get("scope_domain_regex")
+        self._scope: scope.Scope | None = scope.Scope.from_args(
+            self.args.get("scope_domains"), self._scope_domain_regex
+        )
         self._should_start_mcp_server: bool = self.args.get(
             "should_start_mcp_server", False
         )
+        self._batch_size: int = int(self.args.get("ip_batch_size") or 0)
+        self._max_concurrency: int = int(self.args.get("max_concurrency") or 1)
+        self._stream_output: bool = bool(self.args.get("stream_output", False))
+        self._scan_engine: str = str(
+            self.args.get("scan_engine") or definitions.THREADS_SCAN_ENGINE
+        )
+        if (
+            self._stream_output is True
+            and self._scan_engine == definitions.ASYNCIO_SCAN_ENGINE
+            and self._max_concurrency > 1
+        ):
+            raise ValueError(
+                "The asyncio scan engine does not stream the WhatWeb log, "
+                "disable stream_output or use the threads scan engine."
+            )
+        self._plugin_profile: str = str(
+            self.args.get("plugin_profile") or definitions.DEFAULT_PLUGIN_PROFILE
+        )
+        self._plugin_arguments: list[str] = whatweb_utils.get_plugin_arguments(
+            self._plugin_profile
+        )
+        self._log_format: str = str(
+            self.args.get("log_format") or definitions.DEFAULT_LOG_FORMAT
+        )
+        self._log_option: str = whatweb_utils.get_log_option(self._log_format)
+        self._liveness_prefilter: bool = bool(
+            self.args.get("liveness_prefilter", False)
+        )
+        self._liveness_timeout: float = float(
+            self.args.get("liveness_timeout") or liveness.DEFAULT_CONNECT_TIMEOUT
+        )
+        self._liveness_concurrency: int = int(
+            self.args.get("liveness_concurrency") or liveness.DEFAULT_CONCURRENCY
+        )
+        self._cache_ttl: float = float(self.args.get("cache_ttl") or 0)
+        self._cache_max_entries: int = int(
+            self.args.get("cache_max_entries") or cache.DEFAULT_MAX_ENTRIES
+        )
+        self._cache_redis: bool = bool(self.args.get("cache_redis", False))
+        self._cache: cache.FingerprintCache | None = None
+        if self._cache_ttl > 0 and self._should_start_mcp_server is False:
+            self._cache = cache.FingerprintCache(
+                ttl=self._cache_ttl,
+                max_entries=self._cache_max_entries,
+                redis_client=self._redis_client if self._cache_redis is True else None,
+            )
+        self._fingerprint_engine: str = str(
+            self.args.get("fingerprint_engine")
+            or definitions.WHATWEB_FINGERPRINT_ENGINE
+        )
+        self._scheduler: scheduler.PolitenessScheduler | None = None
+        rate_per_host = float(self.args.get("rate_per_host") or 0)
+        rate_per_subnet = float(self.args.get("rate_per_subnet") or 0)
+        rate_global = float(self.args.get("rate_global") or 0)
+        if rate_per_host > 0 or rate_per_subnet > 0 or rate_global > 0:
+            self._scheduler = scheduler.PolitenessScheduler(
+                host_rate=rate_per_host,
+                subnet_rate=rate_per_subnet,
+                global_rate=rate_global,
+                burst=float(self.args.get("rate_burst") or 1),
+            )
+        self._scan_timeout: float = float(self.args.get("scan_timeout") or 0)
+        self._deadline: deadline.AdaptiveDeadline | None = None
+        if self._scan_timeout > 0 and bool(
+            self.args.get("adaptive_scan_timeout", False)
+        ):
+            self._deadline = deadline.AdaptiveDeadline(
+                maximum=self._scan_timeout,
+                minimum=float(self.args.get("min_scan_timeout") or 0),
+                percentile=float(self.args.get("scan_timeout_percentile") or 95),
+                factor=float(self.args.get("scan_timeout_factor") or 3),
+            )
+        max_output_bytes = self.args.get("max_output_bytes")
+        self._max_output_bytes: int = (
+            int(max_output_bytes)
+            if max_output_bytes is not None
+            else definitions.MAX_OUTPUT_BYTES
+        )
+        self._native_engine: native_matcher.NativeEngine | None = None
+        if (
+            self._fingerprint_engine == definitions.NATIVE_FINGERPRINT_ENGINE
+            and self._should_start_mcp_server is False
+        ):
+            self._native_engine = native_matcher.NativeEngine(
+                native_matcher.Matcher.from_file(definitions.NATIVE_SIGNATURES_PATH),
+                pool_size=self._max_concurrency,
+                max_body_bytes=self._max_output_bytes,
+            )
+        self._coalesce_reports: bool = bool(self.args.get("coalesce_reports", False))
+        self._dedup_fronts: dict[bytes | str, dedup.DedupFront] = {}
+        if (
+            bool(self.args.get("dedup_local_filter", False))
+            and self._should_start_mcp_server is False
+        ):
+            capacity = int(
+                self.args.get("dedup_filter_capacity") or dedup.DEFAULT_CAPACITY
+            )
+            for dedup_key in (ASSET_DEDUP_KEY, IP_DEDUP_KEY):
+                self._dedup_fronts[dedup_key] = dedup.DedupFront(
+                    self._redis_client, dedup_key, capacity=capacity
+                )
+        self._emit_lock = threading.Lock()
+        self._metrics_port: int = int(self.args.get("metrics_port") or 0)
+        self._metrics_host: str = str(
+            self.args.get("metrics_host") or metrics.DEFAULT_HOST
+        )
+        self._profiling_directory: str = str(
+            self.args.get("profiling_directory")
+            or os.environ.get(profiling.DIRECTORY_ENV_VARIABLE)
+            or ""
+        )
+        self._profiling_slowest_targets: int = int(
+            self.args.get("profiling_slowest_targets")
+            or profiling.DEFAULT_SLOWEST_TARGETS
+        )
+        self._profiling_traces_url: str = str(
+            self.args.get("profiling_traces_url") or ""
+        )
+        self._profiler: profiling.Profiler | None = None
+        if self._should_start_mcp_server is False:
+            self._profiler = profiling.Profiler.from_settings(
+                self._profiling_directory,
+                slowest_targets=self._profiling_slowest_targets,
+                traces_url=self._profiling_traces_url,
+                service_name=agent_settings.key or "whatweb",
+            )
+        self._worker_pool_size: int = int(self.args.get("worker_pool_size") or 0)
+        self._worker_pool: whatweb_pool.WorkerPool | None = None
+        if self._worker_pool_size > 0 and self._should_start_mcp_server is False:
+            self._worker_pool = whatweb_pool.WorkerPool(
+                self._worker_pool_size, plugin_profiles=[self._plugin_profile]
+            )
 
     def start(self) -> None:
-        """Starts the agent and the MCP server if configured to do so."""
+        """Starts the agent and the MCP server if configured to do so.
+
+        The metrics endpoint is served by the MCP server when it is started, by the agent otherwise. The agent also
+        starts the background load and flush of its dedup fronts.
+        """
         if self._should_start_mcp_server is True:
             version: str = self._agent_definition.version or ""
             agent_key: str = self.settings.key or ""
+            cache_redis_url: str = ""
+            if self._cache_redis is True:
+                cache_redis_url = self.settings.redis_url or ""
 
             runner = mcp_runner.MCPRunner(
                 agent_key=agent_key,
                 agent_version=version,
+                worker_pool_size=self._worker_pool_size,
+                cache_ttl=self._cache_ttl,
+                cache_max_entries=self._cache_max_entries,
+                cache_redis_url=cache_redis_url,
+                scan_timeout=self._scan_timeout,
+                log_format=self._log_format,
+                metrics_port=self._metrics_port,
+                metrics_host=self._metrics_host,
+                profiling_directory=self._profiling_directory,
+                profiling_slowest_targets=self._profiling_slowest_targets,
+                profiling_traces_url=self._profiling_traces_url,
             )
             logger.info("Starting MCP server..")
             runner.run()
         else:
             logger.info("MCP server mode is disabled.")
+            if self._metrics_port > 0:
+                metrics.start_server(self._metrics_port, host=self._metrics_host)
+            for dedup_front in self._dedup_fronts.values():
+                dedup_front.start()
+
+    def at_exit(self) -> None:
+        """Writes the new targets queued by the dedup fronts to Redis, stops the WhatWeb workers and exports the
+        profiling spans before the agent stops."""
+        for dedup_front in self._dedup_fronts.values():
+            dedup_front.close()
+        if self._worker_pool is not None:
+            self._worker_pool.close()
+        if self._profiler is not None:
+            self._profiler.close()
 
     def process(self, message: msg.Message) -> None:
         """Starts a whatweb scan, wait for the scan to finish,
@@ -146,30 +386,489 @@ class AgentWhatWeb(
         """
         if self._should_start_mcp_server is True:
             return
+        if self._profiler is None:
+            self._scan_message(message)
+            return
+        with self._profiler.message(message.selector):
+            self._scan_message(message)
 
+    def _scan_message(self, message: msg.Message) -> None:
+        """Scans the targets of a message that were not processed before and emits the results."""
         logger.info("processing message of selector : %s", message.selector)
-        targets = self._prepare_targets(message)
-        logger.info("Generated targets %s", targets)
-        if self._should_target_be_processed(message) is False:
+        # The URL of a link message is parsed once for the targets, the dedup and the scope checks.
+        domain_target = self._get_domain_target(message)
+        targets = self._prepare_targets(message, domain_target)
+        if self._should_target_be_processed(message, domain_target) is False:
             return
+        targets = metrics.counted(targets, metrics.TARGETS)
+        if self._cache is not None:
+            targets = self._emit_cached_targets(targets)
 
+        if (
+            self._native_engine is None
+            and self._batch_size > 1
+            and message.data.get("host") is not None
+        ):
+            # The targets of a batch are scanned at once, the rate budgets are charged per batch.
+            if self._scheduler is not None:
+                batches = self._scheduler.schedule_batches(
+                    targets, lambda target: target.name, self._batch_size
+                )
+            else:
+                batches = whatweb_utils.chunked(targets, self._batch_size)
+            self._run_scans(self._scan_batch, self._scan_batch_async, batches)
+            return
+
+        if self._scheduler is not None:
+            targets = self._scheduler.schedule(targets, lambda target: target.name)
+        if self._native_engine is not None:
+            self._run_scans(
+                self._scan_target_native, self._scan_target_native_async, targets
+            )
+        else:
+            self._run_scans(self._scan_target, self._scan_target_async, targets)
+
+    def _run_scans(
+        self,
+        scan: Callable[[T], None],
+        scan_async: Callable[[T], Coroutine[Any, Any, None]],
+        items: Iterable[T],
+    ) -> None:
+        """Runs the scan of every item, one after another or concurrently if `max_concurrency` is above 1.
+
+        Concurrent scans run on a thread pool, or on a single event loop with the asyncio scan engine.
+        """
+        if self._profiler is not None:
+            scan = self._profiler.wrap(scan, _describe_scanned)
+            scan_async = self._profiler.wrap_async(scan_async, _describe_scanned)
+        if self._max_concurrency <= 1:
+            for item in items:
+                scan(item)
+        elif self._scan_engine == definitions.ASYNCIO_SCAN_ENGINE:
+            asyncio.run(self._run_scans_async(scan_async, items))
+        else:
+            with futures.ThreadPoolExecutor(
+                max_workers=self._max_concurrency
+            ) as executor:
+                in_flight: set[futures.Future[None]] = set()
+                for item in items:
+                    if len(in_flight) >= self._max_concurrency:
+                        done, in_flight = futures.wait(
+                            in_flight, return_when=futures.FIRST_COMPLETED
+                        )
+                        self._log_failed_scans(done)
+                    in_flight.add(executor.submit(scan, item))
+                done, _ = futures.wait(in_flight)
+                self._log_failed_scans(done)
+
+    async def _run_scans_async(
+        self,
+        scan: Callable[[T], Coroutine[Any, Any, None]],
+        items: Iterable[T],
+    ) -> None:
+        """Runs the scans as tasks of the running event loop, with at most `max_concurrency` in flight.
+
+        Items are generated in a thread, generating them may block on rate budgets or liveness probes.
+        """
+        in_flight: set[asyncio.Task[None]] = set()
+        iterator = iter(items)
+        while True:
+            item = await asyncio.to_thread(next, iterator, _NO_ITEM)
+            if item is _NO_ITEM:
+                break
+            if len(in_flight) >= self._max_concurrency:
+                done, in_flight = await asyncio.wait(
+                    in_flight, return_when=asyncio.FIRST_COMPLETED
+                )
+                self._log_failed_scans(done)
+            in_flight.add(asyncio.create_task(scan(cast(T, item))))
+        if len(in_flight) > 0:
+            done, _ = await asyncio.wait(in_flight)
+            self._log_failed_scans(done)
+
+    def _log_failed_scans(
+        self, done: Iterable[futures.Future[None] | asyncio.Future[None]]
+    ) -> None:
+        """Logs the scans that failed, a failing scan does not stop the other ones."""
+        for future in done:
+            exception = future.exception()
+            if exception is not None:
+                logger.error(
+                    "Error scanning target: %s",
+                    exception,
+                    exc_info=(type(exception), exception, exception.__traceback__),
+                )
+
+    def _emit_cached_targets(
+        self, targets: Iterable[DomainTarget | IPTarget]
+    ) -> Iterator[DomainTarget | IPTarget]:
+        """Emits the cached results of the targets, yields only the targets that must be scanned."""
+        for target in targets:
+            output = self._get_cached_output(target)
+            if output is None:
+                yield target
+                continue
+            logger.info("Using cached results of target %s", target)
+            self._parse_emit_result(target, io.BytesIO(output))
+
+    def _get_cached_output(self, target: DomainTarget | IPTarget) -> bytes | None:
+        """Returns the cached WhatWeb output of the target, None if it must be scanned."""
+        if self._cache is None:
+            return None
+        return self._cache.get(self._get_cache_key(target))
+
+    def _cache_output(self, target: DomainTarget | IPTarget, output: bytes) -> None:
+        """Caches the WhatWeb output of the target if the cache is enabled."""
+        if self._cache is not None:
+            self._cache.set(self._get_cache_key(target), output)
+
+    def _get_cache_key(self, target: DomainTarget | IPTarget) -> str:
+        return cache.make_key(
+            target.target,
+            self._plugin_profile,
+            self._log_format,
+            self._fingerprint_engine,
+        )
+
+    def _cache_batch_output(
+        self,
+        targets: list[DomainTarget | IPTarget],
+        lines_by_host: dict[str, list[bytes]],
+    ) -> None:
+        """Caches the WhatWeb output of every target of a batch, targets without results cache an empty output."""
         for target in targets:
-            try:
-                logger.info("Scanning target %s", target)
+            self._cache_output(
+                target, b"".join(lines_by_host.get(target.name.lower(), []))
+            )
+
+    def _get_scan_timeout(self) -> float | None:
+        """Returns the deadline in seconds of the next scan of a single target, None if scans have no deadline."""
+        if self._deadline is not None:
+            return self._deadline.current()
+        if self._scan_timeout > 0:
+            return self._scan_timeout
+        return None
+
+    def _get_batch_waves(self, targets_count: int) -> int:
+        """Returns the number of targets every WhatWeb thread of a batch scan scans one after another."""
+        return math.ceil(
+            targets_count / min(targets_count, definitions.WHATWEB_MAX_THREADS)
+        )
+
+    def _get_batch_timeout(self, targets_count: int) -> float | None:
+        """Returns the deadline in seconds of a batch scan, the deadline of a target for every wave of targets."""
+        timeout = self._get_scan_timeout()
+        if timeout is None:
+            return None
+        return timeout * self._get_batch_waves(targets_count)
+
+    def _observe_scan_duration(self, started_at: float, waves: int = 1) -> None:
+        """Records the duration of a completed scan, the adaptive deadline is computed from these durations."""
+        if self._deadline is not None:
+            self._deadline.observe((time.monotonic() - started_at) / waves)
+
+    def _log_scan_timeout(self, scanned: str, e: subprocess.TimeoutExpired) -> None:
+        """Logs a scan killed at its deadline, its complete results were emitted."""
+        logger.warning(
+            "Scan of %s timed out after %.1fs, emitted its partial results.",
+            scanned,
+            e.timeout,
+        )
+
+    def _scan_target(self, target: DomainTarget | IPTarget) -> None:
+        """Scans a single target with its own WhatWeb run and emits the results.
+
+        A scan killed at its deadline emits the results of the complete lines written before it was killed.
+        """
+        timeout = self._get_scan_timeout()
+        started_at = time.monotonic()
+        try:
+            logger.info("Scanning target %s", target)
+            if self._stream_output is True:
+                lines = []
+                emitted: set[decoder.Fingerprint] = set()
+                try:
+                    for line in metrics.timed(
+                        whatweb_utils.stream_whatweb_output(
+                            [target.target, *self._plugin_arguments],
+                            timeout=timeout,
+                            max_bytes=self._max_output_bytes,
+                            log_format=self._log_format,
+                            worker_pool=self._worker_pool,
+                        ),
+                        metrics.STAGE_DURATION,
+                        stage="start_scan",
+                    ):
+                        lines.append(line)
+                        self._parse_emit_streamed_line(target, line, emitted)
+                finally:
+                    self._report_coalesced_fingerprints(target, emitted)
+                self._cache_output(target, b"".join(lines))
+            else:
                 with tempfile.NamedTemporaryFile() as fp:
-                    self._start_scan(target, fp.name)
-                    self._parse_emit_result(target, io.BytesIO(fp.read()))
-            except subprocess.CalledProcessError as e:
-                logger.error("Error scanning target `%s`: %s", target, e)
-
-    def _prepare_targets(self, message: msg.Message) -> List[IPTarget | DomainTarget]:
-        """Returns a list of target objects to be scanned."""
-        targets: List[DomainTarget | IPTarget] = []
-        domain_targets = self._prepare_domain_targets(message)
-        ip_targets = self._prepare_ip_targets(message)
-        targets.extend(domain_targets)
-        targets.extend(ip_targets)
-        return targets
+                    try:
+                        self._start_scan(target, fp.name, timeout)
+                    except subprocess.TimeoutExpired:
+                        self._parse_emit_result(target, fp, partial=True)
+                        raise
+                    self._cache_output_file(target, fp)
+                    self._parse_emit_result(target, fp)
+            self._observe_scan_duration(started_at)
+        except subprocess.CalledProcessError as e:
+            logger.error("Error scanning target `%s`: %s", target, e)
+        except subprocess.TimeoutExpired as e:
+            self._log_scan_timeout(f"target `{target}`", e)
+
+    async def _scan_target_async(self, target: DomainTarget | IPTarget) -> None:
+        """Async counterpart of `_scan_target`, WhatWeb runs without blocking the event loop."""
+        timeout = self._get_scan_timeout()
+        started_at = time.monotonic()
+        try:
+            logger.info("Scanning target %s", target)
+            with tempfile.NamedTemporaryFile() as fp:
+                try:
+                    with metrics.STAGE_DURATION.time(stage="start_scan"):
+                        await whatweb_utils.run_whatweb_async(
+                            self._get_scan_arguments(target, fp.name),
+                            timeout=timeout,
+                            worker_pool=self._worker_pool,
+                        )
+                except subprocess.TimeoutExpired:
+                    self._parse_emit_result(target, fp, partial=True)
+                    raise
+                # The Redis tier of the cache is not awaited on the event loop.
+                await asyncio.to_thread(self._cache_output_file, target, fp)
+                self._parse_emit_result(target, fp)
+            self._observe_scan_duration(started_at)
+        except subprocess.CalledProcessError as e:
+            logger.error("Error scanning target `%s`: %s", target, e)
+        except subprocess.TimeoutExpired as e:
+            self._log_scan_timeout(f"target `{target}`", e)
+
+    def _cache_output_file(
+        self, target: DomainTarget | IPTarget, output_file: IO[bytes]
+    ) -> None:
+        """Caches the WhatWeb log of a scan up to the output cap, the log is only read if the cache is enabled."""
+        if self._cache is None:
+            return
+        output_file.seek(0)
+        self._cache_output(
+            target,
+            whatweb_utils.read_capped_output(output_file, self._max_output_bytes),
+        )
+
+    def _scan_target_native(self, target: DomainTarget | IPTarget) -> None:
+        """Fingerprints a single target with the native matcher and emits the results."""
+        if self._native_engine is None:
+            return
+        logger.info("Fingerprinting target %s with the native matcher", target)
+        with profiling.span("native_scan"):
+            output = self._native_engine.scan(
+                target.target, timeout=self._get_scan_timeout()
+            )
+        self._cache_output(target, output)
+        self._parse_emit_result(target, io.BytesIO(output))
+
+    async def _scan_target_native_async(self, target: DomainTarget | IPTarget) -> None:
+        """Async counterpart of `_scan_target_native`, the blocking HTTP client runs in a thread."""
+        await asyncio.to_thread(self._scan_target_native, target)
+
+    def _scan_batch(self, targets: list[DomainTarget | IPTarget]) -> None:
+        """Scans a chunk of targets with a single WhatWeb run, then splits the results back per target.
+
+        WhatWeb writes one JSON line per visited URL, lines are attributed to the target with the same host.
+        Lines of redirects to other hosts are not attributed to any target.
+        """
+        logger.info("Scanning a batch of %s targets", len(targets))
+        if self._stream_output is True:
+            self._scan_batch_streaming(targets)
+            return
+        timeout = self._get_batch_timeout(len(targets))
+        started_at = time.monotonic()
+        try:
+            with (
+                tempfile.NamedTemporaryFile() as input_file,
+                tempfile.NamedTemporaryFile() as fp,
+            ):
+                self._write_batch_input(targets, input_file)
+                try:
+                    self._start_batch_scan(
+                        len(targets), input_file.name, fp.name, timeout
+                    )
+                except subprocess.TimeoutExpired as e:
+                    self._log_scan_timeout(f"batch of {len(targets)} targets", e)
+                    self._parse_emit_batch_result(targets, fp, partial=True)
+                    return
+                self._observe_scan_duration(
+                    started_at, self._get_batch_waves(len(targets))
+                )
+                self._parse_emit_batch_result(targets, fp)
+        except subprocess.CalledProcessError as e:
+            logger.error("Error scanning batch of %s targets: %s", len(targets), e)
+
+    def _scan_batch_streaming(self, targets: list[DomainTarget | IPTarget]) -> None:
+        """Scans a chunk of targets with a single WhatWeb run, emitting every log line as soon as it is written."""
+        targets_by_host = {target.name.lower(): target for target in targets}
+        attributor = whatweb_utils.BatchOutputAttributor(targets_by_host)
+        lines_by_host: dict[str, list[bytes]] = {}
+        emitted_by_host: dict[str, set[decoder.Fingerprint]] = {}
+        timeout = self._get_batch_timeout(len(targets))
+        started_at = time.monotonic()
+        try:
+            with tempfile.NamedTemporaryFile() as input_file:
+                self._write_batch_input(targets, input_file)
+                arguments = self._get_batch_scan_arguments(
+                    len(targets), input_file.name, output_file=None
+                )
+                for line in metrics.timed(
+                    whatweb_utils.stream_whatweb_output(
+                        arguments,
+                        timeout=timeout,
+                        max_bytes=self._max_output_bytes,
+                        log_format=self._log_format,
+                        worker_pool=self._worker_pool,
+                    ),
+                    metrics.STAGE_DURATION,
+                    stage="start_batch_scan",
+                ):
+                    host = attributor.attribute(line)
+                    if host is None:
+                        continue
+                    target = targets_by_host[host]
+                    lines_by_host.setdefault(target.name.lower(), []).append(line)
+                    self._parse_emit_streamed_line(
+                        target,
+                        line,
+                        emitted_by_host.setdefault(target.name.lower(), set()),
+                    )
+        except subprocess.CalledProcessError as e:
+            logger.error("Error scanning batch of %s targets: %s", len(targets), e)
+            return
+        except subprocess.TimeoutExpired as e:
+            self._log_scan_timeout(f"batch of {len(targets)} targets", e)
+            return
+        finally:
+            for host, emitted in emitted_by_host.items():
+                self._report_coalesced_fingerprints(targets_by_host[host], emitted)
+        self._observe_scan_duration(started_at, self._get_batch_waves(len(targets)))
+        self._cache_batch_output(targets, lines_by_host)
+
+    def _parse_emit_streamed_line(
+        self,
+        target: DomainTarget | IPTarget,
+        line: bytes,
+        emitted: set[decoder.Fingerprint],
+    ) -> None:
+        """Parse and emit a line read from the WhatWeb log pipe, a malformed line does not stop the stream.
+
+        Fingerprints already emitted for an earlier line of the target, in `emitted`, are skipped.
+        """
+        try:
+            with profiling.span("parse"):
+                fingerprints = list(decoder.decode_line(line))
+            with profiling.span("emit", fingerprints=len(fingerprints)):
+                self._emit_fingerprints(target, fingerprints, emitted)
+        except json.JSONDecodeError as e:
+            logger.error("Invalid WhatWeb output line for `%s`: %s", target, e)
+
+    async def _scan_batch_async(self, targets: list[DomainTarget | IPTarget]) -> None:
+        """Async counterpart of `_scan_batch`, WhatWeb runs without blocking the event loop."""
+        logger.info("Scanning a batch of %s targets", len(targets))
+        timeout = self._get_batch_timeout(len(targets))
+        started_at = time.monotonic()
+        try:
+            with (
+                tempfile.NamedTemporaryFile() as input_file,
+                tempfile.NamedTemporaryFile() as fp,
+            ):
+                self._write_batch_input(targets, input_file)
+                try:
+                    with metrics.STAGE_DURATION.time(stage="start_batch_scan"):
+                        await whatweb_utils.run_whatweb_async(
+                            self._get_batch_scan_arguments(
+                                len(targets), input_file.name, fp.name
+                            ),
+                            timeout=timeout,
+                            worker_pool=self._worker_pool,
+                        )
+                except subprocess.TimeoutExpired as e:
+                    self._log_scan_timeout(f"batch of {len(targets)} targets", e)
+                    self._parse_emit_batch_result(targets, fp, partial=True)
+                    return
+                self._observe_scan_duration(
+                    started_at, self._get_batch_waves(len(targets))
+                )
+                self._parse_emit_batch_result(targets, fp)
+        except subprocess.CalledProcessError as e:
+            logger.error("Error scanning batch of %s targets: %s", len(targets), e)
+
+    def _write_batch_input(
+        self, targets: list[DomainTarget | IPTarget], input_file: IO[bytes]
+    ) -> None:
+        """Writes the targets of a batch to the WhatWeb input file, one per line."""
+        input_file.write("\n".join(target.target for target in targets).encode())
+        input_file.flush()
+
+    def _parse_emit_batch_result(
+        self,
+        targets: list[DomainTarget | IPTarget],
+        output_file: IO[bytes],
+        partial: bool = False,
+    ) -> None:
+        """Parses the log of a batch scan while it is read, attributing every line to its target, then emits the
+        results of every target.
+
+        The lines are only kept to be cached when the cache is enabled. The output of a batch killed at its deadline
+        is not cached, the results of some targets are missing, and its last line may be partially written.
+        """
+        targets_by_host = {target.name.lower(): target for target in targets}
+        attributor = whatweb_utils.BatchOutputAttributor(targets_by_host)
+        fingerprints_by_host: dict[str, dict[decoder.Fingerprint, None]] = {}
+        lines_by_host: dict[str, list[bytes]] | None = None
+        if self._cache is not None and partial is False:
+            lines_by_host = {}
+        output_file.seek(0)
+        with profiling.span("parse"):
+            for log_line in log_parser.iter_log(
+                output_file,
+                self._max_output_bytes,
+                skipped_plugins=attributor.SKIPPED_PLUGINS,
+                keep_lines=lines_by_host is not None,
+                partial=partial,
+            ):
+                host = attributor.attribute(log_line.head, log_line.plugin_results)
+                if host is None:
+                    continue
+                fingerprints_by_host.setdefault(host, {}).update(
+                    dict.fromkeys(
+                        decoder.decode_plugin_results(log_line.plugin_results)
+                    )
+                )
+                if lines_by_host is not None and log_line.line is not None:
+                    lines_by_host.setdefault(host, []).append(log_line.line)
+        if lines_by_host is not None:
+            self._cache_batch_output(targets, lines_by_host)
+        for host, fingerprints in fingerprints_by_host.items():
+            self._emit_result(targets_by_host[host], fingerprints)
+
+    def _prepare_targets(
+        self, message: msg.Message, domain_target: DomainTarget | None
+    ) -> Iterator[IPTarget | DomainTarget]:
+        """Returns a lazy iterator over the target objects to be scanned.
+
+        The message is validated eagerly, the targets themselves are only generated while they are scanned.
+        IP targets not accepting connections on their port are dropped when the liveness prefilter is enabled.
+        """
+        domain_targets = [domain_target] if domain_target is not None else []
+        ip_targets: Iterator[IPTarget] = self._prepare_ip_targets(message)
+        if self._liveness_prefilter is True:
+            ip_targets = liveness.filter_live_targets(
+                ip_targets,
+                lambda target: (target.name, target.port),
+                timeout=self._liveness_timeout,
+                concurrency=self._liveness_concurrency,
+            )
+        return itertools.chain(domain_targets, ip_targets)
 
     def _get_port(self, message: msg.Message) -> int:
         """Returns the port to be used for the target."""
@@ -187,30 +886,24 @@ class AgentWhatWeb(
         else:
             return str(self.args["schema"])
 
-    def _prepare_domain_targets(self, message: msg.Message) -> List[DomainTarget]:
-        """Returns a list of domain targets to be scanned."""
-        targets: List[DomainTarget] = []
+    def _get_domain_target(self, message: msg.Message) -> DomainTarget | None:
+        """Returns the domain target of a link or a domain message, None for other messages or unsupported URLs."""
         if message.data.get("url") is not None:
-            url_target = self._get_target_from_url(message.data["url"])
-            if url_target is not None:
-                targets.append(url_target)
-        elif message.data.get("name") is not None:
-            domain_name = message.data["name"]
-            domain_target = DomainTarget(
-                name=domain_name,
+            return self._get_target_from_url(message.data["url"])
+        if message.data.get("name") is not None:
+            return DomainTarget(
+                name=message.data["name"],
                 schema=self._get_schema(message),
                 port=self._get_port(message),
             )
-            targets.append(domain_target)
-        return targets
+        return None
 
-    def _prepare_ip_targets(self, message: msg.Message) -> List[IPTarget]:
-        """Returns a list of ip targets to be scanned."""
-        targets: List[IPTarget] = []
+    def _prepare_ip_targets(self, message: msg.Message) -> Iterator[IPTarget]:
+        """Returns a lazy iterator over the ip targets to be scanned."""
         host = message.data.get("host")
         mask = message.data.get("mask")
         if host is None:
-            return targets
+            return iter(())
         if mask is None:
             network = ipaddress.ip_network(f"{host}")
         else:
@@ -233,67 +926,47 @@ class AgentWhatWeb(
                 )
             network = ipaddress.ip_network(f"{host}/{mask}", strict=False)
 
-        for address in network.hosts():
-            targets.append(
-                IPTarget(
-                    name=str(address),
-                    version=address.version,
-                    schema=self._get_schema(message),
-                    port=self._get_port(message),
-                )
+        # Schema and port are shared by all the addresses of the network.
+        schema = self._get_schema(message)
+        port = self._get_port(message)
+        logger.info(
+            "Generated %s ip targets for network %s", _count_hosts(network), network
+        )
+        return (
+            IPTarget(
+                name=str(address), version=address.version, schema=schema, port=port
             )
-        return targets
+            for address in network.hosts()
+        )
 
-    def _is_domain_in_scope(
-        self,
-        message: msg.Message,
-    ) -> bool:
-        """Check if a domain is in the scan scope with a regular expression."""
-        if self._scope_domain_regex is None:
+    def _is_domain_in_scope(self, domain: str) -> bool:
+        """Check if a domain is in the scan scope, every domain is in scope when no scope is set."""
+        if self._scope is None:
             return True
-        domain = ""
-        if message.data.get("url") is not None:
-            extracted_domain = self._get_target_from_url(message.data["url"])
-            if extracted_domain is not None:
-                domain = extracted_domain.name
-        if message.data.get("name") is not None:
-            domain = message.data["name"]
-        domain_in_scope = re.match(self._scope_domain_regex, domain)
-        if domain_in_scope is None:
-            logger.warning(
-                "Domain %s is not in scanning scope %s",
-                domain,
-                self._scope_domain_regex,
-            )
+        if domain not in self._scope:
+            logger.warning("Domain %s is not in scanning scope", domain)
             return False
-        else:
-            return True
+        return True
 
-    def _get_web_target_unique_key(self, message: msg.Message) -> str | None:
-        """Returns a unique key identifier to be used to check if the target was scanned before."""
-        if message.data.get("url") is not None:
-            extracted_target = self._get_target_from_url(message.data["url"])
-            if extracted_target is not None:
-                return f"{extracted_target.schema}_{extracted_target.name}_{extracted_target.port}"
-        if message.data.get("name") is not None:
-            port = self._get_port(message)
-            schema = self._get_schema(message)
-            domain = message.data["name"]
-            return f"{schema}_{domain}_{port}"
-        return None
-
-    def _should_target_be_processed(self, message: msg.Message) -> bool:
+    @metrics.STAGE_DURATION.time(stage="should_target_be_processed")
+    def _should_target_be_processed(
+        self, message: msg.Message, domain_target: DomainTarget | None
+    ) -> bool:
         """Checks if the target has already been processed before, relies on the redis server."""
         if message.data.get("url") is not None or message.data.get("name") is not None:
-            unique_key = self._get_web_target_unique_key(message)
-            if unique_key is None:
+            if domain_target is None:
                 return False
-            if self.set_add(b"agent_whatweb_asset", unique_key) is False:
+            unique_key = (
+                f"{domain_target.schema}_{domain_target.name}_{domain_target.port}"
+            )
+            if self._add_target_key(ASSET_DEDUP_KEY, unique_key) is False:
                 logger.info("target %s/ was processed before, exiting", unique_key)
                 return False
 
-            is_domain_in_scope = self._is_domain_in_scope(message)
-            return is_domain_in_scope
+            # The name of a message with both a URL and a name is the scoped domain.
+            return self._is_domain_in_scope(
+                message.data.get("name") or domain_target.name
+            )
 
         elif message.data.get("host") is not None:
             host = message.data.get("host")
@@ -302,15 +975,13 @@ class AgentWhatWeb(
             port = self._get_port(message)
             if mask is not None:
                 addresses = ipaddress.ip_network(f"{host}/{mask}", strict=False)
-                result = self.add_ip_network(
-                    "agent_whois_ip_asset",
-                    addresses,
-                    lambda net: f"{schema}_{net}_{port}",
+                result = self._add_target_network(
+                    addresses, lambda net: f"{schema}_{net}_{port}"
                 )
                 if result is False:
                     logger.info("target %s was processed before, exiting", addresses)
             else:
-                result = self.set_add("agent_whois_ip_asset", f"{schema}_{host}_{port}")
+                result = self._add_target_key(IP_DEDUP_KEY, f"{schema}_{host}_{port}")
                 if result is False:
                     logger.info("target %s was processed before, exiting", host)
             return result
@@ -318,6 +989,27 @@ class AgentWhatWeb(
             logger.error("Unknown message type %s", message.data)
             return False
 
+    def _add_target_key(self, dedup_key: bytes | str, member: str) -> bool:
+        """Adds a target to a dedup set, returns False if it was added before.
+
+        The local dedup front answers when enabled, Redis is only read when the front can not decide.
+        """
+        dedup_front = self._dedup_fronts.get(dedup_key)
+        if dedup_front is not None:
+            return dedup_front.add(member)
+        return self.set_add(dedup_key, member)
+
+    def _add_target_network(
+        self,
+        addresses: ipaddress.IPv4Network | ipaddress.IPv6Network,
+        member: Callable[[ipaddress.IPv4Network | ipaddress.IPv6Network], str],
+    ) -> bool:
+        """Adds a network to the IP dedup set, returns False if it or one of its supernets was added before."""
+        dedup_front = self._dedup_fronts.get(IP_DEDUP_KEY)
+        if dedup_front is not None:
+            return dedup_front.add_ip_network(addresses, member)
+        return self.add_ip_network(IP_DEDUP_KEY, addresses, member)
+
     def _get_target_from_url(self, url: str) -> DomainTarget | None:
         """Compute schema and port from a URL"""
         parsed_url = parse.urlparse(url)
@@ -334,66 +1026,133 @@ class AgentWhatWeb(
         target = DomainTarget(name=domain_name, schema=schema, port=port)
         return target
 
-    def _start_scan(self, target: DomainTarget | IPTarget, output_file: str) -> None:
+    @metrics.STAGE_DURATION.time(stage="start_scan")
+    def _start_scan(
+        self,
+        target: DomainTarget | IPTarget,
+        output_file: str,
+        timeout: float | None = None,
+    ) -> None:
         """Run a whatweb scan using python subprocess.
 
         Args:
             target: Targeted domain name or IP address.
             output_file: The output file to save the scan result.
+            timeout: Deadline of the scan in seconds, None waits until WhatWeb exits.
         """
         logger.info("Staring a new scan for %s .", target.name)
-        whatweb_command = [
-            definitions.WHATWEB_PATH,
-            f"--log-json-verbose={output_file}",
+        whatweb_utils.run_whatweb(
+            self._get_scan_arguments(target, output_file), self._worker_pool, timeout
+        )
+
+    def _get_scan_arguments(
+        self, target: DomainTarget | IPTarget, output_file: str
+    ) -> list[str]:
+        """Returns the WhatWeb arguments to scan a single target."""
+        return [
+            f"{self._log_option}={output_file}",
             target.target,
+            *self._plugin_arguments,
         ]
-        subprocess.run(whatweb_command, cwd=definitions.WHATWEB_DIRECTORY, check=True)
 
+    @metrics.STAGE_DURATION.time(stage="start_batch_scan")
+    def _start_batch_scan(
+        self,
+        targets_count: int,
+        input_file: str,
+        output_file: str,
+        timeout: float | None = None,
+    ) -> None:
+        """Run a single whatweb scan on all the targets listed in the input file.
+
+        Args:
+            targets_count: Number of targets in the input file.
+            input_file: File listing one target per line.
+            output_file: The output file to save the scan result.
+            timeout: Deadline of the whole batch in seconds, None waits until WhatWeb exits.
+        """
+        logger.info("Staring a new batch scan of %s targets.", targets_count)
+        whatweb_utils.run_whatweb(
+            self._get_batch_scan_arguments(targets_count, input_file, output_file),
+            self._worker_pool,
+            timeout,
+        )
+
+    def _get_batch_scan_arguments(
+        self, targets_count: int, input_file: str, output_file: str | None
+    ) -> list[str]:
+        """Returns the WhatWeb arguments to scan all the targets listed in the input file.
+
+        The log option is left out when no output file is given, for the streaming mode to set its pipe.
+        """
+        max_threads = min(targets_count, definitions.WHATWEB_MAX_THREADS)
+        arguments = [
+            f"--input-file={input_file}",
+            f"--max-threads={max_threads}",
+            *self._plugin_arguments,
+        ]
+        if output_file is not None:
+            arguments.insert(0, f"{self._log_option}={output_file}")
+        return arguments
+
+    @metrics.STAGE_DURATION.time(stage="parse_emit_result")
     def _parse_emit_result(
-        self, target: DomainTarget | IPTarget, output_file: io.BytesIO
+        self,
+        target: DomainTarget | IPTarget,
+        output_file: IO[bytes],
+        partial: bool = False,
     ) -> None:
-        """After the scan is done, parse the output json file into a dict of the scan findings."""
+        """Parses the WhatWeb log of the target while it is read from its file, then emits the scan findings.
+
+        The log of a scan killed at its deadline is partial, its last line may be partially written.
+        """
         output_file.seek(0)
         try:
-            # whatweb writes duplicate lines in some cases, breaking json. We process only the first line.
-            file_contents = output_file.readlines()
-            if file_contents is None or len(file_contents) == 0:
-                return
-
-            for file_content in file_contents:
-                results = json.loads(file_content)
-                for result in results:
-                    if isinstance(result, list):
-                        for list_plugin in result:
-                            # Take first item only.
-                            if len(list_plugin) > 0:
-                                plugin = list_plugin[0]
-                            else:
-                                plugin = list_plugin
-
-                            # Discard blacklisted plugins.
-                            if plugin not in definitions.BLACKLISTED_PLUGINS:
-                                values = list_plugin[1]
-                                versions = []
-                                library_name = plugin
-                                for value in values:
-                                    if "version" in value:
-                                        if isinstance(value["version"], list):
-                                            versions.extend(value["version"])
-                                        else:
-                                            versions.append(value["version"])
-                                    if "string" in value:
-                                        library_name = str(value["string"])
-                                self._send_detected_fingerprints(
-                                    target, library_name, versions
-                                )
-                    else:
-                        logger.warning("found result non list %s", result)
-                logger.info("Scan is done Parsing the results from %s.", output_file)
+            # Lines of the redirect chain report the same fingerprints, they are merged before being emitted.
+            with profiling.span("parse"):
+                fingerprints = dict.fromkeys(
+                    decoder.decode_log(
+                        output_file, self._max_output_bytes, partial=partial
+                    )
+                )
         except OSError as e:
             logger.error(
                 "Exception while processing %s with message %s", output_file, e
             )
+            return
+        self._emit_result(target, fingerprints)
+
+    def _emit_result(
+        self,
+        target: DomainTarget | IPTarget,
+        fingerprints: dict[decoder.Fingerprint, None],
+    ) -> None:
+        """Emits the fingerprints parsed from the WhatWeb log of the target."""
+        if len(fingerprints) == 0:
+            return
+        logger.info("Scan is done, emitting the results of %s.", target)
+        with profiling.span("emit", fingerprints=len(fingerprints)):
+            self._emit_fingerprints(target, fingerprints, set())
+            self._report_coalesced_fingerprints(target, fingerprints)
+
+    def _emit_fingerprints(
+        self,
+        target: DomainTarget | IPTarget,
+        fingerprints: Iterable[decoder.Fingerprint],
+        emitted: set[decoder.Fingerprint],
+    ) -> None:
+        """Emits the fingerprints of the target that are not in `emitted`, then adds them to it."""
+        # The bus and report channels are shared by the concurrent scans.
+        with self._emit_lock:
+            for fingerprint in fingerprints:
+                if fingerprint in emitted:
+                    continue
+                emitted.add(fingerprint)
+                self._send_detected_fingerprints(
+                    target,
+                    fingerprint.name,
+                    [fingerprint.version] if fingerprint.version is not None else None,
+                )
 
     def _prepare_vulnerable_target_data(
         self, target: DomainTarget | IPTarget
@@ -423,6 +1182,7 @@ class AgentWhatWeb(
         else:
             raise NotImplementedError(f"type target {type(target)} not implemented")
 
+    @metrics.STAGE_DURATION.time(stage="send_detected_fingerprints")
     def _send_detected_fingerprints(
         self,
         target: DomainTarget | IPTarget,
@@ -431,86 +1191,87 @@ class AgentWhatWeb(
     ) -> None:
         """Emits the identified fingerprints.
 
+        Every fingerprint is reported as a vulnerability of its own, unless reports are coalesced per target.
+
         Args:
             target: targeted Domain or IP address.
             library_name: Library name.
             versions: The versions identified by WhatWeb scanner.
         """
         logger.info("Found fingerprint %s %s %s", target.name, library_name, versions)
-        fingerprint_type = (
-            definitions.FINGERPRINT_TYPE_MAP[library_name.lower()]
-            if (
-                library_name is not None
-                and library_name.lower() in definitions.FINGERPRINT_TYPE_MAP
-            )
-            else definitions.DEFAULT_FINGERPRINT_TYPE
-        )
-
+        fingerprint_type = self._get_fingerprint_type(library_name)
         vulnerable_target_data = self._prepare_vulnerable_target_data(target)
 
-        if versions is not None and len(versions) > 0:
-            for version in versions:
-                msg_data = self._get_msg_data(
-                    target, library_name, version, fingerprint_type
-                )
-                if isinstance(target, DomainTarget):
-                    self.emit(
-                        selector=definitions.DOMAIN_NAME_LIB_SELECTOR, data=msg_data
-                    )
-                elif isinstance(target, IPTarget) and target.version == 4:
-                    self.emit(selector=definitions.IP_V4_LIB_SELECTOR, data=msg_data)
-                elif isinstance(target, IPTarget) and target.version == 6:
-                    self.emit(selector=definitions.IP_V6_LIB_SELECTOR, data=msg_data)
-
-                self.report_vulnerability(
-                    entry=kb.Entry(
-                        title=VULNZ_TITLE,
-                        risk_rating=VULNZ_ENTRY_RISK_RATING,
-                        short_description=VULNZ_SHORT_DESCRIPTION,
-                        description=VULNZ_DESCRIPTION,
-                        references={},
-                        security_issue=True,
-                        privacy_issue=False,
-                        has_public_exploit=False,
-                        targeted_by_malware=False,
-                        targeted_by_ransomware=False,
-                        targeted_by_nation_state=False,
-                    ),
-                    technical_detail=f"Found fingerprint `{library_name}`, version `{str(version)}`, "
-                    f"of type `{fingerprint_type}` in target `{target.name}`",
-                    risk_rating=vuln_mixin.RiskRating.INFO,
-                    vulnerability_location=vulnerable_target_data,
-                )
-        else:
-            # No version is found.
-            msg_data = self._get_msg_data(target, library_name, None, fingerprint_type)
+        # A fingerprint without version is emitted once with a None version.
+        for version in versions or [None]:
+            msg_data = self._get_msg_data(
+                target, library_name, version, fingerprint_type
+            )
             if isinstance(target, DomainTarget):
                 self.emit(selector=definitions.DOMAIN_NAME_LIB_SELECTOR, data=msg_data)
             elif isinstance(target, IPTarget) and target.version == 4:
                 self.emit(selector=definitions.IP_V4_LIB_SELECTOR, data=msg_data)
             elif isinstance(target, IPTarget) and target.version == 6:
                 self.emit(selector=definitions.IP_V6_LIB_SELECTOR, data=msg_data)
+            metrics.FINGERPRINTS.inc()
 
+            if self._coalesce_reports is False:
+                self.report_vulnerability(
+                    entry=VULNZ_ENTRY,
+                    technical_detail=self._get_fingerprint_detail(
+                        library_name, version, fingerprint_type
+                    )
+                    + f" in target `{target.name}`",
+                    risk_rating=vuln_mixin.RiskRating.INFO,
+                    vulnerability_location=vulnerable_target_data,
+                )
+
+    def _report_coalesced_fingerprints(
+        self,
+        target: DomainTarget | IPTarget,
+        fingerprints: Iterable[decoder.Fingerprint],
+    ) -> None:
+        """Reports all the fingerprints of a target as a single vulnerability, when reports are coalesced."""
+        if self._coalesce_reports is False:
+            return
+        details = []
+        for fingerprint in sorted(
+            set(fingerprints), key=lambda f: (f.name, f.version or "")
+        ):
+            detail = self._get_fingerprint_detail(
+                fingerprint.name, fingerprint.version, fingerprint.type
+            )
+            details.append(f"- {detail}")
+        if len(details) == 0:
+            return
+        technical_detail = "\n".join(
+            [f"Found {len(details)} fingerprints in target `{target.name}`:", *details]
+        )
+        with self._emit_lock:
             self.report_vulnerability(
-                entry=kb.Entry(
-                    title=VULNZ_TITLE,
-                    risk_rating=VULNZ_ENTRY_RISK_RATING,
-                    short_description=VULNZ_SHORT_DESCRIPTION,
-                    description=VULNZ_DESCRIPTION,
-                    references={},
-                    security_issue=True,
-                    privacy_issue=False,
-                    has_public_exploit=False,
-                    targeted_by_malware=False,
-                    targeted_by_ransomware=False,
-                    targeted_by_nation_state=False,
-                ),
-                technical_detail=f"Found fingerprint `{library_name}` of type "
-                f"`{fingerprint_type}` in target `{target.name}`",
+                entry=VULNZ_ENTRY,
+                technical_detail=technical_detail,
                 risk_rating=vuln_mixin.RiskRating.INFO,
-                vulnerability_location=vulnerable_target_data,
+                vulnerability_location=self._prepare_vulnerable_target_data(target),
             )
 
+    def _get_fingerprint_type(self, library_name: str | None) -> str:
+        """Returns the fingerprint type of a library, the default type for unknown libraries."""
+        if library_name is None:
+            return definitions.DEFAULT_FINGERPRINT_TYPE
+        return decoder.fingerprint_type(library_name)
+
+    def _get_fingerprint_detail(
+        self,
+        library_name: str | None,
+        version: str | None,
+        fingerprint_type: str,
+    ) -> str:
+        """Returns the description of a fingerprint used in the vulnerability reports."""
+        if version is not None:
+            return f"Found fingerprint `{library_name}`, version `{version!s}`, of type `{fingerprint_type}`"
+        return f"Found fingerprint `{library_name}` of type `{fingerprint_type}`"
+
     def _get_msg_data(
         self,
         target: DomainTarget | IPTarget,
@@ -0,0 +1,197 @@
+"""Pool of long-lived WhatWeb workers that load the plugin set once and fork a child per scan."""
+
+import json
+import logging
+import os
+import queue
+import select
+import signal
+import subprocess
+import threading
+from collections.abc import Iterable
+from typing import IO
+
+from agent import definitions
+from agent import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerError(Exception):
+    """Raised when a worker process dies or answers with an invalid response."""
+
+
+class Worker:
+    """A single pre-forking WhatWeb worker process."""
+
+    def __init__(self, command: list[str], cwd: str) -> None:
+        self._process = subprocess.Popen(
+            command,
+            cwd=cwd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            # The worker and the scans it forks share a process group, killed together when a scan times out.
+            start_new_session=True,
+        )
+
+    @property
+    def is_alive(self) -> bool:
+        """Whether the worker process is still running."""
+        return self._process.poll() is None
+
+    def run(self, arguments: list[str], timeout: float | None = None) -> int:
+        """Run one WhatWeb scan in the worker and wait for it to finish.
+
+        Args:
+            arguments: WhatWeb command line arguments, without the binary path.
+            timeout: Maximum duration of the scan in seconds, None waits until the worker answers.
+
+        Returns:
+            The exit status of the scan.
+
+        Raises:
+            subprocess.TimeoutExpired: if the worker did not answer in time, the scan is still running.
+        """
+        stdin: IO[bytes] | None = self._process.stdin
+        stdout: IO[bytes] | None = self._process.stdout
+        if stdin is None or stdout is None:
+            raise WorkerError("Worker pipes are not available.")
+        try:
+            stdin.write(json.dumps({"argv": arguments}).encode() + b"\n")
+            stdin.flush()
+            if timeout is not None:
+                readable, _, _ = select.select([stdout], [], [], timeout)
+                if len(readable) == 0:
+                    raise subprocess.TimeoutExpired(arguments, timeout)
+            response = stdout.readline()
+        except OSError as e:
+            raise WorkerError(f"Worker communication failed: {e}") from e
+        if response == b"":
+            raise WorkerError("Worker exited before answering.")
+        try:
+            return int(json.loads(response)["status"])
+        except (ValueError, KeyError, TypeError) as e:
+            raise WorkerError(f"Invalid worker response {response!r}.") from e
+
+    def kill(self) -> None:
+        """Kill the worker and the scan it is running."""
+        try:
+            os.killpg(self._process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self._process.wait()
+
+    def close(self) -> None:
+        """Stop the worker by closing its input, the worker exits once it reads EOF."""
+        if self._process.stdin is not None:
+            try:
+                self._process.stdin.close()
+            except OSError:
+                pass
+        try:
+            self._process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+
+
+def get_worker_command(plugin_profiles: Iterable[str]) -> list[str]:
+    """Returns the command starting a worker that preloads the plugin selections of the given profiles.
+
+    The worker memoizes plugin loading by selection, the selections passed here are the ones the scans of these
+    profiles request, so they reuse the plugins loaded at boot instead of loading them again in every child.
+    """
+    command = ["ruby", definitions.WHATWEB_WORKER_PATH]
+    for plugin_profile in plugin_profiles:
+        selection = definitions.PLUGIN_PROFILES[plugin_profile]
+        if len(selection) > 0:
+            command.append(f"--plugins={','.join(selection)}")
+    return command
+
+
+class WorkerPool:
+    """Fixed size pool of WhatWeb workers, workers are spawned lazily and replaced when they die."""
+
+    def __init__(
+        self,
+        size: int,
+        command: list[str] | None = None,
+        cwd: str = definitions.WHATWEB_DIRECTORY,
+        plugin_profiles: Iterable[str] = (definitions.DEFAULT_PLUGIN_PROFILE,),
+    ) -> None:
+        if size <= 0:
+            raise ValueError("Worker pool size must be a positive number.")
+        self._size = size
+        self._command = command or get_worker_command(plugin_profiles)
+        self._cwd = cwd
+        self._idle: queue.Queue[Worker] = queue.Queue()
+        self._spawned = 0
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        """Maximum number of workers in the pool."""
+        return self._size
+
+    def _acquire(self) -> Worker:
+        """Returns an idle worker, spawns a new one while the pool is not full, blocks otherwise."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._spawned < self._size:
+                self._spawned += 1
+                try:
+                    return Worker(self._command, self._cwd)
+                except OSError:
+                    self._spawned -= 1
+                    raise
+        with metrics.QUEUE_DEPTH.track(queue="worker_pool"):
+            return self._idle.get()
+
+    def _discard(self, worker: Worker) -> None:
+        worker.close()
+        with self._lock:
+            self._spawned -= 1
+
+    def run(self, arguments: list[str], timeout: float | None = None) -> None:
+        """Run a WhatWeb scan on one of the pool workers.
+
+        Args:
+            arguments: WhatWeb command line arguments, without the binary path.
+            timeout: Maximum duration of the scan in seconds, the worker is killed and replaced when it expires.
+
+        Raises:
+            subprocess.CalledProcessError: if the scan exits with a non-zero status or the worker dies.
+            subprocess.TimeoutExpired: if the scan did not finish before the timeout.
+        """
+        worker = self._acquire()
+        try:
+            status = worker.run(arguments, timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning("WhatWeb worker timed out, replacing it.")
+            worker.kill()
+            with self._lock:
+                self._spawned -= 1
+            raise
+        except WorkerError as e:
+            logger.error("WhatWeb worker failed, replacing it: %s", e)
+            self._discard(worker)
+            raise subprocess.CalledProcessError(-1, arguments) from e
+
+        if worker.is_alive is True:
+            self._idle.put(worker)
+        else:
+            self._discard(worker)
+
+        if status != 0:
+            raise subprocess.CalledProcessError(status, arguments)
+
+    def close(self) -> None:
+        """Stop all the idle workers."""
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(worker)
@@ -1,112 +1,634 @@
 """Shared utilities for WhatWeb scanning."""
 
+import asyncio
+import contextlib
+import contextvars
 import io
+import ipaddress
+import itertools
 import json
 import logging
 import os
+import signal
 import subprocess
 import tempfile
+import threading
+from collections.abc import Generator, Iterable, Iterator
+from concurrent import futures
+from typing import IO, TypeVar
+from urllib import parse
 
+from agent import decoder
 from agent import definitions
+from agent import log_parser
+from agent import metrics
+from agent import profiling
+from agent import whatweb_pool
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
 
-def run_whatweb_scan(target_url: str) -> bytes:
+# Size of the reads dropping the rest of a log line past the output cap.
+DRAIN_CHUNK_BYTES = 64 * 1024
+
+
+def get_plugin_arguments(plugin_profile: str) -> list[str]:
+    """Returns the WhatWeb arguments selecting the plugins of a plugin profile.
+
+    Raises:
+        ValueError: if the profile is unknown.
+    """
+    if plugin_profile not in definitions.PLUGIN_PROFILES:
+        raise ValueError(
+            f"Unknown plugin profile {plugin_profile}, "
+            f"expected one of {', '.join(definitions.PLUGIN_PROFILES)}."
+        )
+    selection = definitions.PLUGIN_PROFILES[plugin_profile]
+    if len(selection) == 0:
+        return []
+    return [f"--plugins={','.join(selection)}"]
+
+
+def get_log_option(log_format: str) -> str:
+    """Returns the WhatWeb option writing the JSON log in a log format.
+
+    Raises:
+        ValueError: if the log format is unknown.
+    """
+    if log_format not in definitions.LOG_FORMATS:
+        raise ValueError(
+            f"Unknown log format {log_format}, "
+            f"expected one of {', '.join(definitions.LOG_FORMATS)}."
+        )
+    return definitions.LOG_FORMATS[log_format]
+
+
+@contextlib.contextmanager
+def _observe_run() -> Iterator[None]:
+    """Counts the WhatWeb run of the block while it runs, then counts its exit code."""
+    with metrics.SUBPROCESSES_IN_FLIGHT.track():
+        try:
+            yield
+        except subprocess.TimeoutExpired:
+            metrics.WHATWEB_EXITS.inc(code="timeout")
+            raise
+        except subprocess.CalledProcessError as e:
+            metrics.WHATWEB_EXITS.inc(code=str(e.returncode))
+            raise
+        metrics.WHATWEB_EXITS.inc(code="0")
+
+
+def run_whatweb(
+    arguments: list[str],
+    worker_pool: whatweb_pool.WorkerPool | None = None,
+    timeout: float | None = None,
+) -> None:
+    """Run WhatWeb with the given arguments, in a fresh process or on a pre-forked worker.
+
+    Args:
+        arguments: WhatWeb command line arguments, without the binary path.
+        worker_pool: Pool of pre-forked workers to use instead of spawning the WhatWeb binary.
+        timeout: Deadline of the scan in seconds, the WhatWeb process group is killed when it expires.
+
+    Raises:
+        subprocess.CalledProcessError: if the WhatWeb scan fails.
+        subprocess.TimeoutExpired: if the scan did not finish before the deadline.
+    """
+    with _observe_run():
+        if worker_pool is not None:
+            with profiling.span("wait", worker_pool=True):
+                worker_pool.run(arguments, timeout)
+            return
+        whatweb_command = [definitions.WHATWEB_PATH, *arguments]
+        if timeout is None:
+            # The spawn of the process is part of the wait.
+            with profiling.span("wait"):
+                subprocess.run(
+                    whatweb_command, cwd=definitions.WHATWEB_DIRECTORY, check=True
+                )
+            return
+        # WhatWeb leads its own process group, the deadline kills it with everything it started.
+        with profiling.span("spawn"):
+            process = subprocess.Popen(
+                whatweb_command,
+                cwd=definitions.WHATWEB_DIRECTORY,
+                start_new_session=True,
+            )
+        try:
+            with profiling.span("wait"):
+                returncode = process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            kill_process_group(process)
+            raise
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, whatweb_command)
+
+
+def kill_process_group(process: subprocess.Popen[bytes]) -> None:
+    """Kill the process group led by a process started in a new session, then reap the process."""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    process.wait()
+
+
+def complete_lines(output: bytes) -> bytes:
+    """Returns the complete lines of a log cut by a killed process, the last line may be partially written."""
+    return output[: output.rfind(b"\n") + 1]
+
+
+def run_whatweb_scan(
+    target_url: str,
+    worker_pool: whatweb_pool.WorkerPool | None = None,
+    plugin_profile: str = definitions.DEFAULT_PLUGIN_PROFILE,
+    timeout: float | None = None,
+    log_format: str = definitions.DEFAULT_LOG_FORMAT,
+) -> bytes:
     """Run WhatWeb binary and return raw output.
 
     Args:
         target_url: The URL to scan
+        worker_pool: Optional pool of pre-forked workers to run the scan on.
+        plugin_profile: Name of the plugin profile selecting the plugins to run.
+        timeout: Deadline of the scan in seconds, None waits until WhatWeb exits.
+        log_format: Name of the format of the JSON log written by WhatWeb.
+
+    Raises:
+        subprocess.TimeoutExpired: if the deadline expired, its `output` holds the complete lines written.
     """
+    plugin_arguments = get_plugin_arguments(plugin_profile)
+    log_option = get_log_option(log_format)
     with tempfile.NamedTemporaryFile(delete=False) as fp:
         output_file = fp.name
 
     try:
-        whatweb_command = [
-            definitions.WHATWEB_PATH,
-            f"--log-json-verbose={output_file}",
-            target_url,
-        ]
-
-        subprocess.run(whatweb_command, cwd=definitions.WHATWEB_DIRECTORY, check=True)
+        try:
+            run_whatweb(
+                [f"{log_option}={output_file}", target_url, *plugin_arguments],
+                worker_pool,
+                timeout,
+            )
+        except subprocess.TimeoutExpired as e:
+            with open(output_file, "rb") as f:
+                e.output = complete_lines(read_capped_output(f))
+            raise
 
         with open(output_file, "rb") as f:
-            return f.read()
+            return read_capped_output(f)
     finally:
         if os.path.exists(output_file):
             os.unlink(output_file)
 
 
+def _drain_line(stream: IO[bytes]) -> None:
+    """Reads and drops the rest of the current line of a stream, chunk by chunk."""
+    while True:
+        chunk = stream.readline(DRAIN_CHUNK_BYTES)
+        if chunk == b"" or chunk.endswith(b"\n"):
+            return
+
+
+def _kill_at_deadline(pid: int, killed: threading.Event) -> None:
+    """Kills the process group of a scan whose deadline expired and records the kill."""
+    killed.set()
+    with contextlib.suppress(ProcessLookupError):
+        os.killpg(pid, signal.SIGKILL)
+
+
+def _read_log_lines(pipe: IO[bytes], max_bytes: int) -> Generator[bytes, None, bytes]:
+    """Yields the complete lines of a JSON log read from a pipe until its EOF, up to `max_bytes` bytes.
+
+    Returns:
+        The unterminated last line, empty if the log ends with a newline. It is only complete if the writer exited
+        cleanly, a writer killed at its deadline cuts it.
+    """
+    yielded_bytes = 0
+    while True:
+        if max_bytes > 0:
+            # A line longer than the rest of the cap is never held whole in memory.
+            line = pipe.readline(max_bytes - yielded_bytes + 1)
+        else:
+            line = pipe.readline()
+        if line == b"":
+            return b""
+        if max_bytes > 0 and yielded_bytes + len(line) > max_bytes:
+            # The pipe is still drained for WhatWeb not to block on it.
+            if line.endswith(b"\n") is False:
+                _drain_line(pipe)
+            continue
+        if line.endswith(b"\n") is False:
+            # Only the last line of the log is returned by `readline` without its newline.
+            return line if line.strip() != b"" else b""
+        if line.strip() != b"":
+            yielded_bytes += len(line)
+            yield line
+
+
+def stream_whatweb_output(
+    arguments: list[str],
+    timeout: float | None = None,
+    max_bytes: int = definitions.MAX_OUTPUT_BYTES,
+    log_format: str = definitions.DEFAULT_LOG_FORMAT,
+    worker_pool: whatweb_pool.WorkerPool | None = None,
+) -> Iterator[bytes]:
+    """Run WhatWeb with its JSON log written to a pipe and yield every log line as soon as it is written.
+
+    WhatWeb writes one line per visited URL, so the results of the first URL of a redirect chain are available
+    before the scan is over, without a round trip through a file on disk.
+
+    Args:
+        arguments: WhatWeb command line arguments, without the binary path and the log option.
+        timeout: Deadline of the scan in seconds, the WhatWeb process group is killed when it expires.
+        max_bytes: Bytes of log yielded, the lines past it are read in chunks and dropped. 0 yields all the lines.
+        log_format: Name of the format of the JSON log written by WhatWeb.
+        worker_pool: Pool of pre-forked workers to run the scan on, the log is written to a named pipe the worker
+            opens by its path.
+
+    Raises:
+        subprocess.CalledProcessError: if the WhatWeb scan fails, after all the written lines were yielded.
+        subprocess.TimeoutExpired: if the deadline expired, after all the complete lines were yielded.
+    """
+    with _observe_run():
+        log_option = get_log_option(log_format)
+        if worker_pool is not None:
+            yield from _stream_worker_output(
+                arguments, timeout, max_bytes, log_option, worker_pool
+            )
+        else:
+            yield from _stream_process_output(arguments, timeout, max_bytes, log_option)
+
+
+def _stream_process_output(
+    arguments: list[str], timeout: float | None, max_bytes: int, log_option: str
+) -> Iterator[bytes]:
+    """Streams the log of a WhatWeb process spawned for the scan, its log is written to an inherited pipe."""
+    read_fd, write_fd = os.pipe()
+    try:
+        whatweb_command = [
+            definitions.WHATWEB_PATH,
+            f"{log_option}=/dev/fd/{write_fd}",
+            *arguments,
+        ]
+        with profiling.span("spawn"):
+            process = subprocess.Popen(
+                whatweb_command,
+                cwd=definitions.WHATWEB_DIRECTORY,
+                pass_fds=(write_fd,),
+                start_new_session=timeout is not None,
+            )
+    except OSError:
+        os.close(read_fd)
+        raise
+    finally:
+        # Only WhatWeb holds the write end, the pipe reaches EOF when it exits.
+        os.close(write_fd)
+
+    # Killing the process group at the deadline closes the pipe, which ends the read loop.
+    deadline: threading.Timer | None = None
+    # `Timer.finished` is also set by `cancel`, only this event tells the deadline kill from a crash.
+    killed_at_deadline = threading.Event()
+    if timeout is not None:
+        deadline = threading.Timer(
+            timeout, _kill_at_deadline, (process.pid, killed_at_deadline)
+        )
+        deadline.daemon = True
+        deadline.start()
+    try:
+        with os.fdopen(read_fd, "rb") as pipe:
+            last_line = yield from _read_log_lines(pipe, max_bytes)
+        returncode = process.wait()
+    finally:
+        if deadline is not None:
+            deadline.cancel()
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+    timed_out = killed_at_deadline.is_set() and returncode < 0
+    if last_line != b"" and timed_out is False:
+        yield last_line
+    if timed_out is True:
+        raise subprocess.TimeoutExpired(whatweb_command, timeout or 0)
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, whatweb_command)
+
+
+def _stream_worker_output(
+    arguments: list[str],
+    timeout: float | None,
+    max_bytes: int,
+    log_option: str,
+    worker_pool: whatweb_pool.WorkerPool,
+) -> Iterator[bytes]:
+    """Streams the log of a scan run on a pre-forked worker, its log is written to a named pipe.
+
+    The pool call blocks until the scan exits, it runs in a thread while the pipe is read. The reader holds a write
+    end of the pipe until that call returns, the log reaches EOF once both the scan and the reader closed it.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        log_path = os.path.join(directory, "log.json")
+        os.mkfifo(log_path)
+        # Opening the read end does not wait for a writer, the held write end keeps the pipe open until the scan
+        # is over, whether WhatWeb opened its log or failed before.
+        read_fd = os.open(log_path, os.O_RDONLY | os.O_NONBLOCK)
+        os.set_blocking(read_fd, True)
+        held_write_fd = os.open(log_path, os.O_WRONLY)
+
+        def run() -> None:
+            try:
+                with profiling.span("wait", worker_pool=True):
+                    worker_pool.run([f"{log_option}={log_path}", *arguments], timeout)
+            finally:
+                os.close(held_write_fd)
+
+        # The error of the scan is raised again by the reading thread once the log is read.
+        with futures.ThreadPoolExecutor(max_workers=1) as executor:
+            scan = executor.submit(contextvars.copy_context().run, run)
+            with os.fdopen(read_fd, "rb") as pipe:
+                try:
+                    last_line = yield from _read_log_lines(pipe, max_bytes)
+                finally:
+                    # A consumer stopping early does not stop the scan, the rest of its log is dropped for
+                    # WhatWeb not to block on the pipe.
+                    while pipe.read(DRAIN_CHUNK_BYTES) != b"":
+                        pass
+            error = scan.exception()
+
+    if last_line != b"" and isinstance(error, subprocess.TimeoutExpired) is False:
+        yield last_line
+    if error is not None:
+        raise error
+
+
+async def run_whatweb_async(
+    arguments: list[str],
+    timeout: float | None = None,
+    worker_pool: whatweb_pool.WorkerPool | None = None,
+) -> None:
+    """Run WhatWeb with the given arguments without blocking the event loop.
+
+    The WhatWeb process group is killed if the timeout expires or if the calling task is cancelled.
+
+    Args:
+        arguments: WhatWeb command line arguments, without the binary path.
+        timeout: Maximum duration of the scan in seconds, None waits until WhatWeb exits.
+        worker_pool: Pool of pre-forked workers to use instead of spawning the WhatWeb binary, the pool is
+            blocking and is driven from a thread.
+
+    Raises:
+        subprocess.CalledProcessError: if the WhatWeb scan fails.
+        subprocess.TimeoutExpired: if the scan did not finish before the timeout.
+    """
+    with _observe_run():
+        if worker_pool is not None:
+            with profiling.span("wait", worker_pool=True):
+                await asyncio.to_thread(worker_pool.run, arguments, timeout)
+            return
+
+        whatweb_command = [definitions.WHATWEB_PATH, *arguments]
+        with profiling.span("spawn"):
+            process = await asyncio.create_subprocess_exec(
+                *whatweb_command,
+                cwd=definitions.WHATWEB_DIRECTORY,
+                start_new_session=True,
+            )
+        try:
+            with profiling.span("wait"):
+                returncode = await asyncio.wait_for(process.wait(), timeout)
+        except TimeoutError as e:
+            await _kill_process(process)
+            raise subprocess.TimeoutExpired(whatweb_command, timeout or 0) from e
+        except asyncio.CancelledError:
+            await _kill_process(process)
+            raise
+
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, whatweb_command)
+
+
+async def _kill_process(process: asyncio.subprocess.Process) -> None:
+    """Kill the process group of a WhatWeb process that is still running and reap it."""
+    if process.returncode is not None:
+        return
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        return
+    await asyncio.shield(process.wait())
+
+
+async def run_whatweb_scan_async(
+    target_url: str,
+    timeout: float | None = None,
+    plugin_profile: str = definitions.DEFAULT_PLUGIN_PROFILE,
+    log_format: str = definitions.DEFAULT_LOG_FORMAT,
+) -> bytes:
+    """Async counterpart of `run_whatweb_scan`, run WhatWeb on an event loop and return raw output.
+
+    Args:
+        target_url: The URL to scan
+        timeout: Maximum duration of the scan in seconds, None waits until WhatWeb exits.
+        plugin_profile: Name of the plugin profile selecting the plugins to run.
+        log_format: Name of the format of the JSON log written by WhatWeb.
+
+    Raises:
+        subprocess.TimeoutExpired: if the timeout expired, its `output` holds the complete lines written.
+    """
+    plugin_arguments = get_plugin_arguments(plugin_profile)
+    log_option = get_log_option(log_format)
+    with tempfile.NamedTemporaryFile() as fp:
+        try:
+            await run_whatweb_async(
+                [f"{log_option}={fp.name}", target_url, *plugin_arguments],
+                timeout,
+            )
+        except subprocess.TimeoutExpired as e:
+            e.output = complete_lines(read_capped_output(fp))
+            raise
+        return read_capped_output(fp)
+
+
 def parse_whatweb_output(output_bytes: bytes) -> list[dict[str, str | None]]:
     """Parse WhatWeb JSON output and extract fingerprints.
 
+    Wrapper of `decoder.decode_output` for the callers working on dicts, a malformed line stops the parsing.
+
     Returns:
         List of dicts with keys: name (str), version (str | None), type (str)
     """
     fingerprints: list[dict[str, str | None]] = []
-    output_file = io.BytesIO(output_bytes)
-    output_file.seek(0)
+    try:
+        for fingerprint in decoder.decode_output(io.BytesIO(output_bytes)):
+            fingerprints.append(
+                {
+                    "name": fingerprint.name,
+                    "version": fingerprint.version,
+                    "type": fingerprint.type,
+                }
+            )
+    except (OSError, json.JSONDecodeError) as e:
+        logger.error("Exception while processing WhatWeb output: %s", e)
 
+    return fingerprints
+
+
+def read_capped_output(
+    output_file: IO[bytes], max_bytes: int = definitions.MAX_OUTPUT_BYTES
+) -> bytes:
+    """Reads a WhatWeb JSON log, dropping the lines past `max_bytes`, 0 reads the whole log.
+
+    The log is never read past the cap, the last line that does not fit is dropped whole.
+    """
+    if max_bytes <= 0:
+        return output_file.read()
+    output = output_file.read(max_bytes + 1)
+    if len(output) <= max_bytes:
+        return output
+    logger.warning(
+        "WhatWeb output exceeds %s bytes, dropping the lines past it.", max_bytes
+    )
+    return complete_lines(output[:max_bytes])
+
+
+def chunked(items: Iterable[T], size: int) -> Iterator[list[T]]:
+    """Split items into lists of at most `size` elements, consuming the iterable lazily."""
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if len(chunk) == 0:
+            return
+        yield chunk
+
+
+def _get_output_line_head(line: bytes) -> tuple[str, object] | None:
+    """Returns the URL and the HTTP status starting a WhatWeb JSON log line, only these values are decoded."""
+    text = line.decode(errors="replace").lstrip()
+    if text.startswith("[") is False:
+        return None
+    json_decoder = json.JSONDecoder()
     try:
-        file_contents = output_file.readlines()
-        if file_contents is None or len(file_contents) == 0:
-            return fingerprints
+        url, end = json_decoder.raw_decode(text, 1)
+    except json.JSONDecodeError:
+        logger.error("Invalid WhatWeb output line %s", line)
+        return None
+    if not isinstance(url, str):
+        return None
+    try:
+        status, _ = json_decoder.raw_decode(text, text.index(",", end) + 1)
+    except ValueError:
+        status = None
+    return url, status
 
-        for file_content in file_contents:
-            scan_result = json.loads(file_content)
 
-            if not isinstance(scan_result, list) or len(scan_result) < 3:
-                continue
+def _get_url_host(url: str) -> str | None:
+    """Returns the lowercase host of a URL, IP addresses in their compressed form like the names of the IP targets."""
+    host = parse.urlparse(url).hostname
+    if host is None:
+        return None
+    try:
+        return str(ipaddress.ip_address(host))
+    except ValueError:
+        return host.lower()
 
-            plugins = scan_result[2]
 
-            for plugin_entry in plugins:
-                if not isinstance(plugin_entry, list) or len(plugin_entry) < 2:
-                    continue
+def get_output_line_host(line: bytes) -> str | None:
+    """Returns the lowercase host of the URL a WhatWeb JSON log line was collected from.
 
-                plugin_name = plugin_entry[0]
-                plugin_data = plugin_entry[1]
+    Every line of the log starts with the scanned URL, only that string and the status are decoded to find the host.
+    """
+    head = _get_output_line_head(line)
+    if head is None:
+        return None
+    return _get_url_host(head[0])
 
-                if not isinstance(plugin_name, str):
-                    continue
 
-                if plugin_name in definitions.BLACKLISTED_PLUGINS:
-                    continue
+def get_output_line_redirect_host(
+    line: bytes, plugin_results: Iterable[log_parser.PluginResult] | None = None
+) -> str | None:
+    """Returns the lowercase host a WhatWeb JSON log line redirects to, None if the line is not a redirect.
 
-                versions: list[str] = []
-                library_name: str = plugin_name
+    The location is read from the `RedirectLocation` plugin, the plugins are only parsed for a redirect status.
+    `line` may be the start of the line only when its plugin results are given.
+    """
+    head = _get_output_line_head(line)
+    if head is None:
+        return None
+    status = head[1]
+    if not isinstance(status, int) or not 300 <= status < 400:
+        return None
+    if plugin_results is None:
+        plugin_results = log_parser.iter_plugin_results(line, skipped_plugins=())
+    for plugin_result in plugin_results:
+        if plugin_result.name == "RedirectLocation" and isinstance(
+            plugin_result.string, str
+        ):
+            return _get_url_host(parse.urljoin(head[0], plugin_result.string))
+    return None
 
-                for metadata in plugin_data:
-                    if "version" in metadata:
-                        if isinstance(metadata["version"], list):
-                            versions.extend(metadata["version"])
-                        else:
-                            versions.append(str(metadata["version"]))
-                    if "string" in metadata:
-                        library_name = str(metadata["string"])
 
-                fingerprint_type = definitions.FINGERPRINT_TYPE_MAP.get(
-                    library_name.lower(), definitions.DEFAULT_FINGERPRINT_TYPE
-                )
+class BatchOutputAttributor:
+    """Attributes the lines of the log of a batch scan to the scanned hosts.
 
-                if len(versions) > 0:
-                    for version in versions:
-                        fingerprints.append(
-                            {
-                                "name": library_name,
-                                "version": version,
-                                "type": fingerprint_type,
-                            }
-                        )
-                else:
-                    fingerprints.append(
-                        {
-                            "name": library_name,
-                            "version": None,
-                            "type": fingerprint_type,
-                        }
-                    )
-    except (OSError, json.JSONDecodeError) as e:
-        logger.error("Exception while processing WhatWeb output: %s", e)
+    WhatWeb follows redirects and logs the visited URL, not the target it started from. A line of another host is
+    attributed to the target that redirected to it, redirects are followed by the same WhatWeb thread so the
+    redirecting line is always logged first. Lines of any other host are dropped, logged and counted.
+    """
 
-    return fingerprints
+    # Plugins skipped when parsing the lines given with their plugin results, the redirect location is read.
+    SKIPPED_PLUGINS = log_parser.SKIPPED_PLUGINS - {"RedirectLocation"}
+
+    def __init__(self, hosts: Iterable[str]) -> None:
+        self._hosts = set(hosts)
+        self._redirects: dict[str, str] = {}
+        self.dropped = 0
+
+    def attribute(
+        self,
+        line: bytes,
+        plugin_results: Iterable[log_parser.PluginResult] | None = None,
+    ) -> str | None:
+        """Returns the scanned host a log line belongs to, None if it belongs to none of them.
+
+        `line` may be the start of the line only when its plugin results, parsed with `SKIPPED_PLUGINS`, are given.
+        """
+        host = get_output_line_host(line)
+        if host is None:
+            return None
+        origin = host if host in self._hosts else self._redirects.get(host)
+        if origin is None:
+            self.dropped += 1
+            metrics.BATCH_LINES_DROPPED.inc()
+            logger.debug("Discarding results of unknown host %s", host)
+            return None
+        redirect_host = get_output_line_redirect_host(line, plugin_results)
+        if redirect_host is not None and redirect_host not in self._hosts:
+            self._redirects.setdefault(redirect_host, origin)
+        return origin
+
+
+def split_output_by_host(
+    output_bytes: bytes, hosts: Iterable[str] | None = None
+) -> dict[str, list[bytes]]:
+    """Group the lines of a WhatWeb JSON log by the host of the URL they were collected from.
+
+    Args:
+        output_bytes: The WhatWeb JSON log.
+        hosts: The scanned hosts, the lines redirected from a scanned host are grouped with it and the lines of
+            other hosts are dropped. None groups every line with the host of its own URL.
+
+    Returns:
+        Dict of the lowercase host name to the log lines of that host.
+    """
+    attributor = BatchOutputAttributor(hosts) if hosts is not None else None
+    lines_by_host: dict[str, list[bytes]] = {}
+    for line in output_bytes.splitlines(keepends=True):
+        if attributor is not None:
+            host = attributor.attribute(line)
+        else:
+            host = get_output_line_host(line)
+        if host is None:
+            continue
+        lines_by_host.setdefault(host, []).append(line)
+    return lines_by_host
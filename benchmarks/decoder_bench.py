@@ -0,0 +1,91 @@
+"""Benchmark of the fingerprint decoder against decoding the WhatWeb log lines with the json module into dicts.
+
+Usage: python -m benchmarks.decoder_bench [--repeat N]
+"""
+
+import argparse
+import functools
+import json
+import pathlib
+import time
+from collections.abc import Callable
+from typing import Any
+
+from agent import decoder
+from agent import definitions
+
+TESTS_DIRECTORY = pathlib.Path(__file__).parent.parent / "tests"
+
+
+def _decode(lines: list[bytes]) -> list[decoder.Fingerprint]:
+    """Decodes the lines with the fingerprint decoder, the fingerprints are built as they are read."""
+    return list(decoder.decode_output(lines))
+
+
+def _decode_to_dicts(lines: list[bytes]) -> list[dict[str, Any]]:
+    """Reference decoding: every line is decoded whole and every fingerprint is built as a dict."""
+    fingerprints = []
+    for line in lines:
+        for name, results in json.loads(line)[2]:
+            if name in definitions.BLACKLISTED_PLUGINS:
+                continue
+            versions: list[str | None] = []
+            library_name = name
+            for result in results:
+                if "version" in result:
+                    version = result["version"]
+                    if isinstance(version, list):
+                        versions.extend(str(item) for item in version)
+                    else:
+                        versions.append(str(version))
+                if "string" in result:
+                    library_name = str(result["string"])
+            library_type = decoder.fingerprint_type(library_name)
+            for version in versions or [None]:
+                fingerprints.append(
+                    {"name": library_name, "version": version, "type": library_type}
+                )
+    return fingerprints
+
+
+def _time(function: Callable[[], object], repeat: int) -> float:
+    """Returns the best duration of `repeat` runs, in microseconds."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return min(durations) * 1_000_000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(
+        f"{'fixture':<24} {'lines':>6} {'dicts us':>10} {'decoder us':>11} {'speedup':>9}"
+    )
+    for path in sorted(TESTS_DIRECTORY.glob("*output.json")):
+        lines = [line for line in path.read_bytes().splitlines() if line.strip() != b""]
+        expected = [
+            (fingerprint["name"], fingerprint["version"], fingerprint["type"])
+            for fingerprint in _decode_to_dicts(lines)
+        ]
+        decoded = [
+            (fingerprint.name, fingerprint.version, fingerprint.type)
+            for fingerprint in decoder.decode_output(lines)
+        ]
+        if decoded != expected:
+            raise SystemExit(
+                f"Decoded fingerprints differ from the reference on {path.name}"
+            )
+        dicts_us = _time(functools.partial(_decode_to_dicts, lines), args.repeat)
+        decoder_us = _time(functools.partial(_decode, lines), args.repeat)
+        print(
+            f"{path.name:<24} {len(lines):>6} {dicts_us:>10.1f} {decoder_us:>11.1f} {dicts_us / decoder_us:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
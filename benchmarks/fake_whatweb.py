@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Stand-in for the WhatWeb binary, with a configurable latency and output, to load the agent without the internet.
+
+Takes the WhatWeb options the agent passes: the JSON log option, `--input-file`, `--max-threads` and the target
+URLs; the other options are ignored. Every target is logged as one line of the WhatWeb JSON log, the verbose and
+the lean logs are written alike. Configured by environment variables, inherited from the agent:
+
+- `FAKE_WHATWEB_FARM`: `host:port` of the target farm, `benchmarks.target_farm`. The page of every target is
+  fetched from the farm with the host of the target, the plugin results of the page are logged.
+- `FAKE_WHATWEB_OUTPUT`: WhatWeb JSON log whose plugin results are logged for every target, without any request.
+- `FAKE_WHATWEB_LATENCY`: seconds every target takes on top of the requests, `FAKE_WHATWEB_JITTER` adds up to
+  that many random seconds.
+
+Targets are logged with no results when neither the farm nor an output are set. Select it by pointing
+`agent.definitions.WHATWEB_PATH` to it. Only the standard library is imported, the start of the stand-in is cheap
+next to the start of WhatWeb.
+"""
+
+import concurrent.futures
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+from typing import Any
+from urllib import parse
+
+FARM_ENV_VARIABLE = "FAKE_WHATWEB_FARM"
+OUTPUT_ENV_VARIABLE = "FAKE_WHATWEB_OUTPUT"
+LATENCY_ENV_VARIABLE = "FAKE_WHATWEB_LATENCY"
+JITTER_ENV_VARIABLE = "FAKE_WHATWEB_JITTER"
+LOG_OPTIONS = ("--log-json-verbose=", "--log-lean-json=")
+RESULTS_PATH = "/.whatweb.json"
+REQUEST_TIMEOUT = 15
+
+
+def _parse_arguments(argv: list[str]) -> tuple[str | None, list[str], int]:
+    """Returns the log path, the targets and the number of threads of the command line."""
+    log_path: str | None = None
+    targets: list[str] = []
+    max_threads = 25
+    for argument in argv:
+        if argument.startswith(LOG_OPTIONS):
+            log_path = argument.split("=", 1)[1]
+        elif argument.startswith("--input-file="):
+            with open(argument.split("=", 1)[1]) as input_file:
+                targets.extend(line.strip() for line in input_file if line.strip())
+        elif argument.startswith("--max-threads="):
+            max_threads = int(argument.split("=", 1)[1])
+        elif argument.startswith("-") is False:
+            targets.append(argument)
+    return log_path, targets, max_threads
+
+
+def _replayed_results(path: str) -> list[Any]:
+    """Returns the plugin results of all the lines of a WhatWeb log."""
+    results: list[Any] = []
+    with open(path, "rb") as log:
+        for line in log:
+            if line.strip() != b"":
+                results.extend(json.loads(line)[2])
+    return results
+
+
+def _farm_results(farm: str, url: parse.ParseResult) -> tuple[int, Any]:
+    """Fetches the page of the target from the farm, then the plugin results of the page."""
+    host, port = farm.rsplit(":", 1)
+    connection = http.client.HTTPConnection(host, int(port), timeout=REQUEST_TIMEOUT)
+    try:
+        headers = {"Host": url.hostname or "", "User-Agent": "WhatWeb/0.5.5"}
+        connection.request("GET", url.path or "/", headers=headers)
+        response = connection.getresponse()
+        response.read()
+        connection.request("GET", RESULTS_PATH, headers=headers)
+        return response.status, json.loads(connection.getresponse().read())
+    finally:
+        connection.close()
+
+
+def _scan(target: str, replayed: list[Any] | None) -> bytes | None:
+    """Returns the log line of a target, None if the target could not be fetched."""
+    latency = float(os.environ.get(LATENCY_ENV_VARIABLE) or 0)
+    jitter = float(os.environ.get(JITTER_ENV_VARIABLE) or 0)
+    time.sleep(latency + random.uniform(0, jitter))
+    if "://" not in target:
+        target = f"http://{target}"
+    url = parse.urlparse(target)
+    status, results = 200, []
+    farm = os.environ.get(FARM_ENV_VARIABLE)
+    if replayed is not None:
+        results = replayed
+    elif farm is not None:
+        try:
+            status, results = _farm_results(farm, url)
+        except OSError as e:
+            # Like WhatWeb, unreachable targets are only reported on stderr.
+            print(f"ERROR Opening: {target} - {e}", file=sys.stderr)
+            return None
+    return json.dumps([target, status, results]).encode() + b"\n"
+
+
+def main(argv: list[str]) -> None:
+    log_path, targets, max_threads = _parse_arguments(argv)
+    output = os.environ.get(OUTPUT_ENV_VARIABLE)
+    replayed = _replayed_results(output) if output else None
+    lock = threading.Lock()
+    with open(log_path or os.devnull, "ab", buffering=0) as log:
+
+        def scan_and_log(target: str) -> None:
+            line = _scan(target, replayed)
+            if line is not None:
+                with lock:
+                    log.write(line)
+
+        with concurrent.futures.ThreadPoolExecutor(max(max_threads, 1)) as executor:
+            # Results are consumed to raise the errors of the threads.
+            list(executor.map(scan_and_log, targets))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,367 @@
+"""Benchmark of the hot path of a scan: parsing the WhatWeb log and emitting the fingerprints.
+
+Measures the ops/sec and the peak of the Python allocations of `parse_whatweb_output`, `_parse_emit_result` and
+`_send_detected_fingerprints`, on an agent whose bus is a stub, for the test fixtures and for generated worst
+cases: a long redirect chain, thousands of plugins on a line and a multi-MB verbose payload.
+
+Every benchmark is measured `--repeats` times and its median is reported. `--save` appends the results to a JSON
+lines history, `--compare` compares them to the median of the last `--baseline-runs` saved runs of the same machine
+and Python, and fails on regressions beyond the relative tolerance widened by the spread of the repeats.
+
+Usage: python -m benchmarks.hot_path_bench [--min-time SECONDS] [--repeats N] [--only WORKLOAD] [--save] [--compare]
+"""
+
+import argparse
+import datetime
+import io
+import json
+import logging
+import pathlib
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from typing import Any
+
+from ostorlab.agent import definitions as agent_definitions
+from ostorlab.runtimes import definitions as runtime_definitions
+from ostorlab.utils import definitions as utils_definitions
+
+from agent import decoder
+from agent import whatweb_agent
+from agent import whatweb_utils
+
+ROOT_DIRECTORY = pathlib.Path(__file__).parent.parent
+TESTS_DIRECTORY = ROOT_DIRECTORY / "tests"
+DEFAULT_HISTORY = pathlib.Path(__file__).parent / "results" / "hot_path.jsonl"
+DEFAULT_TOLERANCE = 0.2
+DEFAULT_REPEATS = 5
+DEFAULT_BASELINE_RUNS = 3
+# Peaks of a few KiB vary with the interpreter caches, differences below the slack are not regressions.
+PEAK_BYTES_SLACK = 16 * 1024
+REDIRECT_HOPS = 100
+PLUGINS_PER_LINE = 500
+VERBOSE_PAYLOAD_BYTES = 4 * 1024 * 1024
+TARGET = whatweb_agent.DomainTarget(name="bench.example.com", schema="https", port=443)
+
+
+class StubBusAgent(whatweb_agent.AgentWhatWeb):
+    """Agent whose messages are serialized as usual and counted instead of being sent to the bus."""
+
+    emitted = 0
+
+    def emit_raw(
+        self,
+        selector: str,
+        raw: bytes,
+        message_id: str | None = None,
+        message_priority: int | None = None,
+    ) -> None:
+        self.emitted += 1
+
+
+def _create_agent() -> StubBusAgent:
+    with (ROOT_DIRECTORY / "ostorlab.yaml").open() as yaml_o:
+        agent_definition = agent_definitions.AgentDefinition.from_yaml(yaml_o)
+    agent_settings = runtime_definitions.AgentSettings(
+        key="agent/ostorlab/whatweb",
+        redis_url="redis://localhost",
+        # The healthcheck server binds at construction, any free port avoids conflicts with a running agent.
+        healthcheck_port=0,
+        args=[
+            utils_definitions.Arg(
+                name="schema", type="string", value=json.dumps("https").encode()
+            ),
+            utils_definitions.Arg(
+                name="port", type="number", value=json.dumps(443).encode()
+            ),
+        ],
+    )
+    return StubBusAgent(agent_definition, agent_settings)
+
+
+def _line(url: str, status: int, plugins: list[Any]) -> bytes:
+    return json.dumps([url, status, plugins], separators=(",", ":")).encode() + b"\n"
+
+
+def _redirect_chain() -> bytes:
+    """A chain of redirects reporting the same fingerprints on every hop, then the final page."""
+    plugins = [
+        ["HTTPServer", [{"string": "nginx/1.25.3", "certainty": 100}]],
+        ["nginx", [{"version": ["1.25.3"], "certainty": 100}]],
+        [
+            "RedirectLocation",
+            [{"string": "https://bench.example.com/", "certainty": 100}],
+        ],
+        [
+            "Strict-Transport-Security",
+            [{"string": "max-age=31536000", "certainty": 100}],
+        ],
+    ]
+    lines = [
+        _line(f"https://bench.example.com/hop/{hop}", 301, plugins)
+        for hop in range(REDIRECT_HOPS)
+    ]
+    lines.append(
+        _line(
+            "https://bench.example.com/",
+            200,
+            [*plugins, ["JQuery", [{"version": ["3.7.1"], "certainty": 100}]]],
+        )
+    )
+    return b"".join(lines)
+
+
+def _many_plugins() -> bytes:
+    """A single line reporting thousands of plugins, each with a version and a string."""
+    plugins = [
+        [
+            f"Plugin-{index}",
+            [
+                {"version": [f"{index % 10}.{index % 7}"], "certainty": 100},
+                {"string": f"Library-{index}", "certainty": 75},
+            ],
+        ]
+        for index in range(PLUGINS_PER_LINE)
+    ]
+    return _line("https://bench.example.com/", 200, plugins)
+
+
+def _verbose_payload() -> bytes:
+    """A line of the verbose log with multi-MB matched payloads, as logged for large pages."""
+    chunk = "<div class='content'>" + "x" * 4000 + "</div>"
+    payload = chunk * (VERBOSE_PAYLOAD_BYTES // len(chunk) // 4)
+    plugins = [
+        [
+            f"Body-Plugin-{index}",
+            [
+                {
+                    "regexp": [payload],
+                    "regexp_compiled": "(?-mix:content)",
+                    "search": "body",
+                    "certainty": 100,
+                },
+                {"version": [f"{index}.0"], "certainty": 100},
+            ],
+        ]
+        for index in range(4)
+    ]
+    return _line("https://bench.example.com/", 200, plugins)
+
+
+def _workloads(only: str | None) -> dict[str, bytes]:
+    workloads = {
+        path.stem: path.read_bytes()
+        for path in sorted(TESTS_DIRECTORY.glob("*output.json"))
+    }
+    workloads["redirect_chain"] = _redirect_chain()
+    workloads["many_plugins"] = _many_plugins()
+    workloads["verbose_payload"] = _verbose_payload()
+    if only is not None:
+        return {name: output for name, output in workloads.items() if name == only}
+    return workloads
+
+
+def _ops_per_sec(function: Callable[[], object], min_time: float) -> float:
+    """Returns the ops/sec of the fastest of the runs of the function during `min_time`, at least 3 runs."""
+    durations: list[float] = []
+    deadline = time.perf_counter() + min_time
+    while len(durations) < 3 or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return 1 / min(durations)
+
+
+def _spread(values: list[float]) -> float:
+    """Returns the range of the values relative to their median."""
+    median = statistics.median(values)
+    if median == 0:
+        return 0.0
+    return (max(values) - min(values)) / median
+
+
+def _measure(
+    function: Callable[[], object], min_time: float, repeats: int
+) -> dict[str, float]:
+    """Returns the medians of the ops/sec and of the allocation peaks of `repeats` measures of the function."""
+    ops_per_sec = [_ops_per_sec(function, min_time) for _ in range(repeats)]
+    peaks = [float(_peak_bytes(function)) for _ in range(repeats)]
+    return {
+        "ops_per_sec": statistics.median(ops_per_sec),
+        "ops_per_sec_spread": _spread(ops_per_sec),
+        "peak_bytes": statistics.median(peaks),
+    }
+
+
+def _peak_bytes(function: Callable[[], object]) -> int:
+    """Returns the peak of the Python allocations of one run of the function."""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        function()
+        return tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+
+def _benchmarks(agent: StubBusAgent, output: bytes) -> dict[str, Callable[[], object]]:
+    fingerprints = list(dict.fromkeys(decoder.decode_output(output.splitlines())))
+
+    def send_detected_fingerprints() -> None:
+        for fingerprint in fingerprints:
+            agent._send_detected_fingerprints(
+                TARGET,
+                fingerprint.name,
+                [fingerprint.version] if fingerprint.version is not None else None,
+            )
+
+    return {
+        "parse_whatweb_output": lambda: whatweb_utils.parse_whatweb_output(output),
+        "_parse_emit_result": lambda: agent._parse_emit_result(
+            TARGET, io.BytesIO(output)
+        ),
+        "_send_detected_fingerprints": send_detected_fingerprints,
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT_DIRECTORY,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _last_runs(history: pathlib.Path, runs: int) -> list[dict[str, Any]]:
+    """Returns the last saved runs of the machine and Python running the benchmark, the oldest first."""
+    if history.exists() is False:
+        return []
+    comparable = []
+    for line in history.read_text().splitlines():
+        if line.strip() == "":
+            continue
+        run = json.loads(line)
+        if (
+            run.get("machine") == platform.machine()
+            and run.get("python") == platform.python_version()
+        ):
+            comparable.append(run)
+    return comparable[-runs:]
+
+
+def _baseline(runs: list[dict[str, Any]]) -> dict[str, dict[str, float]]:
+    """Returns the median of every metric of every benchmark over the runs."""
+    values: dict[str, dict[str, list[float]]] = {}
+    for run in runs:
+        for name, result in run["results"].items():
+            for metric, value in result.items():
+                values.setdefault(name, {}).setdefault(metric, []).append(value)
+    return {
+        name: {metric: statistics.median(series) for metric, series in metrics.items()}
+        for name, metrics in values.items()
+    }
+
+
+def _regressions(
+    results: dict[str, dict[str, float]],
+    previous: dict[str, dict[str, float]],
+    tolerance: float,
+) -> list[str]:
+    """Returns the benchmarks slower or allocating more than the baseline, beyond the tolerance.
+
+    The ops/sec tolerance is widened by the spread of the repeats of both the run and the baseline, a noisy
+    benchmark is not reported as a regression.
+    """
+    regressions = []
+    for name, result in results.items():
+        before = previous.get(name)
+        if before is None:
+            continue
+        noise = max(
+            result.get("ops_per_sec_spread", 0.0), before.get("ops_per_sec_spread", 0.0)
+        )
+        if result["ops_per_sec"] < before["ops_per_sec"] * (1 - tolerance - noise):
+            regressions.append(
+                f"{name}: {result['ops_per_sec']:.1f} ops/sec, was {before['ops_per_sec']:.1f}"
+            )
+        if (
+            result["peak_bytes"] > before["peak_bytes"] * (1 + tolerance)
+            and result["peak_bytes"] - before["peak_bytes"] > PEAK_BYTES_SLACK
+        ):
+            regressions.append(
+                f"{name}: peak of {result['peak_bytes']:.0f} bytes, was {before['peak_bytes']:.0f}"
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--min-time", type=float, default=0.5)
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--only", help="Only run the workload with this name.")
+    parser.add_argument("--history", type=pathlib.Path, default=DEFAULT_HISTORY)
+    parser.add_argument("--save", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--baseline-runs", type=int, default=DEFAULT_BASELINE_RUNS)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    # The agent logs every fingerprint, the console output is not part of the measured hot path.
+    logging.disable(logging.INFO)
+    agent = _create_agent()
+    results: dict[str, dict[str, float]] = {}
+    print(
+        f"{'workload':<20} {'function':<28} {'bytes':>9} {'ops/sec':>10} {'peak KiB':>10}"
+    )
+    for workload, output in _workloads(args.only).items():
+        for function_name, function in _benchmarks(agent, output).items():
+            result = _measure(function, args.min_time, max(args.repeats, 1))
+            results[f"{workload}/{function_name}"] = result
+            print(
+                f"{workload:<20} {function_name:<28} {len(output):>9} {result['ops_per_sec']:>10.1f} "
+                f"{result['peak_bytes'] / 1024:>10.1f}"
+            )
+
+    regressions: list[str] = []
+    if args.compare is True:
+        previous = _last_runs(args.history, max(args.baseline_runs, 1))
+        if len(previous) == 0:
+            print(
+                f"No previous run of this machine and Python in {args.history} to compare to."
+            )
+        else:
+            regressions = _regressions(results, _baseline(previous), args.tolerance)
+            commits = ", ".join(run["commit"] or "unknown commit" for run in previous)
+            print(
+                f"Compared to the median of {len(previous)} runs ({commits}), the last of "
+                f"{previous[-1]['timestamp']}: {len(regressions)} regressions."
+            )
+            for regression in regressions:
+                print(f"  {regression}")
+    if args.save is True:
+        args.history.parent.mkdir(parents=True, exist_ok=True)
+        run = {
+            "timestamp": datetime.datetime.now(datetime.UTC).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": results,
+        }
+        with args.history.open("a") as history:
+            history.write(json.dumps(run, sort_keys=True) + "\n")
+    if len(regressions) > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+"""End-to-end load harness of the agent, against the stand-in WhatWeb binary and the local target farm.
+
+Starts the target farm, points `definitions.WHATWEB_PATH` to `benchmarks/fake_whatweb.py` and feeds
+`AgentWhatWeb.process` with domain, link and /24 IP messages, once per combination of the concurrency, batch
+size and scan engine settings. Reports the scanned targets per second, the p50 and p99 latency of the scan of a
+target, from the start of its WhatWeb run to its last emitted fingerprint, and the current and peak RSS of the
+agent. Targets of a batch share the latency of the batch.
+
+Domain and link messages have a single target, only the targets of the IP messages are scanned concurrently and
+batched. The dedup sets are kept in process unless `--redis-url` is set, Redis round trips are then measured too.
+
+Usage: python -m benchmarks.load_harness [--domains N] [--links N] [--ip-ranges N] [--concurrency 1,8,32]
+    [--batch-sizes 0,16] [--scan-engines threads,asyncio] [--latency SECONDS] [--jitter SECONDS]
+    [--output WHATWEB_LOG] [--stream-output] [--redis-url URL]
+"""
+
+import argparse
+import dataclasses
+import itertools
+import json
+import logging
+import os
+import pathlib
+import resource
+import stat
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections.abc import Iterator
+from typing import Any
+
+from ostorlab.agent import definitions as agent_definitions
+from ostorlab.agent.message import message as msg
+from ostorlab.runtimes import definitions as runtime_definitions
+from ostorlab.utils import definitions as utils_definitions
+
+from agent import definitions
+from agent import whatweb_agent
+from benchmarks import fake_whatweb
+from benchmarks import target_farm
+
+ROOT_DIRECTORY = pathlib.Path(__file__).parent.parent
+FAKE_WHATWEB_PATH = pathlib.Path(__file__).parent / "fake_whatweb.py"
+FARM_DOMAIN = "farm.test"
+
+Target = whatweb_agent.DomainTarget | whatweb_agent.IPTarget
+
+
+class InProcessSets:
+    """The Redis commands of the dedup checks and the result cache, served from process memory."""
+
+    def __init__(self) -> None:
+        self._sets: dict[bytes | str, set[bytes]] = {}
+        self._values: dict[bytes | str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def sadd(self, name: bytes | str, *members: bytes | str) -> int:
+        with self._lock:
+            stored = self._sets.setdefault(name, set())
+            added = {_encode(member) for member in members} - stored
+            stored.update(added)
+            return len(added)
+
+    def sismember(self, name: bytes | str, member: bytes | str) -> bool:
+        with self._lock:
+            return _encode(member) in self._sets.get(name, set())
+
+    def get(self, name: bytes | str) -> bytes | None:
+        with self._lock:
+            return self._values.get(name)
+
+    def set(self, name: bytes | str, value: bytes, **options: Any) -> bool:
+        with self._lock:
+            self._values[name] = value
+            return True
+
+
+def _encode(member: bytes | str) -> bytes:
+    return member.encode() if isinstance(member, str) else member
+
+
+class LoadedAgent(whatweb_agent.AgentWhatWeb):
+    """Agent recording the scan latency of every target and counting its messages instead of sending them."""
+
+    def __init__(
+        self,
+        agent_definition: agent_definitions.AgentDefinition,
+        agent_settings: runtime_definitions.AgentSettings,
+    ) -> None:
+        super().__init__(agent_definition, agent_settings)
+        self.latencies: list[float] = []
+        self.emitted = 0
+        self._latencies_lock = threading.Lock()
+
+    def emit_raw(
+        self,
+        selector: str,
+        raw: bytes,
+        message_id: str | None = None,
+        message_priority: int | None = None,
+    ) -> None:
+        with self._latencies_lock:
+            self.emitted += 1
+
+    def _record(self, started_at: float, targets_count: int) -> None:
+        latency = time.perf_counter() - started_at
+        with self._latencies_lock:
+            self.latencies.extend([latency] * targets_count)
+
+    def _scan_target(self, target: Target) -> None:
+        started_at = time.perf_counter()
+        super()._scan_target(target)
+        self._record(started_at, 1)
+
+    async def _scan_target_async(self, target: Target) -> None:
+        started_at = time.perf_counter()
+        await super()._scan_target_async(target)
+        self._record(started_at, 1)
+
+    def _scan_batch(self, targets: list[Target]) -> None:
+        started_at = time.perf_counter()
+        super()._scan_batch(targets)
+        self._record(started_at, len(targets))
+
+    async def _scan_batch_async(self, targets: list[Target]) -> None:
+        started_at = time.perf_counter()
+        await super()._scan_batch_async(targets)
+        self._record(started_at, len(targets))
+
+
+@dataclasses.dataclass
+class LoadResult:
+    """Measures of a run of the messages with a combination of settings."""
+
+    scan_engine: str
+    concurrency: int
+    batch_size: int
+    targets: int
+    fingerprints: int
+    seconds: float
+    p50: float
+    p99: float
+    rss_mib: float
+    peak_rss_mib: float
+
+    @property
+    def targets_per_sec(self) -> float:
+        return self.targets / self.seconds if self.seconds > 0 else 0.0
+
+
+def _arg(name: str, type_: str, value: Any) -> utils_definitions.Arg:
+    return utils_definitions.Arg(
+        name=name, type=type_, value=json.dumps(value).encode()
+    )
+
+
+def _create_agent(
+    scan_engine: str,
+    concurrency: int,
+    batch_size: int,
+    stream_output: bool,
+    redis_url: str | None,
+) -> LoadedAgent:
+    with (ROOT_DIRECTORY / "ostorlab.yaml").open() as yaml_o:
+        agent_definition = agent_definitions.AgentDefinition.from_yaml(yaml_o)
+    agent_settings = runtime_definitions.AgentSettings(
+        key="agent/ostorlab/whatweb",
+        redis_url=redis_url or "redis://localhost",
+        # The healthcheck server binds at construction, any free port avoids conflicts between the agents.
+        healthcheck_port=0,
+        args=[
+            _arg("schema", "string", "http"),
+            _arg("port", "number", 80),
+            _arg("scan_engine", "string", scan_engine),
+            _arg("max_concurrency", "number", concurrency),
+            _arg("ip_batch_size", "number", batch_size),
+            _arg("stream_output", "boolean", stream_output),
+        ],
+    )
+    agent = LoadedAgent(agent_definition, agent_settings)
+    if redis_url is None:
+        agent._redis_client = InProcessSets()  # type: ignore[assignment]
+    return agent
+
+
+def _messages(
+    run_id: str, domains: int, links: int, ip_ranges: int
+) -> Iterator[msg.Message]:
+    """Yields the messages of a run, their targets are new to the dedup sets of previous runs."""
+    for index in range(domains):
+        yield msg.Message.from_data(
+            "v3.asset.domain_name.service",
+            data={
+                "name": f"domain-{run_id}-{index}.{FARM_DOMAIN}",
+                "port": 80,
+                "schema": "http",
+            },
+        )
+    for index in range(links):
+        yield msg.Message.from_data(
+            "v3.asset.link",
+            data={
+                "url": f"http://link-{run_id}-{index}.{FARM_DOMAIN}/index.html",
+                "method": "GET",
+            },
+        )
+    # Ranges of the run are taken from 10.0.0.0/8 after a random offset.
+    offset = int(run_id, 16) % (65536 - ip_ranges)
+    for index in range(ip_ranges):
+        network = offset + index
+        yield msg.Message.from_data(
+            "v3.asset.ip.v4",
+            data={
+                "host": f"10.{network >> 8}.{network & 255}.0",
+                "mask": "24",
+                "version": 4,
+            },
+        )
+
+
+def _percentile(values: list[float], percentile: float) -> float:
+    if len(values) == 0:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+
+def _reset_peak_rss() -> None:
+    """Resets the peak RSS of the process, Linux only, the peak is then the peak since the first run otherwise."""
+    try:
+        pathlib.Path("/proc/self/clear_refs").write_text("5")
+    except OSError:
+        pass
+
+
+def _rss_mib() -> tuple[float, float]:
+    """Returns the current and the peak RSS of the process in MiB."""
+    try:
+        status = pathlib.Path("/proc/self/status").read_text()
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return peak, peak
+    fields = dict(line.split(":", 1) for line in status.splitlines() if ":" in line)
+    return (
+        int(fields["VmRSS"].split()[0]) / 1024,
+        int(fields["VmHWM"].split()[0]) / 1024,
+    )
+
+
+def _run(
+    agent: LoadedAgent, messages: list[msg.Message], scan_engine: str, batch_size: int
+) -> LoadResult:
+    _reset_peak_rss()
+    started_at = time.perf_counter()
+    for message in messages:
+        agent.process(message)
+    seconds = time.perf_counter() - started_at
+    rss, peak_rss = _rss_mib()
+    return LoadResult(
+        scan_engine=scan_engine,
+        concurrency=agent._max_concurrency,
+        batch_size=batch_size,
+        targets=len(agent.latencies),
+        fingerprints=agent.emitted,
+        seconds=seconds,
+        p50=_percentile(agent.latencies, 50),
+        p99=_percentile(agent.latencies, 99),
+        rss_mib=rss,
+        peak_rss_mib=peak_rss,
+    )
+
+
+def _install_fake_whatweb(directory: pathlib.Path) -> pathlib.Path:
+    """Writes a launcher of the stand-in binary running on the interpreter of the harness."""
+    launcher = directory / "whatweb"
+    launcher.write_text(
+        f'#!/bin/sh\nexec "{sys.executable}" "{FAKE_WHATWEB_PATH}" "$@"\n'
+    )
+    launcher.chmod(launcher.stat().st_mode | stat.S_IXUSR)
+    return launcher
+
+
+def _ints(value: str) -> list[int]:
+    return [int(item) for item in value.split(",")]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--domains", type=int, default=20)
+    parser.add_argument("--links", type=int, default=20)
+    parser.add_argument("--ip-ranges", type=int, default=2)
+    parser.add_argument("--concurrency", type=_ints, default=[1, 8, 32])
+    parser.add_argument("--batch-sizes", type=_ints, default=[0, 16])
+    parser.add_argument(
+        "--scan-engines",
+        type=lambda value: value.split(","),
+        default=[definitions.THREADS_SCAN_ENGINE],
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds of every WhatWeb target."
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="Random seconds added to the latency."
+    )
+    parser.add_argument(
+        "--output", help="WhatWeb log replayed for every target instead of the farm."
+    )
+    parser.add_argument("--stream-output", action="store_true")
+    parser.add_argument("--redis-url", help="Redis of the dedup sets.")
+    args = parser.parse_args()
+
+    # The agent logs every target and fingerprint, the console output is not part of the measured load.
+    logging.disable(logging.INFO)
+    farm = target_farm.TargetFarm.from_plugins()
+    server = target_farm.start_server(farm)
+    work_directory = tempfile.TemporaryDirectory()
+    definitions.WHATWEB_PATH = str(
+        _install_fake_whatweb(pathlib.Path(work_directory.name))
+    )
+    definitions.WHATWEB_DIRECTORY = work_directory.name
+    os.environ[fake_whatweb.FARM_ENV_VARIABLE] = f"127.0.0.1:{server.server_address[1]}"
+    os.environ[fake_whatweb.LATENCY_ENV_VARIABLE] = str(args.latency)
+    os.environ[fake_whatweb.JITTER_ENV_VARIABLE] = str(args.jitter)
+    if args.output is not None:
+        os.environ[fake_whatweb.OUTPUT_ENV_VARIABLE] = str(
+            pathlib.Path(args.output).resolve()
+        )
+
+    print(
+        f"{len(farm.plugins)} plugin pages, {args.domains} domains, {args.links} links, "
+        f"{args.ip_ranges} /24 ranges, WhatWeb latency {args.latency}s + {args.jitter}s"
+    )
+    print(
+        f"{'engine':<8} {'conc':>5} {'batch':>6} {'targets':>8} {'fprints':>8} {'targets/s':>10} "
+        f"{'p50 ms':>9} {'p99 ms':>9} {'rss MiB':>8} {'peak MiB':>9}"
+    )
+    try:
+        for scan_engine, concurrency, batch_size in itertools.product(
+            args.scan_engines, args.concurrency, args.batch_sizes
+        ):
+            agent = _create_agent(
+                scan_engine,
+                concurrency,
+                batch_size,
+                args.stream_output,
+                args.redis_url,
+            )
+            messages = list(
+                _messages(
+                    uuid.uuid4().hex[:8], args.domains, args.links, args.ip_ranges
+                )
+            )
+            result = _run(agent, messages, scan_engine, batch_size)
+            print(
+                f"{result.scan_engine:<8} {result.concurrency:>5} {result.batch_size:>6} "
+                f"{result.targets:>8} {result.fingerprints:>8} {result.targets_per_sec:>10.1f} "
+                f"{result.p50 * 1000:>9.1f} {result.p99 * 1000:>9.1f} {result.rss_mib:>8.1f} "
+                f"{result.peak_rss_mib:>9.1f}",
+                flush=True,
+            )
+    finally:
+        server.shutdown()
+        work_directory.cleanup()
+
+
+if __name__ == "__main__":
+    main()
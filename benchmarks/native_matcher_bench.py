@@ -0,0 +1,90 @@
+"""Benchmark of the indexed multi-pattern matcher against the per-regex evaluation of the plugin signatures.
+
+Usage: python -m benchmarks.native_matcher_bench [--size BYTES] [--repeat N]
+"""
+
+import argparse
+import functools
+import pathlib
+import random
+import string
+import time
+from collections.abc import Callable
+
+from agent import native_matcher
+from agent import signatures
+
+PLUGINS_DIRECTORY = pathlib.Path(__file__).parent.parent / "plugins"
+
+
+def _random_html(size: int, rng: random.Random) -> str:
+    """Returns an HTML page of about `size` characters made of random words and tags."""
+    parts = ["<html><head><title>Welcome</title></head><body>"]
+    length = len(parts[0])
+    while length < size:
+        word = "".join(rng.choices(string.ascii_letters, k=rng.randint(2, 10)))
+        part = f"<div class='{word[:4]}'>{word} {word.lower()}</div>\n"
+        parts.append(part)
+        length += len(part)
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def _responses(size: int) -> dict[str, native_matcher.Response]:
+    rng = random.Random(0)
+    page = _random_html(size, rng)
+    return {
+        "no match": native_matcher.Response(
+            url="http://192.168.0.1/",
+            status=200,
+            headers={"server": "nginx", "content-type": "text/html"},
+            body=page,
+        ),
+        "appliance": native_matcher.Response(
+            url="http://192.168.0.2/",
+            status=200,
+            headers={"server": "Plex Media Server", "x-plex-protocol": "1.0"},
+            body=page.replace(
+                "<title>Welcome</title>",
+                "<title>Plex</title><h4>Login to pfSense</h4>",
+            ),
+        ),
+    }
+
+
+def _time(function: Callable[[], object], repeat: int) -> float:
+    """Returns the best duration of `repeat` runs, in milliseconds."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return min(durations) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=256 * 1024)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    plugin_signatures = signatures.extract_signatures(PLUGINS_DIRECTORY)
+    per_regex = native_matcher.Matcher(plugin_signatures, indexed=False)
+    indexed = native_matcher.Matcher(plugin_signatures, indexed=True)
+    matches_count = sum(len(signature["matches"]) for signature in plugin_signatures)
+    print(
+        f"{len(plugin_signatures)} plugins, {matches_count} matches, body of {args.size} bytes"
+    )
+    print(f"{'response':<12} {'per-regex ms':>14} {'indexed ms':>12} {'speedup':>9}")
+    for name, response in _responses(args.size).items():
+        if per_regex.match(response) != indexed.match(response):
+            raise SystemExit(f"Indexed results differ from per-regex results on {name}")
+        per_regex_ms = _time(functools.partial(per_regex.match, response), args.repeat)
+        indexed_ms = _time(functools.partial(indexed.match, response), args.repeat)
+        print(
+            f"{name:<12} {per_regex_ms:>14.2f} {indexed_ms:>12.2f} {per_regex_ms / indexed_ms:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
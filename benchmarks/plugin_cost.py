@@ -0,0 +1,276 @@
+"""Per-plugin cost profiler: replays a recorded corpus of HTTP responses through every plugin signature.
+
+Every `matches` entry of every plugin is evaluated one by one on every response, as WhatWeb runs them, and timed.
+The report ranks the plugins by their total matching time, with their hit rate: the share of the responses they
+fingerprint. Expensive plugins with a low hit rate are the ones to optimize or retire. `--matches` ranks the
+`matches` entries themselves. Signatures are evaluated with Python regexes, the ranking is indicative of the cost
+of the Ruby regexes of WhatWeb, not a measure of it.
+
+The corpus is a JSON lines file of responses: `{"url": ..., "status": ..., "headers": {...}, "body": ...}`.
+`--record URLS_FILE` fetches the URLs listed in a file, one per line, and writes every response of their redirect
+chains to the corpus. Without a corpus, the pages of the target farm are replayed, every plugin then fingerprints
+one page.
+
+Usage: python -m benchmarks.plugin_cost [CORPUS] [--record URLS_FILE] [--repeat N] [--top N] [--matches]
+    [--json REPORT]
+"""
+
+import argparse
+import dataclasses
+import json
+import pathlib
+import time
+from collections.abc import Iterator
+from typing import Any
+
+import requests
+import urllib3
+
+from agent import definitions
+from agent import native_matcher
+from agent import signatures
+from benchmarks import target_farm
+
+PLUGINS_DIRECTORY = pathlib.Path(__file__).parent.parent / "plugins"
+
+
+@dataclasses.dataclass
+class MatchCost:
+    """Time spent evaluating a `matches` entry over the corpus and the responses it matched."""
+
+    plugin: str
+    description: str
+    nanoseconds: int = 0
+    hits: int = 0
+
+
+@dataclasses.dataclass
+class PluginCost:
+    """Time spent evaluating all the `matches` entries of a plugin and the responses it fingerprinted."""
+
+    plugin: str
+    matches: list[MatchCost]
+    hits: int = 0
+
+    @property
+    def nanoseconds(self) -> int:
+        return sum(match.nanoseconds for match in self.matches)
+
+
+def _describe(index: int, match: dict[str, Any]) -> str:
+    """Returns a short label of a `matches` entry: its name, or its search field and pattern."""
+    if match.get("name") is not None:
+        return f"#{index} {match['name']}"
+    pattern = match.get("regexp") or match.get("text") or ""
+    for key in signatures.CAPTURE_KEYS:
+        pattern = pattern or match.get(key, "")
+    return f"#{index} {match.get('search', 'body')} {pattern[:40]}"
+
+
+def load_corpus(path: pathlib.Path) -> Iterator[native_matcher.Response]:
+    with path.open("rb") as corpus:
+        for line in corpus:
+            if line.strip() == b"":
+                continue
+            response = json.loads(line)
+            yield native_matcher.Response(
+                url=response["url"],
+                status=int(response["status"]),
+                headers={
+                    name.lower(): value for name, value in response["headers"].items()
+                },
+                body=response["body"],
+            )
+
+
+def record_corpus(urls: list[str], path: pathlib.Path) -> int:
+    """Fetches the URLs like the native engine and writes every response of their redirect chains to the corpus.
+
+    Returns:
+        The number of recorded responses, unreachable URLs are skipped.
+    """
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    session = requests.Session()
+    session.verify = False
+    session.max_redirects = definitions.NATIVE_MAX_REDIRECTS
+    session.headers["User-Agent"] = definitions.NATIVE_USER_AGENT
+    recorded = 0
+    with path.open("w") as corpus:
+        for url in urls:
+            try:
+                response = session.get(url, timeout=definitions.NATIVE_REQUEST_TIMEOUT)
+            except requests.RequestException as e:
+                print(f"Skipping {url}: {e}")
+                continue
+            for http_response in [*response.history, response]:
+                corpus.write(
+                    json.dumps(
+                        dataclasses.asdict(
+                            native_matcher._to_response(
+                                http_response, http_response.content
+                            )
+                        )
+                    )
+                    + "\n"
+                )
+                recorded += 1
+    return recorded
+
+
+def profile(
+    plugin_signatures: list[dict[str, Any]],
+    responses: list[native_matcher.Response],
+    repeat: int = 1,
+) -> list[PluginCost]:
+    """Evaluates every `matches` entry on every response `repeat` times, returns the costs of the plugins.
+
+    Search contexts are built once per response, only the evaluation of the entries is timed.
+    """
+    plugins = []
+    for signature in plugin_signatures:
+        compiled = [
+            native_matcher.Match.from_signature(match) for match in signature["matches"]
+        ]
+        costs = [
+            MatchCost(plugin=signature["name"], description=_describe(index, match))
+            for index, match in enumerate(signature["matches"])
+        ]
+        plugins.append((PluginCost(signature["name"], costs), compiled))
+
+    for response in responses:
+        contexts: dict[str, str] = {}
+        for plugin_cost, compiled in plugins:
+            plugin_hit = False
+            for match_cost, match in zip(plugin_cost.matches, compiled):
+                context = contexts.get(match.search)
+                if context is None:
+                    context = contexts[match.search] = response.search_context(
+                        match.search
+                    )
+                results: list[dict[str, Any]] = []
+                for _ in range(repeat):
+                    started_at = time.perf_counter_ns()
+                    results = match.evaluate(context)
+                    match_cost.nanoseconds += time.perf_counter_ns() - started_at
+                if len(results) > 0:
+                    match_cost.hits += 1
+                    plugin_hit = True
+            if plugin_hit is True:
+                plugin_cost.hits += 1
+    return sorted((cost for cost, _ in plugins), key=lambda cost: -cost.nanoseconds)
+
+
+def _rate(hits: int, responses: int) -> float:
+    return hits / responses if responses > 0 else 0.0
+
+
+def _print_report(
+    costs: list[PluginCost], responses: int, repeat: int, top: int | None
+) -> None:
+    total = sum(cost.nanoseconds for cost in costs) or 1
+    print(
+        f"{'rank':>4} {'plugin':<40} {'ms':>9} {'share':>7} {'us/resp':>9} {'hit rate':>9} {'ms/hit':>9}"
+    )
+    for rank, cost in enumerate(costs[:top], start=1):
+        milliseconds = cost.nanoseconds / repeat / 1e6
+        per_hit = f"{milliseconds / cost.hits:>9.3f}" if cost.hits > 0 else f"{'-':>9}"
+        print(
+            f"{rank:>4} {cost.plugin[:40]:<40} {milliseconds:>9.3f} {cost.nanoseconds / total:>7.1%} "
+            f"{milliseconds * 1000 / max(responses, 1):>9.2f} {_rate(cost.hits, responses):>9.1%} {per_hit}"
+        )
+
+
+def _print_matches_report(
+    costs: list[PluginCost], responses: int, repeat: int, top: int | None
+) -> None:
+    matches = sorted(
+        (match for cost in costs for match in cost.matches),
+        key=lambda match: -match.nanoseconds,
+    )
+    total = sum(match.nanoseconds for match in matches) or 1
+    print(
+        f"{'rank':>4} {'plugin':<30} {'match':<44} {'ms':>9} {'share':>7} {'hit rate':>9}"
+    )
+    for rank, match in enumerate(matches[:top], start=1):
+        print(
+            f"{rank:>4} {match.plugin[:30]:<30} {match.description[:44]:<44} "
+            f"{match.nanoseconds / repeat / 1e6:>9.3f} {match.nanoseconds / total:>7.1%} "
+            f"{_rate(match.hits, responses):>9.1%}"
+        )
+
+
+def _report(
+    costs: list[PluginCost], responses: int, repeat: int
+) -> list[dict[str, Any]]:
+    return [
+        {
+            "plugin": cost.plugin,
+            "milliseconds": cost.nanoseconds / repeat / 1e6,
+            "hit_rate": _rate(cost.hits, responses),
+            "matches": [
+                {
+                    "match": match.description,
+                    "milliseconds": match.nanoseconds / repeat / 1e6,
+                    "hit_rate": _rate(match.hits, responses),
+                }
+                for match in cost.matches
+            ],
+        }
+        for cost in costs
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus", nargs="?", type=pathlib.Path)
+    parser.add_argument(
+        "--record", type=pathlib.Path, help="Record the corpus from a file of URLs."
+    )
+    parser.add_argument("--plugins", type=pathlib.Path, default=PLUGINS_DIRECTORY)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, help="Only list the N most expensive.")
+    parser.add_argument(
+        "--matches", action="store_true", help="Rank the `matches` entries."
+    )
+    parser.add_argument(
+        "--json", type=pathlib.Path, help="Write the full report as JSON."
+    )
+    args = parser.parse_args()
+
+    if args.record is not None:
+        if args.corpus is None:
+            parser.error("--record needs the corpus file to write.")
+        urls = [
+            line.strip()
+            for line in args.record.read_text().splitlines()
+            if line.strip()
+        ]
+        recorded = record_corpus(urls, args.corpus)
+        print(f"Recorded {recorded} responses of {len(urls)} URLs to {args.corpus}")
+        return
+
+    plugin_signatures = signatures.extract_signatures(args.plugins)
+    if args.corpus is None:
+        responses = target_farm.TargetFarm(plugin_signatures).pages
+        print("No corpus, replaying the pages of the target farm.")
+    else:
+        responses = list(load_corpus(args.corpus))
+    repeat = max(args.repeat, 1)
+    costs = profile(plugin_signatures, responses, repeat)
+    matches_count = sum(len(cost.matches) for cost in costs)
+    print(
+        f"{len(costs)} plugins, {matches_count} matches, {len(responses)} responses, "
+        f"{sum(len(response.body) for response in responses)} body bytes"
+    )
+    if args.matches is True:
+        _print_matches_report(costs, len(responses), repeat, args.top)
+    else:
+        _print_report(costs, len(responses), repeat, args.top)
+    if args.json is not None:
+        args.json.write_text(
+            json.dumps(_report(costs, len(responses), repeat), indent=2)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""Local HTTP target farm serving pages fingerprinted by the signatures of the custom plugins.
+
+Every plugin gets a page built from its `matches` declarations: a string matching each regex, text or capture
+is placed in the searched header, head, title or body. The page is kept only if the native matcher fingerprints
+it with the plugin. A plain page matching no plugin is served as well.
+
+The farm answers any host name, the page of a request is picked from its `Host` header, so any domain or IP can
+be pointed at it. `/.whatweb.json` returns the WhatWeb plugin results of the page of the host, as evaluated by
+the native matcher when the farm started, for the stand-in WhatWeb binary to log them.
+
+Usage: python -m benchmarks.target_farm [--port PORT]
+"""
+
+import argparse
+import http.server
+import json
+import pathlib
+import re
+import threading
+import zlib
+from re import _constants as sre_constants  # type: ignore[attr-defined]
+from re import _parser as sre_parser  # type: ignore[attr-defined]
+from typing import Any
+
+from agent import native_matcher
+from agent import signatures
+
+PLUGINS_DIRECTORY = pathlib.Path(__file__).parent.parent / "plugins"
+RESULTS_PATH = "/.whatweb.json"
+PLAIN_PAGE = native_matcher.Response(
+    url="",
+    status=200,
+    headers={"server": "nginx", "content-type": "text/html"},
+    body="<html><head><title>Welcome</title></head><body><p>It works.</p></body></html>",
+)
+
+_REPEAT_OPS = (
+    sre_constants.MAX_REPEAT,
+    sre_constants.MIN_REPEAT,
+    getattr(sre_constants, "POSSESSIVE_REPEAT", sre_constants.MAX_REPEAT),
+)
+_CATEGORY_SAMPLES = {
+    sre_constants.CATEGORY_DIGIT: "1",
+    sre_constants.CATEGORY_NOT_DIGIT: "a",
+    sre_constants.CATEGORY_SPACE: " ",
+    sre_constants.CATEGORY_NOT_SPACE: "a",
+    sre_constants.CATEGORY_WORD: "a",
+    sre_constants.CATEGORY_NOT_WORD: " ",
+}
+_CATEGORY_PATTERNS = {
+    sre_constants.CATEGORY_DIGIT: re.compile(r"\d"),
+    sre_constants.CATEGORY_NOT_DIGIT: re.compile(r"\D"),
+    sre_constants.CATEGORY_SPACE: re.compile(r"\s"),
+    sre_constants.CATEGORY_NOT_SPACE: re.compile(r"\S"),
+    sre_constants.CATEGORY_WORD: re.compile(r"\w"),
+    sre_constants.CATEGORY_NOT_WORD: re.compile(r"\W"),
+}
+# Characters tried for a negated character class, the first one outside of the class is used.
+_NEGATED_CANDIDATES = "a1 -_.Z"
+
+
+def _in_class(char: str, items: list[tuple[Any, Any]]) -> bool:
+    for op, value in items:
+        if op is sre_constants.LITERAL and chr(value) == char:
+            return True
+        if op is sre_constants.RANGE and value[0] <= ord(char) <= value[1]:
+            return True
+        if op is sre_constants.CATEGORY and _CATEGORY_PATTERNS[value].match(char):
+            return True
+    return False
+
+
+def _class_sample(items: list[tuple[Any, Any]]) -> str:
+    if len(items) > 0 and items[0][0] is sre_constants.NEGATE:
+        for char in _NEGATED_CANDIDATES:
+            if _in_class(char, items[1:]) is False:
+                return char
+        return "~"
+    op, value = items[0]
+    if op is sre_constants.LITERAL:
+        return chr(value)
+    if op is sre_constants.RANGE:
+        return chr(value[0])
+    if op is sre_constants.CATEGORY:
+        return _CATEGORY_SAMPLES.get(value, "a")
+    return "a"
+
+
+def _sample_items(items: Any) -> str:
+    """Returns a short string matched by a parsed regex, assertions and back references are not honored."""
+    parts = []
+    for op, value in items:
+        if op is sre_constants.LITERAL:
+            parts.append(chr(value))
+        elif op is sre_constants.NOT_LITERAL:
+            parts.append("b" if chr(value) == "a" else "a")
+        elif op is sre_constants.ANY:
+            parts.append("a")
+        elif op is sre_constants.IN:
+            parts.append(_class_sample(list(value)))
+        elif op in _REPEAT_OPS:
+            minimum, _, body = value
+            parts.append(_sample_items(body) * minimum)
+        elif op is sre_constants.SUBPATTERN:
+            parts.append(_sample_items(value[3]))
+        elif op is sre_constants.BRANCH:
+            parts.append(_sample_items(value[1][0]))
+    return "".join(parts)
+
+
+def sample(pattern: str) -> str | None:
+    """Returns a string matched by the regex, None if the regex can not be sampled."""
+    try:
+        return _sample_items(sre_parser.parse(pattern))
+    except (sre_parser.error, RecursionError):
+        return None
+
+
+def _page(signature: dict[str, Any]) -> native_matcher.Response:
+    """Returns a page holding a sample of every match declaration of a plugin in its searched part."""
+    headers = dict(PLAIN_PAGE.headers)
+    head: list[str] = []
+    titles: list[str] = []
+    body: list[str] = []
+    for match in signature["matches"]:
+        samples = [
+            sample(match[key]) for key in signatures.CAPTURE_KEYS if key in match
+        ]
+        if "regexp" in match:
+            samples.append(sample(match["regexp"]))
+        if "text" in match:
+            samples.append(match["text"])
+        values = [value for value in samples if value is not None]
+        search = native_matcher.search_field(match.get("search", "body"))
+        if search.startswith("headers["):
+            headers[search[len("headers[") : -1]] = " ".join(values)
+        elif match.get("search") == "title":
+            titles.extend(values)
+        elif match.get("search") == "head":
+            head.extend(values)
+        else:
+            body.extend(values)
+    # Ruby `^` and `$` anchor lines, every sample is on its own line.
+    return native_matcher.Response(
+        url="",
+        status=200,
+        headers=headers,
+        body=(
+            f"<html><head><title>{' '.join(titles)}</title>\n"
+            + "\n".join(head)
+            + "\n</head><body>\n"
+            + "\n".join(body)
+            + "\n</body></html>"
+        ),
+    )
+
+
+class TargetFarm:
+    """Pages of the farm with the plugin results of each page."""
+
+    def __init__(self, plugin_signatures: list[dict[str, Any]]) -> None:
+        matcher = native_matcher.Matcher(plugin_signatures)
+        self.pages: list[native_matcher.Response] = []
+        self.plugins: list[str] = []
+        for signature in plugin_signatures:
+            page = _page(signature)
+            if signature["name"] in (name for name, _ in matcher.match(page)):
+                self.pages.append(page)
+                self.plugins.append(signature["name"])
+        self.pages.append(PLAIN_PAGE)
+        self.results = [json.dumps(matcher.match(page)).encode() for page in self.pages]
+
+    @classmethod
+    def from_plugins(
+        cls, plugins_directory: pathlib.Path = PLUGINS_DIRECTORY
+    ) -> "TargetFarm":
+        return cls(signatures.extract_signatures(plugins_directory))
+
+    def page_index(self, host: str) -> int:
+        """Returns the page of a host, stable across runs."""
+        return zlib.crc32(host.lower().encode()) % len(self.pages)
+
+
+class _FarmHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    farm: TargetFarm
+
+    def do_GET(self) -> None:
+        host = (self.headers.get("Host") or "").rsplit(":", 1)[0]
+        index = self.farm.page_index(host)
+        page = self.farm.pages[index]
+        if self.path == RESULTS_PATH:
+            headers = {"content-type": "application/json"}
+            body = self.farm.results[index]
+        else:
+            headers = page.headers
+            body = page.body.encode()
+        self.send_response(page.status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+class _FarmServer(http.server.ThreadingHTTPServer):
+    # Batches open a connection per WhatWeb thread at once, the default backlog of 5 drops them.
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+def start_server(
+    farm: TargetFarm, port: int = 0, host: str = "127.0.0.1"
+) -> http.server.ThreadingHTTPServer:
+    """Serves the farm from a daemon thread, read the port from `server_address`, `shutdown` stops it."""
+    handler = type("FarmHandler", (_FarmHandler,), {"farm": farm})
+    server = _FarmServer((host, port), handler)
+    threading.Thread(
+        target=server.serve_forever, name="target-farm", daemon=True
+    ).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    farm = TargetFarm.from_plugins()
+    server = start_server(farm, args.port)
+    print(
+        f"Serving {len(farm.plugins)} plugin pages and a plain page on "
+        f"127.0.0.1:{server.server_address[1]}"
+    )
+    threading.Event().wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Unit tests for the scan results cache."""
+
+import zlib
+from typing import Any
+
+import redis
+from pytest_mock import plugin
+
+from agent import cache
+
+
+class FakeRedis:
+    """Minimal Redis client storing values in a dict."""
+
+    def __init__(self) -> None:
+        self.values: dict[str, bytes] = {}
+        self.expirations: dict[str, int] = {}
+
+    def get(self, name: str) -> bytes | None:
+        return self.values.get(name)
+
+    def set(self, name: str, value: bytes, ex: int) -> None:
+        self.values[name] = value
+        self.expirations[name] = ex
+
+
+def testFingerprintCache_whenEntryIsSet_returnsTheSameOutput() -> None:
+    """Test a cached output is returned unchanged."""
+    fingerprint_cache = cache.FingerprintCache(ttl=60)
+
+    fingerprint_cache.set("all:https://ostorlab.co:443", b'["https://ostorlab.co"]\n')
+
+    assert (
+        fingerprint_cache.get("all:https://ostorlab.co:443")
+        == b'["https://ostorlab.co"]\n'
+    )
+    assert fingerprint_cache.get("all:https://example.com:443") is None
+
+
+def testFingerprintCache_whenFull_evictsTheLeastRecentlyUsedEntry() -> None:
+    """Test the LRU keeps at most max_entries and evicts the least recently read entry."""
+    fingerprint_cache = cache.FingerprintCache(ttl=60, max_entries=2)
+    fingerprint_cache.set("a", b"a")
+    fingerprint_cache.set("b", b"b")
+    fingerprint_cache.get("a")
+
+    fingerprint_cache.set("c", b"c")
+
+    assert len(fingerprint_cache) == 2
+    assert fingerprint_cache.get("a") == b"a"
+    assert fingerprint_cache.get("b") is None
+
+
+def testFingerprintCache_whenTtlExpires_returnsNone(
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test an expired entry is a cache miss."""
+    monotonic_mock = mocker.patch("time.monotonic", return_value=100.0)
+    fingerprint_cache = cache.FingerprintCache(ttl=10)
+    fingerprint_cache.set("a", b"a")
+
+    monotonic_mock.return_value = 111.0
+
+    assert fingerprint_cache.get("a") is None
+
+
+def testFingerprintCache_withRedisTier_sharesCompressedEntries() -> None:
+    """Test entries are stored compressed in Redis and read back by another process cache."""
+    fake_redis: Any = FakeRedis()
+    cache.FingerprintCache(ttl=60, redis_client=fake_redis).set("a", b"output" * 100)
+
+    other_process_cache = cache.FingerprintCache(ttl=60, redis_client=fake_redis)
+
+    stored = fake_redis.values[f"{cache.REDIS_KEY_PREFIX}:a"]
+    assert zlib.decompress(stored) == b"output" * 100
+    assert len(stored) < len(b"output" * 100)
+    assert fake_redis.expirations[f"{cache.REDIS_KEY_PREFIX}:a"] == 60
+    assert other_process_cache.get("a") == b"output" * 100
+
+
+def testFingerprintCache_whenRedisFails_handlesItAsAMiss(
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test Redis errors do not fail the lookup."""
+    redis_client = mocker.Mock()
+    redis_client.get.side_effect = redis.exceptions.ConnectionError("down")
+    redis_client.set.side_effect = redis.exceptions.ConnectionError("down")
+    fingerprint_cache = cache.FingerprintCache(
+        ttl=60, max_entries=0, redis_client=redis_client
+    )
+
+    fingerprint_cache.set("a", b"a")
+
+    assert fingerprint_cache.get("a") is None
+
+
+def testMakeKey_whenEngineOrLogFormatDiffers_returnsDifferentKeys() -> None:
+    """Test the results of the native matcher or of the lean log are never served to a verbose WhatWeb scan."""
+    target = "https://ostorlab.co:443"
+
+    keys = {
+        cache.make_key(target, "all", "verbose"),
+        cache.make_key(target, "all", "lean"),
+        cache.make_key(target, "all", "verbose", "native"),
+        cache.make_key(target, "lean", "verbose"),
+    }
+
+    assert len(keys) == 4
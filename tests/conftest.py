@@ -1,19 +1,93 @@
 """Pytest fixture for the whatweb agent."""
 
-import pytest
 import json
 import pathlib
-from typing import Dict, Union
 import random
+from collections.abc import Iterator
+from typing import Any, Dict, Union
 
+import pytest
 from ostorlab.agent import definitions as agent_definitions
+from ostorlab.agent.message import message as m
 from ostorlab.runtimes import definitions as runtime_definitions
 from ostorlab.utils import definitions
-from ostorlab.agent.message import message as m
+from pytest_mock import plugin
 
+from agent import definitions as agent_defs
+from agent import signatures
 from agent import whatweb_agent
 
 
+def pytest_configure(config: pytest.Config) -> None:
+    """Registers the marker of the tests building the agent image, CI deselects them with `-m "not docker"`."""
+    config.addinivalue_line("markers", "docker: test requiring a Docker installation.")
+
+
+class FakeRedisSets:
+    """Minimal Redis client storing sets in a dict, counting the round trips."""
+
+    def __init__(self) -> None:
+        self.sets: dict[bytes | str, set[bytes]] = {}
+        self.round_trips = 0
+
+    def _encode(self, member: bytes | str) -> bytes:
+        return member.encode() if isinstance(member, str) else member
+
+    def sadd(self, name: bytes | str, *members: bytes | str) -> int:
+        self.round_trips += 1
+        return self._sadd(name, *members)
+
+    def _sadd(self, name: bytes | str, *members: bytes | str) -> int:
+        stored = self.sets.setdefault(name, set())
+        added = {self._encode(member) for member in members} - stored
+        stored.update(added)
+        return len(added)
+
+    def sismember(self, name: bytes | str, member: bytes | str) -> bool:
+        self.round_trips += 1
+        return self._encode(member) in self.sets.get(name, set())
+
+    def sscan_iter(self, name: bytes | str, count: int) -> Iterator[bytes]:
+        self.round_trips += 1
+        return iter(list(self.sets.get(name, set())))
+
+    def pipeline(self, transaction: bool = True) -> "FakeRedisPipeline":
+        return FakeRedisPipeline(self)
+
+
+class FakeRedisPipeline:
+    """Pipeline of the fake Redis client, all the queued commands cost a single round trip."""
+
+    def __init__(self, client: FakeRedisSets) -> None:
+        self._client = client
+        self._commands: list[tuple[str, tuple[Any, ...]]] = []
+
+    def sadd(self, name: bytes | str, *members: bytes | str) -> None:
+        self._commands.append(("sadd", (name, *members)))
+
+    def sismember(self, name: bytes | str, member: bytes | str) -> None:
+        self._commands.append(("sismember", (name, member)))
+
+    def execute(self) -> list[Any]:
+        self._client.round_trips += 1
+        results: list[Any] = []
+        for command, arguments in self._commands:
+            if command == "sadd":
+                results.append(self._client._sadd(*arguments))
+            else:
+                name, member = arguments
+                results.append(
+                    self._client._encode(member) in self._client.sets.get(name, set())
+                )
+        return results
+
+
+@pytest.fixture
+def fake_redis_sets() -> FakeRedisSets:
+    """Fake Redis client holding sets for testing purposes."""
+    return FakeRedisSets()
+
+
 @pytest.fixture
 def domain_msg() -> m.Message:
     """Creates a dummy message of type v3.asset.domain_name for testing purposes."""
@@ -152,6 +226,36 @@ def whatweb_agent_with_scope_arg(
         return whatweb_agent.AgentWhatWeb(agent_definition, agent_settings)
 
 
+@pytest.fixture(scope="function")
+def whatweb_agent_with_scope_domains(
+    agent_persist_mock: dict[str | bytes, str | bytes],
+) -> whatweb_agent.AgentWhatWeb:
+    """WhatWeb Agent fixture with a scope of domains, suffixes and regular expressions."""
+    del agent_persist_mock
+    with (pathlib.Path(__file__).parent.parent / "ostorlab.yaml").open() as yaml_o:
+        agent_definition = agent_definitions.AgentDefinition.from_yaml(yaml_o)
+        agent_settings = runtime_definitions.AgentSettings(
+            key="whatweb",
+            redis_url="redis://redis",
+            args=[
+                definitions.Arg(
+                    name="schema", type="string", value=json.dumps("https").encode()
+                ),
+                definitions.Arg(
+                    name="port", type="number", value=json.dumps(443).encode()
+                ),
+                definitions.Arg(
+                    name="scope_domains",
+                    type="array",
+                    value=json.dumps(
+                        ["example.com", "*.ostorlab.co", r"re:.*\.test$"]
+                    ).encode(),
+                ),
+            ],
+        )
+        return whatweb_agent.AgentWhatWeb(agent_definition, agent_settings)
+
+
 @pytest.fixture()
 def test_agent() -> whatweb_agent.AgentWhatWeb:
     """WhatWeb Agent fixture for testing purposes."""
@@ -188,6 +292,14 @@ def scan_message_ipv6_with_mask64() -> m.Message:
     return m.Message.from_data(selector, data=msg_data)
 
 
+@pytest.fixture()
+def scan_message_ipv6_with_mask125() -> m.Message:
+    """Creates a message of type v3.asset.ip.v6 with a /125 mask for testing purposes."""
+    selector = "v3.asset.ip.v6"
+    msg_data = {"host": "2001:db8::", "mask": "125", "version": 6}
+    return m.Message.from_data(selector, data=msg_data)
+
+
 @pytest.fixture()
 def scan_message_ipv6_with_mask112() -> m.Message:
     """Creates a message of type v3.asset.ip.v6 to be used by the agent for testing purposes."""
@@ -235,3 +347,479 @@ def whatweb_agent_with_mcp_server(
             ],
         )
         return whatweb_agent.AgentWhatWeb(agent_definition, agent_settings)
+
+
+@pytest.fixture(scope="function")
+def whatweb_agent_with_worker_pool(
+    agent_persist_mock: dict[str | bytes, str | bytes],
+) -> whatweb_agent.AgentWhatWeb:
+    """WhatWeb Agent fixture with pre-forked workers enabled for testing purposes."""
+    del agent_persist_mock
+    with (pathlib.Path(__file__).parent.parent / "ostorlab.yaml").open() as yaml_o:
+        agent_definition = agent_definitions.AgentDefinition.from_yaml(yaml_o)
+        agent_settings = runtime_definitions.AgentSettings(
+            key="whatweb",
+            bus_url="NA",
+            bus_exchange_topic="NA",
+            redis_url="redis://redis",
+            healthcheck_port=random.randint(4000, 5000),
+            args=[
+                definitions.Arg(
+                    name="schema", type="string", value=json.dumps("https").encode()
+                ),
+                definitions.Arg(
+                    name="port", type="number", value=json.dumps(443).encode()
+                ),
+                definitions.Arg(
+                    name="worker_pool_size",
+                    type="number",
+                    value=json.dumps(2).encode(),
+                ),
+            ],
+        )
+        return whatweb_agent.AgentWhatWeb(agent_definition, agent_settings)
+
+
+@pytest.fixture(scope="function")
+def whatweb_agent_with_ip_batch(
+    agent_persist_mock: dict[str | bytes, str | bytes],
+) -> whatweb_agent.AgentWhatWeb:
+    """WhatWeb Agent fixture scanning IP ranges in batches for testing purposes."""
+    del agent_persist_mock
+    with (pathlib.Path(__file__).parent.parent / "ostorlab.yaml").open() as yaml_o:
+        agent_definition = agent_definitions.AgentDefinition.from_yaml(yaml_o)
+        agent_settings = runtime_definitions.AgentSettings(
+            key="whatweb",
+            bus_url="NA",
+            bus_exchange_topic="NA",
+            redis_url="redis://redis",
+            healthcheck_port=random.randint(4000, 5000),
+            args=[
+                definitions.Arg(
+                    name="schema", type="string", value=json.dumps("http").encode()
+                ),
+                definitions.Arg(
+                    name="port", type="number", value=json.dumps(80).encode()
+                ),
+                definitions.Arg(
+                    name="ip_batch_size",
+                    type="number",
+                    value=json.dumps(100).encode(),
+                ),
+            ],
+        )
+        return whatweb_agent.AgentWhatWeb(agent_definition, agent_settings)
+
+
+@pytest.fixture()
+def scan_message_ipv4_with_mask24() -> m.Message:
+    """Creates a message of type v3.asset.ip.v4 with a /24 mask for testing purposes."""
+    selector = "v3.asset.ip.v4"
+    msg_data = {"host": "192.168.0.0", "mask": "24", "version": 4}
+    return m.Message.from_data(selector, data=msg_data)
+
+
+@pytest.fixture(scope="function")
+def whatweb_agent_with_concurrency(
+    agent_persist_mock: dict[str | bytes, str | bytes],
+) -> whatweb_agent.AgentWhatWeb:
+    """WhatWeb Agent fixture scanning targets concurrently for testing purposes."""
+    del agent_persist_mock
+    with (pathlib.Path(__file__).parent.parent / "ostorlab.yaml").open() as yaml_o:
+        agent_definition = agent_definitions.AgentDefinition.from_yaml(yaml_o)
+        agent_settings = runtime_definitions.AgentSettings(
+            key="whatweb",
+            bus_url="NA",
+            bus_exchange_topic="NA",
+            redis_url="redis://redis",
+            healthcheck_port=random.randint(4000, 5000),
+            args=[
+                definitions.Arg(
+                    name="schema", type="string", value=json.dumps("http").encode()
+                ),
+                definitions.Arg(
+                    name="port", type="number", value=json.dumps(80).encode()
+                ),
+                definitions.Arg(
+                    name="max_concurrency",
+                    type="number",
+                    value=json.dumps(3).encode(),
+                ),
+            ],
+        )
+        return whatweb_agent.AgentWhatWeb(agent_definition, agent_settings)
+
+
+@pytest.fixture()
+def scan_message_ipv4_with_mask29() -> m.Message:
+    """Creates a message of type v3.asset.ip.v4 with a /29 mask for testing purposes."""
+    selector = "v3.asset.ip.v4"
+    msg_data = {"host": "192.168.0.0", "mask": "29", "version": 4}
+    return m.Message.from_data(selector, data=msg_data)
+
+
+@pytest.fixture(scope="function")
+def whatweb_agent_with_asyncio_engine(
+    agent_persist_mock: dict[str | bytes, str | bytes],
+) -> whatweb_agent.AgentWhatWeb:
+    """WhatWeb Agent fixture driving concurrent scans from an event loop for testing purposes."""
+    del agent_persist_mock
+    with (pathlib.Path(__file__).parent.parent / "ostorlab.yaml").open() as yaml_o:
+        agent_definition = agent_definitions.AgentDefinition.from_yaml(yaml_o)
+        agent_settings = runtime_definitions.AgentSettings(
+            key="whatweb",
+            bus_url="NA",
+            bus_exchange_topic="NA",
+            redis_url="redis://redis",
+            healthcheck_port=random.randint(4000, 5000),
+            args=[
+                definitions.Arg(
+                    name="schema", type="string", value=json.dumps("http").encode()
+                ),
+                definitions.Arg(
+                    name="port", type="number", value=json.dumps(80).encode()
+                ),
+                definitions.Arg(
+                    name="max_concurrency",
+                    type="number",
+                    value=json.dumps(3).encode(),
+                ),
+                definitions.Arg(
+                    name="scan_engine",
+                    type="string",
+                    value=json.dumps("asyncio").encode(),
+                ),
+            ],
+        )
+        return whatweb_agent.AgentWhatWeb(agent_definition, agent_settings)
+
+
+@pytest.fixture(scope="function")
+def agent_settings_with_asyncio_engine_and_stream_output() -> (
+    runtime_definitions.AgentSettings
+):
+    """Settings of a WhatWeb Agent asking the asyncio engine to stream the WhatWeb log for testing purposes."""
+    return runtime_definitions.AgentSettings(
+        key="whatweb",
+        bus_url="NA",
+        bus_exchange_topic="NA",
+        redis_url="redis://redis",
+        healthcheck_port=random.randint(4000, 5000),
+        args=[
+            definitions.Arg(
+                name="schema", type="string", value=json.dumps("http").encode()
+            ),
+            definitions.Arg(name="port", type="number", value=json.dumps(80).encode()),
+            definitions.Arg(
+                name="max_concurrency",
+                type="number",
+                value=json.dumps(3).encode(),
+            ),
+            definitions.Arg(
+                name="scan_engine",
+                type="string",
+                value=json.dumps("asyncio").encode(),
+            ),
+            definitions.Arg(
+                name="stream_output",
+                type="boolean",
+                value=json.dumps(True).encode(),
+            ),
+        ],
+    )
+
+
+@pytest.fixture(scope="function")
+def whatweb_agent_with_stream_output(
+    agent_persist_mock: dict[str | bytes, str | bytes],
+) -> whatweb_agent.AgentWhatWeb:
+    """WhatWeb Agent fixture streaming the WhatWeb log through a pipe for testing purposes."""
+    del agent_persist_mock
+    with (pathlib.Path(__file__).parent.parent / "ostorlab.yaml").open() as yaml_o:
+        agent_definition = agent_definitions.AgentDefinition.from_yaml(yaml_o)
+        agent_settings = runtime_definitions.AgentSettings(
+            key="whatweb",
+            bus_url="NA",
+            bus_exchange_topic="NA",
+            redis_url="redis://redis",
+            healthcheck_port=random.randint(4000, 5000),
+            args=[
+                definitions.Arg(
+                    name="schema", type="string", value=json.dumps("https").encode()
+                ),
+                definitions.Arg(
+                    name="port", type="number", value=json.dumps(443).encode()
+                ),
+                definitions.Arg(
+                    name="stream_output",
+                    type="boolean",
+                    value=json.dumps(True).encode(),
+                ),
+            ],
+        )
+        return whatweb_agent.AgentWhatWeb(agent_definition, agent_settings)
+
+
+@pytest.fixture
+def whatweb_agent_with_lean_plugin_profile(
+    agent_persist_mock: dict[str | bytes, str | bytes],
+) -> whatweb_agent.AgentWhatWeb:
+    """WhatWeb Agent fixture running the lean plugin profile for testing purposes."""
+    del agent_persist_mock
+    with (pathlib.Path(__file__).parent.parent / "ostorlab.yaml").open() as yaml_o:
+        agent_definition = agent_definitions.AgentDefinition.from_yaml(yaml_o)
+        agent_settings = runtime_definitions.AgentSettings(
+            key="whatweb",
+            bus_url="NA",
+            bus_exchange_topic="NA",
+            redis_url="redis://redis",
+            healthcheck_port=random.randint(4000, 5000),
+            args=[
+                definitions.Arg(
+                    name="plugin_profile",
+                    type="string",
+                    value=json.dumps("lean").encode(),
+                ),
+            ],
+        )
+        return whatweb_agent.AgentWhatWeb(agent_definition, agent_settings)
+
+
+@pytest.fixture
+def whatweb_agent_with_lean_log_format(
+    agent_persist_mock: dict[str | bytes, str | bytes],
+) -> whatweb_agent.AgentWhatWeb:
+    """WhatWeb Agent fixture reading the lean WhatWeb log for testing purposes."""
+    del agent_persist_mock
+    with (pathlib.Path(__file__).parent.parent / "ostorlab.yaml").open() as yaml_o:
+        agent_definition = agent_definitions.AgentDefinition.from_yaml(yaml_o)
+        agent_settings = runtime_definitions.AgentSettings(
+            key="whatweb",
+            bus_url="NA",
+            bus_exchange_topic="NA",
+            redis_url="redis://redis",
+            healthcheck_port=random.randint(4000, 5000),
+            args=[
+                definitions.Arg(
+                    name="log_format",
+                    type="string",
+                    value=json.dumps("lean").encode(),
+                ),
+            ],
+        )
+        return whatweb_agent.AgentWhatWeb(agent_definition, agent_settings)
+
+
+@pytest.fixture
+def whatweb_agent_with_dedup_local_filter(
+    agent_persist_mock: dict[str | bytes, str | bytes],
+    fake_redis_sets: FakeRedisSets,
+    mocker: plugin.MockerFixture,
+) -> whatweb_agent.AgentWhatWeb:
+    """WhatWeb Agent fixture deduplicating the targets with the local dedup front for testing purposes."""
+    del agent_persist_mock
+    mocker.patch("redis.Redis.from_url", return_value=fake_redis_sets)
+    with (pathlib.Path(__file__).parent.parent / "ostorlab.yaml").open() as yaml_o:
+        agent_definition = agent_definitions.AgentDefinition.from_yaml(yaml_o)
+        agent_settings = runtime_definitions.AgentSettings(
+            key="whatweb",
+            bus_url="NA",
+            bus_exchange_topic="NA",
+            redis_url="redis://redis",
+            healthcheck_port=random.randint(4000, 5000),
+            args=[
+                definitions.Arg(
+                    name="dedup_local_filter",
+                    type="boolean",
+                    value=json.dumps(True).encode(),
+                ),
+                definitions.Arg(
+                    name="dedup_filter_capacity",
+                    type="number",
+                    value=json.dumps(1000).encode(),
+                ),
+            ],
+        )
+        return whatweb_agent.AgentWhatWeb(agent_definition, agent_settings)
+
+
+@pytest.fixture
+def whatweb_agent_with_liveness_prefilter(
+    agent_persist_mock: dict[str | bytes, str | bytes],
+) -> whatweb_agent.AgentWhatWeb:
+    """WhatWeb Agent fixture probing IP targets before scanning them for testing purposes."""
+    del agent_persist_mock
+    with (pathlib.Path(__file__).parent.parent / "ostorlab.yaml").open() as yaml_o:
+        agent_definition = agent_definitions.AgentDefinition.from_yaml(yaml_o)
+        agent_settings = runtime_definitions.AgentSettings(
+            key="whatweb",
+            bus_url="NA",
+            bus_exchange_topic="NA",
+            redis_url="redis://redis",
+            healthcheck_port=random.randint(4000, 5000),
+            args=[
+                definitions.Arg(
+                    name="schema", type="string", value=json.dumps("http").encode()
+                ),
+                definitions.Arg(
+                    name="port", type="number", value=json.dumps(80).encode()
+                ),
+                definitions.Arg(
+                    name="liveness_prefilter",
+                    type="boolean",
+                    value=json.dumps(True).encode(),
+                ),
+                definitions.Arg(
+                    name="liveness_concurrency",
+                    type="number",
+                    value=json.dumps(4).encode(),
+                ),
+            ],
+        )
+        return whatweb_agent.AgentWhatWeb(agent_definition, agent_settings)
+
+
+@pytest.fixture
+def whatweb_agent_with_cache(
+    agent_persist_mock: dict[str | bytes, str | bytes],
+) -> whatweb_agent.AgentWhatWeb:
+    """WhatWeb Agent fixture caching the scan results in process for testing purposes."""
+    del agent_persist_mock
+    with (pathlib.Path(__file__).parent.parent / "ostorlab.yaml").open() as yaml_o:
+        agent_definition = agent_definitions.AgentDefinition.from_yaml(yaml_o)
+        agent_settings = runtime_definitions.AgentSettings(
+            key="whatweb",
+            bus_url="NA",
+            bus_exchange_topic="NA",
+            redis_url="redis://redis",
+            healthcheck_port=random.randint(4000, 5000),
+            args=[
+                definitions.Arg(
+                    name="cache_ttl", type="number", value=json.dumps(60).encode()
+                ),
+            ],
+        )
+        return whatweb_agent.AgentWhatWeb(agent_definition, agent_settings)
+
+
+@pytest.fixture
+def whatweb_agent_with_native_engine(
+    agent_persist_mock: dict[str | bytes, str | bytes],
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> whatweb_agent.AgentWhatWeb:
+    """WhatWeb Agent fixture fingerprinting with the native matcher on the repository plugins."""
+    del agent_persist_mock
+    signatures_path = tmp_path / "signatures.json"
+    plugins_directory = pathlib.Path(__file__).parent.parent / "plugins"
+    signatures.main([str(plugins_directory), str(signatures_path)])
+    monkeypatch.setattr(agent_defs, "NATIVE_SIGNATURES_PATH", str(signatures_path))
+    with (pathlib.Path(__file__).parent.parent / "ostorlab.yaml").open() as yaml_o:
+        agent_definition = agent_definitions.AgentDefinition.from_yaml(yaml_o)
+        agent_settings = runtime_definitions.AgentSettings(
+            key="whatweb",
+            bus_url="NA",
+            bus_exchange_topic="NA",
+            redis_url="redis://redis",
+            healthcheck_port=random.randint(4000, 5000),
+            args=[
+                definitions.Arg(
+                    name="fingerprint_engine",
+                    type="string",
+                    value=json.dumps("native").encode(),
+                ),
+            ],
+        )
+        return whatweb_agent.AgentWhatWeb(agent_definition, agent_settings)
+
+
+@pytest.fixture
+def whatweb_agent_with_subnet_rate(
+    agent_persist_mock: dict[str | bytes, str | bytes],
+) -> whatweb_agent.AgentWhatWeb:
+    """WhatWeb Agent fixture limiting the scans started per subnet for testing purposes."""
+    del agent_persist_mock
+    with (pathlib.Path(__file__).parent.parent / "ostorlab.yaml").open() as yaml_o:
+        agent_definition = agent_definitions.AgentDefinition.from_yaml(yaml_o)
+        agent_settings = runtime_definitions.AgentSettings(
+            key="whatweb",
+            bus_url="NA",
+            bus_exchange_topic="NA",
+            redis_url="redis://redis",
+            healthcheck_port=random.randint(4000, 5000),
+            args=[
+                definitions.Arg(
+                    name="schema", type="string", value=json.dumps("http").encode()
+                ),
+                definitions.Arg(
+                    name="port", type="number", value=json.dumps(80).encode()
+                ),
+                definitions.Arg(
+                    name="max_concurrency",
+                    type="number",
+                    value=json.dumps(3).encode(),
+                ),
+                definitions.Arg(
+                    name="rate_per_subnet",
+                    type="number",
+                    value=json.dumps(20).encode(),
+                ),
+            ],
+        )
+        return whatweb_agent.AgentWhatWeb(agent_definition, agent_settings)
+
+
+@pytest.fixture
+def whatweb_agent_with_adaptive_scan_timeout(
+    agent_persist_mock: dict[str | bytes, str | bytes],
+) -> whatweb_agent.AgentWhatWeb:
+    """WhatWeb Agent fixture killing the scans at an adaptive deadline for testing purposes."""
+    del agent_persist_mock
+    with (pathlib.Path(__file__).parent.parent / "ostorlab.yaml").open() as yaml_o:
+        agent_definition = agent_definitions.AgentDefinition.from_yaml(yaml_o)
+        agent_settings = runtime_definitions.AgentSettings(
+            key="whatweb",
+            bus_url="NA",
+            bus_exchange_topic="NA",
+            redis_url="redis://redis",
+            healthcheck_port=random.randint(4000, 5000),
+            args=[
+                definitions.Arg(
+                    name="scan_timeout", type="number", value=json.dumps(30).encode()
+                ),
+                definitions.Arg(
+                    name="adaptive_scan_timeout",
+                    type="boolean",
+                    value=json.dumps(True).encode(),
+                ),
+                definitions.Arg(
+                    name="cache_ttl", type="number", value=json.dumps(60).encode()
+                ),
+            ],
+        )
+        return whatweb_agent.AgentWhatWeb(agent_definition, agent_settings)
+
+
+@pytest.fixture
+def whatweb_agent_with_coalesced_reports(
+    agent_persist_mock: dict[str | bytes, str | bytes],
+) -> whatweb_agent.AgentWhatWeb:
+    """WhatWeb Agent fixture reporting all the fingerprints of a target at once for testing purposes."""
+    del agent_persist_mock
+    with (pathlib.Path(__file__).parent.parent / "ostorlab.yaml").open() as yaml_o:
+        agent_definition = agent_definitions.AgentDefinition.from_yaml(yaml_o)
+        agent_settings = runtime_definitions.AgentSettings(
+            key="whatweb",
+            bus_url="NA",
+            bus_exchange_topic="NA",
+            redis_url="redis://redis",
+            healthcheck_port=random.randint(4000, 5000),
+            args=[
+                definitions.Arg(
+                    name="coalesce_reports",
+                    type="boolean",
+                    value=json.dumps(True).encode(),
+                ),
+            ],
+        )
+        return whatweb_agent.AgentWhatWeb(agent_definition, agent_settings)
@@ -0,0 +1,60 @@
+"""Smoke test of the agent image, runs a lean scan with the pinned WhatWeb release."""
+
+import json
+import pathlib
+import shutil
+import subprocess
+import uuid
+from collections.abc import Iterator
+
+import pytest
+
+from agent import log_parser
+
+REPOSITORY_DIR = pathlib.Path(__file__).parent.parent
+
+# Serves the image's own files and scans them, the lean log is written to the container's standard output.
+LEAN_SCAN_SCRIPT = (
+    "python -m http.server 8000 --bind 127.0.0.1 --directory /app >/dev/null 2>&1 & "
+    "sleep 2 && "
+    "cd /WhatWeb && "
+    "./whatweb --plugins=-Title --log-lean-json=/tmp/lean.json http://127.0.0.1:8000/ >/dev/null && "
+    "cat /tmp/lean.json"
+)
+
+pytestmark = [
+    pytest.mark.docker,
+    pytest.mark.skipif(shutil.which("docker") is None, reason="Docker is required."),
+]
+
+
+@pytest.fixture(scope="module")
+def agent_image() -> Iterator[str]:
+    """Builds the agent image and removes it once the tests are done."""
+    tag = f"agent_whatweb_smoke:{uuid.uuid4().hex[:12]}"
+    subprocess.run(["docker", "build", "-t", tag, str(REPOSITORY_DIR)], check=True)
+    yield tag
+    subprocess.run(["docker", "rmi", "-f", tag], check=False)
+
+
+def testAgentImage_whenLeanLogFormatIsUsed_writesLeanRecords(agent_image: str) -> None:
+    """Test the lean logger loads in the pinned WhatWeb and writes records the agent parses."""
+    completed = subprocess.run(
+        ["docker", "run", "--rm", agent_image, "sh", "-c", LEAN_SCAN_SCRIPT],
+        check=True,
+        capture_output=True,
+        timeout=300,
+    )
+
+    lines = [line for line in completed.stdout.splitlines() if line.strip() != b""]
+    assert len(lines) > 0
+    url, status, plugins = json.loads(lines[0])
+    assert url == "http://127.0.0.1:8000/"
+    assert status == 200
+    # Lean records hold one result object per plugin, the verbose log holds a list of results.
+    assert all(isinstance(result, dict) for _, result in plugins)
+    assert "Title" not in {name for name, _ in plugins}
+    assert any(
+        plugin_result.name == "HTTPServer"
+        for plugin_result in log_parser.iter_plugin_results(lines[0])
+    )
@@ -0,0 +1,58 @@
+"""Unit tests for the adaptive scan deadline."""
+
+import pytest
+
+from agent import deadline
+
+
+def testAdaptiveDeadline_whenTooFewScansObserved_returnsMaximum() -> None:
+    """Test the deadline does not adapt before enough scans were observed."""
+    scan_deadline = deadline.AdaptiveDeadline(maximum=60, min_samples=3)
+
+    scan_deadline.observe(1)
+    scan_deadline.observe(1)
+
+    assert scan_deadline.current() == 60
+
+
+def testAdaptiveDeadline_whenScansObserved_returnsPercentileTimesFactor() -> None:
+    """Test the deadline is the nearest-rank percentile of the durations times the factor."""
+    scan_deadline = deadline.AdaptiveDeadline(
+        maximum=60, percentile=90, factor=2, min_samples=1
+    )
+
+    for duration in range(1, 11):
+        scan_deadline.observe(duration)
+
+    assert scan_deadline.current() == 18
+
+
+def testAdaptiveDeadline_whenPercentileIsOutOfBounds_isClamped() -> None:
+    """Test the deadline stays between its minimum and its maximum."""
+    fast = deadline.AdaptiveDeadline(maximum=60, minimum=10, min_samples=1)
+    slow = deadline.AdaptiveDeadline(maximum=60, minimum=10, min_samples=1)
+
+    fast.observe(0.1)
+    slow.observe(100)
+
+    assert fast.current() == 10
+    assert slow.current() == 60
+
+
+def testAdaptiveDeadline_whenWindowIsFull_forgetsTheOldestScans() -> None:
+    """Test the deadline follows the latency of the most recent scans."""
+    scan_deadline = deadline.AdaptiveDeadline(
+        maximum=60, factor=1, window=2, min_samples=1
+    )
+
+    scan_deadline.observe(30)
+    scan_deadline.observe(2)
+    scan_deadline.observe(2)
+
+    assert scan_deadline.current() == 2
+
+
+def testAdaptiveDeadline_whenMaximumIsNotPositive_raisesValueError() -> None:
+    """Test a deadline must allow the scans to run."""
+    with pytest.raises(ValueError):
+        deadline.AdaptiveDeadline(maximum=0)
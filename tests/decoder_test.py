@@ -0,0 +1,65 @@
+"""Unit tests for the WhatWeb log fingerprint decoder."""
+
+import json
+import pathlib
+
+import pytest
+
+from agent import decoder
+
+TESTS_DIR = pathlib.Path(__file__).parent
+
+
+def testDecodeLine_whenPluginsHaveVersions_yieldsOneFingerprintPerVersion() -> None:
+    """Test every version of a plugin is a fingerprint and a plugin without version has a None version."""
+    line = (
+        b'["https://ostorlab.co",200,[["jQuery",[{"version":["3.5.1","3.6.0"]}]],'
+        b'["HTTPServer",[{"string":"nginx/1.18.0"}]],["Title",[{"string":"Ostorlab"}]]]]\n'
+    )
+
+    fingerprints = list(decoder.decode_line(line))
+
+    assert fingerprints == [
+        decoder.Fingerprint("jQuery", "3.5.1", "JAVASCRIPT_LIBRARY"),
+        decoder.Fingerprint("jQuery", "3.6.0", "JAVASCRIPT_LIBRARY"),
+        decoder.Fingerprint("nginx/1.18.0", None, "BACKEND_COMPONENT"),
+    ]
+
+
+def testDecodeLine_whenVersionIsNotAString_convertsIt() -> None:
+    """Test the versions of the records are strings."""
+    line = b'["https://ostorlab.co",200,[["PHP",[{"version":7}]]]]'
+
+    assert list(decoder.decode_line(line)) == [
+        decoder.Fingerprint("PHP", "7", "BACKEND_COMPONENT")
+    ]
+
+
+def testDecodeOutput_whenIpOutput_yieldsTheFingerprintsOfEveryLine() -> None:
+    """Test the fingerprints of all the lines of a log are decoded, blank lines are skipped."""
+    lines = (TESTS_DIR / "ip_output.json").read_bytes().splitlines(keepends=True)
+
+    fingerprints = list(decoder.decode_output([*lines, b"\n"]))
+
+    assert (
+        decoder.Fingerprint("lighttpd", "1.4.28", "BACKEND_COMPONENT") in fingerprints
+    )
+    assert len(fingerprints) == sum(
+        len(list(decoder.decode_line(line))) for line in lines
+    )
+
+
+def testDecodeOutput_whenLineIsNotValidJson_raisesJSONDecodeError() -> None:
+    """Test a malformed line fails like the json module."""
+    with pytest.raises(json.JSONDecodeError):
+        list(decoder.decode_output([b'["https://ostorlab.co",200,[["nginx"']))
+
+
+def testFingerprint_isSlottedAndHashable() -> None:
+    """Test the records hold no instance dict and can be deduplicated."""
+    fingerprint = decoder.Fingerprint("nginx", None, "BACKEND_COMPONENT")
+
+    assert hasattr(fingerprint, "__dict__") is False
+    assert (
+        len({fingerprint, decoder.Fingerprint("nginx", None, "BACKEND_COMPONENT")}) == 1
+    )
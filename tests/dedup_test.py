@@ -0,0 +1,238 @@
+"""Unit tests for the local dedup front of the Redis sets."""
+
+import ipaddress
+import threading
+import time
+from typing import Any
+
+import pytest
+from pytest_mock import plugin
+
+from agent import dedup
+from agent import metrics
+from tests import conftest
+
+
+def testBloomFilter_whenMemberWasAdded_containsIt() -> None:
+    """Test added members are always found and most other members are not."""
+    bloom = dedup.BloomFilter(capacity=1000, error_rate=0.01)
+    members = [f"https_{index}.ostorlab.co_443".encode() for index in range(1000)]
+    for member in members:
+        bloom.add(member)
+
+    false_positives = sum(
+        f"https_{index}.example.com_443".encode() in bloom for index in range(10000)
+    )
+
+    assert all(member in bloom for member in members)
+    assert false_positives < 300
+
+
+def testBloomFilter_whenErrorRateIsInvalid_raisesValueError() -> None:
+    """Test the false positive rate must be a probability."""
+    with pytest.raises(ValueError):
+        dedup.BloomFilter(capacity=10, error_rate=1)
+
+
+def testDedupFront_whenMemberIsRepeated_answersFromTheLocalFilters(
+    fake_redis_sets: Any,
+) -> None:
+    """Test new members are added to Redis and repeated members are answered by the LRU without Redis."""
+    front = dedup.DedupFront(fake_redis_sets, "assets", capacity=1000)
+    front.load()
+
+    first = [front.add(f"https_{index}.ostorlab.co_443") for index in range(10)]
+    second = [front.add(f"https_{index}.ostorlab.co_443") for index in range(10)]
+
+    assert first == [True] * 10
+    assert second == [False] * 10
+    assert fake_redis_sets.sets["assets"] == {
+        f"https_{index}.ostorlab.co_443".encode() for index in range(10)
+    }
+    assert front.stats.redis_lookups == 10
+    assert front.stats.lru_hits == 10
+    assert front.stats.redis_avoided_ratio == 0.5
+    # The initial load, then one SADD per new member.
+    assert fake_redis_sets.round_trips == 1 + 10
+
+
+def testDedupFront_whenMemberWasAddedByAnotherReplica_isNotNew(
+    fake_redis_sets: Any,
+) -> None:
+    """Test a member added to Redis after the Bloom filter was loaded is a Bloom miss answered by Redis."""
+    front = dedup.DedupFront(fake_redis_sets, "assets", capacity=1000)
+    front.load()
+    fake_redis_sets.sets["assets"] = {b"https_ostorlab.co_443"}
+
+    assert front.add("https_ostorlab.co_443") is False
+    assert front.stats.redis_lookups == 1
+
+
+def testDedupFront_whenMemberIsInTheBloomFilter_confirmsItWithRedis(
+    fake_redis_sets: Any,
+) -> None:
+    """Test the Bloom filter hits are answered by Redis, only the LRU answers without a round trip."""
+    fake_redis_sets.sets["assets"] = {b"https_ostorlab.co_443"}
+    front = dedup.DedupFront(fake_redis_sets, "assets", capacity=1000, lru_size=1)
+    front.load()
+
+    assert front.add("https_ostorlab.co_443") is False
+    assert front.add("https_example.com_443") is True
+    # Evicted from the LRU, still in the Bloom filter.
+    assert front.add("https_ostorlab.co_443") is False
+    assert front.stats.bloom_hits == 2
+    assert front.stats.bloom_false_positives == 0
+    assert front.stats.redis_lookups == 3
+
+
+def testDedupFront_whenBloomFilterHasAFalsePositive_memberIsNew(
+    fake_redis_sets: Any,
+) -> None:
+    """Test a member the Bloom filter wrongly holds is still found new by Redis and scanned."""
+    front = dedup.DedupFront(fake_redis_sets, "assets", capacity=1000)
+    front.load()
+    front._bloom.add(b"https_ostorlab.co_443")
+
+    assert front.add("https_ostorlab.co_443") is True
+    assert front.stats.bloom_false_positives == 1
+
+
+def testDedupFront_whileRedisAnswers_doesNotBlockTheOtherLookups(
+    fake_redis_sets: Any, mocker: plugin.MockerFixture
+) -> None:
+    """Test the lock of the front is not held during a Redis round trip."""
+    front = dedup.DedupFront(fake_redis_sets, "assets", capacity=1000)
+    front.load()
+    front.add("https_ostorlab.co_443")
+    answering = threading.Event()
+    release = threading.Event()
+    execute = conftest.FakeRedisPipeline.execute
+
+    def slow_execute(pipeline: conftest.FakeRedisPipeline) -> list[Any]:
+        answering.set()
+        release.wait(5)
+        return execute(pipeline)
+
+    mocker.patch.object(conftest.FakeRedisPipeline, "execute", slow_execute)
+    lookup = threading.Thread(target=front.add, args=("https_example.com_443",))
+    lookup.start()
+    answering.wait(5)
+    started_at = time.monotonic()
+    seen = front.add("https_ostorlab.co_443")
+    waited = time.monotonic() - started_at
+    release.set()
+    lookup.join()
+
+    assert seen is False
+    assert waited < 1
+
+
+def testDedupFront_whenLoadingInTheBackground_answersFromRedis(
+    fake_redis_sets: Any,
+) -> None:
+    """Test the first lookup does not wait for the Bloom filter load, Redis answers meanwhile."""
+    fake_redis_sets.sets["assets"] = {b"https_ostorlab.co_443"}
+    front = dedup.DedupFront(fake_redis_sets, "assets", capacity=1000)
+
+    assert front.add("https_ostorlab.co_443") is False
+    assert front.add("https_example.com_443") is True
+
+
+def testDedupFront_whenFlushSizeIsReached_writesTheNewNetworksInOnePipeline(
+    fake_redis_sets: Any,
+) -> None:
+    """Test new networks are written to Redis in pipelined batches."""
+    front = dedup.DedupFront(fake_redis_sets, "ips", capacity=1000, flush_size=4)
+    front.load()
+
+    for index in range(9):
+        front.add_ip_network(
+            ipaddress.ip_network(f"10.0.{index}.0/24"), lambda net: str(net)
+        )
+    front.flush()
+
+    assert fake_redis_sets.sets["ips"] == {
+        f"10.0.{index}.0/24".encode() for index in range(9)
+    }
+    assert front.stats.flushed_members == 9
+
+
+def testDedupFront_whenClosed_writesTheQueuedNetworks(
+    fake_redis_sets: Any,
+) -> None:
+    """Test the networks still queued when the front is closed are written to Redis."""
+    front = dedup.DedupFront(fake_redis_sets, "ips", capacity=1000, flush_interval=60)
+    front.start()
+    front.add_ip_network(ipaddress.ip_network("10.0.0.0/24"), lambda net: str(net))
+
+    front.close()
+
+    assert fake_redis_sets.sets["ips"] == {b"10.0.0.0/24"}
+
+
+def testDedupFront_whenStarted_flushesPeriodically(
+    fake_redis_sets: Any,
+) -> None:
+    """Test a queued network is written by the background flush without any other lookup."""
+    front = dedup.DedupFront(fake_redis_sets, "ips", capacity=1000, flush_interval=0.01)
+    front.start()
+    front.add_ip_network(ipaddress.ip_network("10.0.0.0/24"), lambda net: str(net))
+
+    deadline = time.monotonic() + 5
+    while fake_redis_sets.sets.get("ips") is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    front.close()
+
+    assert fake_redis_sets.sets["ips"] == {b"10.0.0.0/24"}
+
+
+def testDedupFront_whenAnswering_exportsTheRedisAvoidedRatio(
+    fake_redis_sets: Any,
+) -> None:
+    """Test the share of the lookups answered locally is exported as a metric per set."""
+    front = dedup.DedupFront(fake_redis_sets, "ratio_assets", capacity=1000)
+    front.load()
+
+    front.add("a")
+    front.add("a")
+
+    assert metrics.DEDUP_REDIS_AVOIDED_RATIO.value(key="ratio_assets") == 0.5
+
+
+def testDedupFront_whenSupernetWasAdded_networkIsNotNew(
+    fake_redis_sets: Any,
+) -> None:
+    """Test networks follow the semantics of the persist mixin: a network inside a seen network was seen."""
+    fake_redis_sets.sets["ips"] = {b"https_192.168.0.0/16_443"}
+    front = dedup.DedupFront(fake_redis_sets, "ips", capacity=1000)
+    front.load()
+
+    def member(network: ipaddress.IPv4Network | ipaddress.IPv6Network) -> str:
+        return f"https_{network}_443"
+
+    round_trips = fake_redis_sets.round_trips
+    inside = front.add_ip_network(ipaddress.ip_network("192.168.1.0/24"), member)
+
+    assert inside is False
+    # The supernet is only in the Bloom filter, Redis confirms it.
+    assert fake_redis_sets.round_trips == round_trips + 1
+    assert front.add_ip_network(ipaddress.ip_network("10.0.0.0/24"), member) is True
+    assert front.add_ip_network(ipaddress.ip_network("10.0.0.0/28"), member) is False
+
+
+def testDedupFront_whenSupernetWasAddedByAnotherReplica_checksAllSupernetsInOneRoundTrip(
+    fake_redis_sets: Any,
+) -> None:
+    """Test the supernets unknown locally are checked with a single pipelined round trip."""
+    front = dedup.DedupFront(fake_redis_sets, "ips", capacity=1000)
+    front.load()
+    fake_redis_sets.sets["ips"] = {b"192.168.0.0/16"}
+    round_trips = fake_redis_sets.round_trips
+
+    assert (
+        front.add_ip_network(
+            ipaddress.ip_network("192.168.1.0/24"), lambda net: str(net)
+        )
+        is False
+    )
+    assert fake_redis_sets.round_trips - round_trips == 1
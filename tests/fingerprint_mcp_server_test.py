@@ -1,12 +1,16 @@
 """Unittests for fingerprint MCP server."""
 
+import asyncio
 import pathlib
 import subprocess
 
 import pytest
 from pytest_mock import plugin
 
+from agent import cache
 from agent import definitions
+from agent import metrics
+from agent import profiling
 from agent import whatweb_utils
 from agent.mcp_server import tools
 
@@ -127,3 +131,156 @@ def testParseWhatWebOutput_whenStringPresent_usesStringAsName() -> None:
     assert len(fingerprint_dicts) == 1
     assert fingerprint_dicts[0]["name"] == "nginx"
     assert fingerprint_dicts[0]["version"] == "1.18.0"
+
+
+def testFingerprintAsync_whenTargetIsValid_returnsUniqueFingerprints(
+    mocker: plugin.MockerFixture,
+    mock_whatweb_output: bytes,
+) -> None:
+    """Test the async fingerprint tool runs the async scan engine and dedups the fingerprints."""
+    scan_mock = mocker.patch(
+        "agent.whatweb_utils.run_whatweb_scan_async", return_value=mock_whatweb_output
+    )
+
+    result = asyncio.run(tools.fingerprint_async(target="https://ostorlab.co:443"))
+
+    assert scan_mock.call_count == 1
+    assert len(result) == 5
+    assert any(
+        fp.name == "Google-Analytics" and fp.version == "Universal" for fp in result
+    )
+
+
+def testFingerprint_whenPluginProfileIsSet_passesItToTheScan(
+    mocker: plugin.MockerFixture,
+    mock_whatweb_output: bytes,
+) -> None:
+    """Test the fingerprint tool runs the scan with the requested plugin profile."""
+    scan_mock = mocker.patch(
+        "agent.whatweb_utils.run_whatweb_scan", return_value=mock_whatweb_output
+    )
+
+    tools.fingerprint(target="https://ostorlab.co:443", plugin_profile="lean")
+
+    assert scan_mock.call_args.kwargs["plugin_profile"] == "lean"
+
+
+def testFingerprint_whenLogFormatIsSet_passesItToTheScan(
+    mocker: plugin.MockerFixture,
+    mock_whatweb_output: bytes,
+) -> None:
+    """Test the fingerprint tool runs the scan with the configured log format."""
+    scan_mock = mocker.patch(
+        "agent.whatweb_utils.run_whatweb_scan", return_value=mock_whatweb_output
+    )
+    mocker.patch.object(tools, "_log_format", "lean")
+
+    tools.fingerprint(target="https://ostorlab.co:443")
+
+    assert scan_mock.call_args.kwargs["log_format"] == "lean"
+
+
+def testFingerprint_whenCacheIsSet_scansTheTargetOnce(
+    mocker: plugin.MockerFixture,
+    mock_whatweb_output: bytes,
+) -> None:
+    """Test repeated calls for the same target are answered from the cache."""
+    scan_mock = mocker.patch(
+        "agent.whatweb_utils.run_whatweb_scan", return_value=mock_whatweb_output
+    )
+    mocker.patch.object(tools, "_cache", cache.FingerprintCache(ttl=60))
+
+    first_result = tools.fingerprint(target="https://ostorlab.co:443")
+    second_result = tools.fingerprint(target="https://ostorlab.co:443")
+
+    assert scan_mock.call_count == 1
+    assert first_result == second_result
+
+
+def testFingerprintAsync_whenCacheIsSet_scansTheTargetOnceWithTheSameOptions(
+    mocker: plugin.MockerFixture,
+    mock_whatweb_output: bytes,
+) -> None:
+    """Test the async tool shares the cache and the scan options of the sync tool."""
+    scan_mock = mocker.patch(
+        "agent.whatweb_utils.run_whatweb_scan_async", return_value=mock_whatweb_output
+    )
+    mocker.patch.object(tools, "_cache", cache.FingerprintCache(ttl=60))
+    mocker.patch.object(tools, "_scan_timeout", 30)
+
+    first_result = asyncio.run(
+        tools.fingerprint_async(target="https://ostorlab.co:443", plugin_profile="lean")
+    )
+    second_result = tools.fingerprint(
+        target="https://ostorlab.co:443", plugin_profile="lean"
+    )
+
+    assert scan_mock.call_count == 1
+    assert scan_mock.call_args.kwargs == {
+        "plugin_profile": "lean",
+        "timeout": 30,
+        "log_format": definitions.DEFAULT_LOG_FORMAT,
+    }
+    assert first_result == second_result
+
+
+def testFingerprint_whenScanTimesOut_returnsThePartialFingerprintsWithoutCachingThem(
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test a scan killed at its deadline answers with the fingerprints written before it was killed."""
+    scan_mock = mocker.patch(
+        "agent.whatweb_utils.run_whatweb_scan",
+        side_effect=subprocess.TimeoutExpired(
+            cmd="whatweb",
+            timeout=30,
+            output=b'["https://ostorlab.co",301,[["nginx",[{"version":["1.0"]}]]]]\n',
+        ),
+    )
+    mocker.patch.object(tools, "_cache", cache.FingerprintCache(ttl=60))
+    mocker.patch.object(tools, "_scan_timeout", 30)
+
+    first_result = tools.fingerprint(target="https://ostorlab.co:443")
+    tools.fingerprint(target="https://ostorlab.co:443")
+
+    assert scan_mock.call_count == 2
+    assert scan_mock.call_args.kwargs["timeout"] == 30
+    assert [(fp.name, fp.version) for fp in first_result] == [("nginx", "1.0")]
+
+
+def testFingerprintAsync_whenProfilerIsSet_tracesTheTarget(
+    mocker: plugin.MockerFixture,
+    mock_whatweb_output: bytes,
+    tmp_path: pathlib.Path,
+) -> None:
+    """Test every fingerprinted target is traced and profiled when a profiler is set."""
+    mocker.patch(
+        "agent.whatweb_utils.run_whatweb_scan_async", return_value=mock_whatweb_output
+    )
+    profiler = profiling.Profiler(str(tmp_path))
+    mocker.patch.object(tools, "_profiler", profiler)
+
+    result = asyncio.run(tools.fingerprint_async(target="https://ostorlab.co:443"))
+    profiler.close()
+
+    assert len(result) > 0
+    assert [profiled.name for profiled in profiler.slowest] == [
+        "https://ostorlab.co:443"
+    ]
+    assert '"name": "parse"' in (tmp_path / profiling.SPANS_FILE_NAME).read_text()
+
+
+def testFingerprint_whenCalled_timesTheFingerprintStage(
+    mocker: plugin.MockerFixture,
+    mock_whatweb_output: bytes,
+) -> None:
+    """Test the fingerprint stage is timed on every fingerprint, not when the profiler is set."""
+    mocker.patch(
+        "agent.whatweb_utils.run_whatweb_scan", return_value=mock_whatweb_output
+    )
+    mocker.patch.object(tools, "_profiler", None)
+    count = metrics.STAGE_DURATION.count(stage="fingerprint")
+
+    tools.set_profiler(None)
+    tools.fingerprint(target="https://ostorlab.co:443")
+
+    assert metrics.STAGE_DURATION.count(stage="fingerprint") == count + 1
@@ -0,0 +1,117 @@
+"""Unit tests for the TCP liveness prefilter."""
+
+import asyncio
+import socket
+from collections.abc import Iterator
+
+import pytest
+from pytest_mock import plugin
+
+from agent import liveness
+from agent import metrics
+
+
+@pytest.fixture
+def listening_port() -> Iterator[int]:
+    """Port of a local socket accepting connections."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        yield server.getsockname()[1]
+
+
+@pytest.fixture
+def closed_port() -> int:
+    """Port of a local socket that was closed, connections to it are refused."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+        server.bind(("127.0.0.1", 0))
+        return int(server.getsockname()[1])
+
+
+def testIsPortOpen_whenPortIsListening_returnsTrue(listening_port: int) -> None:
+    """Test an accepted connection marks the host as alive."""
+    assert asyncio.run(liveness.is_port_open("127.0.0.1", listening_port, 1)) is True
+
+
+def testIsPortOpen_whenConnectionIsRefused_returnsFalse(closed_port: int) -> None:
+    """Test a refused connection marks the host as dead."""
+    assert asyncio.run(liveness.is_port_open("127.0.0.1", closed_port, 1)) is False
+
+
+def testFilterLiveTargets_whenSomeTargetsAreDead_keepsLiveTargetsInOrder(
+    listening_port: int, closed_port: int
+) -> None:
+    """Test dead targets are dropped across windows and the live ones keep their order."""
+    targets = [
+        ("live-1", listening_port),
+        ("dead-1", closed_port),
+        ("no-port", None),
+        ("dead-2", closed_port),
+        ("live-2", listening_port),
+    ]
+
+    live_targets = list(
+        liveness.filter_live_targets(
+            targets, lambda target: ("127.0.0.1", target[1]), timeout=1, concurrency=2
+        )
+    )
+
+    assert [name for name, _ in live_targets] == ["live-1", "no-port", "live-2"]
+
+
+def testFilterLiveTargets_whenTargetsSpanSeveralWindows_probesThemOnOneEventLoop(
+    listening_port: int, closed_port: int, mocker: plugin.MockerFixture
+) -> None:
+    """Test a single event loop probes every target and the dropped targets are counted."""
+    new_event_loop_spy = mocker.spy(asyncio, "new_event_loop")
+    dropped = metrics.LIVENESS_DROPPED.value()
+    targets = [("live", listening_port), ("dead", closed_port)] * 5
+
+    live_targets = list(
+        liveness.filter_live_targets(
+            targets, lambda target: ("127.0.0.1", target[1]), timeout=1, concurrency=2
+        )
+    )
+
+    assert [name for name, _ in live_targets] == ["live"] * 5
+    assert new_event_loop_spy.call_count == 1
+    assert metrics.LIVENESS_DROPPED.value() == dropped + 5
+
+
+def testFilterLiveTargets_whenConcurrencyIsSet_capsTheConnectsInFlight(
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test the connects in flight never exceed the concurrency."""
+    in_flight = 0
+    max_in_flight = 0
+
+    async def is_port_open(host: str, port: int, timeout: float) -> bool:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.001)
+        in_flight -= 1
+        return True
+
+    mocker.patch.object(liveness, "is_port_open", is_port_open)
+
+    live_targets = list(
+        liveness.filter_live_targets(
+            range(50), lambda target: ("127.0.0.1", 80), timeout=1, concurrency=4
+        )
+    )
+
+    assert live_targets == list(range(50))
+    assert max_in_flight == 4
+
+
+def testFilterLiveTargets_whenClosedEarly_cancelsThePendingProbes(
+    listening_port: int,
+) -> None:
+    """Test closing the generator cancels the probes of the targets that were not consumed."""
+    live_targets = liveness.filter_live_targets(
+        [listening_port] * 10, lambda port: ("127.0.0.1", port), concurrency=4
+    )
+
+    assert next(live_targets) == listening_port
+    live_targets.close()
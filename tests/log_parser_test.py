@@ -0,0 +1,189 @@
+"""Unit tests for the incremental WhatWeb log parser."""
+
+import io
+import json
+import pathlib
+from typing import Any
+
+import pytest
+from pytest_mock import plugin
+
+from agent import definitions
+from agent import log_parser
+
+TESTS_DIR = pathlib.Path(__file__).parent
+
+
+@pytest.fixture(params=["decoded", "incremental"])
+def parsing_mode(
+    request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch
+) -> str:
+    """Runs a test with short lines decoded at once, then with every line parsed incrementally."""
+    if request.param == "incremental":
+        monkeypatch.setattr(log_parser, "INCREMENTAL_LINE_BYTES", 0)
+    return str(request.param)
+
+
+def _decode_line(line: bytes) -> list[log_parser.PluginResult]:
+    """Reference parsing of a line with the whole line decoded."""
+    plugin_results = []
+    for name, results in json.loads(line)[2]:
+        if name in definitions.BLACKLISTED_PLUGINS:
+            continue
+        versions: list[Any] = []
+        string = None
+        for result in results:
+            version = result.get("version", [])
+            versions.extend(version if isinstance(version, list) else [version])
+            string = result.get("string", string)
+        plugin_results.append(log_parser.PluginResult(name, versions, string))
+    return plugin_results
+
+
+@pytest.mark.parametrize(
+    "output_file",
+    ["output.json", "ip_output.json", "sap_output.json", "broadworks_output.json"],
+)
+def testIterPluginResults_whenWhatWebOutput_matchesTheDecodedLine(
+    output_file: str, parsing_mode: str
+) -> None:
+    """Test the incremental parser yields the same results as decoding the whole line."""
+    for line in (TESTS_DIR / output_file).read_bytes().splitlines():
+        plugin_results = list(log_parser.iter_plugin_results(line))
+
+        assert plugin_results == _decode_line(line)
+
+
+def testIterPluginResults_whenPluginIsSkipped_doesNotDecodeItsResults(
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test the payload of a skipped plugin and the skipped keys are stepped over without being decoded."""
+    payload = json.dumps("x" * 1_000_000 + '"]}[{')
+    line = (
+        f'["https://ostorlab.co",200,[["Script",[{{"string":[{payload}]}}]],'
+        f'["nginx",[{{"regexp_compiled":{payload},"version":["1.0"]}}]]]]\n'
+    ).encode()
+    loads_spy = mocker.spy(json, "loads")
+
+    plugin_results = list(log_parser.iter_plugin_results(line))
+
+    assert plugin_results == [log_parser.PluginResult("nginx", ["1.0"])]
+    assert all(len(call.args[0]) < 100 for call in loads_spy.call_args_list)
+
+
+def testIterPluginResults_whenEntriesAreMalformed_skipsThem(parsing_mode: str) -> None:
+    """Test entries that are not plugin results are skipped."""
+    line = b'["https://ostorlab.co",200,["NotAList",[123,[]],["OnlyName"],["nginx",[1,{"version":"2"}]]]]'
+
+    plugin_results = list(log_parser.iter_plugin_results(line))
+
+    assert plugin_results == [log_parser.PluginResult("nginx", ["2"])]
+
+
+def testIterPluginResults_whenPluginHasSeveralResults_mergesThem(
+    parsing_mode: str,
+) -> None:
+    """Test the versions of all the results of a plugin are kept in order, with the last string."""
+    line = b'["https://ostorlab.co",200,[["HTTPServer",[{"string":"a"},{"version":"1"},{"string":"b","version":["2","3"]},{"os":"Linux"}]]]]'
+
+    plugin_results = list(log_parser.iter_plugin_results(line))
+
+    assert plugin_results == [
+        log_parser.PluginResult("HTTPServer", ["1", "2", "3"], "b")
+    ]
+
+
+def testIterPluginResults_whenLeanLogLine_yieldsTheMergedResultOfEveryPlugin(
+    parsing_mode: str,
+) -> None:
+    """Test the single result object of the plugins of a lean log line is read as their only result."""
+    line = b'["https://ostorlab.co",200,[["nginx",{"version":["1.0"],"string":"nginx"}],["Title",{"string":"x"}],["PHP",{}]]]'
+
+    plugin_results = list(log_parser.iter_plugin_results(line))
+
+    assert plugin_results == [
+        log_parser.PluginResult("nginx", ["1.0"], "nginx"),
+        log_parser.PluginResult("PHP", []),
+    ]
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        b'["https://ostorlab.co",200,[["nginx",[{"version":"1.0"}]]',
+        b'["https://ostorlab.co",200,[["nginx",[{"version" "1.0"}]]]]',
+        b'["https://ostorlab.co",200,[["nginx",[{"string":["unterminated]}]]]]',
+        b"",
+    ],
+)
+def testIterPluginResults_whenLineIsNotValidJson_raisesJSONDecodeError(
+    line: bytes, parsing_mode: str
+) -> None:
+    """Test invalid lines fail like decoding them with the json module."""
+    with pytest.raises(json.JSONDecodeError):
+        list(log_parser.iter_plugin_results(line))
+
+
+@pytest.fixture
+def streamed_log(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Parses every line of a log incrementally, reading it in chunks of a few bytes."""
+    monkeypatch.setattr(log_parser, "INCREMENTAL_LINE_BYTES", 16)
+    monkeypatch.setattr(log_parser, "READ_CHUNK_BYTES", 7)
+
+
+@pytest.mark.parametrize(
+    "output_file",
+    ["output.json", "ip_output.json", "sap_output.json", "broadworks_output.json"],
+)
+def testIterLog_whenLinesAreStreamed_matchesTheDecodedLines(
+    output_file: str, streamed_log: None
+) -> None:
+    """Test the lines parsed while reading the log match the decoded lines and are kept byte for byte."""
+    output = (TESTS_DIR / output_file).read_bytes()
+
+    log_lines = list(log_parser.iter_log(io.BytesIO(output), keep_lines=True))
+
+    lines = [line for line in output.splitlines(keepends=True) if line.strip() != b""]
+    assert [log_line.plugin_results for log_line in log_lines] == [
+        _decode_line(line) for line in lines
+    ]
+    assert [log_line.line for log_line in log_lines] == lines
+    assert all(
+        line.startswith(log_line.head) for log_line, line in zip(log_lines, lines)
+    )
+
+
+def testIterLog_whenLogExceedsTheCap_stopsReadingAtTheCap(streamed_log: None) -> None:
+    """Test the line crossing the cap is dropped and the log is not read past the cap."""
+    first = b'["https://a.co",200,[["nginx",[{"version":["1.0"]}]]]]\n'
+    second = (
+        b'["https://b.co",200,[["Apache",[{"string":["' + b"x" * 1000 + b'"]}]]]]\n'
+    )
+    stream = io.BytesIO(first + second + first)
+
+    log_lines = list(log_parser.iter_log(stream, max_bytes=len(first) + 100))
+
+    assert [log_line.plugin_results for log_line in log_lines] == [_decode_line(first)]
+    assert stream.tell() <= len(first) + 100 + log_parser.READ_CHUNK_BYTES
+
+
+@pytest.mark.parametrize("incremental_line_bytes", [16, 64 * 1024])
+def testIterLog_whenLogIsPartial_dropsTheUnterminatedLastLine(
+    incremental_line_bytes: int, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test the last line of a killed scan is dropped, it is kept when the scan exited."""
+    monkeypatch.setattr(log_parser, "INCREMENTAL_LINE_BYTES", incremental_line_bytes)
+    monkeypatch.setattr(log_parser, "READ_CHUNK_BYTES", 7)
+    first = b'["https://a.co",200,[["nginx",[{"version":["1.0"]}]]]]\n'
+    last = b'["https://b.co",200,[["Apache",[{"version":["2.4"]}]]]]'
+
+    partial_lines = list(log_parser.iter_log(io.BytesIO(first + last), partial=True))
+    complete_lines = list(log_parser.iter_log(io.BytesIO(first + last)))
+
+    assert [log_line.plugin_results for log_line in partial_lines] == [
+        _decode_line(first)
+    ]
+    assert [log_line.plugin_results for log_line in complete_lines] == [
+        _decode_line(first),
+        _decode_line(last),
+    ]
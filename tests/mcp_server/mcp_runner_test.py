@@ -30,3 +30,132 @@ def testMCPRunner_whenRun_shouldCallPopenWithCorrectCommand(
     popen_mock.assert_called_once_with(
         expected_command,
     )
+
+
+def testMCPRunner_whenWorkerPoolSizeIsSet_passesItToTheServer(
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test MCPRunner forwards the worker pool size to the MCP server."""
+    popen_mock = mocker.patch("subprocess.Popen")
+    runner = mcp_runner.MCPRunner(
+        agent_key="agent/ostorlab/whatweb_agent",
+        agent_version="1.0.0",
+        worker_pool_size=4,
+    )
+
+    runner.run()
+
+    command = popen_mock.call_args[0][0]
+    assert command[-2:] == ["--worker-pool-size", "4"]
+
+
+def testMCPRunner_whenCacheTtlIsSet_passesTheCacheOptionsToTheServer(
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test MCPRunner forwards the cache settings to the MCP server."""
+    popen_mock = mocker.patch("subprocess.Popen")
+    runner = mcp_runner.MCPRunner(
+        agent_key="agent/ostorlab/whatweb_agent",
+        cache_ttl=60,
+        cache_max_entries=10,
+        cache_redis_url="redis://redis",
+    )
+
+    runner.run()
+
+    command = popen_mock.call_args[0][0]
+    assert command[-6:] == [
+        "--cache-ttl",
+        "60",
+        "--cache-max-entries",
+        "10",
+        "--cache-redis-url",
+        "redis://redis",
+    ]
+
+
+def testMCPRunner_whenScanTimeoutIsSet_passesTheDeadlineToTheServer(
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test MCPRunner forwards the scan deadline to the MCP server."""
+    popen_mock = mocker.patch("subprocess.Popen")
+    runner = mcp_runner.MCPRunner(
+        agent_key="agent/ostorlab/whatweb_agent", scan_timeout=30
+    )
+
+    runner.run()
+
+    command = popen_mock.call_args[0][0]
+    assert command[-2:] == ["--scan-timeout", "30"]
+
+
+def testMCPRunner_whenLogFormatIsSet_passesItToTheServer(
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test MCPRunner forwards the WhatWeb log format to the MCP server."""
+    popen_mock = mocker.patch("subprocess.Popen")
+    runner = mcp_runner.MCPRunner(
+        agent_key="agent/ostorlab/whatweb_agent", log_format="lean"
+    )
+
+    runner.run()
+
+    command = popen_mock.call_args[0][0]
+    assert command[-2:] == ["--log-format", "lean"]
+
+
+def testMCPRunner_whenMetricsPortIsSet_passesItToTheServer(
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test MCPRunner forwards the metrics port to the MCP server."""
+    popen_mock = mocker.patch("subprocess.Popen")
+    runner = mcp_runner.MCPRunner(
+        agent_key="agent/ostorlab/whatweb_agent", metrics_port=9100
+    )
+
+    runner.run()
+
+    command = popen_mock.call_args[0][0]
+    assert command[-2:] == ["--metrics-port", "9100"]
+
+
+def testMCPRunner_whenMetricsHostIsSet_passesItToTheServer(
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test MCPRunner forwards the bind address of the metrics endpoint to the MCP server."""
+    popen_mock = mocker.patch("subprocess.Popen")
+    runner = mcp_runner.MCPRunner(
+        agent_key="agent/ostorlab/whatweb_agent",
+        metrics_port=9100,
+        metrics_host="0.0.0.0",
+    )
+
+    runner.run()
+
+    command = popen_mock.call_args[0][0]
+    assert command[-4:] == ["--metrics-port", "9100", "--metrics-host", "0.0.0.0"]
+
+
+def testMCPRunner_whenProfilingDirectoryIsSet_passesTheProfilingOptionsToTheServer(
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test MCPRunner forwards the profiling settings to the MCP server."""
+    popen_mock = mocker.patch("subprocess.Popen")
+    runner = mcp_runner.MCPRunner(
+        agent_key="agent/ostorlab/whatweb_agent",
+        profiling_directory="/tmp/profiles",
+        profiling_slowest_targets=5,
+        profiling_traces_url="otlp://collector:4317",
+    )
+
+    runner.run()
+
+    command = popen_mock.call_args[0][0]
+    assert command[-6:] == [
+        "--profiling-directory",
+        "/tmp/profiles",
+        "--profiling-slowest-targets",
+        "5",
+        "--profiling-traces-url",
+        "otlp://collector:4317",
+    ]
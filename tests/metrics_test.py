@@ -0,0 +1,139 @@
+"""Unittests for the Prometheus metrics of the scans."""
+
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections.abc import Iterator
+
+import pytest
+
+from agent import metrics
+
+
+def testCounter_whenIncremented_rendersTheSeriesOfEveryLabel() -> None:
+    registry = metrics.Registry()
+    counter = registry.register(
+        metrics.Counter("scans_total", "Scans.", labels=("code",))
+    )
+
+    counter.inc(code="0")
+    counter.inc(2, code="0")
+    counter.inc(code="timeout")
+
+    assert registry.render().decode().splitlines() == [
+        "# HELP scans_total Scans.",
+        "# TYPE scans_total counter",
+        'scans_total{code="0"} 3.0',
+        'scans_total{code="timeout"} 1.0',
+    ]
+
+
+def testCounter_whenLabelsDoNotMatch_raisesValueError() -> None:
+    counter = metrics.Counter("scans_total", "Scans.", labels=("code",))
+
+    with pytest.raises(ValueError):
+        counter.inc(stage="parse")
+    with pytest.raises(ValueError):
+        counter.inc(-1, code="0")
+
+
+def testGauge_whenTracking_countsTheBlocksRunning() -> None:
+    gauge = metrics.Gauge("running", "Running.")
+    values = []
+
+    with gauge.track():
+        with gauge.track():
+            values.append(gauge.value())
+        values.append(gauge.value())
+    values.append(gauge.value())
+
+    assert values == [2.0, 1.0, 0.0]
+
+
+def testHistogram_whenObserved_rendersCumulativeBuckets() -> None:
+    histogram = metrics.Histogram(
+        "stage_seconds", "Stages.", labels=("stage",), buckets=(0.1, 1.0)
+    )
+
+    histogram.observe(0.05, stage="parse")
+    histogram.observe(0.5, stage="parse")
+    histogram.observe(5, stage="parse")
+
+    assert histogram.samples() == [
+        'stage_seconds_bucket{stage="parse",le="0.1"} 1',
+        'stage_seconds_bucket{stage="parse",le="1.0"} 2',
+        'stage_seconds_bucket{stage="parse",le="+Inf"} 3',
+        'stage_seconds_sum{stage="parse"} 5.55',
+        'stage_seconds_count{stage="parse"} 3',
+    ]
+
+
+def testHistogram_whenTimeDecoratesAFunction_observesEveryCall() -> None:
+    histogram = metrics.Histogram("stage_seconds", "Stages.", labels=("stage",))
+
+    @histogram.time(stage="emit")
+    def emit() -> None:
+        pass
+
+    threads = [threading.Thread(target=emit) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert histogram.count(stage="emit") == 8
+
+
+def testRegistry_whenNameIsRegisteredTwice_raisesValueError() -> None:
+    registry = metrics.Registry()
+    registry.register(metrics.Counter("scans_total", "Scans."))
+
+    with pytest.raises(ValueError):
+        registry.register(metrics.Gauge("scans_total", "Scans."))
+
+
+def testCounted_whenItemsAreConsumed_countsThem() -> None:
+    counter = metrics.Counter("targets_total", "Targets.")
+
+    items = metrics.counted(iter(range(5)), counter)
+
+    assert counter.value() == 0
+    assert list(items) == [0, 1, 2, 3, 4]
+    assert counter.value() == 5
+
+
+def testStartServer_whenScraped_servesTheMetricsInTheTextFormat() -> None:
+    registry = metrics.Registry()
+    registry.register(metrics.Counter("scans_total", "Scans.")).inc()
+    server = metrics.start_server(0, registry=registry)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with urllib.request.urlopen(f"{url}{metrics.METRICS_PATH}") as response:
+            body = response.read()
+            content_type = response.headers["Content-Type"]
+        with pytest.raises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(f"{url}/other")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert server.server_address[0] == metrics.DEFAULT_HOST
+    assert body == registry.render()
+    assert content_type == metrics.CONTENT_TYPE
+    assert e.value.code == 404
+
+
+def testTimed_whenConsumerIsSlow_observesOnlyTheWaitForTheItems() -> None:
+    """Test the time spent by the loop body is not observed, only the time the items took to come."""
+    histogram = metrics.Histogram("test_timed_seconds", "Test.", labels=("stage",))
+
+    def slow_items() -> Iterator[int]:
+        time.sleep(0.05)
+        yield 1
+
+    for _ in metrics.timed(slow_items(), histogram, stage="scan"):
+        time.sleep(0.2)
+
+    assert histogram.count(stage="scan") == 1
+    assert 0.05 <= histogram._sums[("scan",)] < 0.2
@@ -0,0 +1,184 @@
+"""Unit tests for the native fingerprint matcher."""
+
+import http.server
+import json
+import pathlib
+import threading
+import time
+from collections.abc import Iterator
+
+import pytest
+
+from agent import native_matcher
+from agent import signatures
+
+PLUGINS_DIRECTORY = pathlib.Path(__file__).parent.parent / "plugins"
+
+SIGNATURES = [
+    {
+        "name": "Plex Media Server",
+        "matches": [
+            {"search": "headers[server]", "name": "Server", "regexp": "(?mi)Plex"},
+            {"search": "head", "name": "Title", "regexp": "(?mi)<title>Plex</title>"},
+        ],
+    },
+    {
+        "name": "Netgear-Router",
+        "matches": [
+            {
+                "search": "headers[www-authenticate]",
+                "model": '(?m)^Basic realm="?NETGEAR ([^"]+)"?',
+                "offset": 0,
+            }
+        ],
+    },
+    {"name": "pfSense", "matches": [{"search": "body", "text": "Login to pfSense"}]},
+]
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path == "/large":
+            body = b"<title>Plex</title>" + b"a" * 1024 * 1024
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.path == "/drip":
+            self.send_response(200)
+            self.send_header("Content-Length", "1000")
+            self.end_headers()
+            try:
+                for _ in range(1000):
+                    self.wfile.write(b"a")
+                    self.wfile.flush()
+                    time.sleep(0.05)
+            except OSError:
+                pass
+            return
+        if self.path == "/":
+            self.send_response(302)
+            self.send_header("Location", "/web/index.html")
+            self.end_headers()
+            return
+        body = b"<html><head><title>Plex</title></head></html>"
+        self.send_response(200)
+        self.send_header("Server", "Plex")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+@pytest.fixture
+def plex_server_url() -> Iterator[str]:
+    """URL of a local HTTP server answering like Plex behind a redirect."""
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+def testMatcher_whenResponseMatches_returnsWhatWebResults() -> None:
+    """Test matching plugins are reported with their captures and text matches."""
+    matcher = native_matcher.Matcher(SIGNATURES)
+    response = native_matcher.Response(
+        url="http://192.168.0.1/",
+        status=401,
+        headers={"www-authenticate": 'Basic realm="NETGEAR R7000"'},
+        body="<h4>Login to pfSense</h4>",
+    )
+
+    results = dict(matcher.match(response))
+
+    assert results == {
+        "Netgear-Router": [{"model": ["R7000"], "certainty": 100}],
+        "pfSense": [{"text": "Login to pfSense", "certainty": 100}],
+    }
+
+
+def testNativeEngine_whenTargetRedirects_logsEveryResponseOfTheChain(
+    plex_server_url: str,
+) -> None:
+    """Test every response of the redirect chain gets a WhatWeb log line."""
+    engine = native_matcher.NativeEngine(native_matcher.Matcher(SIGNATURES))
+
+    lines = [json.loads(line) for line in engine.scan(plex_server_url).splitlines()]
+    engine.close()
+
+    assert [line[1] for line in lines] == [302, 200]
+    assert lines[0][2] == []
+    assert lines[1][0].endswith("/web/index.html")
+    assert [plugin[0] for plugin in lines[1][2]] == ["Plex Media Server"]
+    assert len(lines[1][2][0][1]) == 2
+
+
+def testNativeEngine_whenTargetIsUnreachable_returnsEmptyLog() -> None:
+    """Test connection errors are logged and produce no results."""
+    engine = native_matcher.NativeEngine(native_matcher.Matcher(SIGNATURES), timeout=1)
+
+    assert engine.scan("http://127.0.0.1:1") == b""
+
+
+def testMatcher_whenIndexed_returnsTheSameResultsAsThePerRegexEvaluation() -> None:
+    """Test the prefilter never drops a match of the repository signatures."""
+    plugin_signatures = signatures.extract_signatures(PLUGINS_DIRECTORY)
+    texts = [
+        match.get("text", "")
+        for signature in plugin_signatures
+        for match in signature["matches"]
+    ]
+    response = native_matcher.Response(
+        url="http://192.168.0.1/",
+        status=200,
+        headers={
+            "server": "Citrix NetScaler, BroadWorks, SAP NetWeaver Application Server 7.5",
+            "www-authenticate": 'Basic realm="NETGEAR R7000"',
+        },
+        body="\n".join(texts)
+        + "<title>PLEX</title> GoAnywhere 7.4.1 system: FreeBSD/8.4-NETSCALER-13.1",
+    )
+
+    indexed_results = native_matcher.Matcher(plugin_signatures).match(response)
+    per_regex_results = native_matcher.Matcher(plugin_signatures, indexed=False).match(
+        response
+    )
+
+    assert len(indexed_results) > 5
+    assert indexed_results == per_regex_results
+
+
+def testNativeEngine_whenBodyExceedsTheCap_readsOnlyTheCappedBytes(
+    plex_server_url: str,
+) -> None:
+    """Test the body read stops at the cap instead of loading the whole body in memory."""
+    engine = native_matcher.NativeEngine(
+        native_matcher.Matcher(SIGNATURES), max_body_bytes=1024
+    )
+
+    lines = [
+        json.loads(line) for line in engine.scan(f"{plex_server_url}large").splitlines()
+    ]
+    engine.close()
+
+    assert len(lines) == 1
+    assert [plugin[0] for plugin in lines[0][2]] == ["Plex Media Server"]
+
+
+def testNativeEngine_whenServerTricklesTheBody_stopsAtTheScanDeadline(
+    plex_server_url: str,
+) -> None:
+    """Test a server sending its body byte by byte can not hold the scan past its deadline."""
+    engine = native_matcher.NativeEngine(native_matcher.Matcher(SIGNATURES), timeout=5)
+
+    started_at = time.monotonic()
+    output = engine.scan(f"{plex_server_url}drip", timeout=0.5)
+    engine.close()
+
+    assert time.monotonic() - started_at < 2
+    assert output == b""
@@ -0,0 +1,59 @@
+"""Unit tests for the multi-pattern prefilter."""
+
+import pytest
+
+from agent import pattern_index
+
+
+@pytest.mark.parametrize(
+    "pattern,expected",
+    [
+        ("(?mi)<title>Plex</title>", frozenset(["<title>plex</title>"])),
+        (
+            r"(?mi)Cleo (VLTrader|Harmony|LexiCom)\/[\d.]+",
+            frozenset(["vltrader", "harmony", "lexicom"]),
+        ),
+        (r"(?m)(VLTrader|Harmony)\s+\d", frozenset(["vltrader", "harmony"])),
+        (r"(?m)BroadWorks[\/\s]+([0-9\.]+)", frozenset(["broadworks"])),
+        (r"(?m)\d+\.\d+", None),
+        (r"(?m)(?:abc)?\d+", None),
+        (r"(?m)ab.cd", None),
+        (r"(?m)(Craft|CRAFT)", frozenset(["craft"])),
+        (r"(?m)Powered by(?= )\s+Plex", frozenset(["powered by"])),
+        (r"(?x)Plex Media", None),
+    ],
+)
+def testRequiredLiterals_always_returnsTheMostSelectiveRequiredFactor(
+    pattern: str, expected: frozenset[str] | None
+) -> None:
+    """Test the literals one of which every match contains are extracted and case folded."""
+    assert pattern_index.required_literals(pattern) == expected
+
+
+def testLiteralAutomaton_whenLiteralsOverlap_findsAllOfThem() -> None:
+    """Test overlapping literals and literals prefixes of others are all found in one scan."""
+    automaton = pattern_index.LiteralAutomaton(
+        ["plex", "lex media", "plex media server", "absent"]
+    )
+
+    assert automaton.find("welcome to plex media server") == {
+        "plex",
+        "lex media",
+        "plex media server",
+    }
+
+
+def testPatternIndex_whenContextContainsALiteral_returnsItsEntriesAndTheUnindexedOnes() -> (
+    None
+):
+    """Test entries without literals are always candidates and others only when a literal is found."""
+    index = pattern_index.PatternIndex(
+        [
+            (0, frozenset(["netscaler"])),
+            (1, None),
+            (2, frozenset(["pfsense", "netgate"])),
+        ]
+    )
+
+    assert index.candidates("Login to Netgate pfSense Plus") == [1, 2]
+    assert index.candidates("") == [1]
@@ -0,0 +1,141 @@
+"""Unittests for the profiling of the scans."""
+
+import json
+import pathlib
+import threading
+import time
+from collections.abc import Iterator
+from typing import Any
+
+import pytest
+
+from agent import profiling
+
+
+def _read_spans(path: pathlib.Path) -> list[dict[str, Any]]:
+    """Reads the spans written by the file exporter, pretty printed JSON objects one after another."""
+    decoder = json.JSONDecoder()
+    content = path.read_text()
+    spans = []
+    position = 0
+    while content[position:].strip() != "":
+        position = len(content) - len(content[position:].lstrip())
+        span, position = decoder.raw_decode(content, position)
+        spans.append(span)
+    return spans
+
+
+@pytest.fixture()
+def profiler(tmp_path: pathlib.Path) -> Iterator[profiling.Profiler]:
+    profiler = profiling.Profiler(str(tmp_path), slowest_targets=2)
+    yield profiler
+    profiler.close()
+
+
+def testProfilerFromSettings_withoutDirectory_returnsNone(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.delenv(profiling.DIRECTORY_ENV_VARIABLE, raising=False)
+
+    assert profiling.Profiler.from_settings(None) is None
+    assert profiling.Profiler.from_settings("") is None
+
+
+def testProfilerFromSettings_withDirectoryEnvironmentVariable_returnsProfiler(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+) -> None:
+    monkeypatch.setenv(profiling.DIRECTORY_ENV_VARIABLE, str(tmp_path / "profiles"))
+
+    profiler = profiling.Profiler.from_settings(None)
+
+    assert profiler is not None
+    profiler.close()
+    assert (tmp_path / "profiles").is_dir()
+
+
+def testSpan_outsideOfATracedTarget_isANoOp() -> None:
+    with profiling.span("parse") as span:
+        assert span is None
+
+
+def testProfiler_whenTargetsAreTraced_exportsTheChildSpansOfEveryTarget(
+    profiler: profiling.Profiler, tmp_path: pathlib.Path
+) -> None:
+    with (
+        profiler.message("v3.asset.domain_name"),
+        profiler.target("https://ostorlab.co:443"),
+    ):
+        with profiling.span("wait"):
+            pass
+        with profiling.span("parse"):
+            pass
+    profiler.close()
+
+    spans = {span["name"]: span for span in _read_spans(tmp_path / "spans.json")}
+    assert set(spans) == {"process", "target", "wait", "parse"}
+    assert spans["target"]["attributes"]["whatweb.target"] == "https://ostorlab.co:443"
+    assert spans["target"]["parent_id"] == spans["process"]["context"]["span_id"]
+    assert spans["parse"]["parent_id"] == spans["target"]["context"]["span_id"]
+
+
+def testProfiler_whenWrappedScanRunsOnAnOtherThread_keepsTheTraceOfTheMessage(
+    profiler: profiling.Profiler, tmp_path: pathlib.Path
+) -> None:
+    scanned: list[int] = []
+    with profiler.message("v3.asset.ip"):
+        scan = profiler.wrap(scanned.append, describe=lambda item: f"target {item}")
+        thread = threading.Thread(target=scan, args=(1,))
+        thread.start()
+        thread.join()
+    profiler.close()
+
+    spans = {span["name"]: span for span in _read_spans(tmp_path / "spans.json")}
+    assert scanned == [1]
+    assert spans["target"]["attributes"]["whatweb.target"] == "target 1"
+    assert spans["target"]["parent_id"] == spans["process"]["context"]["span_id"]
+
+
+def testProfiler_whenMoreTargetsThanKept_keepsTheProfilesOfTheSlowestOnes(
+    profiler: profiling.Profiler, tmp_path: pathlib.Path
+) -> None:
+    for name, duration in [("slow", 0.06), ("fast", 0.001), ("medium", 0.03)]:
+        with profiler.target(name):
+            time.sleep(duration)
+
+    slowest = profiler.slowest
+    summary = json.loads((tmp_path / profiling.SLOWEST_FILE_NAME).read_text())
+    assert [profiled.name for profiled in slowest] == ["slow", "medium"]
+    assert [entry["target"] for entry in summary] == ["slow", "medium"]
+    kept_files = {path.name for path in tmp_path.glob("*_*.*")}
+    assert kept_files == {
+        pathlib.Path(path).name for profiled in slowest for path in profiled.files
+    }
+    assert any(name.endswith(".prof") for name in kept_files)
+    assert any(name.endswith(".tracemalloc") for name in kept_files)
+    assert all("fast" not in name for name in kept_files)
+
+
+def testProfiler_whenSlowTargetsEndWithinTheSnapshotInterval_snapshotsTheAllocationsOnce(
+    tmp_path: pathlib.Path,
+) -> None:
+    profiler = profiling.Profiler(
+        str(tmp_path), slowest_targets=3, snapshot_interval=60
+    )
+    try:
+        for name in ["first", "second", "third"]:
+            with profiler.target(name):
+                pass
+    finally:
+        profiler.close()
+
+    snapshots = list(tmp_path.glob("*.tracemalloc"))
+    assert len(profiler.slowest) == 3
+    assert len(snapshots) == 1
+    assert "first" in snapshots[0].name
+
+
+def testProfilerClose_whenCalledTwice_isANoOp(profiler: profiling.Profiler) -> None:
+    profiler.close()
+    profiler.close()
+
+    profiler.flush()
@@ -0,0 +1,113 @@
+"""Unit tests for the politeness scheduler."""
+
+import pytest
+
+from agent import scheduler
+
+
+class FakeClock:
+    """Clock advanced by the scheduler sleeps only."""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def testTokenBucket_whenEmpty_returnsTheTimeUntilTheNextToken() -> None:
+    """Test a token is available again after 1 / rate seconds."""
+    bucket = scheduler.TokenBucket(rate=2, burst=1, now=0)
+    bucket.consume(0)
+
+    assert bucket.wait_time(0) == 0.5
+    assert bucket.wait_time(0.5) == 0
+
+
+@pytest.mark.parametrize(
+    "host,expected",
+    [
+        ("192.168.0.77", "192.168.0.0/24"),
+        ("2001:db8::1", "2001:db8::/64"),
+        ("ostorlab.co", None),
+    ],
+)
+def testSubnetKey_always_returnsTheSubnetOfIpAddresses(
+    host: str, expected: str | None
+) -> None:
+    """Test IP addresses are grouped per /24 or /64 and domain names are not grouped."""
+    assert scheduler.subnet_key(host) == expected
+
+
+def testSchedule_whenHostBudgetIsExhausted_yieldsOtherHostsFirst() -> None:
+    """Test ready work of other hosts is reordered before work waiting for its host bucket."""
+    clock = FakeClock()
+    politeness = scheduler.PolitenessScheduler(
+        host_rate=1, clock=clock, sleep=clock.sleep
+    )
+
+    scheduled = list(
+        politeness.schedule(["a.com", "a.com", "b.com", "c.com"], lambda host: host)
+    )
+
+    assert scheduled == ["a.com", "b.com", "c.com", "a.com"]
+    assert clock.sleeps == [1.0]
+
+
+def testSchedule_whenSubnetBudgetIsSet_spacesTheHostsOfTheSameSubnet() -> None:
+    """Test hosts of the same /24 share a budget and other subnets are not delayed."""
+    clock = FakeClock()
+    politeness = scheduler.PolitenessScheduler(
+        subnet_rate=2, clock=clock, sleep=clock.sleep
+    )
+    start_times: dict[str, float] = {}
+
+    for host in politeness.schedule(
+        ["10.0.0.1", "10.0.0.2", "10.0.0.3", "10.0.1.1"], lambda host: host
+    ):
+        start_times[host] = clock.now
+
+    assert start_times == {
+        "10.0.0.1": 0.0,
+        "10.0.1.1": 0.0,
+        "10.0.0.2": 0.5,
+        "10.0.0.3": 1.0,
+    }
+
+
+def testSchedule_whenGlobalBudgetIsSet_allowsTheBurstThenTheRate() -> None:
+    """Test the global budget lets `burst` items through, then one item per 1 / rate seconds."""
+    clock = FakeClock()
+    politeness = scheduler.PolitenessScheduler(
+        global_rate=10, burst=3, clock=clock, sleep=clock.sleep
+    )
+
+    scheduled = list(politeness.schedule(range(5), lambda item: f"host-{item}"))
+
+    assert scheduled == [0, 1, 2, 3, 4]
+    assert clock.now == pytest.approx(0.2)
+
+
+def testScheduleBatches_whenBatchExceedsTheHostBurst_chargesTheWholeBatchBeforeTheNext() -> (
+    None
+):
+    """Test a batch is charged a token per target, the next batch of the host waits for the whole charge."""
+    clock = FakeClock()
+    politeness = scheduler.PolitenessScheduler(
+        host_rate=1, clock=clock, sleep=clock.sleep
+    )
+    start_times: list[float] = []
+
+    for batch in politeness.schedule_batches(
+        ["a.com", "a.com", "b.com", "a.com", "a.com"], lambda host: host, size=3
+    ):
+        start_times.append(clock.now)
+        assert len(batch) <= 3
+
+    assert start_times == [0.0, 2.0]
+    assert clock.sleeps == [2.0]
@@ -0,0 +1,68 @@
+"""Unittests for the scope of the scanned domains."""
+
+import re
+
+import pytest
+
+from agent import scope
+
+
+def testScope_withExactDomain_matchesOnlyTheDomain() -> None:
+    domains_scope = scope.Scope(["ostorlab.co"])
+
+    assert "ostorlab.co" in domains_scope
+    assert "api.ostorlab.co" not in domains_scope
+    assert "co" not in domains_scope
+    assert "notostorlab.co" not in domains_scope
+
+
+def testScope_withWildcardDomain_matchesOnlySubdomains() -> None:
+    domains_scope = scope.Scope(["*.ostorlab.co"])
+
+    assert "api.ostorlab.co" in domains_scope
+    assert "a.b.ostorlab.co" in domains_scope
+    assert "ostorlab.co" not in domains_scope
+    assert "api.ostorlab.com" not in domains_scope
+
+
+def testScope_withExactAndWildcardDomains_matchesBoth() -> None:
+    domains_scope = scope.Scope(["ostorlab.co", "*.ostorlab.co", "example.com"])
+
+    assert "ostorlab.co" in domains_scope
+    assert "api.ostorlab.co" in domains_scope
+    assert "example.com" in domains_scope
+    assert "www.example.com" not in domains_scope
+
+
+def testScope_withMixedCaseAndTrailingDot_matchesDomain() -> None:
+    domains_scope = scope.Scope(["Ostorlab.CO."])
+
+    assert "ostorlab.co" in domains_scope
+    assert "OSTORLAB.co." in domains_scope
+
+
+def testScope_withRegex_matchesFromTheStartOfTheDomain() -> None:
+    domains_scope = scope.Scope([r"re:.*\.test$", "re:api"])
+
+    assert "www.ostorlab.test" in domains_scope
+    assert "api.ostorlab.co" in domains_scope
+    assert "www.api.ostorlab.co" not in domains_scope
+
+
+def testScopeFromArgs_withoutEntriesNorRegex_returnsNone() -> None:
+    assert scope.Scope.from_args(None, None) is None
+    assert scope.Scope.from_args([], None) is None
+
+
+def testScopeFromArgs_withEntriesAndRegex_matchesBoth() -> None:
+    domains_scope = scope.Scope.from_args(["example.com"], ".*ostorlab.co")
+
+    assert domains_scope is not None
+    assert "example.com" in domains_scope
+    assert "api.ostorlab.co" in domains_scope
+    assert "www.example.com" not in domains_scope
+
+
+def testScope_withInvalidRegex_raisesError() -> None:
+    with pytest.raises(re.error):
+        scope.Scope(["re:("])
@@ -0,0 +1,104 @@
+"""Unit tests for the extraction of the plugin signatures."""
+
+import pathlib
+import re
+
+import pytest
+
+from agent import signatures
+
+PLUGINS_DIRECTORY = pathlib.Path(__file__).parent.parent / "plugins"
+
+
+def testConvertRegex_whenRubyFlagsAndAnchors_returnsEquivalentPythonPattern() -> None:
+    """Test Ruby's flags, line anchors and escaped slashes are converted."""
+    pattern = signatures.convert_regex(r"^<title>Plex<\/title>.+$", "im")
+
+    assert pattern == r"(?mis)^<title>Plex</title>.+$"
+    assert re.search(pattern, "x\n<TITLE>plex</title>\nfoo") is not None
+
+
+def testConvertRegex_whenRubyOnlyConstructs_returnsPythonEquivalents() -> None:
+    """Test named groups, hex digit escapes and POSIX classes are converted."""
+    pattern = signatures.convert_regex(r"(?<version>\h+)[[:alpha:]]\z")
+
+    found = re.search(pattern, "build 0af3b")
+
+    assert found is not None
+    assert found.group("version") == "0af3"
+
+
+def testConvertRegex_whenConstructHasNoPythonEquivalent_raisesExtractionError() -> None:
+    """Test unsupported Ruby regexes are rejected."""
+    with pytest.raises(signatures.ExtractionError):
+        signatures.convert_regex(r"\p{Alpha}+")
+
+
+def testParseRegex_whenPatternIsConverted_returnsItsTree() -> None:
+    """Test a converted pattern is parsed into literals, groups, repeats and other constructs."""
+    tree = signatures.parse_regex(r"(?mi)a(?P<v>b|\.)+[c]")
+
+    assert tree == signatures.RegexGroup(
+        (
+            (
+                signatures.RegexLiteral("a"),
+                signatures.RegexRepeat(
+                    1,
+                    signatures.RegexGroup(
+                        (
+                            (signatures.RegexLiteral("b"),),
+                            (signatures.RegexLiteral("."),),
+                        )
+                    ),
+                ),
+                signatures.RegexOther(),
+            ),
+        )
+    )
+
+
+@pytest.mark.parametrize("pattern", [r"(?x)a b", r"(a", r"a)", r"[ab"])
+def testParseRegex_whenPatternIsOutsideTheConvertedSubset_raisesExtractionError(
+    pattern: str,
+) -> None:
+    """Test unbalanced patterns and the verbose flag are rejected."""
+    with pytest.raises(signatures.ExtractionError):
+        signatures.parse_regex(pattern)
+
+
+def testExtractPlugin_whenPluginHasMatches_returnsNameAndMatches() -> None:
+    """Test the name and the match declarations of a plugin are extracted."""
+    signature = signatures.extract_plugin((PLUGINS_DIRECTORY / "plex.rb").read_text())
+
+    assert signature["name"] == "Plex Media Server"
+    assert signature["matches"][1] == {
+        "search": "headers[server]",
+        "name": "Plex Server Header",
+        "regexp": "(?mi)Plex",
+    }
+
+
+def testExtractPlugin_whenMatchCapturesAModel_keepsTheCaptureAndItsOffset() -> None:
+    """Test capture declarations are extracted and the search defaults to the body."""
+    signature = signatures.extract_plugin(
+        (PLUGINS_DIRECTORY / "netgear_router.rb").read_text()
+    )
+
+    assert signature["matches"][1]["search"] == "body"
+    assert signature["matches"][1]["offset"] == 0
+    assert "model" in signature["matches"][1]
+
+
+def testExtractPlugin_whenPluginHasCodeBlocks_raisesExtractionError() -> None:
+    """Test plugins with Ruby code are left to WhatWeb."""
+    source = 'Plugin.define do\n name "Code"\n passive do\n  m = []\n end\nend\n'
+
+    with pytest.raises(signatures.ExtractionError):
+        signatures.extract_plugin(source)
+
+
+def testExtractSignatures_always_extractsEveryRepositoryPlugin() -> None:
+    """Test all the custom plugins are supported by the extraction."""
+    extracted = signatures.extract_signatures(PLUGINS_DIRECTORY)
+
+    assert len(extracted) == len(list(PLUGINS_DIRECTORY.glob("*.rb")))
@@ -0,0 +1,98 @@
+"""Unit tests for the pre-forking WhatWeb worker pool."""
+
+import subprocess
+import sys
+import time
+from collections.abc import Iterator
+
+import pytest
+
+from agent import whatweb_pool
+
+FAKE_WORKER = """
+import json
+import sys
+import time
+
+for line in sys.stdin:
+    argv = json.loads(line)["argv"]
+    if argv[0] == "--crash":
+        sys.exit(1)
+    if argv[0] == "--hang":
+        time.sleep(30)
+    status = int(argv[0].split("=")[1]) if argv[0].startswith("--status=") else 0
+    sys.stdout.write(json.dumps({"status": status}) + "\\n")
+    sys.stdout.flush()
+"""
+
+
+@pytest.fixture
+def fake_pool() -> Iterator[whatweb_pool.WorkerPool]:
+    """Pool of fake workers speaking the worker protocol."""
+    pool = whatweb_pool.WorkerPool(
+        size=2, command=[sys.executable, "-c", FAKE_WORKER], cwd="."
+    )
+    yield pool
+    pool.close()
+
+
+def testWorkerPool_whenScanSucceeds_reusesTheSameWorker(
+    fake_pool: whatweb_pool.WorkerPool,
+) -> None:
+    """Test the worker is returned to the pool and reused by the next scan."""
+    fake_pool.run(["--status=0", "https://ostorlab.co"])
+    fake_pool.run(["--status=0", "https://ostorlab.co"])
+
+    assert fake_pool._spawned == 1
+
+
+def testWorkerPool_whenScanFails_raisesCalledProcessError(
+    fake_pool: whatweb_pool.WorkerPool,
+) -> None:
+    """Test a non-zero scan status is surfaced like a failing WhatWeb process."""
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        fake_pool.run(["--status=3", "https://ostorlab.co"])
+
+    assert e.value.returncode == 3
+
+
+def testWorkerPool_whenWorkerDies_replacesTheWorker(
+    fake_pool: whatweb_pool.WorkerPool,
+) -> None:
+    """Test a dead worker is discarded and a new one is spawned for the next scan."""
+    with pytest.raises(subprocess.CalledProcessError):
+        fake_pool.run(["--crash"])
+
+    fake_pool.run(["--status=0", "https://ostorlab.co"])
+
+    assert fake_pool._spawned == 1
+
+
+def testWorkerPool_whenScanExceedsTimeout_killsAndReplacesTheWorker(
+    fake_pool: whatweb_pool.WorkerPool,
+) -> None:
+    """Test a hanging worker is killed at the deadline and a new one serves the next scan."""
+    start = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired):
+        fake_pool.run(["--hang"], timeout=0.2)
+
+    fake_pool.run(["--status=0", "https://ostorlab.co"], timeout=5)
+
+    assert time.monotonic() - start < 5
+    assert fake_pool._spawned == 1
+
+
+def testWorkerPool_whenSizeIsNotPositive_raisesValueError() -> None:
+    """Test the pool rejects an empty size."""
+    with pytest.raises(ValueError):
+        whatweb_pool.WorkerPool(size=0)
+
+
+def testGetWorkerCommand_whenProfilesSelectPlugins_preloadsTheirSelections() -> None:
+    """Test the worker is started with the plugin selections of the profiles it serves."""
+    command = whatweb_pool.get_worker_command(["all", "lean"])
+
+    assert command[:2] == ["ruby", whatweb_pool.definitions.WHATWEB_WORKER_PATH]
+    assert command[2:] == [
+        f"--plugins={','.join(whatweb_pool.definitions.PLUGIN_PROFILES['lean'])}"
+    ]
@@ -1,15 +1,27 @@
 """Unittests for whatweb agent."""
 
+import asyncio
+import ipaddress
 import pathlib
 import subprocess
 import tempfile
+import threading
+import time
 from typing import Any
 
 import pytest
+from ostorlab.agent import definitions as agent_definitions
 from ostorlab.agent.message import message
+from ostorlab.runtimes import definitions as runtime_definitions
 from pytest_mock import plugin
 
+from agent import definitions
+from agent import metrics
+from agent import native_matcher
+from agent import profiling
+from agent import scheduler
 from agent import whatweb_agent
+from tests import conftest
 
 
 def testWhatWebAgent_withDomainMsgAndAllChecksEnabled_emitsFingerprints(
@@ -375,7 +387,7 @@ def testWhatWebAgent_whenIpMsgHasPortAndSchemaAndMask_emitsFingerprints(
             fp.write(op.read())
             fp.seek(0)
             whatweb_test_agent.process(ip_msg_with_port_schema_mask)
-            assert len(agent_mock) == 52
+            assert len(agent_mock) == 32
             assert any(
                 fingerprint_msg.data.get("port") == 80 for fingerprint_msg in agent_mock
             )
@@ -408,7 +420,7 @@ def testWhatWebAgent_whenIpMsgHasPortAndSchemaAndMask_emitsFingerprints(
         mocker.patch("tempfile.NamedTemporaryFile", return_value=fp)
         with open(f"{pathlib.Path(__file__).parent}/ip_output.json", "rb") as op:
             whatweb_test_agent.process(ip_msg_with_port_schema_mask)
-            assert len(agent_mock) == 52
+            assert len(agent_mock) == 32
 
 
 def testWhatWebAgent_whenWhatWebReturnsError_ContinueProcessing(
@@ -677,6 +689,7 @@ def testWhatWebAgent_withIPv4AndMaskButNoVersion_shouldHandleVersionCorrectly(
 
     mock_temp_file = mocker.Mock()
     mock_temp_file.read.return_value = b'{"target":"test","results":[]}'
+    mock_temp_file.readline.return_value = b""
     mock_temp_file.name = "mock_file"
     mock_tempfile = mocker.patch("tempfile.NamedTemporaryFile")
     mock_tempfile.return_value.__enter__.return_value = mock_temp_file
@@ -700,7 +713,7 @@ def testWhatWebAgent_withIPv4AndMaskButNoVersion_shouldHandleVersionCorrectly(
     assert len(calls) == len(expected_ips)
 
     for call, expected_ip in zip(calls, expected_ips):
-        args, kwargs = call
+        args, _ = call
         command = args[0]
         assert any(expected_ip in arg for arg in command), (
             f"Expected IP {expected_ip} not found in command {command}"
@@ -934,3 +947,782 @@ def testWhatWebAgent_whenUrlHasInvalidPort_shouldNotFail(
 
             assert len(agent_mock) > 0
             assert any(msg.data.get("name") == "example.com" for msg in agent_mock)
+
+
+def testWhatWebAgent_whenWorkerPoolIsEnabled_runsScansOnThePool(
+    agent_mock: list[message.Message],
+    whatweb_agent_with_worker_pool: whatweb_agent.AgentWhatWeb,
+    domain_msg: message.Message,
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test that the scans run on the pre-forked workers instead of spawning the WhatWeb binary."""
+    subprocess_mock = mocker.patch("subprocess.run", return_value=None)
+    pool_run_mock = mocker.patch("agent.whatweb_pool.WorkerPool.run", return_value=None)
+    with tempfile.TemporaryFile() as fp:
+        mocker.patch("tempfile.NamedTemporaryFile", return_value=fp)
+        with open(f"{pathlib.Path(__file__).parent}/output.json", "rb") as op:
+            fp.write(op.read())
+            fp.seek(0)
+
+            whatweb_agent_with_worker_pool.process(domain_msg)
+
+    assert subprocess_mock.call_count == 0
+    assert pool_run_mock.call_count == 1
+    assert pool_run_mock.call_args[0][0][0].startswith("--log-json-verbose=")
+    assert pool_run_mock.call_args[0][0][1] == "https://ostorlab.co:443"
+    assert any(
+        fingerprint_msg.data.get("library_name") == "Google-Analytics"
+        for fingerprint_msg in agent_mock
+    )
+
+
+def testWhatWebAgent_whenIpBatchSizeIsSet_scansChunksAndAttributesFingerprintsPerHost(
+    agent_mock: list[message.Message],
+    whatweb_agent_with_ip_batch: whatweb_agent.AgentWhatWeb,
+    scan_message_ipv4_with_mask24: message.Message,
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test IP ranges are scanned by chunks of targets and the results are split back per host."""
+    output = (pathlib.Path(__file__).parent / "ip_output.json").read_bytes()
+    scanned_inputs: list[list[str]] = []
+
+    def run_whatweb(
+        arguments: list[str], worker_pool: Any = None, timeout: Any = None
+    ) -> None:
+        log_file = arguments[0].split("=", 1)[1]
+        input_file = arguments[1].split("=", 1)[1]
+        targets = pathlib.Path(input_file).read_text().splitlines()
+        scanned_inputs.append(targets)
+        pathlib.Path(log_file).write_bytes(output)
+
+    run_mock = mocker.patch("agent.whatweb_utils.run_whatweb", side_effect=run_whatweb)
+
+    whatweb_agent_with_ip_batch.process(scan_message_ipv4_with_mask24)
+
+    assert run_mock.call_count == 3
+    assert [len(targets) for targets in scanned_inputs] == [100, 100, 54]
+    assert run_mock.call_args_list[0].args[0][2] == "--max-threads=25"
+    fingerprints = [m for m in agent_mock if m.data.get("library_name") is not None]
+    assert {m.data["host"] for m in fingerprints} == {
+        "192.168.0.66",
+        "192.168.0.76",
+        "192.168.0.107",
+        "192.168.0.146",
+        "192.168.0.254",
+    }
+    assert any(
+        m.data["host"] == "192.168.0.146" and m.data["library_name"] == "nginx"
+        for m in fingerprints
+    )
+    assert all(
+        m.data["library_name"] != "nginx"
+        for m in fingerprints
+        if m.data["host"] != "192.168.0.146"
+    )
+
+
+def testWhatWebAgent_whenMaxConcurrencyIsSet_scansTargetsConcurrentlyAndIsolatesFailures(
+    agent_mock: list[message.Message],
+    whatweb_agent_with_concurrency: whatweb_agent.AgentWhatWeb,
+    scan_message_ipv4_with_mask29: message.Message,
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test targets are scanned concurrently within the limit and a failing target does not abort the others."""
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+
+    def run_whatweb(
+        arguments: list[str], worker_pool: Any = None, timeout: Any = None
+    ) -> None:
+        nonlocal in_flight, peak
+        log_file = arguments[0].split("=", 1)[1]
+        target = arguments[1]
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.05)
+        with lock:
+            in_flight -= 1
+        if target == "http://192.168.0.2:80":
+            raise subprocess.CalledProcessError(returncode=1, cmd="cmd")
+        if target == "http://192.168.0.3:80":
+            raise RuntimeError("unexpected failure")
+        pathlib.Path(log_file).write_text(
+            f'["{target}",200,[["nginx",[{{"version":["1.0"]}}]]]]\n'
+        )
+
+    mocker.patch("agent.whatweb_utils.run_whatweb", side_effect=run_whatweb)
+
+    whatweb_agent_with_concurrency.process(scan_message_ipv4_with_mask29)
+
+    assert 1 < peak <= 3
+    hosts = {
+        m.data["host"] for m in agent_mock if m.data.get("library_name") == "nginx"
+    }
+    assert hosts == {"192.168.0.1", "192.168.0.4", "192.168.0.5", "192.168.0.6"}
+
+
+def testWhatWebAgent_whenAsyncioEngineIsSet_drivesScansFromAnEventLoop(
+    agent_mock: list[message.Message],
+    whatweb_agent_with_asyncio_engine: whatweb_agent.AgentWhatWeb,
+    scan_message_ipv4_with_mask29: message.Message,
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test the asyncio engine runs the scans concurrently on a single thread and isolates failures."""
+    in_flight = 0
+    peak = 0
+    threads: set[int] = set()
+
+    async def run_whatweb_async(
+        arguments: list[str], timeout: float | None = None, worker_pool: Any = None
+    ) -> None:
+        nonlocal in_flight, peak
+        threads.add(threading.get_ident())
+        log_file = arguments[0].split("=", 1)[1]
+        target = arguments[1]
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.05)
+        in_flight -= 1
+        if target == "http://192.168.0.2:80":
+            raise subprocess.CalledProcessError(returncode=1, cmd="cmd")
+        pathlib.Path(log_file).write_text(
+            f'["{target}",200,[["nginx",[{{"version":["1.0"]}}]]]]\n'
+        )
+
+    subprocess_mock = mocker.patch("subprocess.run")
+    mocker.patch("agent.whatweb_utils.run_whatweb_async", side_effect=run_whatweb_async)
+
+    whatweb_agent_with_asyncio_engine.process(scan_message_ipv4_with_mask29)
+
+    assert subprocess_mock.call_count == 0
+    assert 1 < peak <= 3
+    assert len(threads) == 1
+    hosts = {
+        m.data["host"] for m in agent_mock if m.data.get("library_name") == "nginx"
+    }
+    assert hosts == {
+        "192.168.0.1",
+        "192.168.0.3",
+        "192.168.0.4",
+        "192.168.0.5",
+        "192.168.0.6",
+    }
+
+
+def testWhatWebAgent_whenAsyncioEngineStreamsOutput_raisesValueError(
+    agent_persist_mock: dict[str | bytes, str | bytes],
+    agent_settings_with_asyncio_engine_and_stream_output: runtime_definitions.AgentSettings,
+) -> None:
+    """Test the agent refuses to start when the asyncio engine is asked to stream the WhatWeb log."""
+    del agent_persist_mock
+    with (pathlib.Path(__file__).parent.parent / "ostorlab.yaml").open() as yaml_o:
+        agent_definition = agent_definitions.AgentDefinition.from_yaml(yaml_o)
+
+    with pytest.raises(ValueError, match="does not stream"):
+        whatweb_agent.AgentWhatWeb(
+            agent_definition, agent_settings_with_asyncio_engine_and_stream_output
+        )
+
+
+def testWhatWebAgent_whenStreamOutputIsSet_emitsFingerprintsFromThePipe(
+    agent_mock: list[message.Message],
+    whatweb_agent_with_stream_output: whatweb_agent.AgentWhatWeb,
+    domain_msg: message.Message,
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test the streaming mode parses the lines read from the WhatWeb log pipe, without a temporary file."""
+    lines = (pathlib.Path(__file__).parent / "output.json").read_bytes().splitlines()
+    stream_mock = mocker.patch(
+        "agent.whatweb_utils.stream_whatweb_output",
+        return_value=iter([b"not valid json", *lines]),
+    )
+    tempfile_mock = mocker.patch("tempfile.NamedTemporaryFile")
+
+    whatweb_agent_with_stream_output.process(domain_msg)
+
+    assert tempfile_mock.call_count == 0
+    assert stream_mock.call_args.args[0] == ["https://ostorlab.co:443"]
+    assert any(
+        fingerprint_msg.data.get("library_name") == "Google-Analytics"
+        and fingerprint_msg.data.get("library_version") == "Universal"
+        for fingerprint_msg in agent_mock
+    )
+
+
+def testWhatWebAgent_whenMessageHasLargeNetwork_generatesSlottedTargetsLazily(
+    whatweb_test_agent: whatweb_agent.AgentWhatWeb,
+    scan_message_ipv4_with_mask16: message.Message,
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test IP targets are generated on demand, with schema and port resolved once per message."""
+    get_port_spy = mocker.spy(whatweb_test_agent, "_get_port")
+
+    targets = whatweb_test_agent._prepare_targets(scan_message_ipv4_with_mask16, None)
+    first_targets = [next(targets) for _ in range(3)]
+
+    assert isinstance(targets, list) is False
+    assert [target.name for target in first_targets] == [
+        "192.168.0.1",
+        "192.168.0.2",
+        "192.168.0.3",
+    ]
+    assert hasattr(first_targets[0], "__dict__") is False
+    assert sum(1 for _ in targets) == 65534 - 3
+    assert get_port_spy.call_count == 1
+
+
+@pytest.mark.parametrize(
+    "network,expected_count",
+    [
+        ("192.168.0.0/24", 254),
+        ("192.168.0.0/31", 2),
+        ("192.168.0.1/32", 1),
+        ("2001:db8::/120", 255),
+        ("2001:db8::1/128", 1),
+    ],
+)
+def testCountHosts_always_matchesTheNumberOfGeneratedHosts(
+    network: str, expected_count: int
+) -> None:
+    """Test the targets count is computed without generating the addresses."""
+    ip_network = ipaddress.ip_network(network)
+
+    assert whatweb_agent._count_hosts(ip_network) == expected_count
+    assert whatweb_agent._count_hosts(ip_network) == len(list(ip_network.hosts()))
+
+
+def testWhatWebAgent_whenLeanPluginProfileIsSet_excludesBlacklistedPluginsFromTheScan(
+    agent_mock: list[message.Message],
+    whatweb_agent_with_lean_plugin_profile: whatweb_agent.AgentWhatWeb,
+    domain_msg: message.Message,
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test that the blacklisted plugins are excluded on the WhatWeb command line."""
+    subprocess_mock = mocker.patch("subprocess.run", return_value=None)
+    with tempfile.TemporaryFile() as fp:
+        mocker.patch("tempfile.NamedTemporaryFile", return_value=fp)
+        with open(f"{pathlib.Path(__file__).parent}/output.json", "rb") as op:
+            fp.write(op.read())
+            fp.seek(0)
+
+            whatweb_agent_with_lean_plugin_profile.process(domain_msg)
+
+    command = subprocess_mock.call_args[0][0]
+    plugins_arguments = [arg for arg in command if arg.startswith("--plugins=")]
+    assert len(plugins_arguments) == 1
+    assert "-UncommonHeaders" in plugins_arguments[0].split("=", 1)[1].split(",")
+    assert command[2] == "https://ostorlab.co:443"
+    assert any(
+        fingerprint_msg.data.get("library_name") == "Google-Analytics"
+        for fingerprint_msg in agent_mock
+    )
+
+
+def testWhatWebAgent_whenLivenessPrefilterIsSet_onlyScansResponsiveHosts(
+    agent_mock: list[message.Message],
+    whatweb_agent_with_liveness_prefilter: whatweb_agent.AgentWhatWeb,
+    scan_message_ipv4_with_mask29: message.Message,
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test the IP targets not accepting connections are dropped before spawning WhatWeb."""
+
+    async def is_port_open(host: str, port: int, timeout: float) -> bool:
+        return host in ("192.168.0.2", "192.168.0.5") and port == 80
+
+    mocker.patch("agent.liveness.is_port_open", side_effect=is_port_open)
+    run_whatweb_mock = mocker.patch("agent.whatweb_utils.run_whatweb")
+
+    whatweb_agent_with_liveness_prefilter.process(scan_message_ipv4_with_mask29)
+
+    scanned_targets = [call[0][0][1] for call in run_whatweb_mock.call_args_list]
+    assert scanned_targets == ["http://192.168.0.2:80", "http://192.168.0.5:80"]
+
+
+def testWhatWebAgent_whenCacheIsEnabled_reusesResultsOfAlreadyScannedTargets(
+    agent_mock: list[message.Message],
+    agent_persist_mock: dict[str | bytes, str | bytes],
+    whatweb_agent_with_cache: whatweb_agent.AgentWhatWeb,
+    domain_msg: message.Message,
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test a target scanned by a previous message is emitted from the cache without running WhatWeb."""
+    subprocess_mock = mocker.patch("subprocess.run", return_value=None)
+    with tempfile.TemporaryFile() as fp:
+        mocker.patch("tempfile.NamedTemporaryFile", return_value=fp)
+        with open(f"{pathlib.Path(__file__).parent}/output.json", "rb") as op:
+            fp.write(op.read())
+            fp.seek(0)
+
+            whatweb_agent_with_cache.process(domain_msg)
+    emitted_count = len(agent_mock)
+    agent_persist_mock.clear()
+
+    whatweb_agent_with_cache.process(domain_msg)
+
+    assert subprocess_mock.call_count == 1
+    assert emitted_count > 0
+    assert len(agent_mock) == 2 * emitted_count
+
+
+def testWhatWebAgent_whenNativeEngineIsSet_emitsCustomPluginFingerprintsWithoutWhatWeb(
+    agent_mock: list[message.Message],
+    whatweb_agent_with_native_engine: whatweb_agent.AgentWhatWeb,
+    domain_msg: message.Message,
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test the native matcher fingerprints the fetched response and WhatWeb is never started."""
+    subprocess_mock = mocker.patch("subprocess.run")
+    response = native_matcher.Response(
+        url="https://ostorlab.co/",
+        status=200,
+        headers={"server": "Plex", "x-plex-protocol": "1.0"},
+        body="<html><head><title>Plex</title></head></html>",
+    )
+    mocker.patch(
+        "agent.native_matcher.NativeEngine._fetch", return_value=(response, None)
+    )
+
+    whatweb_agent_with_native_engine.process(domain_msg)
+
+    assert subprocess_mock.call_count == 0
+    assert any(
+        fingerprint_msg.data.get("library_name") == "Plex Media Server"
+        for fingerprint_msg in agent_mock
+    )
+
+
+def testWhatWebAgent_whenIpv6RangeIsScannedInBatches_attributesFingerprintsPerHost(
+    agent_mock: list[message.Message],
+    whatweb_agent_with_ip_batch: whatweb_agent.AgentWhatWeb,
+    scan_message_ipv6_with_mask125: message.Message,
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test IPv6 targets are bracketed in the batch input and their results are matched back to them."""
+    scanned_inputs: list[str] = []
+
+    def run_whatweb(
+        arguments: list[str], worker_pool: Any = None, timeout: Any = None
+    ) -> None:
+        log_file = arguments[0].split("=", 1)[1]
+        input_file = arguments[1].split("=", 1)[1]
+        targets = pathlib.Path(input_file).read_text().splitlines()
+        scanned_inputs.extend(targets)
+        pathlib.Path(log_file).write_text(
+            "".join(f'["{target}/",200,[["nginx",[]]]]\n' for target in targets)
+        )
+
+    mocker.patch("agent.whatweb_utils.run_whatweb", side_effect=run_whatweb)
+
+    whatweb_agent_with_ip_batch.process(scan_message_ipv6_with_mask125)
+
+    assert "http://[2001:db8::1]:80" in scanned_inputs
+    hosts = {
+        m.data["host"] for m in agent_mock if m.data.get("library_name") == "nginx"
+    }
+    assert hosts == {f"2001:db8::{index}" for index in range(1, 8)}
+
+
+def testWhatWebAgent_whenBatchOutputExceedsTheCap_dropsTheLinesPastTheCapOfTheRun(
+    agent_mock: list[message.Message],
+    whatweb_agent_with_ip_batch: whatweb_agent.AgentWhatWeb,
+    scan_message_ipv4_with_mask29: message.Message,
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test the targets of a batch share the output cap of the WhatWeb run instead of getting one cap each."""
+    line_bytes = len(b'["http://192.168.0.1:80",200,[["nginx",[]]]]\n')
+
+    def run_whatweb(
+        arguments: list[str], worker_pool: Any = None, timeout: Any = None
+    ) -> None:
+        log_file = arguments[0].split("=", 1)[1]
+        input_file = arguments[1].split("=", 1)[1]
+        targets = pathlib.Path(input_file).read_text().splitlines()
+        pathlib.Path(log_file).write_text(
+            "".join(f'["{target}",200,[["nginx",[]]]]\n' for target in targets)
+        )
+
+    mocker.patch("agent.whatweb_utils.run_whatweb", side_effect=run_whatweb)
+    whatweb_agent_with_ip_batch._max_output_bytes = 2 * line_bytes
+
+    whatweb_agent_with_ip_batch.process(scan_message_ipv4_with_mask29)
+
+    hosts = {
+        m.data["host"] for m in agent_mock if m.data.get("library_name") == "nginx"
+    }
+    assert hosts == {"192.168.0.1", "192.168.0.2"}
+
+
+def testWhatWebAgent_whenIpBatchSizeAndSubnetRateAreSet_chargesEveryTargetOfABatch(
+    whatweb_agent_with_ip_batch: whatweb_agent.AgentWhatWeb,
+    scan_message_ipv4_with_mask24: message.Message,
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test a batch starts only once the subnet budget allows all its targets, not one target at a time."""
+    now = [0.0]
+    start_times: list[float] = []
+
+    def sleep(seconds: float) -> None:
+        now[0] += seconds
+
+    def run_whatweb(
+        arguments: list[str], worker_pool: Any = None, timeout: Any = None
+    ) -> None:
+        start_times.append(now[0])
+
+    whatweb_agent_with_ip_batch._scheduler = scheduler.PolitenessScheduler(
+        subnet_rate=100, clock=lambda: now[0], sleep=sleep
+    )
+    mocker.patch("agent.whatweb_utils.run_whatweb", side_effect=run_whatweb)
+
+    whatweb_agent_with_ip_batch.process(scan_message_ipv4_with_mask24)
+
+    assert start_times == pytest.approx([0.0, 1.0, 2.0])
+
+
+def testWhatWebAgent_whenSubnetRateIsSet_spacesTheScansOfTheSubnet(
+    whatweb_agent_with_subnet_rate: whatweb_agent.AgentWhatWeb,
+    scan_message_ipv4_with_mask29: message.Message,
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test concurrent scans of the same /24 start no faster than the subnet budget."""
+    start_times: list[float] = []
+
+    def run_whatweb(
+        arguments: list[str], worker_pool: Any = None, timeout: Any = None
+    ) -> None:
+        start_times.append(time.monotonic())
+
+    mocker.patch("agent.whatweb_utils.run_whatweb", side_effect=run_whatweb)
+
+    whatweb_agent_with_subnet_rate.process(scan_message_ipv4_with_mask29)
+
+    assert len(start_times) == 6
+    assert max(start_times) - min(start_times) >= 0.2
+
+
+def testWhatWebAgent_whenScanExceedsItsDeadline_emitsThePartialResultsWithoutCachingThem(
+    agent_mock: list[message.Message],
+    whatweb_agent_with_adaptive_scan_timeout: whatweb_agent.AgentWhatWeb,
+    domain_msg: message.Message,
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test a scan killed at its deadline emits the complete lines written, its cut line is dropped."""
+
+    def run_whatweb(
+        arguments: list[str], worker_pool: Any = None, timeout: Any = None
+    ) -> None:
+        log_file = arguments[0].split("=", 1)[1]
+        pathlib.Path(log_file).write_text(
+            '["https://ostorlab.co",301,[["nginx",[{"version":["1.0"]}]]]]\n["https://ostor'
+        )
+        raise subprocess.TimeoutExpired(arguments, timeout)
+
+    run_mock = mocker.patch("agent.whatweb_utils.run_whatweb", side_effect=run_whatweb)
+    error_log_mock = mocker.patch("agent.whatweb_agent.logger.error")
+
+    whatweb_agent_with_adaptive_scan_timeout.process(domain_msg)
+
+    assert run_mock.call_args.args[2] == 30
+    assert whatweb_agent_with_adaptive_scan_timeout._cache is not None
+    assert len(whatweb_agent_with_adaptive_scan_timeout._cache) == 0
+    assert error_log_mock.call_count == 0
+    assert any(
+        fingerprint_msg.data.get("library_name") == "nginx"
+        and fingerprint_msg.data.get("library_version") == "1.0"
+        for fingerprint_msg in agent_mock
+    )
+
+
+def testWhatWebAgent_whenRedirectChainReportsTheSameFingerprint_emitsItOnce(
+    agent_mock: list[message.Message],
+    whatweb_test_agent: whatweb_agent.AgentWhatWeb,
+    domain_msg: message.Message,
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test the fingerprints of the lines of a redirect chain are merged before being emitted."""
+    mocker.patch("subprocess.run", return_value=None)
+    with tempfile.TemporaryFile() as fp:
+        mocker.patch("tempfile.NamedTemporaryFile", return_value=fp)
+        fp.write((pathlib.Path(__file__).parent / "output.json").read_bytes())
+        fp.seek(0)
+
+        whatweb_test_agent.process(domain_msg)
+
+    cloudflare_msgs = [
+        m
+        for m in agent_mock
+        if m.selector == definitions.DOMAIN_NAME_LIB_SELECTOR
+        and m.data.get("library_name") == "cloudflare"
+    ]
+    assert len(cloudflare_msgs) == 1
+
+
+def testWhatWebAgent_whenStreamedLinesReportTheSameFingerprint_emitsItOnce(
+    agent_mock: list[message.Message],
+    whatweb_agent_with_stream_output: whatweb_agent.AgentWhatWeb,
+    domain_msg: message.Message,
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test a fingerprint already emitted for an earlier line of the stream is not emitted again."""
+    lines = (pathlib.Path(__file__).parent / "output.json").read_bytes().splitlines()
+    mocker.patch("agent.whatweb_utils.stream_whatweb_output", return_value=iter(lines))
+
+    whatweb_agent_with_stream_output.process(domain_msg)
+
+    cloudflare_msgs = [
+        m
+        for m in agent_mock
+        if m.selector == definitions.DOMAIN_NAME_LIB_SELECTOR
+        and m.data.get("library_name") == "cloudflare"
+    ]
+    assert len(cloudflare_msgs) == 1
+
+
+def testWhatWebAgent_whenReportsAreCoalesced_reportsAllTheFingerprintsOfTheTargetOnce(
+    agent_mock: list[message.Message],
+    whatweb_agent_with_coalesced_reports: whatweb_agent.AgentWhatWeb,
+    ip_msg_with_port_schema_mask: message.Message,
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test the coalesced mode sends one vulnerability per target and still emits every library."""
+    mocker.patch("subprocess.run", return_value=None)
+    with tempfile.TemporaryFile() as fp:
+        mocker.patch("tempfile.NamedTemporaryFile", return_value=fp)
+        fp.write((pathlib.Path(__file__).parent / "ip_output.json").read_bytes())
+        fp.seek(0)
+
+        whatweb_agent_with_coalesced_reports.process(ip_msg_with_port_schema_mask)
+
+    library_msgs = [
+        m for m in agent_mock if m.selector == definitions.IP_V4_LIB_SELECTOR
+    ]
+    vuln_msgs = [
+        m for m in agent_mock if m.data.get("title") == "Tech Stack Fingerprint"
+    ]
+    assert len(library_msgs) == 16
+    assert len(vuln_msgs) == 1
+    technical_detail = vuln_msgs[0].data["technical_detail"]
+    assert technical_detail.startswith(
+        "Found 16 fingerprints in target `192.168.0.0`:\n"
+    )
+    assert (
+        "- Found fingerprint `lighttpd`, version `1.4.28`, of type `BACKEND_COMPONENT`"
+        in technical_detail
+    )
+
+
+def testWhatWebAgent_whenLeanLogFormatIsSet_readsTheLeanLog(
+    agent_mock: list[message.Message],
+    whatweb_agent_with_lean_log_format: whatweb_agent.AgentWhatWeb,
+    domain_msg: message.Message,
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test the lean log option is passed to WhatWeb and the lean records are emitted as fingerprints."""
+    subprocess_mock = mocker.patch("subprocess.run", return_value=None)
+    with tempfile.TemporaryFile() as fp:
+        mocker.patch("tempfile.NamedTemporaryFile", return_value=fp)
+        fp.write(
+            b'["https://ostorlab.co:443",200,[["HTTPServer",{"string":"nginx"}],'
+            b'["nginx",{"version":["1.18.0"]}],["Title",{"string":"Ostorlab"}],["HTML5",{}]]]\n'
+        )
+        fp.seek(0)
+
+        whatweb_agent_with_lean_log_format.process(domain_msg)
+
+    command = subprocess_mock.call_args[0][0]
+    assert command[1].startswith("--log-lean-json=")
+    assert [
+        (
+            fingerprint_msg.data.get("library_name"),
+            fingerprint_msg.data.get("library_version"),
+        )
+        for fingerprint_msg in agent_mock
+        if fingerprint_msg.selector.endswith(".library")
+    ] == [("nginx", None), ("nginx", "1.18.0")]
+
+
+def testWhatWebAgent_whenDedupLocalFilterIsSet_skipsRepeatedTargetsWithoutRedisLookups(
+    agent_mock: list[message.Message],
+    whatweb_agent_with_dedup_local_filter: whatweb_agent.AgentWhatWeb,
+    fake_redis_sets: conftest.FakeRedisSets,
+    domain_msg: message.Message,
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test a repeated domain message is answered by the local dedup front and the new target reaches Redis."""
+    scan_mock = mocker.patch(
+        "agent.whatweb_agent.AgentWhatWeb._run_scans", return_value=None
+    )
+
+    for _ in range(3):
+        whatweb_agent_with_dedup_local_filter.process(domain_msg)
+    whatweb_agent_with_dedup_local_filter._dedup_fronts[
+        whatweb_agent.ASSET_DEDUP_KEY
+    ].flush()
+
+    assert scan_mock.call_count == 1
+    assert fake_redis_sets.sets[whatweb_agent.ASSET_DEDUP_KEY] == {
+        b"https_ostorlab.co_443"
+    }
+    stats = whatweb_agent_with_dedup_local_filter._dedup_fronts[
+        whatweb_agent.ASSET_DEDUP_KEY
+    ].stats
+    assert stats.lru_hits == 2
+    # Only the first, new, target was added with a Redis round trip.
+    assert stats.redis_lookups == 1
+
+
+@pytest.mark.parametrize(
+    "url,scanned",
+    [
+        ("https://example.com", True),
+        ("https://www.example.com", False),
+        ("https://api.ostorlab.co/path", True),
+        ("https://ostorlab.co", False),
+        ("https://staging.test:8443", True),
+    ],
+)
+def testWhatWebAgent_withScopeDomains_scansOnlyTheDomainsInScope(
+    agent_mock: list[message.Message],
+    whatweb_agent_with_scope_domains: whatweb_agent.AgentWhatWeb,
+    mocker: plugin.MockerFixture,
+    url: str,
+    scanned: bool,
+) -> None:
+    """Ensure exact domains, subdomain wildcards and regular expressions of the scope are enforced."""
+    start_scan_mock = mocker.patch.object(
+        whatweb_agent_with_scope_domains, "_start_scan"
+    )
+    link_msg = message.Message.from_data(
+        selector="v3.asset.link", data={"url": url, "method": "GET"}
+    )
+
+    whatweb_agent_with_scope_domains.process(link_msg)
+
+    assert start_scan_mock.called is scanned
+    assert len(agent_mock) == 0
+
+
+def testWhatWebAgent_whenLinkMessage_parsesTheUrlOnce(
+    agent_mock: list[message.Message],
+    whatweb_agent_with_scope_arg: whatweb_agent.AgentWhatWeb,
+    link_msg: message.Message,
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Ensure the URL is parsed once for the targets, the dedup and the scope checks."""
+    mocker.patch.object(whatweb_agent_with_scope_arg, "_start_scan")
+    parse_spy = mocker.spy(whatweb_agent_with_scope_arg, "_get_target_from_url")
+
+    whatweb_agent_with_scope_arg.process(link_msg)
+
+    assert parse_spy.call_count == 1
+    assert len(agent_mock) == 0
+
+
+def testWhatWebAgent_whenTargetIsScanned_recordsTheStageLatenciesAndThroughput(
+    agent_mock: list[message.Message],
+    whatweb_test_agent: whatweb_agent.AgentWhatWeb,
+    domain_msg: message.Message,
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Ensure the scan stages are timed and the scanned targets and emitted fingerprints are counted."""
+    stages = [
+        "should_target_be_processed",
+        "start_scan",
+        "parse_emit_result",
+        "send_detected_fingerprints",
+    ]
+    stage_counts = {
+        stage: metrics.STAGE_DURATION.count(stage=stage) for stage in stages
+    }
+    targets = metrics.TARGETS.value()
+    fingerprints = metrics.FINGERPRINTS.value()
+    mocker.patch("subprocess.run", return_value=None)
+    with tempfile.TemporaryFile() as fp:
+        mocker.patch("tempfile.NamedTemporaryFile", return_value=fp)
+        with open(f"{pathlib.Path(__file__).parent}/output.json", "rb") as op:
+            fp.write(op.read())
+            fp.seek(0)
+
+            whatweb_test_agent.process(domain_msg)
+
+    emitted = [
+        fingerprint_msg
+        for fingerprint_msg in agent_mock
+        if fingerprint_msg.selector == definitions.DOMAIN_NAME_LIB_SELECTOR
+    ]
+    assert len(emitted) > 0
+    for stage in stages:
+        assert metrics.STAGE_DURATION.count(stage=stage) > stage_counts[stage]
+    assert metrics.TARGETS.value() == targets + 1
+    assert metrics.FINGERPRINTS.value() == fingerprints + len(emitted)
+
+
+def testWhatWebAgent_whenMetricsPortIsSet_servesTheMetricsOnStart(
+    whatweb_test_agent: whatweb_agent.AgentWhatWeb,
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Ensure the agent serves its metrics endpoint when a metrics port is set."""
+    start_server_mock = mocker.patch("agent.metrics.start_server")
+    whatweb_test_agent._metrics_port = 9100
+
+    whatweb_test_agent.start()
+
+    start_server_mock.assert_called_once_with(9100, host="127.0.0.1")
+
+
+def testWhatWebAgent_whenProfilingIsEnabled_tracesTheTargetAndKeepsItsProfiles(
+    agent_mock: list[message.Message],
+    whatweb_test_agent: whatweb_agent.AgentWhatWeb,
+    domain_msg: message.Message,
+    mocker: plugin.MockerFixture,
+    tmp_path: pathlib.Path,
+) -> None:
+    """Ensure a profiled scan is traced with its stages and the profiles of the target are kept."""
+    profiler = profiling.Profiler(str(tmp_path))
+    whatweb_test_agent._profiler = profiler
+    mocker.patch("subprocess.run", return_value=None)
+    with tempfile.TemporaryFile() as fp:
+        mocker.patch("tempfile.NamedTemporaryFile", return_value=fp)
+        with open(f"{pathlib.Path(__file__).parent}/output.json", "rb") as op:
+            fp.write(op.read())
+            fp.seek(0)
+
+            whatweb_test_agent.process(domain_msg)
+    profiler.close()
+
+    spans = (tmp_path / profiling.SPANS_FILE_NAME).read_text()
+    assert len(agent_mock) > 0
+    assert [profiled.name for profiled in profiler.slowest] == [
+        "https://ostorlab.co:443"
+    ]
+    for span_name in ("process", "target", "wait", "parse", "emit"):
+        assert f'"name": "{span_name}"' in spans
+
+
+def testWhatWebAgent_atExit_closesTheWorkerPool(
+    whatweb_agent_with_worker_pool: whatweb_agent.AgentWhatWeb,
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test the pre-forked workers are stopped when the agent stops."""
+    close_mock = mocker.patch("agent.whatweb_pool.WorkerPool.close")
+
+    whatweb_agent_with_worker_pool.at_exit()
+
+    assert close_mock.call_count == 1
+
+
+def testWhatWebAgent_atExit_closesTheProfiler(
+    whatweb_test_agent: whatweb_agent.AgentWhatWeb,
+    mocker: plugin.MockerFixture,
+    tmp_path: pathlib.Path,
+) -> None:
+    """Test the profiling spans are exported and the tracing of the allocations stops when the agent stops."""
+    profiler = profiling.Profiler(str(tmp_path))
+    close_mock = mocker.spy(profiler, "close")
+    whatweb_test_agent._profiler = profiler
+
+    whatweb_test_agent.at_exit()
+
+    assert close_mock.call_count == 1
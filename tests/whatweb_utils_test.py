@@ -1,12 +1,62 @@
 """Unit tests for whatweb_utils module."""
 
+import asyncio
+import io
+import os
+import pathlib
+import signal
 import subprocess
+import sys
+import time
 
 import pytest
 from pytest_mock import plugin
 
+from agent import definitions
+from agent import metrics
+from agent import whatweb_pool
 from agent import whatweb_utils
 
+# Worker speaking the pool protocol, the scans write two lines to the log path or fail without opening it.
+FAKE_LOG_WORKER = """
+import json
+import sys
+
+for line in sys.stdin:
+    log_option, target = json.loads(line)["argv"][:2]
+    status = 2 if "fail" in target else 0
+    if status == 0:
+        with open(log_option.split("=", 1)[1], "w") as log:
+            log.write(json.dumps([target, 301, []], separators=(",", ":")) + "\\n")
+            log.write(json.dumps([target, 200, []], separators=(",", ":")) + "\\n")
+    sys.stdout.write(json.dumps({"status": status}) + "\\n")
+    sys.stdout.flush()
+"""
+
+
+@pytest.fixture
+def fake_whatweb(tmp_path: pathlib.Path, mocker: plugin.MockerFixture) -> pathlib.Path:
+    """Installs a fake WhatWeb binary that writes one JSON line to its log, or sleeps when asked to."""
+    script = tmp_path / "whatweb"
+    script.write_text(
+        "#!/bin/sh\n"
+        'log="${1#--log-json-verbose=}"\n'
+        'case "$2" in\n'
+        "  *fail*) exit 2 ;;\n"
+        "  *crash*) kill -9 $$ ;;\n"
+        '  *huge*) head -c 1048576 /dev/zero | tr "\\\\0" a >> "$log"; echo >> "$log" ;;\n'
+        "  *slow*) sleep 30 ;;\n"
+        '  *tarpit*) echo "[\\"$2\\",301,[[\\"nginx\\",[]]]]" >> "$log"; printf "[cut" >> "$log"; sleep 30 ;;\n'
+        '  *stream*) echo "[\\"$2\\",301,[]]" >> "$log"; sleep 1 ;;\n'
+        '  *unterminated*) printf "[\\"%s\\",200,[]]" "$2" >> "$log"; exit 0 ;;\n'
+        "esac\n"
+        'echo "[\\"$2\\",200,[[\\"nginx\\",[]]]]" > "$log"\n'
+    )
+    script.chmod(0o755)
+    mocker.patch.object(definitions, "WHATWEB_PATH", str(script))
+    mocker.patch.object(definitions, "WHATWEB_DIRECTORY", str(tmp_path))
+    return script
+
 
 def testParseWhatWebOutput_whenEmptyBytes_returnsEmptyList() -> None:
     """Test parse_whatweb_output handles empty input."""
@@ -184,3 +234,405 @@ def testRunWhatWebScan_whenSubprocessFails_cleansUpFile(
         whatweb_utils.run_whatweb_scan("https://example.com")
 
     assert mock_unlink.call_count == 1
+
+
+def testChunked_whenItemsDoNotFillTheLastChunk_yieldsAShorterChunk() -> None:
+    """Test chunked splits an iterable in lists of the requested size."""
+    result = list(whatweb_utils.chunked(iter(range(5)), 2))
+
+    assert result == [[0, 1], [2, 3], [4]]
+
+
+def testSplitOutputByHost_whenLinesOfSeveralHosts_groupsLinesPerHost() -> None:
+    """Test split_output_by_host attributes every line to the host of its URL."""
+    test_output = (
+        b'["http://192.168.0.1",301,[["nginx",[]]]]\n'
+        b'["https://192.168.0.2/login",200,[["apache",[]]]]\n'
+        b'["https://192.168.0.1/",200,[["PHP",[]]]]\n'
+        b"not valid json\n"
+    )
+
+    result = whatweb_utils.split_output_by_host(test_output)
+
+    assert list(result.keys()) == ["192.168.0.1", "192.168.0.2"]
+    assert len(result["192.168.0.1"]) == 2
+    assert result["192.168.0.2"] == [
+        b'["https://192.168.0.2/login",200,[["apache",[]]]]\n'
+    ]
+
+
+def testSplitOutputByHost_whenTargetRedirectsToAnotherHost_attributesTheRedirectToTheTarget() -> (
+    None
+):
+    """Test the lines of a redirect target are grouped with the scanned host that redirected to it."""
+    test_output = (
+        b'["http://192.168.0.1/",301,[["RedirectLocation",[{"string":"https://www.example.com/"}]]]]\n'
+        b'["https://192.168.0.2/",200,[["apache",[]]]]\n'
+        b'["https://www.example.com/",200,[["nginx",[]]]]\n'
+    )
+
+    result = whatweb_utils.split_output_by_host(
+        test_output, ["192.168.0.1", "192.168.0.2"]
+    )
+
+    assert result["192.168.0.1"] == [
+        b'["http://192.168.0.1/",301,[["RedirectLocation",[{"string":"https://www.example.com/"}]]]]\n',
+        b'["https://www.example.com/",200,[["nginx",[]]]]\n',
+    ]
+    assert "www.example.com" not in result
+
+
+def testBatchOutputAttributor_whenLineIsOfAnUnknownHost_dropsAndCountsIt() -> None:
+    """Test lines of a host that is neither scanned nor a redirect of a scanned host are dropped and counted."""
+    attributor = whatweb_utils.BatchOutputAttributor(["192.168.0.1"])
+    dropped_before = metrics.BATCH_LINES_DROPPED.value()
+
+    assert attributor.attribute(b'["https://192.168.0.1/",200,[]]\n') == "192.168.0.1"
+    assert attributor.attribute(b'["https://other.example.com/",200,[]]\n') is None
+    assert attributor.dropped == 1
+    assert metrics.BATCH_LINES_DROPPED.value() == dropped_before + 1
+
+
+def testRunWhatWebScanAsync_whenScanSucceeds_returnsOutput(
+    fake_whatweb: pathlib.Path,
+) -> None:
+    """Test run_whatweb_scan_async returns the WhatWeb log content."""
+    result = asyncio.run(whatweb_utils.run_whatweb_scan_async("https://example.com"))
+
+    assert result == b'["https://example.com",200,[["nginx",[]]]]\n'
+
+
+def testRunWhatWebScanAsync_whenManyScansInFlight_runsThemOnOneEventLoop(
+    fake_whatweb: pathlib.Path,
+) -> None:
+    """Test several async scans can be awaited together from a single event loop."""
+
+    async def scan_all() -> list[bytes]:
+        return await asyncio.gather(
+            *(
+                whatweb_utils.run_whatweb_scan_async(f"https://example{i}.com")
+                for i in range(20)
+            )
+        )
+
+    results = asyncio.run(scan_all())
+
+    assert len(results) == 20
+    assert all(b"nginx" in result for result in results)
+
+
+def testRunWhatWebAsync_whenScanFails_raisesCalledProcessError(
+    fake_whatweb: pathlib.Path,
+) -> None:
+    """Test run_whatweb_async surfaces a non-zero exit status."""
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        asyncio.run(
+            whatweb_utils.run_whatweb_async(["--log-json-verbose=/dev/null", "fail"])
+        )
+
+    assert e.value.returncode == 2
+
+
+def testRunWhatWebAsync_whenTimeoutExpires_killsProcessAndRaisesTimeoutExpired(
+    fake_whatweb: pathlib.Path,
+) -> None:
+    """Test run_whatweb_async kills a scan that exceeds its timeout."""
+    start = time.monotonic()
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        asyncio.run(
+            whatweb_utils.run_whatweb_async(
+                ["--log-json-verbose=/dev/null", "slow"], timeout=0.2
+            )
+        )
+
+    assert time.monotonic() - start < 5
+
+
+def testRunWhatWebAsync_whenTaskIsCancelled_killsProcessGroup(
+    fake_whatweb: pathlib.Path,
+    mocker: plugin.MockerFixture,
+) -> None:
+    """Test cancelling a scan kills the process group of its WhatWeb process."""
+    kill_spy = mocker.spy(os, "killpg")
+
+    async def cancel_scan() -> None:
+        task = asyncio.create_task(
+            whatweb_utils.run_whatweb_async(["--log-json-verbose=/dev/null", "slow"])
+        )
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_scan())
+
+    assert kill_spy.call_count == 1
+
+
+def testStreamWhatWebOutput_whenScanWritesLines_yieldsThemBeforeTheScanEnds(
+    fake_whatweb: pathlib.Path,
+) -> None:
+    """Test stream_whatweb_output yields each log line as soon as WhatWeb writes it."""
+    start = time.monotonic()
+    stream = whatweb_utils.stream_whatweb_output(["https://stream.example.com"])
+
+    first_line = next(stream)
+    first_line_delay = time.monotonic() - start
+    remaining_lines = list(stream)
+
+    assert first_line == b'["https://stream.example.com",301,[]]\n'
+    assert first_line_delay < 1
+    assert remaining_lines == [b'["https://stream.example.com",200,[["nginx",[]]]]\n']
+
+
+def testStreamWhatWebOutput_whenOutputExceedsTheCap_dropsTheLinesPastIt(
+    fake_whatweb: pathlib.Path,
+) -> None:
+    """Test the lines past the output cap are drained from the pipe without being yielded."""
+    first_line = b'["https://stream.example.com",301,[]]\n'
+
+    lines = list(
+        whatweb_utils.stream_whatweb_output(
+            ["https://stream.example.com"], max_bytes=len(first_line)
+        )
+    )
+
+    assert lines == [first_line]
+
+
+def testStreamWhatWebOutput_whenALineExceedsTheCap_dropsItAndYieldsTheNextLines(
+    fake_whatweb: pathlib.Path,
+) -> None:
+    """Test a line longer than the cap is drained from the pipe in chunks, the lines after it are yielded."""
+    lines = list(
+        whatweb_utils.stream_whatweb_output(
+            ["https://huge.example.com"], max_bytes=1024
+        )
+    )
+
+    assert lines == [b'["https://huge.example.com",200,[["nginx",[]]]]\n']
+
+
+def testStreamWhatWebOutput_whenScanFails_raisesCalledProcessError(
+    fake_whatweb: pathlib.Path,
+) -> None:
+    """Test stream_whatweb_output surfaces a non-zero exit status once the pipe is drained."""
+    with pytest.raises(subprocess.CalledProcessError):
+        list(whatweb_utils.stream_whatweb_output(["https://fail.example.com"]))
+
+
+def testStreamWhatWebOutput_whenScanIsKilledBeforeTheDeadline_raisesCalledProcessError(
+    fake_whatweb: pathlib.Path,
+) -> None:
+    """Test a scan killed by a signal, like the OOM killer, is reported as failed and not as timed out."""
+    with pytest.raises(subprocess.CalledProcessError) as error:
+        list(
+            whatweb_utils.stream_whatweb_output(
+                ["https://crash.example.com"], timeout=30
+            )
+        )
+
+    assert error.value.returncode == -signal.SIGKILL
+
+
+def testStreamWhatWebOutput_whenDeadlineExpires_yieldsCompleteLinesAndRaisesTimeoutExpired(
+    fake_whatweb: pathlib.Path,
+) -> None:
+    """Test the deadline kills the process group holding the pipe, the partially written line is dropped."""
+    start = time.monotonic()
+    lines: list[bytes] = []
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        lines.extend(
+            whatweb_utils.stream_whatweb_output(
+                ["https://tarpit.example.com"], timeout=0.5
+            )
+        )
+
+    assert time.monotonic() - start < 5
+    assert lines == [b'["https://tarpit.example.com",301,[["nginx",[]]]]\n']
+
+
+def testStreamWhatWebOutput_whenLastLineIsUnterminatedOnACleanExit_yieldsIt(
+    fake_whatweb: pathlib.Path,
+) -> None:
+    """Test the last line of a scan exiting cleanly is kept without its newline, even with a deadline."""
+    lines = list(
+        whatweb_utils.stream_whatweb_output(
+            ["https://unterminated.example.com"], timeout=30
+        )
+    )
+
+    assert lines == [b'["https://unterminated.example.com",200,[]]']
+
+
+def testStreamWhatWebOutput_whenWorkerPoolIsGiven_streamsTheLogOfTheWorkerScan() -> (
+    None
+):
+    """Test a streamed scan runs on the worker pool, its log is read from the named pipe the worker writes."""
+    pool = whatweb_pool.WorkerPool(
+        size=1, command=[sys.executable, "-c", FAKE_LOG_WORKER], cwd="."
+    )
+    try:
+        lines = list(
+            whatweb_utils.stream_whatweb_output(
+                ["https://pool.example.com"], worker_pool=pool
+            )
+        )
+    finally:
+        pool.close()
+
+    assert lines == [
+        b'["https://pool.example.com",301,[]]\n',
+        b'["https://pool.example.com",200,[]]\n',
+    ]
+
+
+def testStreamWhatWebOutput_whenWorkerScanFails_raisesCalledProcessError() -> None:
+    """Test the failure of a worker scan is raised once its log is read, also when it never opened the log."""
+    pool = whatweb_pool.WorkerPool(
+        size=1, command=[sys.executable, "-c", FAKE_LOG_WORKER], cwd="."
+    )
+    try:
+        with pytest.raises(subprocess.CalledProcessError):
+            list(
+                whatweb_utils.stream_whatweb_output(
+                    ["https://fail.example.com"], worker_pool=pool, timeout=10
+                )
+            )
+    finally:
+        pool.close()
+
+
+def testRunWhatWeb_whenDeadlineExpires_killsProcessGroupAndRaisesTimeoutExpired(
+    fake_whatweb: pathlib.Path,
+) -> None:
+    """Test a scan exceeding its deadline is killed with the processes it started."""
+    start = time.monotonic()
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        whatweb_utils.run_whatweb(["--log-json-verbose=/dev/null", "slow"], timeout=0.2)
+
+    assert time.monotonic() - start < 5
+
+
+def testRunWhatWebScan_whenDeadlineExpires_attachesCompleteLinesToTheTimeout(
+    fake_whatweb: pathlib.Path,
+) -> None:
+    """Test the complete lines written before the deadline are kept for the caller to emit."""
+    with pytest.raises(subprocess.TimeoutExpired) as e:
+        whatweb_utils.run_whatweb_scan("https://tarpit.example.com", timeout=0.5)
+
+    assert e.value.output == b'["https://tarpit.example.com",301,[["nginx",[]]]]\n'
+
+
+def testRunWhatWebScanAsync_whenDeadlineExpires_attachesCompleteLinesToTheTimeout(
+    fake_whatweb: pathlib.Path,
+) -> None:
+    """Test the async scan keeps the complete lines written before the deadline."""
+    with pytest.raises(subprocess.TimeoutExpired) as e:
+        asyncio.run(
+            whatweb_utils.run_whatweb_scan_async(
+                "https://tarpit.example.com", timeout=0.5
+            )
+        )
+
+    assert e.value.output == b'["https://tarpit.example.com",301,[["nginx",[]]]]\n'
+
+
+def testCompleteLines_whenLastLineIsCut_dropsIt() -> None:
+    """Test the line cut by a kill is dropped and complete lines are kept."""
+    assert whatweb_utils.complete_lines(b'["a",200,[]]\n["b",2') == b'["a",200,[]]\n'
+    assert whatweb_utils.complete_lines(b'["a",2') == b""
+
+
+def testGetOutputLineHost_whenLineIsInvalid_returnsNone() -> None:
+    """Test get_output_line_host ignores lines that are not WhatWeb log lines."""
+    assert whatweb_utils.get_output_line_host(b"not valid json") is None
+    assert whatweb_utils.get_output_line_host(b'["https://Example.com/a",200,[]]') == (
+        "example.com"
+    )
+
+
+def testGetPluginArguments_whenProfileRunsAllPlugins_returnsNoArgument() -> None:
+    """Test the default profile keeps WhatWeb's default plugin selection."""
+    assert whatweb_utils.get_plugin_arguments("all") == []
+
+
+def testGetPluginArguments_whenLeanProfile_excludesEveryBlacklistedPlugin() -> None:
+    """Test the lean profile turns the blacklisted plugins into WhatWeb exclusions."""
+    arguments = whatweb_utils.get_plugin_arguments("lean")
+
+    assert len(arguments) == 1
+    assert arguments[0].startswith("--plugins=")
+    assert arguments[0].removeprefix("--plugins=").split(",") == [
+        f"-{plugin}" for plugin in definitions.BLACKLISTED_PLUGINS
+    ]
+
+
+def testGetPluginArguments_whenProfileIsUnknown_raisesValueError() -> None:
+    """Test an unknown profile is rejected."""
+    with pytest.raises(ValueError):
+        whatweb_utils.get_plugin_arguments("unknown")
+
+
+def testGetLogOption_whenLeanFormat_returnsTheLeanLogOption() -> None:
+    """Test the lean format selects the log option of the lean output module."""
+    assert whatweb_utils.get_log_option("lean") == "--log-lean-json"
+    assert whatweb_utils.get_log_option("verbose") == "--log-json-verbose"
+
+
+def testGetLogOption_whenFormatIsUnknown_raisesValueError() -> None:
+    """Test an unknown log format is rejected."""
+    with pytest.raises(ValueError):
+        whatweb_utils.get_log_option("unknown")
+
+
+def testParseWhatWebOutput_whenLeanLog_returnsTheFingerprintsOfTheVerboseLog() -> None:
+    """Test a lean log line, merging the results of every plugin, yields the fingerprints of its verbose line."""
+    verbose_line = (
+        b'["http://192.168.0.76",200,[["HTTPServer",[{"name":"server string","string":"lighttpd/1.4.28",'
+        b'"certainty":100}]],["lighttpd",[{"regexp":["lighttpd"],"certainty":100},{"version":["1.4.28"],'
+        b'"regexp_compiled":"(?-mix:lighttpd)","certainty":100}]],["IP",[{"string":"192.168.0.76"}]]]]\n'
+    )
+    lean_line = (
+        b'["http://192.168.0.76",200,[["HTTPServer",{"string":"lighttpd/1.4.28"}],'
+        b'["lighttpd",{"version":["1.4.28"]}],["IP",{"string":"192.168.0.76"}]]]\n'
+    )
+
+    fingerprints = whatweb_utils.parse_whatweb_output(lean_line)
+
+    assert fingerprints == whatweb_utils.parse_whatweb_output(verbose_line)
+    assert {"name": "lighttpd", "version": "1.4.28", "type": "BACKEND_COMPONENT"} in (
+        fingerprints
+    )
+
+
+def testReadCappedOutput_whenOutputExceedsTheCap_dropsTheLinesPastIt() -> None:
+    """Test the log is read up to the cap and the line crossing it is dropped whole."""
+    output = b'["a",200,[]]\n["b",200,[]]\n'
+
+    assert whatweb_utils.read_capped_output(io.BytesIO(output), 20) == b'["a",200,[]]\n'
+    assert whatweb_utils.read_capped_output(io.BytesIO(output), 26) == output
+    assert whatweb_utils.read_capped_output(io.BytesIO(output), 0) == output
+
+
+def testRunWhatWeb_whenScansExit_countsTheirExitCodes(
+    fake_whatweb: pathlib.Path,
+) -> None:
+    """Test the exit code of every WhatWeb run is counted, with the runs killed at their deadline."""
+    succeeded = metrics.WHATWEB_EXITS.value(code="0")
+    failed = metrics.WHATWEB_EXITS.value(code="2")
+    timed_out = metrics.WHATWEB_EXITS.value(code="timeout")
+
+    whatweb_utils.run_whatweb(["--log-json-verbose=/dev/null", "ok"])
+    with pytest.raises(subprocess.CalledProcessError):
+        whatweb_utils.run_whatweb(["--log-json-verbose=/dev/null", "fail"])
+    with pytest.raises(subprocess.TimeoutExpired):
+        whatweb_utils.run_whatweb(["--log-json-verbose=/dev/null", "slow"], timeout=0.2)
+
+    assert metrics.WHATWEB_EXITS.value(code="0") == succeeded + 1
+    assert metrics.WHATWEB_EXITS.value(code="2") == failed + 1
+    assert metrics.WHATWEB_EXITS.value(code="timeout") == timed_out + 1
+    assert metrics.SUBPROCESSES_IN_FLIGHT.value() == 0
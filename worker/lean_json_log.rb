@@ -0,0 +1,84 @@
+# Lean JSON log of WhatWeb.
+#
+# The verbose JSON log serializes every plugin result with its compiled regexes, matched payloads and metadata,
+# the agent only reads the versions and strings. The lean log writes one compact line per visited URL:
+#
+#   [url, status, [[plugin, {"version": [...], "string": ...}]...]]
+#
+# Each plugin holds a single result merging the versions of all its results and its last string, a plugin without
+# any of them holds an empty object. The line is a subset of the verbose log, both are read by the same parser.
+#
+# WhatWeb's option parser only knows its own loggers: `--log-lean-json=FILE` is rewritten into
+# `--log-json-verbose=FILE` and the verbose logger is switched to the lean record. The file is required at the
+# end of `lib/whatweb.rb`, the WhatWeb script arguments are rewritten when it is loaded and the pre-forking worker
+# rewrites the arguments of every request.
+
+require 'json'
+
+module LeanJSONLog
+  OPTION = '--log-lean-json'.freeze
+  VERBOSE_OPTION = '--log-json-verbose'.freeze
+  LOCK = Mutex.new
+
+  class << self
+    attr_accessor :enabled
+
+    # Rewrites the lean log option of the arguments into the verbose one and enables the lean record.
+    def rewrite_arguments!(argv)
+      argv.map! do |argument|
+        next argument unless argument == OPTION || argument.start_with?("#{OPTION}=")
+
+        self.enabled = true
+        argument.sub(OPTION, VERBOSE_OPTION)
+      end
+    end
+
+    # Merges the results of a plugin into its versions and its last string.
+    def merge(plugin_results)
+      merged = {}
+      versions = []
+      Array(plugin_results).each do |result|
+        next unless result.is_a?(Hash)
+
+        version = result[:version] || result['version']
+        versions.concat(Array(version)) unless version.nil?
+        string = result[:string] || result['string']
+        merged['string'] = utf8(string) unless string.nil?
+      end
+      merged['version'] = utf8(versions) unless versions.empty?
+      merged
+    end
+
+    # HTTP payloads are binary strings, invalid characters would make the JSON generator fail.
+    def utf8(value)
+      case value
+      when String then value.dup.force_encoding(Encoding::UTF_8).scrub('?')
+      when Array then value.map { |item| utf8(item) }
+      else value.to_s
+      end
+    end
+  end
+
+  def out(target, status, results)
+    return super unless LeanJSONLog.enabled
+
+    plugins = results.map do |plugin_name, plugin_results|
+      [plugin_name.to_s, LeanJSONLog.merge(plugin_results)]
+    end
+    line = JSON.generate([LeanJSONLog.utf8(target.to_s), status, plugins])
+    LOCK.synchronize { @f.puts(line) }
+  end
+end
+
+# The verbose logger class was renamed across WhatWeb versions, a WhatWeb without any of them can not write the
+# lean log and fails to load instead of silently writing the verbose one.
+LEAN_JSON_LOGGER_CLASSES = %w[LoggingJSONVerbose OutputJSONVerbose].select do |logger_class|
+  Object.const_defined?(logger_class)
+end
+if LEAN_JSON_LOGGER_CLASSES.empty?
+  raise NameError, 'Lean JSON log: WhatWeb defines neither LoggingJSONVerbose nor OutputJSONVerbose.'
+end
+
+LEAN_JSON_LOGGER_CLASSES.each { |logger_class| Object.const_get(logger_class).prepend(LeanJSONLog) }
+
+LeanJSONLog.rewrite_arguments!(ARGV)
@@ -0,0 +1,60 @@
+#!/usr/bin/env ruby
+# Pre-forking WhatWeb worker.
+#
+# The worker boots Ruby, the WhatWeb library and the plugin set once, then serves scan requests read from STDIN.
+# Every request is a JSON line `{"argv": [...]}` holding the WhatWeb command line arguments. The scan runs in a
+# forked child that shares the preloaded plugins copy-on-write, and the worker answers with a JSON line
+# `{"status": <exit status>}` on STDOUT once the child exits. The worker stops when STDIN is closed.
+# The lean JSON log option of a request is rewritten in its child, see `lean_json_log.rb`.
+#
+# The worker arguments are the `--plugins=<selection>` options of the plugin profiles the scans will use, every
+# selection is loaded at boot next to the default plugin set.
+
+require 'json'
+
+WHATWEB_ROOT = __dir__
+WHATWEB_SCRIPT = File.join(WHATWEB_ROOT, 'whatweb')
+
+Dir.chdir(WHATWEB_ROOT)
+$LOAD_PATH.unshift(WHATWEB_ROOT)
+$LOAD_PATH.unshift(File.join(WHATWEB_ROOT, 'lib'))
+require 'whatweb'
+
+# Memoize plugin loading so the scans forked from this worker reuse the plugin sets loaded at boot time.
+# WhatWeb passes nil without `--plugins` and the option value otherwise, an empty selection is the default set.
+module PreloadedPlugins
+  def load_plugins(list = nil)
+    key = list.respond_to?(:empty?) && list.empty? ? nil : list
+    @preloaded_plugins ||= {}
+    return @preloaded_plugins[key] if @preloaded_plugins.key?(key)
+
+    @preloaded_plugins[key] = super
+  end
+end
+
+if defined?(PluginSupport) && PluginSupport.respond_to?(:load_plugins)
+  PluginSupport.singleton_class.prepend(PreloadedPlugins)
+  PluginSupport.load_plugins
+  ARGV.each do |argument|
+    PluginSupport.load_plugins(argument.delete_prefix('--plugins=')) if argument.start_with?('--plugins=')
+  end
+end
+ARGV.clear
+
+# STDOUT is reserved for the protocol, WhatWeb's own output is sent to STDERR.
+protocol = $stdout.dup
+protocol.sync = true
+$stdout.reopen($stderr)
+
+$stdin.each_line do |line|
+  request = JSON.parse(line)
+  pid = fork do
+    $stdin.reopen(File::NULL)
+    ARGV.replace(request.fetch('argv'))
+    LeanJSONLog.rewrite_arguments!(ARGV) if defined?(LeanJSONLog)
+    $PROGRAM_NAME = WHATWEB_SCRIPT
+    load WHATWEB_SCRIPT
+  end
+  _, status = Process.wait2(pid)
+  protocol.puts(JSON.generate({ 'status' => status.exitstatus || 1 }))
+end